@@ -23,11 +23,19 @@ from biz.svn.svn_worker import handle_svn_changes, handle_multiple_svn_repositor
 from biz.service.review_service import ReviewService
 from biz.utils.im import notifier
 from biz.utils.log import logger
-from biz.utils.queue import handle_queue
+from biz.utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, WEBHOOK_REQUESTS, render_metrics, \
+    reset_multiproc_dir
+from biz.utils.queue import handle_queue, start_queue_workers, get_queue_metrics, shutdown_queue
+from biz.utils.mr_supersession import MergeRequestSupersession, mr_debouncer, gitlab_mr_key, github_pr_key
+from biz.utils.webhook_inbox import InboxTask, WebhookInbox, record_webhook, reject_webhook, replay_events, \
+    resume_unfinished, supersede_webhook
 from biz.utils.reporter import Reporter
+from biz.llm.failover import ProviderHealthStore
 
 from biz.utils.config_checker import check_config
 from biz.utils.default_config import get_env_bool, get_env_with_default, get_env_int
+from biz.utils.config_snapshot import get_config_snapshot, invalidate_config_snapshot
+from biz.utils.prompt_registry import invalidate_prompt_cache
 
 api_app = Flask(__name__)
 
@@ -42,17 +50,22 @@ svn_check_enabled = get_env_bool('SVN_CHECK_ENABLED')
 # 后台任务相关全局变量
 background_threads = []
 scheduler = None
+# 最近一次加载的配置快照版本（gunicorn 多进程部署时各进程据此发现配置文件变化）
+loaded_config_version = get_config_snapshot().version
 
 
 def reload_config():
     """重新加载配置并重新配置定时任务"""
-    global push_review_enabled, svn_check_enabled, scheduler
+    global push_review_enabled, svn_check_enabled, scheduler, loaded_config_version
     
     try:
         logger.info("🔄 开始重新加载配置...")
         
         # 重新加载环境变量
         load_dotenv("conf/.env", override=True)
+        invalidate_config_snapshot()
+        invalidate_prompt_cache()
+        loaded_config_version = get_config_snapshot().version
         
         # 更新全局配置变量
         push_review_enabled = get_env_bool('PUSH_REVIEW_ENABLED')
@@ -88,6 +101,12 @@ def reload_config():
         return False
 
 
+def reload_config_if_changed():
+    """配置文件变化后重新加载配置（gunicorn 部署时每个进程定期调用，/reload-config 请求只会到达其中一个进程）"""
+    if get_config_snapshot().version != loaded_config_version:
+        reload_config()
+
+
 def setup_signal_handlers():
     """设置信号处理器"""
     def signal_handler(signum, frame):
@@ -162,10 +181,21 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "message": "AI Code Review service is running",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "queue": get_queue_metrics(),
+        "mr_supersession": MergeRequestSupersession.get_stats(),
+        "llm_providers": ProviderHealthStore.get_stats()
     })
 
 
+@api_app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 指标端点"""
+    if not get_env_bool('METRICS_ENABLED'):
+        return jsonify({'message': 'Metrics are disabled'}), 404
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+
 @api_app.route('/review/daily_report', methods=['GET'])
 def daily_report():
     # 获取当前日期0点和23点59分59秒的时间戳
@@ -546,7 +576,7 @@ def setup_scheduler():
         # Start the scheduler
         scheduler.start()
         logger.info("Scheduler started successfully.")        # Shut down the scheduler when exiting the app
-        atexit.register(lambda: scheduler.shutdown())
+        atexit.register(lambda: scheduler.running and scheduler.shutdown())
         
     except Exception as e:
         logger.error(f"❌ Error setting up scheduler: {e}")
@@ -566,12 +596,52 @@ def handle_webhook():
         webhook_source = request.headers.get('X-GitHub-Event')
 
         if webhook_source:  # GitHub webhook
+            WEBHOOK_REQUESTS.inc(source='github', event=webhook_source)
             return handle_github_webhook(webhook_source, data)
         else:  # GitLab webhook
+            WEBHOOK_REQUESTS.inc(source='gitlab', event=data.get('object_kind') or 'unknown')
             return handle_gitlab_webhook(data)
     else:
         return jsonify({'message': 'Invalid data format'}), 400
 
+def _queue_busy_response():
+    """任务队列已满时的响应（背压）"""
+    return jsonify({'message': 'Review queue is full, please retry later.'}), 503
+
+
+def _submit_webhook_task(task, *args):
+    """入队；队列已满时在收件箱中把事件标记为 rejected"""
+    if handle_queue(task, *args):
+        return True
+    reject_webhook(task)
+    return False
+
+
+# webhook 处理函数参数 (webhook_data, token, url, url_slug) 中访问令牌的位置，令牌不写入收件箱
+WEBHOOK_TOKEN_ARG_INDEX = 1
+
+
+def _enqueue_webhook(source, event_type, function, *args):
+    """先写入Webhook收件箱（落盘后返回），再入队"""
+    return _submit_webhook_task(record_webhook(source, event_type, function, args, WEBHOOK_TOKEN_ARG_INDEX), *args)
+
+
+def _enqueue_merge_request(source, event_type, mr_key, head_sha, debounce, function, *args):
+    """
+    写入收件箱、登记MR/PR最新head并入队；debounce为True时在防抖窗口结束后才入队，
+    窗口内同一MR的新事件会替换旧事件（被替换的事件在收件箱中记为 superseded，不再恢复）。
+    防抖事件已返回 200，到期入队失败时由防抖器按退避重试，不标记为 rejected（保持 received，重启后恢复）
+    """
+    task = record_webhook(source, event_type, function, args, WEBHOOK_TOKEN_ARG_INDEX)
+    MergeRequestSupersession.register_head(mr_key, head_sha)
+    debounce_seconds = get_env_int('MR_DEBOUNCE_SECONDS', 0)
+    if debounce and debounce_seconds > 0:
+        event_id = task.event_id if isinstance(task, InboxTask) else None
+        supersede_webhook(mr_debouncer.submit(mr_key, debounce_seconds, lambda: handle_queue(task, *args),
+                                              token=event_id))
+        return True
+    return _submit_webhook_task(task, *args)
+
 
 def handle_github_webhook(event_type, data):    # 获取GitHub配置
     github_token = get_env_with_default('GITHUB_ACCESS_TOKEN') or request.headers.get('X-GitHub-Token')
@@ -587,13 +657,21 @@ def handle_github_webhook(event_type, data):    # 获取GitHub配置
 
     if event_type == "pull_request":
         # 使用handle_queue进行异步处理
-        handle_queue(handle_github_pull_request_event, data, github_token, github_url, github_url_slug)
+        pull_request = data.get('pull_request', {})
+        pr_key = github_pr_key(data.get('repository', {}).get('full_name'), pull_request.get('number'))
+        if not _enqueue_merge_request('github', event_type, pr_key, pull_request.get('head', {}).get('sha'),
+                                      data.get('action') == 'synchronize',
+                                      handle_github_pull_request_event, data, github_token, github_url,
+                                      github_url_slug):
+            return _queue_busy_response()
         # 立马返回响应
         return jsonify(
             {'message': f'GitHub request received(event_type={event_type}), will process asynchronously.'}), 200
     elif event_type == "push":
         # 使用handle_queue进行异步处理
-        handle_queue(handle_github_push_event, data, github_token, github_url, github_url_slug)
+        if not _enqueue_webhook('github', event_type, handle_github_push_event, data, github_token, github_url,
+                                github_url_slug):
+            return _queue_busy_response()
         # 立马返回响应
         return jsonify(
             {'message': f'GitHub request received(event_type={event_type}), will process asynchronously.'}), 200
@@ -632,14 +710,23 @@ def handle_gitlab_webhook(data):
     # 处理Merge Request Hook
     if object_kind == "merge_request":
         # 创建一个新进程进行异步处理
-        handle_queue(handle_merge_request_event, data, gitlab_token, gitlab_url, gitlab_url_slug)
+        object_attributes = data.get('object_attributes', {})
+        mr_key = gitlab_mr_key(gitlab_url_slug, object_attributes.get('target_project_id'),
+                               object_attributes.get('iid'))
+        if not _enqueue_merge_request('gitlab', object_kind, mr_key,
+                                      (object_attributes.get('last_commit') or {}).get('id'),
+                                      object_attributes.get('action') == 'update',
+                                      handle_merge_request_event, data, gitlab_token, gitlab_url, gitlab_url_slug):
+            return _queue_busy_response()
         # 立马返回响应
         return jsonify(
             {'message': f'Request received(object_kind={object_kind}), will process asynchronously.'}), 200
     elif object_kind == "push":
         # 创建一个新进程进行异步处理
         # TODO check if PUSH_REVIEW_ENABLED is needed here
-        handle_queue(handle_push_event, data, gitlab_token, gitlab_url, gitlab_url_slug)
+        if not _enqueue_webhook('gitlab', object_kind, handle_push_event, data, gitlab_token, gitlab_url,
+                                gitlab_url_slug):
+            return _queue_busy_response()
         # 立马返回响应
         return jsonify(
             {'message': f'Request received(object_kind={object_kind}), will process asynchronously.'}), 200
@@ -668,15 +755,18 @@ def manual_svn_check():
 
         # 允许通过查询参数指定仓库名称
         repo_name = request.args.get('repo')
+        WEBHOOK_REQUESTS.inc(source='svn', event='manual')
         
         # 异步处理SVN检查
         if repo_name:
             # 检查特定仓库
-            handle_queue(trigger_specific_svn_repo, repo_name=repo_name, hours=hours)
+            if not handle_queue(trigger_specific_svn_repo, repo_name=repo_name, hours=hours):
+                return _queue_busy_response()
             message = f'仓库 "{repo_name}" 的SVN检查已启动'
         else:
             # 检查所有仓库
-            handle_queue(trigger_svn_check, hours=hours)
+            if not handle_queue(trigger_svn_check, hours=hours):
+                return _queue_busy_response()
             message = 'SVN检查已启动'
         
         # 准备响应消息
@@ -907,6 +997,20 @@ def start_background_tasks():
     
     logger.info("✅ 后台任务初始化完成")
 
+def start_services():
+    """
+    启动工作进程池、恢复未处理完的Webhook事件、启动定时任务调度器与后台任务（每个部署只能有一个进程运行这些服务）
+    工作进程池的进程由单线程的 forkserver 派生，不会从本进程（运行着 HTTP 请求等线程）直接 fork；
+    setup_scheduler 中会先初始化SVN仓库，再启动调度器
+    """
+    start_queue_workers()
+    if get_env_with_default('QUEUE_DRIVER') != 'rq':
+        # 恢复上次运行（容器重启 / 崩溃前）排队中或处理中的Webhook事件；rq 模式下任务保存在 Redis 中
+        resume_unfinished(handle_queue)
+    setup_scheduler()
+    start_background_tasks()
+
+
 def shutdown_background_tasks():
     """关闭后台任务"""
     global background_threads, scheduler
@@ -914,9 +1018,13 @@ def shutdown_background_tasks():
     logger.info("⏹️ 正在关闭后台任务...")
     
     # 关闭调度器
-    if scheduler:
+    if scheduler and scheduler.running:
         scheduler.shutdown()
     
+    # 提交防抖窗口内尚未入队的MR事件，再关闭工作进程池（等待进行中的审查任务完成）
+    mr_debouncer.flush()
+    shutdown_queue()
+    
     # 等待后台线程结束
     for thread in background_threads:
         if thread.is_alive():
@@ -945,6 +1053,34 @@ def retry_review():
         return jsonify({"success": False, "message": f"重新评审失败: {e}"}), 500
 
 
+@api_app.route('/review/inbox/replay', methods=['POST'])
+def replay_webhook_inbox():
+    """
+    管理员按时间范围重放Webhook收件箱中的事件
+    传入参数：start_time、end_time（时间戳，秒），可选 status（状态列表，默认 ["failed", "rejected"]，
+    重放已完成的事件需显式传入 "done"）、source（gitlab/github）
+    收件箱中不保存访问令牌：未配置 GITLAB_ACCESS_TOKEN / GITHUB_ACCESS_TOKEN 时需在请求头
+    X-Gitlab-Token / X-GitHub-Token 中携带令牌
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        start_time = float(data['start_time'])
+        end_time = float(data['end_time'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"success": False, "message": "缺少或无效的start_time/end_time参数"}), 400
+    statuses = data.get('status')
+    if isinstance(statuses, str):
+        statuses = [statuses]
+    try:
+        tokens = {'gitlab': request.headers.get('X-Gitlab-Token'), 'github': request.headers.get('X-GitHub-Token')}
+        result = replay_events(handle_queue, start_time, end_time, statuses=statuses, source=data.get('source'),
+                               tokens=tokens)
+        return jsonify({"success": True, "result": result, "inbox": WebhookInbox.get_stats()})
+    except Exception as e:
+        logger.error(f"重放Webhook事件失败: {e}")
+        return jsonify({"success": False, "message": f"重放Webhook事件失败: {e}"}), 500
+
+
 def initialize_all_svn_repositories():
     """在启动定时器前初始化所有SVN仓库"""
     try:
@@ -1041,13 +1177,13 @@ if __name__ == '__main__':
         # 初始化SVN仓库（必须先于调度器和后台任务执行，避免首次checkout时与后续操作并发竞争导致 "already locked" 错误）
         initialize_all_svn_repositories()
         
-        # 启动定时任务调度器
-        setup_scheduler()
-        
-        # 启动后台任务
-        start_background_tasks()
+        # 清空上次运行遗留的多进程指标文件（先于工作进程池启动）
+        reset_multiproc_dir()
+
+        # 启动工作进程池、定时任务调度器与后台任务
+        start_services()
         
-        # 启动Flask API服务
+        # 启动Flask API服务（开发服务器；生产环境使用 gunicorn -c gunicorn.conf.py api:api_app）
         port = get_env_int('API_PORT')
         logger.info("=" * 60)
         logger.info("🚀 AI-CodeReview API 服务启动中...")
@@ -1060,8 +1196,8 @@ if __name__ == '__main__':
         # 注册优雅关闭处理
         atexit.register(shutdown_background_tasks)
         
-        # 启动 Flask 应用，在 Docker 环境下使用调试模式便于查看日志
-        debug_mode = os.getenv('DOCKER_ENV') == 'true'
+        # 启动 Flask 开发服务器，调试模式需显式开启（FLASK_DEBUG=1），避免对外暴露交互式调试器
+        debug_mode = os.getenv('FLASK_DEBUG') == '1'
         api_app.run(host='0.0.0.0', port=port, debug=debug_mode, use_reloader=False)
     except KeyboardInterrupt:
         logger.info("⏹️ 收到停止信号，正在关闭服务...")
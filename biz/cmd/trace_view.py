@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+审查阶段耗时分解工具
+读取 TRACE_FILE（默认 log/trace.jsonl，含轮转备份），按修订号（SVN revision / Git commit SHA 前缀）找到对应的审查，
+以火焰图式的缩进树打印各阶段耗时、占比与自身耗时。
+
+用法:
+    python biz/cmd/trace_view.py 12345               # 最近一次 r12345 的审查
+    python biz/cmd/trace_view.py 9f3c2ab --repo demo # Git 提交，按仓库过滤
+    python biz/cmd/trace_view.py 12345 --all --collapse
+    python biz/cmd/trace_view.py --list              # 最近的 trace 列表
+"""
+
+import argparse
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent.parent  # 回到项目根目录
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)  # 切换到项目根目录
+
+BAR_WIDTH = 30
+# 树中展示的属性（repo / revision 已在标题中显示）
+SHOWN_ATTRIBUTES = ('batch_index', 'batches', 'files', 'tokens', 'command', 'level', 'channel', 'table')
+
+
+def _duration(span: Dict) -> float:
+    return (span['end_ns'] - span['start_ns']) / 1e9
+
+
+def _revision_matches(value, query: str) -> bool:
+    value = str(value or '')
+    # Git SHA 支持前缀匹配，SVN 修订号需完全一致（避免 12 匹配到 123）
+    return value == query or (len(query) >= 7 and value.startswith(query))
+
+
+def find_review_spans(spans: List[Dict], revision: str, repo: Optional[str] = None) -> List[Dict]:
+    """找出修订号匹配的 span 中最外层的那些（子 span 会继承 revision 属性），按开始时间排序"""
+    revision = revision[1:] if revision[:1] in ('r', 'R') and revision[1:].isdigit() else revision
+    by_id = {span['span_id']: span for span in spans}
+    matched = [span for span in spans if _revision_matches(span['attributes'].get('revision'), revision)
+               and (not repo or span['attributes'].get('repo') == repo)]
+    matched_ids = {span['span_id'] for span in matched}
+    tops = [span for span in matched if span['parent_span_id'] not in matched_ids]
+    for span in tops:
+        span['_parent'] = by_id.get(span['parent_span_id'])
+    return sorted(tops, key=lambda s: s['start_ns'])
+
+
+def _children_index(spans: List[Dict]) -> Dict[str, List[Dict]]:
+    children = defaultdict(list)
+    for span in spans:
+        if span['parent_span_id']:
+            children[span['parent_span_id']].append(span)
+    for items in children.values():
+        items.sort(key=lambda s: s['start_ns'])
+    return children
+
+
+def _collapse(items: List[Dict]) -> List[Dict]:
+    """合并同名兄弟 span：耗时求和，记录次数，子节点合并后继续折叠"""
+    groups: Dict[str, Dict] = {}
+    for span in items:
+        group = groups.get(span['name'])
+        if group is None:
+            groups[span['name']] = dict(span, _count=1, _members=[span], attributes={})
+        else:
+            group['_count'] += 1
+            group['_members'].append(span)
+            group['end_ns'] += span['end_ns'] - span['start_ns']
+    return list(groups.values())
+
+
+def _label(span: Dict) -> str:
+    attributes = ', '.join(f"{key}={span['attributes'][key]}" for key in SHOWN_ATTRIBUTES
+                           if key in span['attributes'])
+    label = span['name'] + (f" [{attributes}]" if attributes else '')
+    if span.get('_count', 1) > 1:
+        label += f" ×{span['_count']}"
+    if span.get('status') == 2:
+        label += ' ❌'
+    return label
+
+
+def print_tree(root: Dict, children: Dict[str, List[Dict]], collapse: bool = False):
+    total = max(_duration(root), 1e-9)
+
+    def _print(span: Dict, depth: int):
+        members = span.get('_members', [span])
+        kids = [kid for member in members for kid in children.get(member['span_id'], [])]
+        if collapse:
+            kids = _collapse(kids)
+        duration = _duration(span)
+        child_time = sum(_duration(kid) for kid in kids)
+        self_time = max(0.0, duration - child_time)
+        share = duration / total
+        bar = '█' * max(1, round(share * BAR_WIDTH)) if duration > 0 else ''
+        name = '  ' * depth + _label(span)
+        print(f"{name:<56} {duration:9.2f}s {share:7.1%}  self {self_time:8.2f}s  {bar}")
+        for kid in kids:
+            _print(kid, depth + 1)
+
+    _print(root, 0)
+
+
+def show_revision(spans: List[Dict], revision: str, repo: Optional[str], show_all: bool, collapse: bool) -> int:
+    tops = find_review_spans(spans, revision, repo)
+    if not tops:
+        print(f"❌ 没有找到修订号 {revision} 的追踪记录（检查 TRACING_ENABLED 与追踪文件是否轮转）")
+        return 1
+    children = _children_index(spans)
+    for top in (tops if show_all else tops[-1:]):
+        attributes = top['attributes']
+        started = datetime.fromtimestamp(top['start_ns'] / 1e9).strftime('%Y-%m-%d %H:%M:%S')
+        print('=' * 110)
+        print(f"📍 仓库 {attributes.get('repo', '-')}  修订 {attributes.get('revision')}  开始 {started}  "
+              f"总耗时 {_duration(top):.2f}s  trace {top['trace_id']}")
+        parent = top.get('_parent')
+        if parent is not None:
+            # 修订号所在的外层 trace（例如一次 SVN 检查）中的其余阶段，便于看到 svn update 等前置耗时
+            siblings = [s for s in children.get(parent['span_id'], []) if s['span_id'] != top['span_id']
+                        and s['attributes'].get('revision') != top['attributes'].get('revision')]
+            summary = ', '.join(f"{s['name']} {_duration(s):.2f}s" for s in siblings if s['name'] != top['name'])
+            print(f"   所属 {_label(parent)} 共 {_duration(parent):.2f}s" + (f"；同级阶段: {summary}" if summary else ''))
+        print('-' * 110)
+        print_tree(top, children, collapse)
+    if len(tops) > 1 and not show_all:
+        print(f"\n（共 {len(tops)} 次记录，使用 --all 查看全部）")
+    return 0
+
+
+def list_traces(spans: List[Dict], limit: int):
+    roots = sorted((s for s in spans if not s['parent_span_id']), key=lambda s: s['start_ns'])[-limit:]
+    if not roots:
+        print("暂无追踪记录")
+        return
+    print(f"{'开始时间':<20} {'阶段':<24} {'仓库':<20} {'修订':<16} {'耗时':>10}")
+    print("-" * 96)
+    for root in roots:
+        started = datetime.fromtimestamp(root['start_ns'] / 1e9).strftime('%Y-%m-%d %H:%M:%S')
+        attributes = root['attributes']
+        print(f"{started:<20} {root['name']:<24} {str(attributes.get('repo', '-')):<20} "
+              f"{str(attributes.get('revision', '-'))[:16]:<16} {_duration(root):9.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='审查阶段耗时分解（读取追踪文件）')
+    parser.add_argument('revision', nargs='?', help='SVN 修订号（如 12345 或 r12345）或 Git 提交 SHA（至少 7 位前缀）')
+    parser.add_argument('--repo', help='按仓库 / 项目名过滤')
+    parser.add_argument('--file', help='追踪文件路径，默认读取 TRACE_FILE')
+    parser.add_argument('--all', action='store_true', help='显示该修订号的全部审查记录（默认只显示最近一次）')
+    parser.add_argument('--collapse', action='store_true', help='合并同名的兄弟阶段（如多批 LLM 审查）')
+    parser.add_argument('--list', action='store_true', help='列出最近的 trace')
+    parser.add_argument('--limit', type=int, default=20, help='--list 显示的条数')
+    args = parser.parse_args()
+
+    from biz.utils.tracing import read_spans
+    spans = read_spans(args.file)
+    if args.list or not args.revision:
+        list_traces(spans, args.limit)
+        return 0
+    return show_revision(spans, args.revision, args.repo, args.all, args.collapse)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
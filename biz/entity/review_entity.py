@@ -1,7 +1,8 @@
 class MergeRequestReviewEntity:
     def __init__(self, project_name: str, author: str, source_branch: str, target_branch: str, updated_at: int,
                  commits: list, score: float, url: str, review_result: str, url_slug: str, webhook_data: dict,
-                 additions: int, deletions: int, mr_id: int = None, trigger_type: str = "webhook"):
+                 additions: int, deletions: int, mr_id: int = None, trigger_type: str = "webhook",
+                 review_mode: str = "full"):
         self.project_name = project_name
         self.author = author
         self.source_branch = source_branch
@@ -17,6 +18,7 @@ class MergeRequestReviewEntity:
         self.deletions = deletions
         self.mr_id = mr_id  # MR在数据库中的ID
         self.trigger_type = trigger_type  # 触发类型: "webhook", "manual", "scheduled"
+        self.review_mode = review_mode  # 审查方式: "full" 全量, "incremental" 只审查自上次审查以来的增量修改
 
     @property
     def commit_messages(self):
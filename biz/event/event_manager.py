@@ -5,6 +5,7 @@ from biz.entity.review_entity import MergeRequestReviewEntity, PushReviewEntity,
 from biz.service.review_service import ReviewService
 from biz.utils.im import notifier
 from biz.utils.default_config import get_env_with_default
+from biz.utils.tracing import span
 
 # 定义全局事件管理器（事件信号）
 event_manager = {
@@ -383,12 +384,14 @@ def on_merge_request_reviewed(mr_review_entity: MergeRequestReviewEntity):
     # 生成推送消息内容
     im_msg = _generate_mr_notification_content(mr_review_entity, notification_mode)
     
-    notifier.send_notification(content=im_msg, msg_type='markdown', title='MR审查完成',
-                               project_name=mr_review_entity.project_name, url_slug=mr_review_entity.url_slug,
-                               webhook_data=mr_review_entity.webhook_data)
+    with span('notify'):
+        notifier.send_notification(content=im_msg, msg_type='markdown', title='MR审查完成',
+                                   project_name=mr_review_entity.project_name, url_slug=mr_review_entity.url_slug,
+                                   webhook_data=mr_review_entity.webhook_data)
 
     # 记录到数据库
-    ReviewService().insert_mr_review_log(mr_review_entity)
+    with span('db.insert', table='mr_review_log'):
+        ReviewService().insert_mr_review_log(mr_review_entity)
 
 
 def on_push_reviewed(entity: PushReviewEntity):
@@ -399,12 +402,14 @@ def on_push_reviewed(entity: PushReviewEntity):
     # 生成推送消息内容
     im_msg = _generate_push_notification_content(entity, notification_mode)
 
-    notifier.send_notification(content=im_msg, msg_type='markdown',title=f"{entity.project_name} Push审查",
-                               project_name=entity.project_name, url_slug=entity.url_slug,
-                               webhook_data=entity.webhook_data)
+    with span('notify'):
+        notifier.send_notification(content=im_msg, msg_type='markdown',title=f"{entity.project_name} Push审查",
+                                   project_name=entity.project_name, url_slug=entity.url_slug,
+                                   webhook_data=entity.webhook_data)
 
     # 记录到数据库
-    ReviewService().insert_push_review_log(entity)
+    with span('db.insert', table='push_review_log'):
+        ReviewService().insert_push_review_log(entity)
 
 
 def on_svn_reviewed(entity: SvnReviewEntity):
@@ -418,16 +423,18 @@ def on_svn_reviewed(entity: SvnReviewEntity):
     # url_slug 传入 SVN 线（trunk / branches_xxx / tags_xxx）：
     # 支持通过环境变量 DINGTALK_WEBHOOK_URL_{线} / WECOM_WEBHOOK_URL_{线} / FEISHU_WEBHOOK_URL_{线}
     # 为不同 SVN 线配置不同的推送地址（如 DINGTALK_WEBHOOK_URL_TRUNK、DINGTALK_WEBHOOK_URL_BRANCHES_DEV）
-    notifier.send_notification(
-        content=im_msg, 
-        msg_type='markdown',
-        title=f"{entity.project_name} SVN审查",
-        project_name=entity.project_name,
-        url_slug=entity.branch or None
-    )
+    with span('notify'):
+        notifier.send_notification(
+            content=im_msg, 
+            msg_type='markdown',
+            title=f"{entity.project_name} SVN审查",
+            project_name=entity.project_name,
+            url_slug=entity.branch or None
+        )
 
     # 记录到数据库
-    ReviewService().insert_svn_review_log(entity)
+    with span('db.insert', table='svn_review_log'):
+        ReviewService().insert_svn_review_log(entity)
 
 
 # 连接事件处理函数到事件信号
@@ -16,12 +16,15 @@
 - review_excel_files 合并多文件后，末尾统一输出一行"总分: XX分"（取各文件评估分最低值，
   代表整体风险），供 CodeReviewer.parse_review_score 提取。
 """
+import asyncio
 import re
 from typing import Any, Callable, Dict, List, Optional
 
+from biz.llm.async_runtime import gather_limited, run_sync
 from biz.utils.code_reviewer import BaseReviewer, is_api_error_message
-from biz.utils.default_config import get_env_int
+from biz.utils.default_config import get_env_bool, get_env_int
 from biz.utils.log import logger
+from biz.utils.tool_runner import ToolCallRunner
 
 from biz.excel.excel_reader import WorkbookData, workbook_to_text, workbook_statistics
 from biz.excel.excel_rules import run_rule_checks, format_rule_issues
@@ -173,6 +176,8 @@ class ExcelAgenticReviewer(ExcelReviewer):
         super().__init__()
         self.tool_context = tool_context or {}
         self.max_tool_rounds = get_env_int("AGENTIC_REVIEW_MAX_TOOL_ROUNDS", 5)
+        # 同一次审查的各文件共用：跨文件的相同工具调用只执行一次
+        self.tool_runner = ToolCallRunner(self._dispatch_tool)
 
     def _call_ai(self, user_content: str) -> str:
         """工具调用循环；最终仍失败（返回错误）时降级为不带工具调用的普通审查，
@@ -196,7 +201,8 @@ class ExcelAgenticReviewer(ExcelReviewer):
             {"role": "user", "content": user_content},
         ]
         for round_idx in range(self.max_tool_rounds):
-            response = self.client.completions_with_tools(messages, EXCEL_TOOLS_SCHEMA)
+            with self.tool_runner.model_call():
+                response = self.client.completions_with_tools(messages, EXCEL_TOOLS_SCHEMA)
             tool_calls = response.get("tool_calls") or []
             if not tool_calls:
                 return response.get("content") or ""
@@ -205,8 +211,7 @@ class ExcelAgenticReviewer(ExcelReviewer):
                 f"Excel 配置表审查请求调用工具 (原生协议, 第{round_idx + 1}轮): "
                 f"{[c['name'] for c in tool_calls]}"
             )
-            for call in tool_calls:
-                result_text = self._dispatch_tool(call)
+            for call, result_text in zip(tool_calls, self.tool_runner.run(tool_calls)):
                 messages.append({
                     "role": "tool",
                     "tool_call_id": call["id"],
@@ -217,7 +222,8 @@ class ExcelAgenticReviewer(ExcelReviewer):
             "role": "user",
             "content": "已达到本次审查的最大工具调用次数，请直接基于当前已获得的信息给出最终审查报告，不要再调用工具。",
         })
-        response = self.client.completions_with_tools(messages, [])
+        with self.tool_runner.model_call():
+            response = self.client.completions_with_tools(messages, [])
         return response.get("content") or ""
 
     def _run_text_protocol_loop(self, user_content: str) -> str:
@@ -231,7 +237,8 @@ class ExcelAgenticReviewer(ExcelReviewer):
             {"role": "user", "content": user_content},
         ]
         for round_idx in range(self.max_tool_rounds):
-            content = self.client.completions(messages) or ""
+            with self.tool_runner.model_call():
+                content = self.client.completions(messages) or ""
             tool_call = AgenticCodeReviewer._parse_text_tool_call(content)
             if tool_call is None:
                 return content
@@ -239,7 +246,7 @@ class ExcelAgenticReviewer(ExcelReviewer):
                 f"Excel 配置表审查请求调用工具 (文本协议, 第{round_idx + 1}轮): {tool_call['name']}"
             )
             messages.append({"role": "assistant", "content": content})
-            result_text = self._dispatch_tool(tool_call)
+            result_text = self.tool_runner.run([tool_call])[0]
             messages.append({
                 "role": "user",
                 "content": f"工具 {tool_call['name']} 返回结果：\n{result_text}\n\n"
@@ -250,7 +257,8 @@ class ExcelAgenticReviewer(ExcelReviewer):
             "role": "user",
             "content": "已达到本次审查的最大工具调用次数，请直接给出最终审查报告，不要再输出 tool_call。",
         })
-        return self.client.completions(messages) or ""
+        with self.tool_runner.model_call():
+            return self.client.completions(messages) or ""
 
     def _dispatch_tool(self, call: Dict[str, Any]) -> str:
         """执行单个工具调用；任何异常/未知工具都返回可读错误文本，不中断审查"""
@@ -288,9 +296,8 @@ def review_excel_files(excel_files: List[Dict], commits_text: str = "",
     if not excel_files:
         return "无需要审查的配置表", 0
     reviewer = ExcelAgenticReviewer(tool_context=tool_context) if agentic else ExcelReviewer()
-    reports: List[str] = []
-    file_scores: List[int] = []
-    for f in excel_files:
+
+    def _review_one(f: Dict) -> tuple:
         file_path = f.get('file_path', '未知文件')
         try:
             report = reviewer.review_excel_file(
@@ -317,8 +324,18 @@ def review_excel_files(excel_files: List[Dict], commits_text: str = "",
         score = parse_file_score(report)
         if score is None:
             report = f"{report}\n\n**⚠️ AI 未按输出格式给出「文件评估: XX分」，已按 0 分保守计入**"
-        file_scores.append(score if score is not None else 0)
-        reports.append(report)
+        return report, score if score is not None else 0
+
+    if get_env_bool('LLM_ASYNC_ENABLED') and len(excel_files) > 1:
+        # 各文件互相独立：在共享事件循环上并发审查（单文件内的工具调用循环仍在线程中顺序执行）
+        limit = get_env_int('LLM_ASYNC_MAX_IN_FLIGHT', 32)
+        results = run_sync(gather_limited([asyncio.to_thread(_review_one, f) for f in excel_files], limit))
+    else:
+        results = [_review_one(f) for f in excel_files]
+    if agentic:
+        reviewer.tool_runner.report("excel")
+    reports: List[str] = [report for report, _ in results]
+    file_scores: List[int] = [score for _, score in results]
     report_text = "\n\n---\n\n".join(reports)
     total_score = min(file_scores) if file_scores else 0
     report_text += f"\n\n**总分: {total_score}分**"
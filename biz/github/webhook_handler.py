@@ -4,6 +4,7 @@ import time
 
 import requests
 import fnmatch
+from biz.utils.diff_compactor import compact_changes
 from biz.utils.log import logger
 
 
@@ -56,7 +57,7 @@ def filter_changes(changes: list):
         and not is_path_excluded(item.get('new_path', ''), exclude_patterns)
     ]
     logger.info(f"After filtering by extension: {filtered_changes}")
-    return filtered_changes
+    return compact_changes(filtered_changes)
 
 
 class PullRequestHandler:
@@ -68,6 +69,7 @@ class PullRequestHandler:
         self.event_type = None
         self.repo_full_name = None
         self.action = None
+        self.head_sha = None
         self.parse_event_type()
 
     def parse_event_type(self):
@@ -80,6 +82,7 @@ class PullRequestHandler:
         self.pull_request_number = self.webhook_data.get('pull_request', {}).get('number')
         self.repo_full_name = self.webhook_data.get('repository', {}).get('full_name')
         self.action = self.webhook_data.get('action')
+        self.head_sha = self.webhook_data.get('pull_request', {}).get('head', {}).get('sha')
 
     def get_pull_request_changes(self) -> list:
         # 检查是否为 Pull Request Hook 事件
@@ -163,6 +166,49 @@ class PullRequestHandler:
             logger.warn(f"Failed to get commits: {response.status_code}, {response.text}")
             return []
 
+    def repository_compare(self, base: str, head: str) -> list:
+        # 比较两个提交之间的差异（用于增量审查：上次审查的head到当前head）
+        url = f"https://api.github.com/repos/{self.repo_full_name}/compare/{base}...{head}"
+        headers = {
+            'Authorization': f'token {self.github_token}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
+        response = requests.get(url, headers=headers)
+        logger.debug(
+            f"Get changes response from GitHub for repository_compare: {response.status_code}, {response.text}, URL: {url}")
+
+        if response.status_code == 200:
+            # 转换为GitLab格式的changes
+            changes = []
+            for file in response.json().get('files', []):
+                changes.append({
+                    'old_path': file.get('previous_filename') or file.get('filename'),
+                    'new_path': file.get('filename'),
+                    'diff': file.get('patch', ''),
+                    'status': file.get('status', ''),
+                    'additions': file.get('additions', 0),
+                    'deletions': file.get('deletions', 0),
+                })
+            return changes
+        else:
+            logger.warn(
+                f"Failed to get changes for repository_compare: {response.status_code}, {response.text}")
+            return []
+
+    def is_ancestor(self, ancestor: str, descendant: str) -> bool:
+        # ancestor 是否仍在 descendant 的提交历史中（force-push 改写历史后不再是祖先，增量审查需回退全量）
+        url = f"https://api.github.com/repos/{self.repo_full_name}/compare/{ancestor}...{descendant}"
+        headers = {
+            'Authorization': f'token {self.github_token}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
+        response = requests.get(url, headers=headers, params={'per_page': 1})
+        logger.debug(f"Get compare status response from GitHub: {response.status_code}, URL: {url}")
+        if response.status_code == 200:
+            return response.json().get('status') in ('ahead', 'identical')
+        logger.warn(f"Failed to get compare status: {response.status_code}, {response.text}")
+        return False
+
     def add_pull_request_notes(self, review_result):
         url = f"https://api.github.com/repos/{self.repo_full_name}/issues/{self.pull_request_number}/comments"
         headers = {
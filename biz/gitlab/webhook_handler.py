@@ -5,6 +5,7 @@ from urllib.parse import urljoin
 import fnmatch
 import requests
 
+from biz.utils.diff_compactor import compact_changes
 from biz.utils.log import logger
 
 
@@ -31,7 +32,7 @@ def filter_changes(changes: list):
         if any(item.get('new_path', '').endswith(ext) for ext in supported_extensions)
         and not is_path_excluded(item.get('new_path', ''), exclude_patterns)
     ]
-    return filtered_changes
+    return compact_changes(filtered_changes)
 
 
 def slugify_url(original_url: str) -> str:
@@ -61,6 +62,7 @@ class MergeRequestHandler:
         self.event_type = None
         self.project_id = None
         self.action = None
+        self.head_sha = None
         self.parse_event_type()
 
     def parse_event_type(self):
@@ -75,6 +77,7 @@ class MergeRequestHandler:
         self.merge_request_iid = merge_request.get('iid')
         self.project_id = merge_request.get('target_project_id')
         self.action = merge_request.get('action')
+        self.head_sha = (merge_request.get('last_commit') or {}).get('id')
 
     def get_merge_request_changes(self) -> list:
         # 检查是否为 Merge Request Hook 事件
@@ -132,6 +135,37 @@ class MergeRequestHandler:
             logger.warn(f"Failed to get commits: {response.status_code}, {response.text}")
             return []
 
+    def repository_compare(self, before: str, after: str) -> list:
+        # 比较两个提交之间的差异（用于增量审查：上次审查的head到当前head）
+        url = f"{urljoin(f'{self.gitlab_url}/', f'api/v4/projects/{self.project_id}/repository/compare')}?from={before}&to={after}"
+        headers = {
+            'Private-Token': self.gitlab_token
+        }
+        response = requests.get(url, headers=headers, verify=False)
+        logger.debug(
+            f"Get changes response from GitLab for repository_compare: {response.status_code}, {response.text}, URL: {url}")
+
+        if response.status_code == 200:
+            return response.json().get('diffs', [])
+        else:
+            logger.warn(
+                f"Failed to get changes for repository_compare: {response.status_code}, {response.text}")
+            return []
+
+    def is_ancestor(self, ancestor: str, descendant: str) -> bool:
+        # ancestor 是否仍在 descendant 的提交历史中（force-push 改写历史后不再是祖先，增量审查需回退全量）
+        url = urljoin(f"{self.gitlab_url}/", f"api/v4/projects/{self.project_id}/repository/merge_base")
+        headers = {
+            'Private-Token': self.gitlab_token
+        }
+        response = requests.get(url, headers=headers, params=[('refs[]', ancestor), ('refs[]', descendant)],
+                                verify=False)
+        logger.debug(f"Get merge base response from GitLab: {response.status_code}, {response.text}, URL: {url}")
+        if response.status_code == 200:
+            return response.json().get('id') == ancestor
+        logger.warn(f"Failed to get merge base: {response.status_code}, {response.text}")
+        return False
+
     def add_merge_request_notes(self, review_result):
         url = urljoin(f"{self.gitlab_url}/",
                       f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/notes")
@@ -0,0 +1,55 @@
+"""
+LLM 异步调用的共享事件循环
+每个进程只启动一个后台事件循环线程，同步代码通过 run_sync 把协程提交到该循环并等待结果；
+gather_limited 用信号量限制同时在途的请求数。这样一个进程内即可同时维持大量进行中的 LLM 请求，
+不再需要为每个请求占用一个线程或进程。
+
+fork 出的子进程（如预派生的工作进程）不会继承父进程的事件循环线程，首次使用时按 pid 重新创建。
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+from typing import Any, Awaitable, Iterable, List, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_loop_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """获取（必要时启动）当前进程共享的后台事件循环"""
+    global _loop, _loop_thread, _loop_pid
+    with _lock:
+        if _loop is None or _loop_pid != os.getpid() or _loop.is_closed() \
+                or _loop_thread is None or not _loop_thread.is_alive():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, daemon=True, name="llm-async-loop")
+            thread.start()
+            _loop, _loop_thread, _loop_pid = loop, thread, os.getpid()
+        return _loop
+
+
+def run_sync(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """在共享事件循环上执行协程并同步等待结果（同步调用方的门面）；协程在调用方的 contextvars 上下文中运行"""
+    loop = get_event_loop()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("run_sync 不能在共享事件循环线程内调用，请直接 await")
+    return asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), loop).result(timeout)
+
+
+async def _in_context(coro: Awaitable, context: contextvars.Context) -> Any:
+    return await asyncio.get_running_loop().create_task(coro, context=context)
+
+
+async def gather_limited(coros: Iterable[Awaitable], limit: int) -> List[Any]:
+    """并发执行协程，同时在途数量不超过 limit，结果按输入顺序返回"""
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def _run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(_run(coro) for coro in coros))
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+大模型调用台账
+每次客户端调用（completions / completions_with_tools 及其异步版本）记录一行：供应商、模型、输入 / 缓存命中 /
+输出 token、估算费用、总耗时、首 token 耗时（流式）、重试次数、结果，以及所属项目和关联 ID（MR / 提交 / 修订号），
+用于容量规划与费用分析（UI「LLM 用量」页面）。
+
+- Factory 返回的客户端外层包一层 LedgerClient 计时；token 用量由 biz/llm/usage.py 的回调写入当前调用，
+  限流重试、故障转移、流式首 token 通过 note_call / note_call_retry 补充到当前调用
+- 项目与关联 ID 由审查入口通过 llm_call_context 设置（contextvars，跨线程池 / 事件循环时显式复制上下文）
+- 写库在后台线程中批量进行，调用路径上只有一次入队；队列满时丢弃并计数，不阻塞审查
+- 嵌套的客户端（故障转移的成员客户端）检测到已有进行中的调用时直接透传，不重复记录
+- 每次调用的耗时同时计入 /metrics 的 codereview_llm_call_duration_seconds，关闭台账时仍然统计
+"""
+
+import atexit
+import contextvars
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from biz.llm.usage import register_usage_listener
+from biz.utils.default_config import get_env_bool, get_env_int
+from biz.utils.log import logger
+from biz.utils.metrics import DB_WRITE_SECONDS, LLM_CALL_SECONDS
+
+_COLUMNS = ('created_at', 'provider', 'model', 'method', 'project_name', 'correlation_id', 'prompt_tokens',
+            'cached_tokens', 'completion_tokens', 'cost', 'duration_ms', 'ttft_ms', 'retries', 'outcome', 'error')
+
+_current_call: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar('llm_current_call',
+                                                                                         default=None)
+_call_context: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar('llm_call_context', default={})
+
+
+class LlmCallLedger:
+    """大模型调用台账表（SQLite）"""
+
+    DB_FILE = "data/data.db"
+
+    @staticmethod
+    def init_db():
+        """初始化大模型调用台账表"""
+        try:
+            with sqlite3.connect(LlmCallLedger.DB_FILE) as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS llm_call_ledger (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        created_at INTEGER NOT NULL,
+                        provider TEXT,
+                        model TEXT,
+                        method TEXT,
+                        project_name TEXT,
+                        correlation_id TEXT,
+                        prompt_tokens INTEGER DEFAULT 0,
+                        cached_tokens INTEGER DEFAULT 0,
+                        completion_tokens INTEGER DEFAULT 0,
+                        cost REAL DEFAULT 0,
+                        duration_ms INTEGER,
+                        ttft_ms INTEGER,
+                        retries INTEGER DEFAULT 0,
+                        outcome TEXT,
+                        error TEXT
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_call_ledger_created_at ON llm_call_ledger (created_at)')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"大模型调用台账表初始化失败: {e}")
+
+    @staticmethod
+    @DB_WRITE_SECONDS.time(operation='llm_call_ledger')
+    def insert_many(rows: List[Dict[str, Any]]):
+        with sqlite3.connect(LlmCallLedger.DB_FILE, timeout=10) as conn:
+            conn.executemany(f"INSERT INTO llm_call_ledger ({', '.join(_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                             [tuple(row.get(column) for column in _COLUMNS) for row in rows])
+            conn.commit()
+
+    @staticmethod
+    def delete_before(timestamp: int) -> int:
+        with sqlite3.connect(LlmCallLedger.DB_FILE, timeout=10) as conn:
+            deleted = conn.execute('DELETE FROM llm_call_ledger WHERE created_at < ?', (timestamp,)).rowcount
+            conn.commit()
+        return deleted
+
+    @staticmethod
+    def get_calls(created_at_gte: Optional[int] = None, created_at_lte: Optional[int] = None) -> pd.DataFrame:
+        """按时间范围查询调用记录"""
+        query = f"SELECT {', '.join(_COLUMNS)} FROM llm_call_ledger WHERE 1=1"
+        params = []
+        if created_at_gte is not None:
+            query += ' AND created_at >= ?'
+            params.append(created_at_gte)
+        if created_at_lte is not None:
+            query += ' AND created_at <= ?'
+            params.append(created_at_lte)
+        try:
+            with sqlite3.connect(LlmCallLedger.DB_FILE) as conn:
+                return pd.read_sql_query(query + ' ORDER BY created_at', conn, params=params)
+        except sqlite3.DatabaseError as e:
+            logger.error(f"查询大模型调用台账失败: {e}")
+            return pd.DataFrame(columns=list(_COLUMNS))
+
+
+def summarize_calls(df: pd.DataFrame, group_by: List[str], window_seconds: int) -> pd.DataFrame:
+    """
+    按维度汇总调用记录：调用数、吞吐（次/小时）、耗时 P50/P95、首 token P95、token 与费用、缓存命中率、失败率。
+    window_seconds 为统计时间窗长度，用于计算吞吐。
+    """
+    if df.empty:
+        return pd.DataFrame()
+    grouped = df.groupby(group_by, dropna=False)
+    summary = grouped.agg(calls=('outcome', 'size'),
+                          p50_ms=('duration_ms', lambda s: s.quantile(0.5)),
+                          p95_ms=('duration_ms', lambda s: s.quantile(0.95)),
+                          ttft_p95_ms=('ttft_ms', lambda s: s.dropna().quantile(0.95) if s.notna().any() else None),
+                          prompt_tokens=('prompt_tokens', 'sum'),
+                          cached_tokens=('cached_tokens', 'sum'),
+                          completion_tokens=('completion_tokens', 'sum'),
+                          cost=('cost', 'sum'),
+                          retries=('retries', 'sum'),
+                          errors=('outcome', lambda s: int((s != 'ok').sum())))
+    summary['calls_per_hour'] = summary['calls'] / max(window_seconds / 3600, 1e-9)
+    summary['cache_hit_rate'] = (summary['cached_tokens'] / summary['prompt_tokens'].where(summary['prompt_tokens'] > 0)
+                                 ).fillna(0)
+    summary['error_rate'] = summary['errors'] / summary['calls']
+    return summary.reset_index().sort_values('calls', ascending=False, ignore_index=True)
+
+
+@contextmanager
+def llm_call_context(project_name: str = '', correlation_id: str = ''):
+    """设置当前审查的项目与关联 ID（如 mr:12@abcd1234、push:abcd1234、svn:r1024），范围内的 LLM 调用都记录到该审查名下"""
+    token = _call_context.set({'project_name': project_name or '', 'correlation_id': correlation_id or ''})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def note_call(**fields):
+    """补充当前调用的字段（如流式调用的 ttft_ms），不在调用中时忽略"""
+    call = _current_call.get()
+    if call is not None:
+        call.update(fields)
+
+
+def note_call_retry():
+    """当前调用发生了一次重试（429 重试，或故障转移 / 对冲到下一个供应商）"""
+    call = _current_call.get()
+    if call is not None:
+        call['retries'] += 1
+
+
+def _on_usage(record: Dict[str, Any]):
+    call = _current_call.get()
+    if call is None:
+        return
+    for key in ('prompt_tokens', 'cached_tokens', 'completion_tokens', 'cost'):
+        call[key] += record[key]
+    # 故障转移时以实际返回用量的供应商为准
+    call['provider'] = record['provider']
+    call['model'] = record['model'] or call['model']
+
+
+register_usage_listener(_on_usage)
+
+
+class LedgerClient:
+    """
+    记录每次调用的台账：耗时、结果与用量。其余属性透传给被包装的客户端。
+    """
+
+    def __init__(self, client, provider: str):
+        self._client = client
+        self._provider = provider
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def completions(self, messages, model=None):
+        return self._call('completions', model, self._client.completions, messages, model)
+
+    def completions_with_tools(self, messages, tools, model=None):
+        return self._call('completions_with_tools', model, self._client.completions_with_tools, messages, tools, model)
+
+    async def acompletions(self, messages, model=None):
+        return await self._acall('acompletions', model, self._client.acompletions, messages, model)
+
+    async def acompletions_with_tools(self, messages, tools, model=None):
+        return await self._acall('acompletions_with_tools', model, self._client.acompletions_with_tools,
+                                 messages, tools, model)
+
+    def completions_many(self, messages_list, max_in_flight: int = 0):
+        from biz.llm.async_runtime import gather_limited, run_sync
+        limit = max_in_flight or get_env_int('LLM_ASYNC_MAX_IN_FLIGHT', 32)
+        return run_sync(gather_limited([self.acompletions(messages) for messages in messages_list], limit))
+
+    def _start(self, method: str, model) -> Optional[Dict[str, Any]]:
+        if _current_call.get() is not None:
+            return None
+        context = _call_context.get()
+        return {'created_at': int(time.time()), 'provider': self._provider,
+                'model': model or getattr(self._client, 'default_model', None) or '', 'method': method,
+                'project_name': context.get('project_name', ''), 'correlation_id': context.get('correlation_id', ''),
+                'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0, 'cost': 0.0,
+                'ttft_ms': None, 'retries': 0, 'started': time.monotonic()}
+
+    def _call(self, method: str, model, func, *args):
+        call = self._start(method, model)
+        if call is None:
+            return func(*args)
+        token = _current_call.set(call)
+        try:
+            result = func(*args)
+        except Exception as e:
+            _finish(call, 'exception', f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current_call.reset(token)
+        _finish(call, *_outcome(result))
+        return result
+
+    async def _acall(self, method: str, model, func, *args):
+        call = self._start(method, model)
+        if call is None:
+            return await func(*args)
+        token = _current_call.set(call)
+        try:
+            result = await func(*args)
+        except Exception as e:
+            _finish(call, 'exception', f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current_call.reset(token)
+        _finish(call, *_outcome(result))
+        return result
+
+
+def _outcome(result: Any):
+    from biz.utils.code_reviewer import is_api_error_message
+    text = result.get('content') if isinstance(result, dict) else result
+    if isinstance(result, dict) and result.get('tool_calls'):
+        return 'ok', None
+    if is_api_error_message(text):
+        return 'error', str(text)[:500]
+    return 'ok', None
+
+
+def _finish(call: Dict[str, Any], outcome: str, error: Optional[str]):
+    call['duration_ms'] = round((time.monotonic() - call.pop('started')) * 1000)
+    call['outcome'] = outcome
+    call['error'] = error[:500] if error else None
+    LLM_CALL_SECONDS.observe(call['duration_ms'] / 1000, provider=call['provider'], outcome=outcome)
+    if get_env_bool('LLM_LEDGER_ENABLED'):
+        _writer.put(call)
+
+
+class _LedgerWriter:
+    """后台批量写库：调用路径只入队；fork 出的子进程按 pid 重新创建写线程"""
+
+    BATCH_SIZE = 200
+    FLUSH_INTERVAL = 1.0
+    CLEANUP_INTERVAL = 3600
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+        self.dropped = 0
+        self._last_cleanup = 0.0
+
+    def _ensure_started(self) -> queue.Queue:
+        with self._lock:
+            if self._queue is None or self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=10000)
+                self._pid = os.getpid()
+                LlmCallLedger.init_db()
+                threading.Thread(target=self._run, args=(self._queue,), daemon=True, name="llm-ledger").start()
+            return self._queue
+
+    def put(self, row: Dict[str, Any]):
+        try:
+            self._ensure_started().put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"⚠️ 大模型调用台账写入队列已满，已丢弃 {self.dropped} 条记录")
+
+    def _run(self, q: queue.Queue):
+        while True:
+            rows = [q.get()]
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            while len(rows) < self.BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                LlmCallLedger.insert_many(rows)
+                self._cleanup()
+            except sqlite3.DatabaseError as e:
+                logger.warning(f"写入大模型调用台账失败（{len(rows)} 条）: {e}")
+            finally:
+                for _ in rows:
+                    q.task_done()
+
+    def _cleanup(self):
+        retention_days = get_env_int('LLM_LEDGER_RETENTION_DAYS', 30)
+        if retention_days <= 0 or time.monotonic() - self._last_cleanup < self.CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = time.monotonic()
+        deleted = LlmCallLedger.delete_before(int(time.time()) - retention_days * 86400)
+        if deleted:
+            logger.info(f"🧹 已清理 {deleted} 条过期的大模型调用台账记录")
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待队列中的记录写完（进程退出或测试时调用）"""
+        q = self._queue
+        if q is None or self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout
+        while q.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return not q.unfinished_tasks
+
+
+_writer = _LedgerWriter()
+flush_ledger = _writer.flush
+atexit.register(flush_ledger)
@@ -1,10 +1,47 @@
+import asyncio
+import contextvars
 import json
+import queue
+import re
+import threading
+import time
 from abc import abstractmethod
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+import httpx
+
+from biz.llm.call_ledger import note_call
 from biz.llm.types import NotGiven, NOT_GIVEN
+from biz.llm.usage import normalize_usage, record_usage
+from biz.utils.default_config import get_env_bool, get_env_int
 from biz.utils.log import logger
 
+# 流式响应开头命中这些特征时视为服务端错误负载（网关把错误页/错误 JSON 当正文返回），提前中止
+_STREAM_ERROR_PAYLOAD_RE = re.compile(
+    r'^\s*(\{\s*"(error|detail)"|<!DOCTYPE html|<html|Internal Server Error|Bad Gateway|Service Unavailable|'
+    r'Gateway Time-?out|Error:)', re.IGNORECASE)
+# 收到多少字符正文后做一次错误负载检测
+STREAM_ERROR_CHECK_CHARS = 64
+# 当前上下文最近一次流式调用的指标：ttft_ms / duration_ms / output_tokens / tokens_per_sec / aborted。
+# 客户端实例在进程内共享、分批审查并发调用，指标不能存放在实例上
+_last_stream_metrics: contextvars.ContextVar[Optional[Dict[str, Any]]] = \
+    contextvars.ContextVar('last_stream_metrics', default=None)
+
+
+def get_last_stream_metrics() -> Optional[Dict[str, Any]]:
+    """返回当前线程 / 协程上下文中最近一次流式调用的指标，未发生流式调用时返回 None"""
+    return _last_stream_metrics.get()
+
+
+def http_pool_limits() -> httpx.Limits:
+    """
+    各客户端底层 HTTP 连接池的上限。客户端实例由 client_registry 在进程内共享，
+    保持长连接可以在多次审查之间复用到供应商的 TCP/TLS 连接。
+    """
+    return httpx.Limits(max_connections=get_env_int('LLM_HTTP_MAX_CONNECTIONS', 64),
+                        max_keepalive_connections=get_env_int('LLM_HTTP_MAX_KEEPALIVE', 16),
+                        keepalive_expiry=get_env_int('LLM_HTTP_KEEPALIVE_EXPIRY', 60))
+
 
 def extract_assistant_message(message) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
     """
@@ -51,11 +88,48 @@ def extract_assistant_message(message) -> Tuple[Dict[str, Any], List[Dict[str, A
     return assistant_message, tool_calls
 
 
+def iter_openai_stream(stream) -> Iterator[Tuple[str, Any]]:
+    """
+    将 OpenAI 兼容 SDK 的流式响应转换为 (类型, 内容) 序列：
+    content=正文增量，reasoning=思考链增量（只用于判断模型仍在输出），usage=服务端返回的 usage 对象（提供时）。
+    """
+    for chunk in stream:
+        usage = getattr(chunk, "usage", None)
+        if usage is not None and getattr(usage, "completion_tokens", None):
+            yield "usage", usage
+        if not getattr(chunk, "choices", None):
+            continue
+        delta = chunk.choices[0].delta
+        for field in ("reasoning_content", "reasoning"):
+            value = getattr(delta, field, None)
+            if value:
+                yield "reasoning", value
+                break
+        if getattr(delta, "content", None):
+            yield "content", delta.content
+
+
+def _close_stream(stream):
+    """关闭底层 HTTP 响应，使阻塞在读取上的线程尽快退出"""
+    for target in (stream, getattr(stream, "response", None)):
+        close = getattr(target, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.debug(f"关闭流式响应失败: {e}")
+            return
+
+
 class BaseClient:
     """ Base class for chat models client. """
 
     # 子类若支持 function calling（工具调用），应设置为 True 并覆盖 completions_with_tools
     supports_tools: bool = False
+    # 子类若实现了 _open_stream（流式响应），应设置为 True；LLM_STREAMING_ENABLED=1 时 completions 走流式
+    supports_streaming: bool = False
+    # 供应商名称，用于用量统计（biz/llm/usage.py）
+    provider_name: str = ""
 
     def ping(self) -> bool:
         """Ping the model to check connectivity."""
@@ -99,3 +173,156 @@ class BaseClient:
             "tool_calls": [],
             "assistant_message": {"role": "assistant", "content": content},
         }
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        """
+        异步对话补全。默认在线程中执行同步 completions()；
+        有原生异步 SDK 的客户端（AsyncOpenAI / ollama AsyncClient / httpx）应覆盖此方法。
+        """
+        return await asyncio.to_thread(self.completions, messages, model)
+
+    async def acompletions_with_tools(self,
+                                      messages: List[Dict[str, Any]],
+                                      tools: List[Dict[str, Any]],
+                                      model: Optional[str] | NotGiven = NOT_GIVEN,
+                                      ) -> Dict[str, Any]:
+        """异步工具调用补全，返回结构同 completions_with_tools；默认在线程中执行同步版本"""
+        return await asyncio.to_thread(self.completions_with_tools, messages, tools, model)
+
+    def completions_many(self, messages_list: List[List[Dict[str, str]]],
+                         max_in_flight: int = 0) -> List[str]:
+        """同步门面：在共享事件循环上并发执行多组对话补全，结果按输入顺序返回"""
+        from biz.llm.async_runtime import gather_limited, run_sync
+        limit = max_in_flight or get_env_int('LLM_ASYNC_MAX_IN_FLIGHT', 32)
+        return run_sync(gather_limited([self.acompletions(messages) for messages in messages_list], limit))
+
+    def _record_usage(self, model: str, usage: Any):
+        """记录供应商返回的 usage（输入 / 缓存命中 / 输出 token），统计失败不影响审查"""
+        try:
+            record_usage(self.provider_name or type(self).__name__, model, usage)
+        except Exception as e:
+            logger.debug(f"记录用量失败: {e}")
+
+    def _use_streaming(self) -> bool:
+        return self.supports_streaming and get_env_bool('LLM_STREAMING_ENABLED')
+
+    def _open_stream(self, messages: List[Dict[str, Any]], model: str) -> Tuple[Iterator[Tuple[str, Any]], Any]:
+        """
+        发起流式请求，返回 (增量序列, 可关闭的响应对象)。
+        增量序列元素为 (类型, 内容)，类型为 content / reasoning / usage，见 iter_openai_stream；
+        usage 的内容可以是供应商原始 usage（记录用量）或仅输出 token 数。
+        """
+        raise NotImplementedError
+
+    def _postprocess_stream_content(self, content: str) -> str:
+        """流式正文拼接完成后的处理（如去掉 <think> 标签），默认原样返回"""
+        return content
+
+    def completions_streaming(self,
+                              messages: List[Dict[str, Any]],
+                              model: Optional[str] | NotGiven = NOT_GIVEN,
+                              ) -> str:
+        """
+        流式对话补全：逐块消费响应，区分首 token 超时与输出中途停滞超时，
+        并在正文开头是明显的错误负载时提前中止；记录首 token 耗时与输出速度。
+
+        思考链增量同样视为"仍在输出"，可以区分慢但持续思考的模型与已经挂死的连接。
+        超时或错误负载时返回错误信息（由调用方按 API 错误处理），请求异常照常抛出。
+        """
+        model = model or self.default_model
+        first_token_timeout = get_env_int('LLM_STREAM_FIRST_TOKEN_TIMEOUT', 300)
+        stall_timeout = get_env_int('LLM_STREAM_STALL_TIMEOUT', 60)
+        started = time.monotonic()
+        iterator, stream = self._open_stream(messages, model)
+
+        events: queue.Queue = queue.Queue()
+
+        def _reader():
+            try:
+                for event in iterator:
+                    events.put(event)
+                events.put(("done", None))
+            except Exception as e:
+                events.put(("error", e))
+
+        threading.Thread(target=_reader, daemon=True, name="llm-stream").start()
+
+        content_parts: List[str] = []
+        content_length = 0
+        chunk_count = 0
+        usage_tokens = None
+        usage = None
+        first_token_at = None
+        checked = False
+        aborted = None
+        error_result = None
+        while True:
+            timeout = first_token_timeout if first_token_at is None else stall_timeout
+            try:
+                kind, payload = events.get(timeout=timeout)
+            except queue.Empty:
+                if first_token_at is None:
+                    aborted = "first_token_timeout"
+                    error_result = f"❌ AI审查失败: 请求超时（{timeout}秒内未收到模型的任何输出），请稍后重试"
+                else:
+                    aborted = "stall_timeout"
+                    error_result = f"❌ AI审查失败: 模型输出中途停滞超时（{timeout}秒无新内容），请稍后重试"
+                break
+            if kind == "done":
+                break
+            if kind == "error":
+                _close_stream(stream)
+                raise payload
+            if kind == "usage":
+                if isinstance(payload, int):
+                    usage_tokens = payload
+                else:
+                    usage = payload
+                    usage_tokens = (normalize_usage(payload) or {}).get("completion_tokens")
+                continue
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            chunk_count += 1
+            if kind == "content":
+                content_parts.append(payload)
+                content_length += len(payload)
+                if not checked and content_length >= STREAM_ERROR_CHECK_CHARS:
+                    checked = True
+                    if _STREAM_ERROR_PAYLOAD_RE.match(''.join(content_parts)):
+                        aborted = "error_payload"
+                        break
+
+        content = ''.join(content_parts)
+        if aborted == "error_payload" or (aborted is None and _STREAM_ERROR_PAYLOAD_RE.match(content)):
+            aborted = "error_payload"
+            error_result = f"❌ AI审查失败: API返回错误内容: {content[:100]}"
+        if aborted:
+            _close_stream(stream)
+        elif usage is not None:
+            self._record_usage(model, usage)
+
+        finished = time.monotonic()
+        output_tokens = usage_tokens or chunk_count
+        generation_seconds = finished - (first_token_at or finished)
+        metrics = {
+            "model": model,
+            "ttft_ms": round((first_token_at - started) * 1000) if first_token_at else None,
+            "duration_ms": round((finished - started) * 1000),
+            "output_tokens": output_tokens,
+            "tokens_per_sec": round(output_tokens / generation_seconds, 1) if generation_seconds > 0 else None,
+            "aborted": aborted,
+        }
+        _last_stream_metrics.set(metrics)
+        note_call(ttft_ms=metrics['ttft_ms'])
+        ttft_text = f"{metrics['ttft_ms'] / 1000:.1f}s" if first_token_at else "无"
+        logger.info(f"⏱️ 流式调用 {model}: 首 token {ttft_text}, 总耗时 "
+                    f"{metrics['duration_ms'] / 1000:.1f}s, 输出 {output_tokens} tokens, "
+                    f"{metrics['tokens_per_sec'] or 0} tokens/s"
+                    + (f", 已中止({aborted})" if aborted else ""))
+        if error_result:
+            logger.error(error_result)
+            return error_result
+        return self._postprocess_stream_content(content)
@@ -1,9 +1,9 @@
 import os
 from typing import Any, Dict, List, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 
-from biz.llm.client.base import BaseClient, extract_assistant_message
+from biz.llm.client.base import BaseClient, extract_assistant_message, http_pool_limits, iter_openai_stream
 from biz.llm.types import NotGiven, NOT_GIVEN
 from biz.utils.log import logger
 from biz.utils.default_config import get_env_with_default, get_env_int
@@ -11,6 +11,8 @@ from biz.utils.default_config import get_env_with_default, get_env_int
 
 class DeepSeekClient(BaseClient):
     supports_tools = True
+    supports_streaming = True
+    provider_name = "deepseek"
 
     # DeepSeek 官方约定（2026-08 更新，api-docs.deepseek.com/guides/thinking_mode）：
     # - 当前模型为 deepseek-v4-pro / deepseek-v4-flash（旧 deepseek-chat/deepseek-reasoner 逐步下线）；
@@ -27,7 +29,10 @@ class DeepSeekClient(BaseClient):
         if not self.api_key:
             raise ValueError("API key is required. Please provide it or set it in the environment variables.")
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url) # DeepSeek supports OpenAI API SDK
+        # DeepSeek supports OpenAI API SDK
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url,
+                             http_client=DefaultHttpxClient(limits=http_pool_limits()))
+        self._async_client = None
         self.default_model = get_env_with_default("DEEPSEEK_API_MODEL")
         self.thinking_level = (get_env_with_default("DEEPSEEK_THINKING_LEVEL") or "high").lower().strip()
         self.context_window = get_env_int("DEEPSEEK_CONTEXT_WINDOW", 1048576)
@@ -57,7 +62,9 @@ class DeepSeekClient(BaseClient):
         try:
             model = model or self.default_model
             logger.debug(f"Sending request to DeepSeek API. Model: {model}, Messages: {messages}")
-            
+            if self._use_streaming():
+                return self.completions_streaming(messages, model)
+
             kwargs = {"model": model, "messages": messages}
             kwargs.update(self._build_extra_kwargs(model))
             completion = self.client.chat.completions.create(**kwargs)
@@ -66,17 +73,29 @@ class DeepSeekClient(BaseClient):
                 logger.error("Empty response from DeepSeek API")
                 return "AI服务返回为空，请稍后重试"
                 
+            self._record_usage(model, getattr(completion, "usage", None))
             return completion.choices[0].message.content
             
         except Exception as e:
-            logger.error(f"DeepSeek API error: {str(e)}")
-            # 检查是否是认证错误
-            if "401" in str(e):
-                return "DeepSeek API认证失败，请检查API密钥是否正确"
-            elif "404" in str(e):
-                return "DeepSeek API接口未找到，请检查API地址是否正确"
-            else:
-                return f"调用DeepSeek API时出错: {str(e)}"
+            return self._format_error(e)
+
+    @staticmethod
+    def _format_error(e: Exception) -> str:
+        logger.error(f"DeepSeek API error: {str(e)}")
+        # 检查是否是认证错误
+        if "401" in str(e):
+            return "DeepSeek API认证失败，请检查API密钥是否正确"
+        elif "404" in str(e):
+            return "DeepSeek API接口未找到，请检查API地址是否正确"
+        else:
+            return f"调用DeepSeek API时出错: {str(e)}"
+
+    def _open_stream(self, messages, model):
+        # 流式响应默认不带 usage，需显式要求在最后一个分块返回（用于记录缓存命中与用量）
+        kwargs = {"model": model, "messages": messages, "stream": True, "stream_options": {"include_usage": True}}
+        kwargs.update(self._build_extra_kwargs(model))
+        stream = self.client.chat.completions.create(**kwargs)
+        return iter_openai_stream(stream), stream
 
     def completions_with_tools(self,
                                 messages: List[Dict[str, Any]],
@@ -90,6 +109,50 @@ class DeepSeekClient(BaseClient):
             kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
         completion = self.client.chat.completions.create(**kwargs)
+        self._record_usage(model, getattr(completion, "usage", None))
+        message = completion.choices[0].message
+        assistant_message, tool_calls = extract_assistant_message(message)
+        return {"content": message.content, "tool_calls": tool_calls, "assistant_message": assistant_message}
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        """异步客户端按需创建（只在共享事件循环中使用）"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                             http_client=DefaultAsyncHttpxClient(limits=http_pool_limits()))
+        return self._async_client
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        model = model or self.default_model
+        if self._use_streaming():
+            return await super().acompletions(messages, model)
+        try:
+            kwargs = {"model": model, "messages": messages}
+            kwargs.update(self._build_extra_kwargs(model))
+            completion = await self._get_async_client().chat.completions.create(**kwargs)
+            if not completion or not completion.choices:
+                logger.error("Empty response from DeepSeek API")
+                return "AI服务返回为空，请稍后重试"
+            self._record_usage(model, getattr(completion, "usage", None))
+            return completion.choices[0].message.content
+        except Exception as e:
+            return self._format_error(e)
+
+    async def acompletions_with_tools(self,
+                                      messages: List[Dict[str, Any]],
+                                      tools: List[Dict[str, Any]],
+                                      model: Optional[str] | NotGiven = NOT_GIVEN,
+                                      ) -> Dict[str, Any]:
+        model = model or self.default_model
+        kwargs = {"model": model, "messages": messages}
+        kwargs.update(self._build_extra_kwargs(model))
+        if tools:
+            kwargs["tools"] = tools
+            kwargs["tool_choice"] = "auto"
+        completion = await self._get_async_client().chat.completions.create(**kwargs)
+        self._record_usage(model, getattr(completion, "usage", None))
         message = completion.choices[0].message
         assistant_message, tool_calls = extract_assistant_message(message)
         return {"content": message.content, "tool_calls": tool_calls, "assistant_message": assistant_message}
@@ -1,10 +1,13 @@
+import asyncio
 import os
 import json
 import time
+
+import httpx
 import requests
 from typing import Any, Dict, List, Optional
 
-from biz.llm.client.base import BaseClient
+from biz.llm.client.base import BaseClient, http_pool_limits
 from biz.llm.types import NotGiven, NOT_GIVEN
 from biz.utils.log import logger
 from biz.utils.default_config import get_env_with_default, get_env_int
@@ -25,6 +28,10 @@ class JediClient(BaseClient):
     # 纯文本协议模拟路径（已实测在明确指令下可以正确输出约定的tool_call JSON）。
     # completions_with_tools() 予以保留：如果之后网关修复了这个问题，只需把这里改回 True 验证即可。
     supports_tools = False
+    # 流式响应（实验性）：按 stream=true 请求网关，兼容 SSE（data: {...}）与逐行 JSON 两种分块格式，
+    # 每块按与 completions() 相同的字段解析正文增量；网关不支持流式时返回的完整 JSON 也能按一块解析。
+    supports_streaming = True
+    provider_name = "jedi"
 
     def __init__(self, api_key: str = None):
         self.api_key = api_key or get_env_with_default("JEDI_API_KEY")
@@ -38,6 +45,14 @@ class JediClient(BaseClient):
         if not self.base_url:
             raise ValueError("Base URL is required. Please provide it or set it in the environment variables.")
 
+        # 复用长连接：实例由 client_registry 在进程内共享
+        self.session = requests.Session()
+        pool_size = get_env_int('LLM_HTTP_MAX_KEEPALIVE', 16)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._async_http = None
+
     def _thinking_temperature(self) -> float:
         """思考程度 → temperature 档位（仅 Jedi 因无原生思考参数，用温度小幅递增模拟思考强度）。
 
@@ -84,7 +99,9 @@ class JediClient(BaseClient):
         try:
             model = model or self.default_model
             logger.debug(f"Sending request to Jedi API. Model: {model}, Messages: {messages}")
-            
+            if self._use_streaming():
+                return self.completions_streaming(messages, model)
+
             # 转换消息格式
             jedi_input = self._convert_messages_to_jedi_format(messages)
             
@@ -141,7 +158,7 @@ class JediClient(BaseClient):
                     logger.info(f"Jedi API 请求尝试 {attempt + 1}/{max_retries + 1}, 复杂度: {complexity_level}, 超时设置: {current_timeout}秒")
                     
                     # 发送请求
-                    response = requests.post(
+                    response = self.session.post(
                         self.base_url,
                         headers=headers,
                         json=payload,
@@ -181,6 +198,7 @@ class JediClient(BaseClient):
                             
                             if content and str(content).strip():
                                 logger.info(f"Jedi API 请求成功，用时: 尝试 {attempt + 1}")
+                                self._record_usage(model, self._extract_usage(result))
                                 return str(content)
                             else:
                                 logger.warning("Jedi API 返回空内容")
@@ -260,6 +278,102 @@ class JediClient(BaseClient):
             logger.error(f"Jedi API error: {str(e)}", exc_info=True)
             return error_result
 
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        """
+        异步请求只做一次尝试：成功直接返回；非200、空内容、finish_reason=tool_calls 截断或网络异常时，
+        降级到线程中执行 completions()，复用其完整的重试/超时/错误信息逻辑。
+        """
+        model = model or self.default_model
+        if self._use_streaming():
+            return await super().acompletions(messages, model)
+        payload = {
+            "input": self._convert_messages_to_jedi_format(messages),
+            "model_name": model,
+            "chatModelConfig": {
+                "temperature": self._thinking_temperature(),
+                "frequency_penalty": 0.1,
+                "presence_penalty": 0,
+                "max_tokens": min(self.context_window, MAX_COMPLETION_TOKENS),
+                "top_p": 1,
+                "seed": 42
+            },
+            "stream": False
+        }
+        headers = {
+            "accept": "application/json",
+            "token": self.api_key,
+            "Content-Type": "application/json"
+        }
+        try:
+            if self._async_http is None:
+                self._async_http = httpx.AsyncClient(timeout=600, limits=http_pool_limits())
+            response = await self._async_http.post(self.base_url, headers=headers, json=payload)
+            if response.status_code == 200:
+                result = response.json()
+                finish_reason = ((result.get("response_metadata") or {}).get("finish_reason")
+                                 if isinstance(result, dict) else None)
+                content = self._extract_content_from_result(result)
+                if content and not (finish_reason == "tool_calls" and not self._extract_tool_calls(result)):
+                    self._record_usage(model, self._extract_usage(result))
+                    return content
+            logger.warning(f"Jedi API 异步请求未拿到完整结果（状态码: {response.status_code}），降级为同步重试")
+        except Exception as e:
+            logger.warning(f"Jedi API 异步请求异常: {e}，降级为同步重试")
+        return await asyncio.to_thread(self.completions, messages, model)
+
+    def _open_stream(self, messages, model):
+        payload = {
+            "input": self._convert_messages_to_jedi_format(messages),
+            "model_name": model,
+            "chatModelConfig": {
+                "temperature": self._thinking_temperature(),
+                "frequency_penalty": 0.1,
+                "presence_penalty": 0,
+                "max_tokens": min(self.context_window, MAX_COMPLETION_TOKENS),
+                "top_p": 1,
+                "seed": 42
+            },
+            "stream": True
+        }
+        headers = {
+            "accept": "text/event-stream, application/json",
+            "token": self.api_key,
+            "Content-Type": "application/json"
+        }
+        # 读超时只作兜底，首 token / 停滞超时由 completions_streaming 控制
+        read_timeout = max(get_env_int('LLM_STREAM_FIRST_TOKEN_TIMEOUT', 300), get_env_int('LLM_STREAM_STALL_TIMEOUT', 60)) + 30
+        response = self.session.post(self.base_url, headers=headers, json=payload, stream=True, timeout=(30, read_timeout))
+        if response.status_code != 200:
+            detail = response.text[:200]
+            response.close()
+            raise RuntimeError(f"Jedi API请求失败，状态码: {response.status_code}, 响应内容: {detail}")
+
+        def _iter():
+            for line in response.iter_lines(decode_unicode=True):
+                line = (line or "").strip()
+                if line.startswith("data:"):
+                    line = line[5:].strip()
+                if not line or line == "[DONE]":
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except json.JSONDecodeError:
+                    yield "content", line + "\n"
+                    continue
+                # 与 completions() 一致：finish_reason=tool_calls 但无真实 tool_calls 说明内容被截断
+                finish_reason = ((chunk.get("response_metadata") or {}).get("finish_reason")
+                                 if isinstance(chunk, dict) else None)
+                if finish_reason == "tool_calls" and not self._extract_tool_calls(chunk):
+                    raise RuntimeError("Jedi API 返回了不完整的响应(finish_reason=tool_calls但无真实tool_calls数据)")
+                content = self._extract_content_from_result(chunk)
+                if content:
+                    yield "content", content
+
+        return _iter(), response
+
     def completions_with_tools(self,
                                 messages: List[Dict[str, Any]],
                                 tools: List[Dict[str, Any]],
@@ -301,7 +415,7 @@ class JediClient(BaseClient):
                 "Content-Type": "application/json"
             }
             logger.info(f"Jedi API (实验性tools请求) 发送，工具数: {len(tools)}")
-            response = requests.post(self.base_url, headers=headers, json=payload, timeout=600)
+            response = self.session.post(self.base_url, headers=headers, json=payload, timeout=600)
             logger.debug(f"Jedi API (实验性tools请求) response status: {response.status_code}")
 
             if response.status_code == 200:
@@ -314,6 +428,7 @@ class JediClient(BaseClient):
                 elif content:
                     logger.info("Jedi网关返回了正常文本内容但没有tool_calls，可能网关忽略了tools字段（或本轮无需调用工具）")
                 if content or tool_calls:
+                    self._record_usage(model, self._extract_usage(result))
                     assistant_message: Dict[str, Any] = {"role": "assistant", "content": content or ""}
                     if tool_calls:
                         assistant_message["tool_calls"] = [
@@ -349,6 +464,15 @@ class JediClient(BaseClient):
             return str(content) if content else ""
         return str(result) if result else ""
 
+    @staticmethod
+    def _extract_usage(result) -> Optional[Dict[str, Any]]:
+        """从Jedi网关响应中提取用量：LangChain 消息格式的 usage_metadata，或 response_metadata 中的 token_usage/usage"""
+        if not isinstance(result, dict):
+            return None
+        response_metadata = result.get("response_metadata") or {}
+        return (result.get("usage_metadata") or response_metadata.get("token_usage")
+                or response_metadata.get("usage") or result.get("usage"))
+
     @staticmethod
     def _extract_tool_calls(result) -> List[Dict[str, Any]]:
         """
@@ -3,20 +3,25 @@ import re
 from typing import Dict, List, Optional
 
 from ollama import ChatResponse
-from ollama import Client
+from ollama import AsyncClient, Client
 
-from biz.llm.client.base import BaseClient
+from biz.llm.client.base import BaseClient, http_pool_limits
 from biz.llm.types import NotGiven, NOT_GIVEN
 from biz.utils.default_config import get_env_with_default, get_env_int
 
 
 class OllamaClient(BaseClient):
+    supports_streaming = True
+    provider_name = "ollama"
+
     def __init__(self, api_key: str = None):
         self.default_model = get_env_with_default("OLLAMA_API_MODEL")
         self.base_url = get_env_with_default("OLLAMA_API_BASE_URL")
         self.client = Client(
             host=self.base_url,
+            limits=http_pool_limits(),
         )
+        self._async_client = None
         self.thinking_level = (get_env_with_default("OLLAMA_THINKING_LEVEL") or "high").lower().strip()
         self.context_window = get_env_int("OLLAMA_CONTEXT_WINDOW", 65536)
 
@@ -51,6 +56,8 @@ class OllamaClient(BaseClient):
                     model: Optional[str] | NotGiven = NOT_GIVEN,
                     ) -> str:
         model = model or self.default_model
+        if self._use_streaming():
+            return self.completions_streaming(messages, model)
         kwargs = {"model": model, "messages": messages}
         kwargs.update(self._build_chat_kwargs(model))
         try:
@@ -59,5 +66,50 @@ class OllamaClient(BaseClient):
             # 旧版 ollama SDK 不支持 think 顶层参数：降级重试（思考程度不生效，其余参数保留）
             kwargs.pop("think", None)
             response: ChatResponse = self.client.chat(**kwargs)
+        self._record_usage(model, response)
         content = response['message']['content']
         return self._extract_content(content)
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        model = model or self.default_model
+        if self._use_streaming():
+            return await super().acompletions(messages, model)
+        if self._async_client is None:
+            self._async_client = AsyncClient(host=self.base_url, limits=http_pool_limits())
+        kwargs = {"model": model, "messages": messages}
+        kwargs.update(self._build_chat_kwargs(model))
+        try:
+            response: ChatResponse = await self._async_client.chat(**kwargs)
+        except TypeError:
+            kwargs.pop("think", None)
+            response: ChatResponse = await self._async_client.chat(**kwargs)
+        self._record_usage(model, response)
+        return self._extract_content(response['message']['content'])
+
+    def _open_stream(self, messages, model):
+        kwargs = {"model": model, "messages": messages, "stream": True}
+        kwargs.update(self._build_chat_kwargs(model))
+        try:
+            stream = self.client.chat(**kwargs)
+        except TypeError:
+            kwargs.pop("think", None)
+            stream = self.client.chat(**kwargs)
+
+        def _iter():
+            for part in stream:
+                message = part['message']
+                if message.get('thinking'):
+                    yield "reasoning", message['thinking']
+                if message['content']:
+                    yield "content", message['content']
+                if part.get('done') and part.get('eval_count'):
+                    yield "usage", part
+
+        # ollama SDK 的流式响应是生成器，无法从其他线程关闭，超时后由读取线程自行结束
+        return _iter(), None
+
+    def _postprocess_stream_content(self, content: str) -> str:
+        return self._extract_content(content)
@@ -1,9 +1,9 @@
 import os
 from typing import Any, Dict, List, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 
-from biz.llm.client.base import BaseClient, extract_assistant_message
+from biz.llm.client.base import BaseClient, extract_assistant_message, http_pool_limits, iter_openai_stream
 from biz.llm.types import NotGiven, NOT_GIVEN
 
 
@@ -12,6 +12,8 @@ from biz.utils.default_config import get_env_with_default, get_env_int
 
 class OpenAIClient(BaseClient):
     supports_tools = True
+    supports_streaming = True
+    provider_name = "openai"
 
     # 通用 OpenAI 兼容网关（OAI）：官方 OpenAI 及第三方 OAI 兼容模型均走此通道。
     # 典型场景：走 new-api/one-api 等转换型中转站接入 DeepSeek/Qwen/Kimi 等模型。
@@ -29,7 +31,9 @@ class OpenAIClient(BaseClient):
         if not self.api_key:
             raise ValueError("API key is required. Please provide it or set it in the environment variables.")
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url,
+                             http_client=DefaultHttpxClient(limits=http_pool_limits()))
+        self._async_client = None
         self.default_model = get_env_with_default("OPENAI_API_MODEL")
         self.thinking_level = (get_env_with_default("OPENAI_THINKING_LEVEL") or "high").lower().strip()
         self.context_window = get_env_int("OPENAI_CONTEXT_WINDOW", 131072)
@@ -50,11 +54,21 @@ class OpenAIClient(BaseClient):
                     model: Optional[str] | NotGiven = NOT_GIVEN,
                     ) -> str:
         model = model or self.default_model
+        if self._use_streaming():
+            return self.completions_streaming(messages, model)
         kwargs = {"model": model, "messages": messages}
         kwargs.update(self._build_extra_kwargs(model))
         completion = self.client.chat.completions.create(**kwargs)
+        self._record_usage(model, getattr(completion, "usage", None))
         return completion.choices[0].message.content
 
+    def _open_stream(self, messages, model):
+        # 流式响应默认不带 usage，需显式要求在最后一个分块返回（用于记录缓存命中与用量）
+        kwargs = {"model": model, "messages": messages, "stream": True, "stream_options": {"include_usage": True}}
+        kwargs.update(self._build_extra_kwargs(model))
+        stream = self.client.chat.completions.create(**kwargs)
+        return iter_openai_stream(stream), stream
+
     def completions_with_tools(self,
                                 messages: List[Dict[str, Any]],
                                 tools: List[Dict[str, Any]],
@@ -67,6 +81,44 @@ class OpenAIClient(BaseClient):
             kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
         completion = self.client.chat.completions.create(**kwargs)
+        self._record_usage(model, getattr(completion, "usage", None))
+        message = completion.choices[0].message
+        assistant_message, tool_calls = extract_assistant_message(message)
+        return {"content": message.content, "tool_calls": tool_calls, "assistant_message": assistant_message}
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        """异步客户端按需创建（只在共享事件循环中使用）"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                             http_client=DefaultAsyncHttpxClient(limits=http_pool_limits()))
+        return self._async_client
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        model = model or self.default_model
+        if self._use_streaming():
+            return await super().acompletions(messages, model)
+        kwargs = {"model": model, "messages": messages}
+        kwargs.update(self._build_extra_kwargs(model))
+        completion = await self._get_async_client().chat.completions.create(**kwargs)
+        self._record_usage(model, getattr(completion, "usage", None))
+        return completion.choices[0].message.content
+
+    async def acompletions_with_tools(self,
+                                      messages: List[Dict[str, Any]],
+                                      tools: List[Dict[str, Any]],
+                                      model: Optional[str] | NotGiven = NOT_GIVEN,
+                                      ) -> Dict[str, Any]:
+        model = model or self.default_model
+        kwargs = {"model": model, "messages": messages}
+        kwargs.update(self._build_extra_kwargs(model))
+        if tools:
+            kwargs["tools"] = tools
+            kwargs["tool_choice"] = "auto"
+        completion = await self._get_async_client().chat.completions.create(**kwargs)
+        self._record_usage(model, getattr(completion, "usage", None))
         message = completion.choices[0].message
         assistant_message, tool_calls = extract_assistant_message(message)
         return {"content": message.content, "tool_calls": tool_calls, "assistant_message": assistant_message}
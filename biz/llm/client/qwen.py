@@ -2,15 +2,17 @@ import os
 import re
 from typing import Any, Dict, List, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 
-from biz.llm.client.base import BaseClient, extract_assistant_message
+from biz.llm.client.base import BaseClient, extract_assistant_message, http_pool_limits, iter_openai_stream
 from biz.llm.types import NotGiven, NOT_GIVEN
 from biz.utils.default_config import get_env_with_default, get_env_int
 
 
 class QwenClient(BaseClient):
     supports_tools = True
+    supports_streaming = True
+    provider_name = "qwen"
 
     # 阿里云百炼约定（2026-08）：qwen3 全系（qwen3 / qwen3.5 / qwen3.7 / qwen3.8-max...）
     # 支持 enable_thinking + thinking_budget；旧模型（qwen-coder-plus / qwen-max / qwen2.5）不支持，
@@ -23,7 +25,9 @@ class QwenClient(BaseClient):
         if not self.api_key:
             raise ValueError("API key is required. Please provide it or set it in the environment variables.")
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url,
+                             http_client=DefaultHttpxClient(limits=http_pool_limits()))
+        self._async_client = None
         self.default_model = get_env_with_default("QWEN_API_MODEL")
         self.thinking_level = (get_env_with_default("QWEN_THINKING_LEVEL") or "high").lower().strip()
         self.context_window = get_env_int("QWEN_CONTEXT_WINDOW", 1048576)
@@ -47,13 +51,26 @@ class QwenClient(BaseClient):
                     model: Optional[str] | NotGiven = NOT_GIVEN,
                     ) -> str:
         model = model or self.default_model
+        if self._use_streaming():
+            return self.completions_streaming(messages, model)
         completion = self.client.chat.completions.create(
             model=model,
             messages=messages,
             extra_body=self._build_extra_body(model),
         )
+        self._record_usage(model, getattr(completion, "usage", None))
         return completion.choices[0].message.content
 
+    def _open_stream(self, messages, model):
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            extra_body=self._build_extra_body(model),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        return iter_openai_stream(stream), stream
+
     def completions_with_tools(self,
                                 messages: List[Dict[str, Any]],
                                 tools: List[Dict[str, Any]],
@@ -65,6 +82,42 @@ class QwenClient(BaseClient):
             kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
         completion = self.client.chat.completions.create(**kwargs)
+        self._record_usage(model, getattr(completion, "usage", None))
+        message = completion.choices[0].message
+        assistant_message, tool_calls = extract_assistant_message(message)
+        return {"content": message.content, "tool_calls": tool_calls, "assistant_message": assistant_message}
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        """异步客户端按需创建（只在共享事件循环中使用）"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                             http_client=DefaultAsyncHttpxClient(limits=http_pool_limits()))
+        return self._async_client
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        model = model or self.default_model
+        if self._use_streaming():
+            return await super().acompletions(messages, model)
+        kwargs = {"model": model, "messages": messages, "extra_body": self._build_extra_body(model)}
+        completion = await self._get_async_client().chat.completions.create(**kwargs)
+        self._record_usage(model, getattr(completion, "usage", None))
+        return completion.choices[0].message.content
+
+    async def acompletions_with_tools(self,
+                                      messages: List[Dict[str, Any]],
+                                      tools: List[Dict[str, Any]],
+                                      model: Optional[str] | NotGiven = NOT_GIVEN,
+                                      ) -> Dict[str, Any]:
+        model = model or self.default_model
+        kwargs = {"model": model, "messages": messages, "extra_body": self._build_extra_body(model)}
+        if tools:
+            kwargs["tools"] = tools
+            kwargs["tool_choice"] = "auto"
+        completion = await self._get_async_client().chat.completions.create(**kwargs)
+        self._record_usage(model, getattr(completion, "usage", None))
         message = completion.choices[0].message
         assistant_message, tool_calls = extract_assistant_message(message)
         return {"content": message.content, "tool_calls": tool_calls, "assistant_message": assistant_message}
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/llm/client/base.py 流式调用路径的单元测试。
+
+覆盖：
+1. 正常流式输出：拼接正文，思考链不计入正文，记录首 token 耗时与输出速度
+2. 首 token 超时与输出中途停滞超时分别返回错误信息
+3. 正文开头是错误负载时提前中止
+4. 共享客户端被多个线程并发调用时，各线程读到的是自己那次调用的指标
+"""
+import os
+import threading
+import time
+from unittest import TestCase, main
+
+from biz.llm.client.base import BaseClient, get_last_stream_metrics
+
+
+class FakeStream:
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+
+    def __iter__(self):
+        for delay, kind, payload in self.events:
+            if self.closed:
+                return
+            time.sleep(delay)
+            yield kind, payload
+
+    def close(self):
+        self.closed = True
+
+
+class FakeStreamingClient(BaseClient):
+    supports_streaming = True
+    default_model = 'fake-model'
+
+    def __init__(self, events):
+        self.stream = FakeStream(events)
+
+    def completions(self, messages, model=None):
+        return self.completions_streaming(messages, model)
+
+    def _open_stream(self, messages, model):
+        return iter(self.stream), self.stream
+
+
+class TestStreamingCompletions(TestCase):
+    def setUp(self):
+        os.environ['LLM_STREAM_FIRST_TOKEN_TIMEOUT'] = '1'
+        os.environ['LLM_STREAM_STALL_TIMEOUT'] = '1'
+
+    def tearDown(self):
+        os.environ.pop('LLM_STREAM_FIRST_TOKEN_TIMEOUT', None)
+        os.environ.pop('LLM_STREAM_STALL_TIMEOUT', None)
+
+    def test_normal_stream(self):
+        client = FakeStreamingClient([(0.05, 'reasoning', '思考中'), (0, 'content', '总分: '),
+                                      (0.05, 'content', '90分'), (0, 'usage', 12)])
+        self.assertEqual(client.completions([]), '总分: 90分')
+        metrics = get_last_stream_metrics()
+        self.assertGreaterEqual(metrics['ttft_ms'], 40)
+        self.assertEqual(metrics['output_tokens'], 12)
+        self.assertIsNotNone(metrics['tokens_per_sec'])
+        self.assertIsNone(metrics['aborted'])
+
+    def test_first_token_and_stall_timeout(self):
+        client = FakeStreamingClient([(1.5, 'content', 'late')])
+        self.assertIn('未收到模型的任何输出', client.completions([]))
+        self.assertEqual(get_last_stream_metrics()['aborted'], 'first_token_timeout')
+        self.assertTrue(client.stream.closed)
+
+        # 思考链持续输出不算停滞，正文开始后停滞才中止
+        client = FakeStreamingClient([(0.6, 'reasoning', '.'), (0.6, 'reasoning', '.'), (0.6, 'content', 'a'),
+                                      (1.5, 'content', 'b')])
+        self.assertIn('中途停滞', client.completions([]))
+        self.assertEqual(get_last_stream_metrics()['aborted'], 'stall_timeout')
+
+    def test_error_payload_aborts_early(self):
+        client = FakeStreamingClient([(0, 'content', '<html><head><title>502 Bad Gateway</title></head>' + ' ' * 40),
+                                      (5, 'content', 'never')])
+        started = time.monotonic()
+        self.assertIn('API返回错误内容', client.completions([]))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(get_last_stream_metrics()['aborted'], 'error_payload')
+
+
+    def test_concurrent_calls_keep_own_metrics(self):
+        class SharedClient(FakeStreamingClient):
+            def _open_stream(self, messages, model):
+                stream = FakeStream([(messages[0], 'content', 'ok'), (0, 'usage', 5)])
+                return iter(stream), stream
+
+        client = SharedClient([])
+        results = {}
+
+        def _call(delay):
+            client.completions([delay])
+            # 另一线程的调用在此期间完成，不能覆盖本线程的指标
+            time.sleep(0.3)
+            results[delay] = get_last_stream_metrics()['ttft_ms']
+
+        threads = [threading.Thread(target=_call, args=(delay,)) for delay in (0.05, 0.25)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(results[0.05], 200)
+        self.assertGreaterEqual(results[0.25], 200)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,25 @@
 import os
 from typing import Any, Dict, List, Optional
 
+import httpx
 from zhipuai import ZhipuAI
 
-from biz.llm.client.base import BaseClient, extract_assistant_message
+from biz.llm.client.base import BaseClient, extract_assistant_message, http_pool_limits, iter_openai_stream
 from biz.llm.types import NotGiven, NOT_GIVEN
 from biz.utils.default_config import get_env_with_default, get_env_int
 
 
 class ZhipuAIClient(BaseClient):
     supports_tools = True
+    supports_streaming = True
+    provider_name = "zhipuai"
 
     def __init__(self, api_key: str = None):
         self.api_key = api_key or get_env_with_default("ZHIPUAI_API_KEY")
         if not self.api_key:
             raise ValueError("API key is required. Please provide it or set it in the environment variables.")
 
-        self.client = ZhipuAI(api_key=api_key)
+        self.client = ZhipuAI(api_key=self.api_key, http_client=httpx.Client(limits=http_pool_limits()))
         self.default_model = get_env_with_default("ZHIPUAI_API_MODEL")
         self.thinking_level = (get_env_with_default("ZHIPUAI_THINKING_LEVEL") or "high").lower().strip()
         self.context_window = get_env_int("ZHIPUAI_CONTEXT_WINDOW", 1048576)
@@ -37,11 +40,20 @@ class ZhipuAIClient(BaseClient):
                     model: Optional[str] | NotGiven = NOT_GIVEN,
                     ) -> str:
         model = model or self.default_model
+        if self._use_streaming():
+            return self.completions_streaming(messages, model)
         kwargs = {"model": model, "messages": messages}
         kwargs.update(self._build_extra_kwargs(model))
         completion = self.client.chat.completions.create(**kwargs)
+        self._record_usage(model, getattr(completion, "usage", None))
         return completion.choices[0].message.content
 
+    def _open_stream(self, messages, model):
+        kwargs = {"model": model, "messages": messages, "stream": True}
+        kwargs.update(self._build_extra_kwargs(model))
+        stream = self.client.chat.completions.create(**kwargs)
+        return iter_openai_stream(stream), stream
+
     def completions_with_tools(self,
                                 messages: List[Dict[str, Any]],
                                 tools: List[Dict[str, Any]],
@@ -54,6 +66,7 @@ class ZhipuAIClient(BaseClient):
             kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
         completion = self.client.chat.completions.create(**kwargs)
+        self._record_usage(model, getattr(completion, "usage", None))
         message = completion.choices[0].message
         assistant_message, tool_calls = extract_assistant_message(message)
         return {"content": message.content, "tool_calls": tool_calls, "assistant_message": assistant_message}
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+LLM 客户端注册表
+BaseReviewer / Reporter 每次构造都会调用 Factory().getClient()，原先每次都新建 OpenAI / ollama / zhipuai
+客户端及其底层 httpx 连接池，多次审查之间无法复用到供应商的 TCP/TLS 连接。
+
+这里按 (provider, base_url, api_key, model, 其余供应商配置摘要) 在进程内共享客户端实例
+（各 SDK 客户端本身线程安全），连接池上限见 http_pool_limits。配置变化后键随之变化，下次获取时重建；
+fork 出的子进程不复用父进程的连接池，按 pid 重新创建。
+"""
+
+import hashlib
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from biz.llm.client.base import BaseClient
+from biz.utils.config_snapshot import get_config_snapshot
+from biz.utils.default_config import get_env_with_default
+from biz.utils.log import logger
+
+# 供应商 → 环境变量前缀
+PROVIDER_ENV_PREFIXES = {
+    'zhipuai': 'ZHIPUAI',
+    'openai': 'OPENAI',
+    'deepseek': 'DEEPSEEK',
+    'jedi': 'JEDI',
+    'qwen': 'QWEN',
+    'ollama': 'OLLAMA',
+}
+
+_lock = threading.Lock()
+_clients: Dict[Tuple, BaseClient] = {}
+_pid: Optional[int] = None
+_stats = {'hits': 0, 'builds': 0}
+
+
+def client_key(provider: str) -> Tuple:
+    """客户端缓存键：base_url / api_key / model 之外，其余同前缀配置（思考档位、上下文窗口等）取摘要"""
+    prefix = PROVIDER_ENV_PREFIXES.get(provider, provider.upper()) + '_'
+    names = sorted({k for k in os.environ if k.startswith(prefix)} |
+                   {k for k in get_config_snapshot().values if k.startswith(prefix)})
+    settings = '\n'.join(f"{k}={get_env_with_default(k)}" for k in names)
+    return (provider,
+            get_env_with_default(prefix + 'API_BASE_URL'),
+            get_env_with_default(prefix + 'API_KEY'),
+            get_env_with_default(prefix + 'API_MODEL'),
+            hashlib.sha256(settings.encode('utf-8')).hexdigest()[:16])
+
+
+def get_shared_client(provider: str, builder: Callable[[], BaseClient]) -> BaseClient:
+    """获取进程内共享的客户端实例，不存在或配置已变化时调用 builder 创建"""
+    global _pid
+    key = client_key(provider)
+    with _lock:
+        if _pid != os.getpid():
+            _clients.clear()
+            _pid = os.getpid()
+        client = _clients.get(key)
+        if client is not None:
+            _stats['hits'] += 1
+            return client
+        # 同一供应商的旧配置实例不再使用（进行中的请求仍持有引用，不主动关闭）
+        for stale in [k for k in _clients if k[0] == provider]:
+            del _clients[stale]
+        client = builder()
+        _clients[key] = client
+        _stats['builds'] += 1
+    logger.info(f"🔌 已创建 {provider} 客户端实例（进程内共享，连接池复用）")
+    return client
+
+
+def get_client_registry_stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_stats, cached=len(_clients))
+
+
+def clear_client_registry():
+    """清空共享客户端（供测试或需要强制重建连接时调用）"""
+    with _lock:
+        _clients.clear()
@@ -1,5 +1,6 @@
 import os
 
+from biz.llm.call_ledger import LedgerClient
 from biz.llm.client.base import BaseClient
 from biz.llm.client.deepseek import DeepSeekClient
 from biz.llm.client.jedi import JediClient
@@ -7,6 +8,9 @@ from biz.llm.client.ollama_client import OllamaClient
 from biz.llm.client.openai import OpenAIClient
 from biz.llm.client.qwen import QwenClient
 from biz.llm.client.zhipuai import ZhipuAIClient
+from biz.llm.client_registry import get_shared_client
+from biz.llm.failover import build_failover_client
+from biz.llm.rate_limiter import ProviderRateLimiter, RateLimitedClient
 from biz.utils.log import logger
 
 from biz.utils.default_config import get_env_with_default
@@ -15,6 +19,11 @@ from biz.utils.default_config import get_env_with_default
 class Factory:
     @staticmethod
     def getClient(provider: str = None) -> BaseClient:
+        if provider is None and get_env_with_default("LLM_FAILOVER_PROVIDERS"):
+            # 配置了备用供应商：返回按顺序故障转移/对冲的组合客户端
+            primary = get_env_with_default("LLM_PROVIDER")
+            return LedgerClient(build_failover_client(primary, get_env_with_default("LLM_FAILOVER_PROVIDERS"),
+                                                      Factory.getClient), primary)
         provider = provider or get_env_with_default("LLM_PROVIDER")
         chat_model_providers = {
             'zhipuai': lambda: ZhipuAIClient(),
@@ -27,6 +36,13 @@ class Factory:
 
         provider_func = chat_model_providers.get(provider)
         if provider_func:
-            return provider_func()
+            # 进程内共享客户端实例，复用底层连接池；配置变化时自动重建
+            client = get_shared_client(provider, provider_func)
+            # 配置了 RPM/TPM 时加上跨进程的供应商级限流
+            limiter = ProviderRateLimiter.from_env(provider)
+            if limiter:
+                client = RateLimitedClient(client, limiter)
+            # 每次调用记录台账（耗时、用量、结果），故障转移的成员客户端在外层调用中透传不重复记录
+            return LedgerClient(client, provider)
         else:
             raise Exception(f'Unknown chat model provider: {provider}')
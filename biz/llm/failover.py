@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+多供应商故障转移与对冲请求
+LLM_FAILOVER_PROVIDERS 配置了备用供应商时，Factory.getClient() 返回 FailoverClient，
+按 [LLM_PROVIDER] + 备用列表的顺序组合多个客户端：
+
+- 每个供应商维护最近 LLM_FAILOVER_WINDOW 次调用的耗时与成败，计算 p50/p95 与错误率
+- 对冲：主供应商耗时超过其 p95 仍未返回时，向下一个供应商并行发出第二个请求，取先成功的结果
+  （落后的请求无法中止，会在后台完成并计入统计）
+- 故障转移：请求失败（异常或返回错误文本）时依次尝试后续供应商
+- 熔断：连续失败或窗口内错误率过高时熔断该供应商 LLM_CIRCUIT_OPEN_SECONDS 秒，之后半开放行一次试探
+
+各进程的健康统计定期写入 SQLite，由 /health 接口汇总展示。
+"""
+
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from biz.llm.call_ledger import note_call_retry
+from biz.llm.client.base import BaseClient
+from biz.llm.types import NotGiven, NOT_GIVEN
+from biz.utils.default_config import get_env_bool, get_env_int
+from biz.utils.log import logger
+
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half_open'
+
+
+def parse_failover_members(primary: str, fallbacks: str) -> List[Tuple[str, Optional[str]]]:
+    """解析 "provider[:model]" 列表，主供应商在前，去重"""
+    members = [(primary, None)]
+    for item in (fallbacks or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        provider, _, model = item.partition(':')
+        member = (provider.strip(), model.strip() or None)
+        if member not in members:
+            members.append(member)
+    return members
+
+
+def _percentile(sorted_values: List[float], ratio: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(ratio * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class ProviderHealth:
+    """单个供应商的滚动健康统计与熔断器（线程安全）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.window = max(10, get_env_int('LLM_FAILOVER_WINDOW', 100))
+        self.failure_threshold = max(1, get_env_int('LLM_CIRCUIT_FAILURE_THRESHOLD', 5))
+        self.error_rate_threshold = get_env_int('LLM_CIRCUIT_ERROR_RATE', 50) / 100
+        self.open_seconds = get_env_int('LLM_CIRCUIT_OPEN_SECONDS', 60)
+        self._samples = deque(maxlen=self.window)  # (latency_seconds, ok)
+        self._consecutive_failures = 0
+        self._state = CIRCUIT_CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """熔断打开期间拒绝；到期后进入半开状态，只放行一个试探请求"""
+        with self._lock:
+            if self._state == CIRCUIT_CLOSED:
+                return True
+            if self._state == CIRCUIT_OPEN and time.time() - self._opened_at >= self.open_seconds:
+                self._state = CIRCUIT_HALF_OPEN
+                self._trial_in_flight = False
+            # 试探请求可能因主供应商先返回而未真正发出，超过熔断时长仍无结果时允许再次试探
+            if self._state == CIRCUIT_HALF_OPEN and (
+                    not self._trial_in_flight or time.time() - self._trial_started >= self.open_seconds):
+                self._trial_in_flight = True
+                self._trial_started = time.time()
+                return True
+            return False
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            previous = self._state
+            self._samples.append((latency, ok))
+            if ok:
+                self._consecutive_failures = 0
+                self._state = CIRCUIT_CLOSED
+            else:
+                self._consecutive_failures += 1
+                failures = sum(1 for _, sample_ok in self._samples if not sample_ok)
+                high_error_rate = len(self._samples) >= 10 and failures / len(self._samples) >= self.error_rate_threshold
+                if self._state == CIRCUIT_HALF_OPEN or self._consecutive_failures >= self.failure_threshold \
+                        or high_error_rate:
+                    self._state = CIRCUIT_OPEN
+                    self._opened_at = time.time()
+            self._trial_in_flight = False
+            changed = previous != self._state
+        if changed:
+            logger.warning(f"🔌 LLM 供应商 {self.name} 熔断状态: {previous} → {self._state}")
+        self.flush(force=changed)
+
+    def p95(self, min_samples: int) -> Optional[float]:
+        """成功调用的 p95 耗时（秒），样本不足时返回 None"""
+        with self._lock:
+            latencies = sorted(latency for latency, ok in self._samples if ok)
+        if len(latencies) < min_samples:
+            return None
+        return _percentile(latencies, 0.95)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(latency for latency, ok in self._samples if ok)
+            total = len(self._samples)
+            failures = sum(1 for _, ok in self._samples if not ok)
+            state = self._state
+            consecutive = self._consecutive_failures
+        return {
+            'samples': total,
+            'p50_ms': int(_percentile(latencies, 0.5) * 1000) if latencies else None,
+            'p95_ms': int(_percentile(latencies, 0.95) * 1000) if latencies else None,
+            'error_rate': round(failures / total, 3) if total else 0.0,
+            'consecutive_failures': consecutive,
+            'circuit': state,
+        }
+
+    def flush(self, force: bool = False):
+        """把统计写入 SQLite（每个供应商最多每 LLM_FAILOVER_HEALTH_FLUSH_SECONDS 秒一次）"""
+        now = time.time()
+        if not force and now - self._last_flush < get_env_int('LLM_FAILOVER_HEALTH_FLUSH_SECONDS', 10):
+            return
+        self._last_flush = now
+        ProviderHealthStore.save(self.name, self.stats())
+
+
+class ProviderHealthStore:
+    """供应商健康统计快照（SQLite），供 /health 接口跨进程读取"""
+
+    DB_FILE = "data/data.db"
+
+    @staticmethod
+    def init_db():
+        """初始化供应商健康统计表"""
+        try:
+            with sqlite3.connect(ProviderHealthStore.DB_FILE) as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS llm_provider_health (
+                        name TEXT PRIMARY KEY,
+                        pid INTEGER,
+                        stats TEXT NOT NULL,
+                        updated_at INTEGER NOT NULL
+                    )
+                ''')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"供应商健康统计表初始化失败: {e}")
+
+    @staticmethod
+    def save(name: str, stats: Dict[str, Any]):
+        try:
+            with sqlite3.connect(ProviderHealthStore.DB_FILE, timeout=5) as conn:
+                conn.execute('INSERT OR REPLACE INTO llm_provider_health (name, pid, stats, updated_at) '
+                             'VALUES (?, ?, ?, ?)', (name, os.getpid(), json.dumps(stats), int(time.time())))
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.warning(f"写入供应商健康统计失败: {e}")
+
+    @staticmethod
+    def get_stats(max_age_seconds: int = 3600) -> Dict[str, Dict[str, Any]]:
+        """获取最近更新过的各供应商健康统计"""
+        try:
+            with sqlite3.connect(ProviderHealthStore.DB_FILE) as conn:
+                rows = conn.execute('SELECT name, pid, stats, updated_at FROM llm_provider_health '
+                                    'WHERE updated_at >= ? ORDER BY name',
+                                    (int(time.time()) - max_age_seconds,)).fetchall()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"查询供应商健康统计失败: {e}")
+            return {}
+        return {name: dict(json.loads(stats), pid=pid, updated_at=updated_at)
+                for name, pid, stats, updated_at in rows}
+
+
+_health: Dict[str, ProviderHealth] = {}
+_health_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+
+
+def get_provider_health(name: str) -> ProviderHealth:
+    """同一进程内按 "provider:model" 共享健康统计"""
+    with _health_lock:
+        if name not in _health:
+            if not _health:
+                ProviderHealthStore.init_db()
+            _health[name] = ProviderHealth(name)
+        return _health[name]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    with _health_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=max(2, get_env_int('LLM_FAILOVER_MAX_WORKERS', 16)),
+                                           thread_name_prefix='llm-failover')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _is_error_result(result: Any) -> bool:
+    from biz.utils.code_reviewer import is_api_error_message
+    if isinstance(result, dict):
+        return not result.get('tool_calls') and is_api_error_message(result.get('content') or '')
+    return is_api_error_message(result)
+
+
+class FailoverMember:
+    def __init__(self, provider: str, model: Optional[str], client: BaseClient):
+        self.provider = provider
+        self.model = model
+        self.client = client
+        self.name = f"{provider}:{model or getattr(client, 'default_model', '') or 'default'}"
+        self.health = get_provider_health(self.name)
+
+    def call(self, method: str, *args) -> Tuple[Any, bool]:
+        """调用客户端并记录耗时与成败，返回 (结果或异常, 是否成功)"""
+        start = time.monotonic()
+        try:
+            result = getattr(self.client, method)(*args, self.model or NOT_GIVEN)
+            ok = not _is_error_result(result)
+        except Exception as e:
+            logger.warning(f"LLM 供应商 {self.name} 调用异常: {type(e).__name__}: {e}")
+            result, ok = e, False
+        self.health.record(time.monotonic() - start, ok)
+        return result, ok
+
+
+class FailoverClient(BaseClient):
+    """按顺序组合多个供应商的客户端：对冲请求 + 故障转移 + 熔断"""
+
+    def __init__(self, members: List[FailoverMember]):
+        if not members:
+            raise ValueError("FailoverClient 至少需要一个可用的供应商")
+        self.members = members
+        primary = members[0].client
+        self.default_model = getattr(primary, 'default_model', None)
+        self.context_window = getattr(primary, 'context_window', None)
+        # 工具调用协议以主供应商为准，故障转移时只选择同样支持工具调用的供应商
+        self.supports_tools = getattr(primary, 'supports_tools', False)
+        self.hedge_enabled = get_env_bool('LLM_FAILOVER_HEDGE_ENABLED')
+        self.hedge_min_samples = get_env_int('LLM_FAILOVER_HEDGE_MIN_SAMPLES', 10)
+
+    def completions(self,
+                    messages: List[Dict[str, str]],
+                    model: Optional[str] | NotGiven = NOT_GIVEN,
+                    ) -> str:
+        return self._dispatch('completions', self.members, self.hedge_enabled, messages)
+
+    def completions_with_tools(self,
+                               messages: List[Dict[str, Any]],
+                               tools: List[Dict[str, Any]],
+                               model: Optional[str] | NotGiven = NOT_GIVEN,
+                               ) -> Dict[str, Any]:
+        members = [m for m in self.members if getattr(m.client, 'supports_tools', False) == self.supports_tools]
+        # 工具调用是多轮对话中的一步，不做对冲，只做故障转移
+        return self._dispatch('completions_with_tools', members, False, messages, tools)
+
+    def _candidates(self, members: List[FailoverMember]) -> List[FailoverMember]:
+        allowed = [m for m in members if m.health.allow_request()]
+        if not allowed:
+            logger.warning("所有 LLM 供应商均处于熔断状态，仍按顺序尝试")
+            return list(members)
+        return allowed
+
+    def _dispatch(self, method: str, members: List[FailoverMember], hedge: bool, *args):
+        candidates = self._candidates(members)
+        executor = _get_executor()
+        pending = {}
+        next_index = 0
+        hedged = False
+        last_result = None
+
+        def _launch():
+            nonlocal next_index
+            member = candidates[next_index]
+            if next_index:
+                note_call_retry()
+            next_index += 1
+            # 复制调用方上下文，成员客户端的用量与重试记入当前调用的台账
+            pending[executor.submit(contextvars.copy_context().run, member.call, method, *args)] = member
+
+        _launch()
+        while pending:
+            timeout = None
+            if hedge and not hedged and next_index < len(candidates):
+                timeout = candidates[0].health.p95(self.hedge_min_samples)
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                logger.info(f"⏱️ {candidates[0].name} 超过 p95 ({timeout:.1f}s) 未返回，向 "
+                            f"{candidates[next_index].name} 发出对冲请求")
+                _launch()
+                continue
+            for future in done:
+                member = pending.pop(future)
+                result, ok = future.result()
+                if ok:
+                    if member is not candidates[0]:
+                        logger.info(f"🔀 本次调用由 {member.name} 完成")
+                    return result
+                last_result = result
+            if not pending and next_index < len(candidates):
+                logger.warning(f"🔀 {candidates[next_index - 1].name} 调用失败，故障转移到 {candidates[next_index].name}")
+                _launch()
+
+        if isinstance(last_result, Exception):
+            raise last_result
+        return last_result
+
+
+def build_failover_client(primary: str, fallbacks: str, client_factory: Callable[[str], BaseClient]):
+    """构建故障转移客户端；备用供应商创建失败（如缺少密钥）时跳过"""
+    members = []
+    for provider, model in parse_failover_members(primary, fallbacks):
+        try:
+            members.append(FailoverMember(provider, model, client_factory(provider)))
+        except Exception as e:
+            if not members:
+                raise
+            logger.warning(f"备用 LLM 供应商 {provider} 初始化失败，已跳过: {e}")
+    if len(members) == 1:
+        return members[0].client
+    logger.info(f"LLM 故障转移顺序: {' → '.join(m.name for m in members)}")
+    return FailoverClient(members)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+大模型供应商级限流（跨进程共享）
+同时按请求数（RPM）和估算 token 数（TPM，按 count_tokens 统计提示词）限流，避免 RQ 工作进程、
+SVN 定时任务线程与手动重试同时发起请求时超过供应商的频率限制。
+
+算法为带预约的令牌桶（GCRA）：每个供应商只保存"理论到达时间"（TAT），调用方原子地预约下一个
+可用时刻后睡眠到该时刻再发请求。预约按到达顺序发放，调用方天然公平排队而不是失败；进程崩溃
+只会空出一个时间片，不会留下需要清理的锁。
+
+状态存储：QUEUE_DRIVER=rq 时使用 Redis（Lua 脚本保证原子性），否则使用 SQLite（BEGIN IMMEDIATE）。
+收到 429 时按 Retry-After（无则按 LLM_RATE_LIMIT_BACKOFF_SECONDS）暂停该供应商的所有调用方并重试。
+"""
+
+import asyncio
+import datetime
+import email.utils
+import re
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from biz.llm.call_ledger import note_call_retry
+from biz.utils.default_config import get_env_int, get_env_with_default
+from biz.utils.log import logger
+from biz.utils.token_util import count_tokens
+
+_RATE_LIMIT_TEXT_RE = re.compile(r'429|Too Many Requests|rate.?limit|限流', re.IGNORECASE)
+
+
+class SqliteRateLimitStore:
+    """限流状态存储（SQLite，适用于单机多进程）"""
+
+    DB_FILE = "data/data.db"
+
+    @staticmethod
+    def init_db():
+        """初始化限流状态表"""
+        try:
+            with sqlite3.connect(SqliteRateLimitStore.DB_FILE) as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS llm_rate_limits (
+                        provider TEXT PRIMARY KEY,
+                        request_tat REAL NOT NULL DEFAULT 0,
+                        token_tat REAL NOT NULL DEFAULT 0,
+                        blocked_until REAL NOT NULL DEFAULT 0
+                    )
+                ''')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"限流状态表初始化失败: {e}")
+
+    @staticmethod
+    def reserve(provider: str, costs: Tuple[float, float], tolerances: Tuple[float, float], now: float) -> float:
+        """原子地预约下一个可用时刻，返回允许发出请求的时间点"""
+        conn = sqlite3.connect(SqliteRateLimitStore.DB_FILE, timeout=30, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT request_tat, token_tat, blocked_until FROM llm_rate_limits WHERE provider = ?',
+                               (provider,)).fetchone()
+            request_tat, token_tat, blocked_until = row or (0.0, 0.0, 0.0)
+            start, request_tat, token_tat = _schedule(request_tat, token_tat, blocked_until, costs, tolerances, now)
+            conn.execute('INSERT OR REPLACE INTO llm_rate_limits (provider, request_tat, token_tat, blocked_until) '
+                         'VALUES (?, ?, ?, ?)', (provider, request_tat, token_tat, blocked_until))
+            conn.execute('COMMIT')
+            return start
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def block(provider: str, until: float):
+        """暂停该供应商的调用直到 until（只会延长，不会缩短）"""
+        with sqlite3.connect(SqliteRateLimitStore.DB_FILE, timeout=30) as conn:
+            conn.execute('INSERT OR IGNORE INTO llm_rate_limits (provider) VALUES (?)', (provider,))
+            conn.execute('UPDATE llm_rate_limits SET blocked_until = MAX(blocked_until, ?) WHERE provider = ?',
+                         (until, provider))
+            conn.commit()
+
+
+class RedisRateLimitStore:
+    """限流状态存储（Redis，适用于 rq 多机部署）"""
+
+    KEY_PREFIX = "llm_rate_limit:"
+    # 与 _schedule 相同的计算逻辑
+    RESERVE_SCRIPT = """
+        local state = redis.call('HMGET', KEYS[1], 'request_tat', 'token_tat', 'blocked_until')
+        local request_tat = tonumber(state[1]) or 0
+        local token_tat = tonumber(state[2]) or 0
+        local blocked_until = tonumber(state[3]) or 0
+        local request_cost, token_cost = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local request_tol, token_tol, now = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+        local start = math.max(now, blocked_until, request_tat - request_tol, token_tat - token_tol)
+        request_tat = math.max(request_tat, start) + request_cost
+        token_tat = math.max(token_tat, start) + token_cost
+        redis.call('HSET', KEYS[1], 'request_tat', tostring(request_tat), 'token_tat', tostring(token_tat))
+        redis.call('EXPIRE', KEYS[1], 86400)
+        return tostring(start)
+    """
+    BLOCK_SCRIPT = """
+        local current = tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0
+        if tonumber(ARGV[1]) > current then
+            redis.call('HSET', KEYS[1], 'blocked_until', ARGV[1])
+        end
+        redis.call('EXPIRE', KEYS[1], 86400)
+        return 1
+    """
+
+    def __init__(self, redis_client=None):
+        if redis_client is None:
+            from redis import Redis
+            redis_client = Redis(get_env_with_default('REDIS_HOST'), get_env_int('REDIS_PORT'))
+        self.redis = redis_client
+        self._reserve = self.redis.register_script(self.RESERVE_SCRIPT)
+        self._block = self.redis.register_script(self.BLOCK_SCRIPT)
+
+    def reserve(self, provider: str, costs: Tuple[float, float], tolerances: Tuple[float, float], now: float) -> float:
+        return float(self._reserve(keys=[self.KEY_PREFIX + provider], args=[*costs, *tolerances, now]))
+
+    def block(self, provider: str, until: float):
+        self._block(keys=[self.KEY_PREFIX + provider], args=[until])
+
+
+def _schedule(request_tat: float, token_tat: float, blocked_until: float,
+              costs: Tuple[float, float], tolerances: Tuple[float, float], now: float):
+    """GCRA 预约：返回 (允许发出时间, 新的请求 TAT, 新的 token TAT)"""
+    request_cost, token_cost = costs
+    request_tol, token_tol = tolerances
+    start = max(now, blocked_until, request_tat - request_tol, token_tat - token_tol)
+    return start, max(request_tat, start) + request_cost, max(token_tat, start) + token_cost
+
+
+_stores: Dict[str, Any] = {}
+
+
+def get_rate_limit_store():
+    """按 QUEUE_DRIVER 选择存储：rq 模式用 Redis，其余用 SQLite"""
+    driver = get_env_with_default('QUEUE_DRIVER', 'async')
+    if driver not in _stores:
+        if driver == 'rq':
+            _stores[driver] = RedisRateLimitStore()
+        else:
+            SqliteRateLimitStore.init_db()
+            _stores[driver] = SqliteRateLimitStore
+    return _stores[driver]
+
+
+class ProviderRateLimiter:
+    """单个供应商的限流器；RPM/TPM 为 0 表示该维度不限"""
+
+    def __init__(self, provider: str, rpm: int = 0, tpm: int = 0, burst_seconds: float = 10, store=None):
+        self.provider = provider
+        self.rpm = max(0, rpm)
+        self.tpm = max(0, tpm)
+        # 允许突发的时长：最多可以一次性用掉 burst_seconds 秒的额度
+        self.burst_seconds = max(0.0, burst_seconds)
+        self.store = store or get_rate_limit_store()
+
+    @classmethod
+    def from_env(cls, provider: str) -> Optional['ProviderRateLimiter']:
+        """读取 <PROVIDER>_RATE_LIMIT_RPM/TPM（未配置时使用 LLM_RATE_LIMIT_RPM/TPM），都为 0 时返回 None"""
+        prefix = provider.upper()
+        rpm = get_env_int(f'{prefix}_RATE_LIMIT_RPM', get_env_int('LLM_RATE_LIMIT_RPM', 0))
+        tpm = get_env_int(f'{prefix}_RATE_LIMIT_TPM', get_env_int('LLM_RATE_LIMIT_TPM', 0))
+        if rpm <= 0 and tpm <= 0:
+            return None
+        return cls(provider, rpm, tpm, get_env_int('LLM_RATE_LIMIT_BURST_SECONDS', 10))
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpm > 0 or self.tpm > 0
+
+    def reserve(self, tokens: int) -> float:
+        """预约一次调用，返回需要等待的秒数；存储异常时放行（不因限流故障阻断审查）"""
+        if not self.enabled:
+            return 0.0
+        request_cost = 60.0 / self.rpm if self.rpm else 0.0
+        token_cost = 60.0 * tokens / self.tpm if self.tpm else 0.0
+        tolerances = (max(0.0, self.burst_seconds - request_cost) if self.rpm else 0.0,
+                      max(0.0, self.burst_seconds - token_cost) if self.tpm else 0.0)
+        now = time.time()
+        try:
+            start = self.store.reserve(self.provider, (request_cost, token_cost), tolerances, now)
+        except Exception as e:
+            logger.warning(f"⚠️ 限流状态读写失败，本次调用不限流: {e}")
+            return 0.0
+        return max(0.0, start - now)
+
+    def acquire(self, tokens: int):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self._log_wait(wait, tokens)
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int):
+        wait = await asyncio.to_thread(self.reserve, tokens)
+        if wait > 0:
+            self._log_wait(wait, tokens)
+            await asyncio.sleep(wait)
+
+    def block(self, seconds: float):
+        """收到 429 后暂停该供应商的所有调用方"""
+        try:
+            self.store.block(self.provider, time.time() + seconds)
+        except Exception as e:
+            logger.warning(f"⚠️ 限流状态写入失败: {e}")
+
+    def _log_wait(self, wait: float, tokens: int):
+        if wait >= 1:
+            logger.info(f"⏳ {self.provider} 限流排队 {wait:.1f} 秒（估算 {tokens} tokens，RPM={self.rpm}，TPM={self.tpm}）")
+
+
+def estimate_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(count_tokens(str(message.get('content') or '')) for message in messages)
+
+
+def parse_retry_after(error: Exception) -> Optional[float]:
+    """从异常携带的 HTTP 响应中读取 Retry-After（秒数或 HTTP 日期）"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # 格式错误的 Retry-After 不应掩盖原始的限流错误
+        return None
+    if parsed.tzinfo is None:
+        # "-0000" 时区解析为不带时区的时间，按 HTTP 日期的约定视为 UTC
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    return status == 429 or type(error).__name__ == 'RateLimitError'
+
+
+def is_rate_limit_text(result: Any) -> bool:
+    """部分客户端把 429 转成错误文本返回（如 DeepSeek / Jedi），按错误文本识别"""
+    if not isinstance(result, str) or not _RATE_LIMIT_TEXT_RE.search(result):
+        return False
+    from biz.utils.code_reviewer import is_api_error_message
+    return is_api_error_message(result)
+
+
+class RateLimitedClient:
+    """
+    为任意客户端加上供应商级限流：调用前按估算 token 排队，遇到 429 时按 Retry-After 暂停并重试
+    （最多 LLM_RATE_LIMIT_MAX_RETRIES 次）。其余属性透传给被包装的客户端。
+    """
+
+    def __init__(self, client, limiter: ProviderRateLimiter):
+        self._client = client
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def completions(self, messages, model=None):
+        return self._call(self._client.completions, messages, messages, model)
+
+    def completions_with_tools(self, messages, tools, model=None):
+        return self._call(self._client.completions_with_tools, messages, messages, tools, model)
+
+    async def acompletions(self, messages, model=None):
+        return await self._acall(self._client.acompletions, messages, messages, model)
+
+    async def acompletions_with_tools(self, messages, tools, model=None):
+        return await self._acall(self._client.acompletions_with_tools, messages, messages, tools, model)
+
+    def completions_many(self, messages_list, max_in_flight: int = 0):
+        from biz.llm.async_runtime import gather_limited, run_sync
+        limit = max_in_flight or get_env_int('LLM_ASYNC_MAX_IN_FLIGHT', 32)
+        return run_sync(gather_limited([self.acompletions(messages) for messages in messages_list], limit))
+
+    def _call(self, func, messages, *args):
+        tokens = estimate_prompt_tokens(messages)
+        max_retries = get_env_int('LLM_RATE_LIMIT_MAX_RETRIES', 3)
+        for attempt in range(max_retries + 1):
+            self._limiter.acquire(tokens)
+            try:
+                result = func(*args)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == max_retries:
+                    raise
+                self._on_rate_limited(parse_retry_after(e), attempt, max_retries)
+                continue
+            if is_rate_limit_text(self._result_text(result)) and attempt < max_retries:
+                self._on_rate_limited(None, attempt, max_retries)
+                continue
+            return result
+
+    async def _acall(self, func, messages, *args):
+        tokens = estimate_prompt_tokens(messages)
+        max_retries = get_env_int('LLM_RATE_LIMIT_MAX_RETRIES', 3)
+        for attempt in range(max_retries + 1):
+            await self._limiter.aacquire(tokens)
+            try:
+                result = await func(*args)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == max_retries:
+                    raise
+                self._on_rate_limited(parse_retry_after(e), attempt, max_retries)
+                continue
+            if is_rate_limit_text(self._result_text(result)) and attempt < max_retries:
+                self._on_rate_limited(None, attempt, max_retries)
+                continue
+            return result
+
+    @staticmethod
+    def _result_text(result):
+        return result.get('content') if isinstance(result, dict) else result
+
+    def _on_rate_limited(self, retry_after: Optional[float], attempt: int, max_retries: int):
+        seconds = retry_after if retry_after is not None else get_env_int('LLM_RATE_LIMIT_BACKOFF_SECONDS', 20)
+        note_call_retry()
+        logger.warning(f"🚦 {self._limiter.provider} 返回 429，暂停 {seconds:.0f} 秒后重试 ({attempt + 1}/{max_retries})")
+        self._limiter.block(seconds)
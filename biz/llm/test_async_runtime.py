@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/llm/async_runtime.py 共享事件循环与异步客户端门面的单元测试。
+
+覆盖：
+1. run_sync 复用同一个后台事件循环，gather_limited 按输入顺序返回且在途数不超过上限
+2. BaseClient 默认的 acompletions 在线程中执行同步 completions，completions_many 结果按输入顺序返回
+3. LLM_ASYNC_ENABLED 开启时分批审查走异步路径，单批异常不影响其他批次
+"""
+import asyncio
+import os
+import time
+from unittest import TestCase, main
+
+from biz.llm.async_runtime import gather_limited, get_event_loop, run_sync
+from biz.llm.client.base import BaseClient
+from biz.utils.code_reviewer import BatchCodeReviewer
+
+
+class EchoClient(BaseClient):
+    def completions(self, messages, model=None):
+        time.sleep(0.05)
+        return messages[-1]['content'].upper()
+
+
+class TestAsyncRuntime(TestCase):
+    def tearDown(self):
+        os.environ.pop('LLM_ASYNC_ENABLED', None)
+        os.environ.pop('LLM_ASYNC_MAX_IN_FLIGHT', None)
+
+    def test_gather_limited(self):
+        state = {'running': 0, 'peak': 0}
+
+        async def _job(i):
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+            await asyncio.sleep(0.01 * (5 - i))
+            state['running'] -= 1
+            return i
+
+        self.assertEqual(run_sync(gather_limited([_job(i) for i in range(5)], 2)), [0, 1, 2, 3, 4])
+        self.assertLessEqual(state['peak'], 2)
+        self.assertIs(get_event_loop(), get_event_loop())
+
+    def test_completions_many(self):
+        client = EchoClient()
+        messages_list = [[{'role': 'user', 'content': f'batch {i}'}] for i in range(8)]
+        start = time.monotonic()
+        results = client.completions_many(messages_list, max_in_flight=8)
+        self.assertEqual(results, [f'BATCH {i}' for i in range(8)])
+        self.assertLess(time.monotonic() - start, 0.3)
+
+    def test_async_review_batches(self):
+        os.environ['LLM_ASYNC_ENABLED'] = '1'
+        reviewer = BatchCodeReviewer.__new__(BatchCodeReviewer)
+
+        async def _areview(diffs_text, commits_text=''):
+            if 'bad.py' in diffs_text:
+                raise ConnectionError('reset')
+            return f' ok {len(diffs_text)} '
+
+        reviewer.areview_code = _areview
+        batches = [[{'file_path': 'a.py', 'diff': '+a'}], [{'file_path': 'bad.py', 'diff': '+b'}]]
+        results = reviewer._review_batches(batches, '')
+        self.assertTrue(results[0].startswith('ok '))
+        self.assertIn('❌ AI审查失败', results[1])
+
+
+if __name__ == '__main__':
+    main()
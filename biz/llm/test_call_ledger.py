@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/llm/call_ledger.py 大模型调用台账的单元测试。
+
+覆盖：
+1. 每次调用记录一行：用量、耗时、首 token、重试、项目与关联 ID，后台批量写库
+2. 异常与 API 错误消息记为失败，嵌套客户端不重复记录
+3. 线程池与共享事件循环中的调用保留调用方的项目上下文
+4. 按项目 / 供应商汇总吞吐、P95 与 token
+"""
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.llm.async_runtime import gather_limited, run_sync
+from biz.llm.call_ledger import LedgerClient, LlmCallLedger, flush_ledger, llm_call_context, note_call, \
+    note_call_retry, summarize_calls
+from biz.llm.client.base import BaseClient
+from biz.utils.code_reviewer import BatchCodeReviewer
+
+
+class FakeClient(BaseClient):
+    provider_name = 'fakeprov'
+    default_model = 'fake-model'
+
+    def __init__(self, content='代码结构清晰，命名规范，总分: 90分'):
+        self.content = content
+
+    def completions(self, messages, model=None):
+        if isinstance(self.content, Exception):
+            raise self.content
+        note_call(ttft_ms=12)
+        self._record_usage(model or self.default_model,
+                           SimpleNamespace(prompt_tokens=100, completion_tokens=20, prompt_cache_hit_tokens=60))
+        return self.content
+
+
+class TestCallLedger(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.patcher = patch.object(LlmCallLedger, 'DB_FILE', os.path.join(self.tmpdir.name, 'data.db'))
+        self.patcher.start()
+        LlmCallLedger.init_db()
+
+    def tearDown(self):
+        flush_ledger()
+        self.patcher.stop()
+        self.tmpdir.cleanup()
+
+    def _calls(self):
+        self.assertTrue(flush_ledger())
+        return LlmCallLedger.get_calls()
+
+    def test_records_call(self):
+        client = LedgerClient(FakeClient(), 'fakeprov')
+        with llm_call_context('demo', 'mr:12@abcd1234'):
+            client.completions([{'role': 'user', 'content': 'review'}])
+        row = self._calls().iloc[0]
+        self.assertEqual((row['provider'], row['model'], row['project_name'], row['correlation_id']),
+                         ('fakeprov', 'fake-model', 'demo', 'mr:12@abcd1234'))
+        self.assertEqual((row['prompt_tokens'], row['cached_tokens'], row['completion_tokens']), (100, 60, 20))
+        self.assertEqual((row['ttft_ms'], row['retries'], row['outcome']), (12, 0, 'ok'))
+        self.assertGreaterEqual(row['duration_ms'], 0)
+
+    def test_failures_and_nested_clients(self):
+        self.assertRaises(RuntimeError, LedgerClient(FakeClient(RuntimeError('boom')), 'fakeprov').completions, [])
+        LedgerClient(FakeClient('❌ AI审查失败: 请求超时'), 'fakeprov').completions([])
+
+        inner = LedgerClient(FakeClient(), 'inner')
+
+        class Outer(FakeClient):
+            def completions(self, messages, model=None):
+                note_call_retry()
+                return inner.completions(messages, model)
+
+        LedgerClient(Outer(), 'outer').completions([])
+        calls = self._calls()
+        self.assertEqual(list(calls['outcome']), ['exception', 'error', 'ok'])
+        self.assertIn('boom', calls.iloc[0]['error'])
+        # 嵌套调用只记一行，供应商以实际返回用量的为准
+        self.assertEqual((calls.iloc[2]['provider'], calls.iloc[2]['retries']), ('fakeprov', 1))
+
+    def test_context_propagates_to_threads_and_event_loop(self):
+        client = LedgerClient(FakeClient(), 'fakeprov')
+        with llm_call_context('demo', 'svn:r7'), patch.dict(os.environ, {'REVIEW_BATCH_CONCURRENCY': '3'}):
+            BatchCodeReviewer._run_parallel(lambda i: client.completions([]), [1, 2, 3], 'test')
+            run_sync(gather_limited([client.acompletions([]) for _ in range(2)], 2))
+        calls = self._calls()
+        self.assertEqual(len(calls), 5)
+        self.assertEqual(set(calls['correlation_id']), {'svn:r7'})
+
+    def test_summarize_calls(self):
+        client = LedgerClient(FakeClient(), 'fakeprov')
+        for project in ('a', 'a', 'b'):
+            with llm_call_context(project):
+                client.completions([])
+        summary = summarize_calls(self._calls(), ['project_name'], 3600)
+        self.assertEqual(list(summary['project_name']), ['a', 'b'])
+        self.assertEqual(list(summary['calls']), [2, 1])
+        self.assertEqual(summary.iloc[0]['prompt_tokens'], 200)
+        self.assertAlmostEqual(summary.iloc[0]['cache_hit_rate'], 0.6)
+        self.assertEqual(summary.iloc[0]['calls_per_hour'], 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/llm/client_registry.py 客户端注册表的单元测试。
+
+覆盖：
+1. 相同配置多次获取返回同一个实例
+2. api_key / 思考档位等配置变化后重建实例
+3. 创建失败（如缺少 API key）不缓存
+"""
+import os
+from unittest import TestCase, main
+
+from biz.llm.client_registry import clear_client_registry, get_client_registry_stats, get_shared_client
+
+
+class FakeClient:
+    def __init__(self):
+        if not os.environ.get('FAKEPROV_API_KEY'):
+            raise ValueError("API key is required.")
+        self.api_key = os.environ['FAKEPROV_API_KEY']
+
+
+class TestClientRegistry(TestCase):
+    def setUp(self):
+        clear_client_registry()
+        os.environ['FAKEPROV_API_KEY'] = 'key-1'
+
+    def tearDown(self):
+        for key in ('FAKEPROV_API_KEY', 'FAKEPROV_THINKING_LEVEL'):
+            os.environ.pop(key, None)
+        clear_client_registry()
+
+    def test_reuse_same_instance(self):
+        first = get_shared_client('fakeprov', FakeClient)
+        builds = get_client_registry_stats()['builds']
+        self.assertIs(get_shared_client('fakeprov', FakeClient), first)
+        self.assertEqual(get_client_registry_stats()['builds'], builds)
+
+    def test_rebuild_on_config_change(self):
+        first = get_shared_client('fakeprov', FakeClient)
+        os.environ['FAKEPROV_API_KEY'] = 'key-2'
+        second = get_shared_client('fakeprov', FakeClient)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.api_key, 'key-2')
+        os.environ['FAKEPROV_THINKING_LEVEL'] = 'off'
+        self.assertIsNot(get_shared_client('fakeprov', FakeClient), second)
+        self.assertEqual(get_client_registry_stats()['cached'], 1)
+
+    def test_build_failure_not_cached(self):
+        os.environ['FAKEPROV_API_KEY'] = ''
+        self.assertRaises(ValueError, get_shared_client, 'fakeprov', FakeClient)
+        os.environ['FAKEPROV_API_KEY'] = 'key-3'
+        self.assertEqual(get_shared_client('fakeprov', FakeClient).api_key, 'key-3')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/llm/failover.py 多供应商故障转移的单元测试。
+
+覆盖：
+1. 主供应商抛异常或返回错误文本时故障转移到备用供应商
+2. 主供应商超过 p95 未返回时发出对冲请求，取先返回的结果
+3. 连续失败后熔断，熔断期间不再调用该供应商
+4. 备用供应商列表解析（主供应商在前、去重、可指定模型）
+"""
+import os
+import tempfile
+import time
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.llm import failover
+from biz.llm.failover import FailoverClient, FailoverMember, ProviderHealthStore, parse_failover_members
+
+REVIEW = '### 📄 a.py\n代码结构清晰，命名规范，建议补充异常处理的单元测试。\n总分: 90分'
+
+
+class FakeClient:
+    supports_tools = False
+    default_model = 'fake'
+
+    def __init__(self, delay=0.0, result=REVIEW, error=None):
+        self.delay = delay
+        self.result = result
+        self.error = error
+        self.calls = 0
+
+    def completions(self, messages, model=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class TestFailoverClient(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_patch = patch.object(ProviderHealthStore, 'DB_FILE', os.path.join(self.tmpdir.name, 'data.db'))
+        self.db_patch.start()
+        ProviderHealthStore.init_db()
+        failover._health.clear()
+        os.environ['LLM_CIRCUIT_FAILURE_THRESHOLD'] = '2'
+
+    def tearDown(self):
+        os.environ.pop('LLM_CIRCUIT_FAILURE_THRESHOLD', None)
+        failover._health.clear()
+        self.db_patch.stop()
+        self.tmpdir.cleanup()
+
+    def _client(self, primary, fallback):
+        return FailoverClient([FailoverMember('primary', None, primary), FailoverMember('backup', None, fallback)])
+
+    def test_failover_on_error(self):
+        backup = FakeClient(result='备用供应商：' + REVIEW)
+        client = self._client(FakeClient(error=ConnectionError('reset')), backup)
+        self.assertTrue(client.completions([]).startswith('备用供应商'))
+
+        client = self._client(FakeClient(result='调用DeepSeek API时出错: 503'), backup)
+        self.assertTrue(client.completions([]).startswith('备用供应商'))
+
+    def test_hedge_when_primary_slow(self):
+        primary, backup = FakeClient(delay=0.01), FakeClient(result='备用供应商：' + REVIEW)
+        client = self._client(primary, backup)
+        client.hedge_min_samples = 3
+        for _ in range(3):
+            self.assertEqual(client.completions([]), REVIEW)
+        self.assertEqual(backup.calls, 0)
+
+        primary.delay = 1.0
+        start = time.monotonic()
+        self.assertTrue(client.completions([]).startswith('备用供应商'))
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(backup.calls, 1)
+
+    def test_circuit_breaker(self):
+        primary, backup = FakeClient(error=TimeoutError('timeout')), FakeClient()
+        client = self._client(primary, backup)
+        client.completions([])
+        client.completions([])
+        self.assertEqual(primary.calls, 2)
+        client.completions([])
+        self.assertEqual(primary.calls, 2)
+        self.assertEqual(ProviderHealthStore.get_stats()['primary:fake']['circuit'], 'open')
+
+    def test_parse_members(self):
+        self.assertEqual(parse_failover_members('deepseek', 'qwen, openai:gpt-4o-mini,deepseek'),
+                         [('deepseek', None), ('qwen', None), ('openai', 'gpt-4o-mini')])
+
+
+if __name__ == '__main__':
+    main()
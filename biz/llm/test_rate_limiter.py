@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/llm/rate_limiter.py 供应商级限流的单元测试。
+
+覆盖：
+1. RPM 限流：超出突发额度后按到达顺序排队，预约时间依次递增
+2. TPM 限流：按估算 token 数计算等待时间
+3. 429 暂停：block 之后所有调用方的预约都推迟到暂停结束
+4. 限流包装：遇到 429 异常按 Retry-After 暂停并重试，其余异常直接抛出
+5. Retry-After 支持秒数与 HTTP 日期，格式错误时忽略
+"""
+import email.utils
+import os
+import tempfile
+import time
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.llm.rate_limiter import (ProviderRateLimiter, RateLimitedClient, SqliteRateLimitStore, parse_retry_after)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class FakeRateLimitError(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Error code: 429')
+        self.status_code = 429
+        self.response = FakeResponse(429, {'retry-after': retry_after})
+
+
+class FlakyClient:
+    supports_tools = True
+
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def completions(self, messages, model=None):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return 'ok'
+
+
+class TestRateLimiter(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_patch = patch.object(SqliteRateLimitStore, 'DB_FILE', os.path.join(self.tmpdir.name, 'data.db'))
+        self.db_patch.start()
+        SqliteRateLimitStore.init_db()
+
+    def tearDown(self):
+        self.db_patch.stop()
+        self.tmpdir.cleanup()
+
+    def test_requests_queue_in_order(self):
+        limiter = ProviderRateLimiter('fake', rpm=60, burst_seconds=2, store=SqliteRateLimitStore)
+        waits = [limiter.reserve(0) for _ in range(5)]
+        # 突发额度 2 秒（2 个请求），之后每秒 1 个
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 1.0, delta=0.1)
+        self.assertAlmostEqual(waits[4], 3.0, delta=0.1)
+
+    def test_token_budget(self):
+        limiter = ProviderRateLimiter('fake', tpm=6000, burst_seconds=0, store=SqliteRateLimitStore)
+        self.assertEqual(limiter.reserve(1000), 0.0)
+        # 上一次用掉 10 秒的 token 额度
+        self.assertAlmostEqual(limiter.reserve(100), 10.0, delta=0.1)
+
+    def test_block_delays_all_callers(self):
+        limiter = ProviderRateLimiter('fake', rpm=600, burst_seconds=10, store=SqliteRateLimitStore)
+        limiter.block(30)
+        self.assertAlmostEqual(limiter.reserve(0), 30.0, delta=0.1)
+        other = ProviderRateLimiter('other', rpm=600, store=SqliteRateLimitStore)
+        self.assertEqual(other.reserve(0), 0.0)
+
+    def test_retry_after_on_429(self):
+        os.environ['LLM_RATE_LIMIT_MAX_RETRIES'] = '2'
+        limiter = ProviderRateLimiter('fake', rpm=6000, store=SqliteRateLimitStore)
+        client = RateLimitedClient(FlakyClient([FakeRateLimitError('0')]), limiter)
+        try:
+            with patch('biz.llm.rate_limiter.count_tokens', side_effect=len), \
+                    patch.object(limiter, 'block') as block:
+                self.assertEqual(client.completions([{'role': 'user', 'content': 'hi'}]), 'ok')
+            block.assert_called_once_with(0.0)
+            self.assertEqual(client.calls, 2)
+            self.assertTrue(client.supports_tools)
+
+            client = RateLimitedClient(FlakyClient([ValueError('bad')]), limiter)
+            with patch('biz.llm.rate_limiter.count_tokens', side_effect=len):
+                self.assertRaises(ValueError, client.completions, [{'role': 'user', 'content': 'hi'}])
+        finally:
+            os.environ.pop('LLM_RATE_LIMIT_MAX_RETRIES', None)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after(FakeRateLimitError('7')), 7.0)
+        self.assertIsNone(parse_retry_after(ValueError('bad')))
+        # HTTP 日期：GMT 与 -0000（不带时区）均按 UTC 计算
+        future = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(parse_retry_after(FakeRateLimitError(future)), 30, delta=2)
+        naive = email.utils.formatdate(time.time() + 30).rsplit(' ', 1)[0] + ' -0000'
+        self.assertAlmostEqual(parse_retry_after(FakeRateLimitError(naive)), 30, delta=2)
+        self.assertEqual(parse_retry_after(FakeRateLimitError('Wed, 21 Oct 2015 07:28:00 GMT')), 0.0)
+        self.assertIsNone(parse_retry_after(FakeRateLimitError('garbage')))
+
+
+if __name__ == '__main__':
+    main()
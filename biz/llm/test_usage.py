@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/llm/usage.py 用量统计的单元测试。
+
+覆盖：
+1. DeepSeek / OpenAI / Ollama / LangChain 格式的 usage 统一为输入、缓存命中、输出 token
+2. 按供应商单价估算费用，缓存命中 token 按缓存单价计算
+3. 进程内累计与缓存命中率、用量回调
+4. 审查消息的固定部分在代码变更之前，不同批次共享相同前缀
+"""
+import os
+from types import SimpleNamespace
+from unittest import TestCase, main
+
+from biz.llm.usage import estimate_cost, get_usage_stats, normalize_usage, record_usage, \
+    register_usage_listener, reset_usage_stats
+from biz.utils.prompt_registry import get_prompts
+
+
+class TestUsage(TestCase):
+    def setUp(self):
+        reset_usage_stats()
+
+    def tearDown(self):
+        for key in ('LLM_PRICE_INPUT_PER_M', 'DEEPSEEK_PRICE_CACHED_INPUT_PER_M', 'LLM_PRICE_OUTPUT_PER_M'):
+            os.environ.pop(key, None)
+        reset_usage_stats()
+
+    def test_normalize_provider_formats(self):
+        deepseek = SimpleNamespace(prompt_tokens=1000, completion_tokens=50, prompt_cache_hit_tokens=800,
+                                   prompt_cache_miss_tokens=200)
+        self.assertEqual(normalize_usage(deepseek),
+                         {'prompt_tokens': 1000, 'cached_tokens': 800, 'completion_tokens': 50})
+        openai = {'prompt_tokens': 2048, 'completion_tokens': 10, 'prompt_tokens_details': {'cached_tokens': 1024}}
+        self.assertEqual(normalize_usage(openai)['cached_tokens'], 1024)
+        self.assertEqual(normalize_usage({'prompt_eval_count': 30, 'eval_count': 7}),
+                         {'prompt_tokens': 30, 'cached_tokens': 0, 'completion_tokens': 7})
+        langchain = {'input_tokens': 100, 'output_tokens': 5, 'input_token_details': {'cache_read': 60}}
+        self.assertEqual(normalize_usage(langchain)['cached_tokens'], 60)
+        self.assertIsNone(normalize_usage(None))
+        self.assertIsNone(normalize_usage({'foo': 1}))
+
+    def test_estimate_cost(self):
+        os.environ['LLM_PRICE_INPUT_PER_M'] = '2'
+        os.environ['LLM_PRICE_OUTPUT_PER_M'] = '8'
+        usage = {'prompt_tokens': 1_000_000, 'cached_tokens': 500_000, 'completion_tokens': 100_000}
+        # 未配置缓存单价时按普通输入单价
+        self.assertAlmostEqual(estimate_cost('deepseek', usage), 2 + 0.8)
+        os.environ['DEEPSEEK_PRICE_CACHED_INPUT_PER_M'] = '0.2'
+        self.assertAlmostEqual(estimate_cost('deepseek', usage), 1 + 0.1 + 0.8)
+
+    def test_totals_and_listener(self):
+        records = []
+        register_usage_listener(records.append)
+        record_usage('deepseek', 'deepseek-v4-flash', {'prompt_tokens': 100, 'prompt_cache_hit_tokens': 0,
+                                                       'completion_tokens': 10})
+        record_usage('deepseek', 'deepseek-v4-flash', {'prompt_tokens': 100, 'prompt_cache_hit_tokens': 90,
+                                                       'completion_tokens': 10})
+        self.assertIsNone(record_usage('deepseek', 'deepseek-v4-flash', None))
+        stats = get_usage_stats()['deepseek']
+        self.assertEqual((stats['calls'], stats['prompt_tokens'], stats['cached_tokens']), (2, 200, 90))
+        self.assertEqual(stats['cache_hit_rate'], 0.45)
+        self.assertEqual([r['cached_tokens'] for r in records[-2:]], [0, 90])
+        self.assertEqual(records[-1]['provider'], 'deepseek')
+
+    def test_diffs_after_stable_prefix(self):
+        for key in ('code_review_prompt', 'code_review_batch_prompt', 'code_review_agentic_prompt'):
+            template = get_prompts(key)['user_message']['content']
+            first = template.format(commits_text='fix: a', diffs_text='diff-1')
+            second = template.format(commits_text='fix: a', diffs_text='diff-2')
+            self.assertTrue(template.rstrip().endswith('{diffs_text}'), key)
+            self.assertEqual(first[:-len('diff-1')], second[:-len('diff-2')], key)
+
+
+if __name__ == '__main__':
+    main()
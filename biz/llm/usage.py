@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+大模型用量统计（输入 / 缓存命中 / 输出 token 与估算费用）
+DeepSeek、Qwen、OpenAI 都会对命中提示词前缀缓存的输入 token 打折计费，审查消息的固定部分
+（system prompt、用户提示词说明、提交信息）已放在代码变更之前构成稳定前缀，这里从各供应商返回的
+usage 中取出缓存命中数，按进程累计并记录日志，便于观察缓存命中率与费用。
+
+各家 usage 字段不同，统一为 prompt_tokens / cached_tokens / completion_tokens：
+- DeepSeek：prompt_cache_hit_tokens / prompt_cache_miss_tokens
+- OpenAI / Qwen / 智谱：prompt_tokens_details.cached_tokens
+- Ollama：prompt_eval_count / eval_count（本地模型，无缓存计费）
+- Jedi 网关（LangChain 消息格式）：usage_metadata.input_tokens / output_tokens / input_token_details.cache_read
+
+单价（每百万 token）按 <PROVIDER>_PRICE_INPUT_PER_M 等配置，未配置时使用 LLM_PRICE_* 全局值，为 0 时不计费用。
+需要持久化用量的模块通过 register_usage_listener 注册回调。
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from biz.utils.default_config import get_env_with_default
+from biz.utils.log import logger
+
+_lock = threading.Lock()
+_totals: Dict[str, Dict[str, float]] = {}
+_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def _field(obj: Any, name: str) -> Any:
+    """同时兼容 SDK 返回的对象与 dict"""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def normalize_usage(usage: Any) -> Optional[Dict[str, int]]:
+    """把各供应商的 usage 统一为 {prompt_tokens, cached_tokens, completion_tokens}，无法识别时返回 None"""
+    if usage is None:
+        return None
+    prompt_tokens = _field(usage, 'prompt_tokens')
+    if prompt_tokens is not None:
+        cached = _field(usage, 'prompt_cache_hit_tokens')
+        if cached is None:
+            cached = _field(_field(usage, 'prompt_tokens_details'), 'cached_tokens')
+        return {'prompt_tokens': _int(prompt_tokens), 'cached_tokens': _int(cached),
+                'completion_tokens': _int(_field(usage, 'completion_tokens'))}
+    if _field(usage, 'input_tokens') is not None:
+        return {'prompt_tokens': _int(_field(usage, 'input_tokens')),
+                'cached_tokens': _int(_field(_field(usage, 'input_token_details'), 'cache_read')),
+                'completion_tokens': _int(_field(usage, 'output_tokens'))}
+    if _field(usage, 'prompt_eval_count') is not None or _field(usage, 'eval_count') is not None:
+        return {'prompt_tokens': _int(_field(usage, 'prompt_eval_count')), 'cached_tokens': 0,
+                'completion_tokens': _int(_field(usage, 'eval_count'))}
+    return None
+
+
+def _price(provider: str, name: str) -> float:
+    value = get_env_with_default(f"{provider.upper()}_PRICE_{name}_PER_M") or \
+        get_env_with_default(f"LLM_PRICE_{name}_PER_M")
+    try:
+        return float(value or 0)
+    except ValueError:
+        return 0.0
+
+
+def estimate_cost(provider: str, usage: Dict[str, int]) -> float:
+    """按单价估算一次调用的费用；缓存命中单价未配置时按普通输入单价计算"""
+    input_price = _price(provider, 'INPUT')
+    cached_price = _price(provider, 'CACHED_INPUT') or input_price
+    uncached = usage['prompt_tokens'] - usage['cached_tokens']
+    return (uncached * input_price + usage['cached_tokens'] * cached_price
+            + usage['completion_tokens'] * _price(provider, 'OUTPUT')) / 1_000_000
+
+
+def register_usage_listener(listener: Callable[[Dict[str, Any]], None]):
+    """注册用量回调，每次记录用量时以 {provider, model, prompt_tokens, cached_tokens, completion_tokens, cost} 调用"""
+    with _lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def record_usage(provider: str, model: str, usage: Any) -> Optional[Dict[str, Any]]:
+    """记录一次调用的用量；usage 为供应商原始返回（对象或 dict），无法识别时忽略"""
+    normalized = normalize_usage(usage)
+    if normalized is None:
+        return None
+    record = dict(normalized, provider=provider, model=model, cost=estimate_cost(provider, normalized))
+    with _lock:
+        totals = _totals.setdefault(provider, {'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0,
+                                               'completion_tokens': 0, 'cost': 0.0})
+        totals['calls'] += 1
+        for key in ('prompt_tokens', 'cached_tokens', 'completion_tokens', 'cost'):
+            totals[key] += record[key]
+        listeners = list(_listeners)
+    hit_rate = normalized['cached_tokens'] / normalized['prompt_tokens'] if normalized['prompt_tokens'] else 0
+    logger.info(f"📊 {provider}/{model} 用量: 输入 {normalized['prompt_tokens']} tokens"
+                f"（缓存命中 {normalized['cached_tokens']}, {hit_rate:.0%}）, 输出 {normalized['completion_tokens']} tokens"
+                + (f", 估算费用 {record['cost']:.4f}" if record['cost'] else ""))
+    for listener in listeners:
+        try:
+            listener(record)
+        except Exception as e:
+            logger.warning(f"用量回调执行失败: {e}")
+    return record
+
+
+def get_usage_stats() -> Dict[str, Dict[str, float]]:
+    """本进程内按供应商累计的用量，附带缓存命中率"""
+    with _lock:
+        stats = {provider: dict(totals) for provider, totals in _totals.items()}
+    for totals in stats.values():
+        totals['cache_hit_rate'] = round(totals['cached_tokens'] / totals['prompt_tokens'], 4) \
+            if totals['prompt_tokens'] else 0.0
+    return stats
+
+
+def reset_usage_stats():
+    """清空进程内累计用量（供测试使用）"""
+    with _lock:
+        _totals.clear()
@@ -7,15 +7,25 @@ from biz.entity.review_entity import MergeRequestReviewEntity, PushReviewEntity
 from biz.event.event_manager import event_manager
 from biz.gitlab.webhook_handler import filter_changes, MergeRequestHandler, PushHandler
 from biz.github.webhook_handler import filter_changes as filter_github_changes, PullRequestHandler as GithubPullRequestHandler, PushHandler as GithubPushHandler
+from biz.llm.call_ledger import llm_call_context
 from biz.utils.code_reviewer import CodeReviewer, is_api_error_message
+from biz.utils.diff_compactor import serialize_files
 from biz.utils.im import notifier
 from biz.utils.log import logger
+from biz.utils.metrics import REVIEW_SECONDS
+from biz.utils.tracing import set_span_attributes, span, trace
 from biz.utils.version_tracker import VersionTracker
 from biz.utils.default_config import get_env_bool
 from biz.service.review_service import ReviewService
+from biz.utils.mr_supersession import MergeRequestSupersession, gitlab_mr_key, github_pr_key, \
+    STAT_DROPPED_QUEUED, STAT_CANCELLED_IN_FLIGHT
+from biz.utils.incremental_review import MergeRequestReviewState, get_incremental_base, plan_incremental_review, \
+    build_incremental_commits_text, REVIEW_MODE_FULL, REVIEW_MODE_INCREMENTAL
 
 
 
+@REVIEW_SECONDS.time(review_type='gitlab_push')
+@trace('gitlab.push')
 def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gitlab_url_slug: str):
     push_review_enabled = get_env_bool('PUSH_REVIEW_ENABLED')
     # 检查是否启用版本追踪功能
@@ -24,7 +34,9 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
     try:
         handler = PushHandler(webhook_data, gitlab_token, gitlab_url)
         logger.info('Push Hook event received')
-        commits = handler.get_push_commits()
+        set_span_attributes(repo=webhook_data.get('project', {}).get('name'), revision=webhook_data.get('after'))
+        with span('gitlab.fetch_commits'):
+            commits = handler.get_push_commits()
         if not commits:
             logger.error('Failed to get commits')
             return
@@ -41,7 +53,8 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
         changes = []        
         if push_review_enabled:
             # 获取PUSH的changes
-            changes = handler.get_push_changes()
+            with span('gitlab.fetch_changes'):
+                changes = handler.get_push_changes()
             logger.info('changes: %s', changes)
             changes = filter_changes(changes)
             
@@ -74,7 +87,8 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
                     else:
                         try:
                             commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
-                            review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
+                            with llm_call_context(project_name, f"push:{commits[-1].get('id', '')[:8]}"):
+                                review_result = CodeReviewer().review_and_strip_code(serialize_files(changes), commits_text)
                             
                             # API错误时发送评论并入库，不再直接返回
                             if is_api_error_message(review_result):
@@ -122,7 +136,8 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
                 else:
                     try:
                         commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
-                        review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
+                        with llm_call_context(project_name, f"push:{commits[-1].get('id', '')[:8]}"):
+                            review_result = CodeReviewer().review_and_strip_code(serialize_files(changes), commits_text)
                         
                         # API错误时发送评论并入库，不再直接返回
                         if is_api_error_message(review_result):
@@ -149,22 +164,23 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
                     handler.add_push_notes(f'Auto Review Result: \n{review_result}')
 
         # 发送事件和入库时，存储结构化diff
-        ReviewService.insert_push_review_log_with_details(
-            PushReviewEntity(
-                project_name=webhook_data['project']['name'],
-                author=webhook_data['user_username'],
-                branch=webhook_data['project']['default_branch'],
-                updated_at=int(datetime.now().timestamp()),  # 当前时间
-                commits=commits,
-                score=score,
-                review_result=review_result,
-                url_slug=gitlab_url_slug,
-                webhook_data=webhook_data,
-                additions=additions,
-                deletions=deletions,
-            ),
-            file_details=json.dumps(changes, ensure_ascii=False)
-        )
+        with span('db.insert', table='push_review_log'):
+            ReviewService.insert_push_review_log_with_details(
+                PushReviewEntity(
+                    project_name=webhook_data['project']['name'],
+                    author=webhook_data['user_username'],
+                    branch=webhook_data['project']['default_branch'],
+                    updated_at=int(datetime.now().timestamp()),  # 当前时间
+                    commits=commits,
+                    score=score,
+                    review_result=review_result,
+                    url_slug=gitlab_url_slug,
+                    webhook_data=webhook_data,
+                    additions=additions,
+                    deletions=deletions,
+                ),
+                file_details=json.dumps(changes, ensure_ascii=False)
+            )
 
         event_manager['push_reviewed'].send(PushReviewEntity(
             project_name=webhook_data['project']['name'],
@@ -186,6 +202,8 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
         logger.error('出现未知错误: %s', error_message)
 
 
+@REVIEW_SECONDS.time(review_type='gitlab_merge_request')
+@trace('gitlab.merge_request')
 def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gitlab_url_slug: str):
     '''
     处理Merge Request Hook事件
@@ -203,6 +221,8 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
         # 解析Webhook数据
         handler = MergeRequestHandler(webhook_data, gitlab_token, gitlab_url)
         logger.info('Merge Request Hook event received')
+        set_span_attributes(repo=webhook_data.get('project', {}).get('name'), revision=handler.head_sha,
+                            mr_iid=handler.merge_request_iid)
         # 如果开启了仅review projected branches的，判断当前目标分支是否为projected branches
         if merge_review_only_protected_branches and not handler.target_branch_protected():
             logger.info("Merge Request target branch not match protected branches, ignored.")
@@ -212,9 +232,15 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
             logger.info(f"Merge Request Hook event, action={handler.action}, ignored.")
             return
 
+        # 排队期间该MR已有更新的推送，丢弃旧head的任务
+        mr_key = gitlab_mr_key(gitlab_url_slug, handler.project_id, handler.merge_request_iid)
+        if MergeRequestSupersession.check_superseded(mr_key, handler.head_sha, STAT_DROPPED_QUEUED):
+            return
+
         # 仅仅在MR创建或更新时进行Code Review
         # 获取Merge Request的changes
-        changes = handler.get_merge_request_changes()
+        with span('gitlab.fetch_changes'):
+            changes = handler.get_merge_request_changes()
         logger.info('changes: %s', changes)
         changes = filter_changes(changes)
         if not changes:
@@ -226,7 +252,8 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
         for item in changes:
             additions += item.get('additions', 0)
             deletions += item.get('deletions', 0)        # 获取Merge Request的commits
-        commits = handler.get_merge_request_commits()
+        with span('gitlab.fetch_commits'):
+            commits = handler.get_merge_request_commits()
         if not commits:
             logger.error('Failed to get commits')
             return
@@ -255,10 +282,35 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
                 return
         # review 代码
         commits_text = ';'.join(commit['title'] for commit in commits)
+
+        # 增量审查：只审查自上次审查的head以来的增量修改
+        review_changes = changes
+        review_mode = REVIEW_MODE_FULL
+        note_title = 'Auto Review Result'
+        labels = webhook_data.get('labels') or webhook_data.get('object_attributes', {}).get('labels', [])
+        incremental_state = get_incremental_base(mr_key, handler.head_sha, handler.action, labels)
+        if incremental_state:
+            with span('gitlab.compare'):
+                delta_changes = plan_incremental_review(handler, incremental_state, changes, filter_changes, 'gitlab')
+            if delta_changes:
+                logger.info(f'MR增量审查: {incremental_state["head_sha"][:8]}..{handler.head_sha[:8]}, '
+                            f'{len(delta_changes)}/{len(changes)} 个文件')
+                review_changes = delta_changes
+                review_mode = REVIEW_MODE_INCREMENTAL
+                commits_text = build_incremental_commits_text(commits_text, incremental_state, handler.head_sha)
+                note_title = f'Auto Review Result (增量审查 {incremental_state["head_sha"][:8]}..{handler.head_sha[:8]})'
+                # 入库的评分只对应增量修改，新增/删除行数与文件明细也按实际送审的增量统计
+                additions = sum(item.get('additions', 0) for item in review_changes)
+                deletions = sum(item.get('deletions', 0) for item in review_changes)
         
         review_score = 0
         try:
-            review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
+            with llm_call_context(project_name, f"mr:{handler.merge_request_iid}@{(handler.head_sha or '')[:8]}"):
+                review_result = CodeReviewer().review_and_strip_code(serialize_files(review_changes), commits_text)
+
+            # 审查期间该MR已有更新的推送，不再发布过期的审查结果
+            if MergeRequestSupersession.check_superseded(mr_key, handler.head_sha, STAT_CANCELLED_IN_FLIGHT):
+                return
             
             # API错误时发送评论并入库，不再直接返回
             if is_api_error_message(review_result):
@@ -274,7 +326,10 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
                 review_score = CodeReviewer.parse_review_score(review_text=review_result)
 
                 # 将review结果提交到Gitlab的 notes
-                handler.add_merge_request_notes(f'Auto Review Result: \n{review_result}')
+                handler.add_merge_request_notes(f'{note_title}: \n{review_result}')
+
+                # 记录本次审查的head，供下次增量审查使用
+                MergeRequestReviewState.save(mr_key, handler.head_sha, review_result, review_score)
             
         except Exception as e:
             logger.error(f'GitLab MR代码审查过程中发生异常: {e}')
@@ -295,25 +350,27 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
             logger.info(f'Version review recorded for project {project_name}')
 
         # 发送事件和入库时，存储结构化diff
-        ReviewService.insert_mr_review_log_with_details(
-            MergeRequestReviewEntity(
-                project_name=webhook_data['project']['name'],
-                author=webhook_data['user']['username'],
-                source_branch=webhook_data['object_attributes']['source_branch'],
-                target_branch=webhook_data['object_attributes']['target_branch'],
-                updated_at=int(datetime.now().timestamp()),
-                commits=commits,
-                score=review_score,
-                url=webhook_data['object_attributes']['url'],
-                review_result=review_result,
-                url_slug=gitlab_url_slug,
-                webhook_data=webhook_data,
-                additions=additions,
-                deletions=deletions,
-                mr_id=webhook_data['object_attributes']['iid']  # 传递GitLab的MR ID
-            ),
-            file_details=json.dumps(changes, ensure_ascii=False)
-        )
+        with span('db.insert', table='mr_review_log'):
+            ReviewService.insert_mr_review_log_with_details(
+                MergeRequestReviewEntity(
+                    project_name=webhook_data['project']['name'],
+                    author=webhook_data['user']['username'],
+                    source_branch=webhook_data['object_attributes']['source_branch'],
+                    target_branch=webhook_data['object_attributes']['target_branch'],
+                    updated_at=int(datetime.now().timestamp()),
+                    commits=commits,
+                    score=review_score,
+                    url=webhook_data['object_attributes']['url'],
+                    review_result=review_result,
+                    url_slug=gitlab_url_slug,
+                    webhook_data=webhook_data,
+                    additions=additions,
+                    deletions=deletions,
+                    mr_id=webhook_data['object_attributes']['iid'],  # 传递GitLab的MR ID
+                    review_mode=review_mode
+                ),
+                file_details=json.dumps(review_changes, ensure_ascii=False)
+            )
 
         # dispatch merge_request_reviewed event
         event_manager['merge_request_reviewed'].send(
@@ -331,7 +388,8 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
                 webhook_data=webhook_data,
                 additions=additions,
                 deletions=deletions,
-                mr_id=webhook_data['object_attributes']['iid']  # 传递GitLab的MR ID
+                mr_id=webhook_data['object_attributes']['iid'],  # 传递GitLab的MR ID
+                review_mode=review_mode
             )
         )
 
@@ -340,11 +398,14 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
         notifier.send_notification(content=error_message)
         logger.error('出现未知错误: %s', error_message)
 
+@REVIEW_SECONDS.time(review_type='github_push')
+@trace('github.push')
 def handle_github_push_event(webhook_data: dict, github_token: str, github_url: str, github_url_slug: str):
     push_review_enabled = get_env_bool('PUSH_REVIEW_ENABLED')
     try:
         handler = GithubPushHandler(webhook_data, github_token, github_url)
         logger.info('GitHub Push event received')
+        set_span_attributes(repo=webhook_data.get('repository', {}).get('name'), revision=webhook_data.get('after'))
         commits = handler.get_push_commits()
         if not commits:
             logger.error('Failed to get commits')
@@ -369,7 +430,8 @@ def handle_github_push_event(webhook_data: dict, github_token: str, github_url:
             if len(changes) > 0:
                 try:
                     commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
-                    review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
+                    with llm_call_context(webhook_data['repository']['name'], f"push:{commits[-1].get('id', '')[:8]}"):
+                        review_result = CodeReviewer().review_and_strip_code(serialize_files(changes), commits_text)
                     
                     # API错误时发送评论并入库，不再直接返回
                     if is_api_error_message(review_result):
@@ -433,6 +495,8 @@ def handle_github_push_event(webhook_data: dict, github_token: str, github_url:
         logger.error('出现未知错误: %s', error_message)
 
 
+@REVIEW_SECONDS.time(review_type='github_pull_request')
+@trace('github.pull_request')
 def handle_github_pull_request_event(webhook_data: dict, github_token: str, github_url: str, github_url_slug: str):
     '''
     处理GitHub Pull Request 事件
@@ -446,6 +510,8 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
         # 解析Webhook数据
         handler = GithubPullRequestHandler(webhook_data, github_token, github_url)
         logger.info('GitHub Pull Request event received')
+        set_span_attributes(repo=webhook_data.get('repository', {}).get('name'), revision=handler.head_sha,
+                            pr_number=handler.pull_request_number)
         # 如果开启了仅review projected branches的，判断当前目标分支是否为projected branches
         if merge_review_only_protected_branches and not handler.target_branch_protected():
             logger.info("Merge Request target branch not match protected branches, ignored.")
@@ -455,6 +521,11 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
             logger.info(f"Pull Request Hook event, action={handler.action}, ignored.")
             return
 
+        # 排队期间该PR已有更新的推送，丢弃旧head的任务
+        pr_key = github_pr_key(handler.repo_full_name, handler.pull_request_number)
+        if MergeRequestSupersession.check_superseded(pr_key, handler.head_sha, STAT_DROPPED_QUEUED):
+            return
+
         # 仅仅在PR创建或更新时进行Code Review
         # 获取Pull Request的changes
         changes = handler.get_pull_request_changes()
@@ -478,9 +549,34 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
 
         # review 代码
         commits_text = ';'.join(commit['title'] for commit in commits)
+
+        # 增量审查：只审查自上次审查的head以来的增量修改
+        review_changes = changes
+        review_mode = REVIEW_MODE_FULL
+        note_title = 'Auto Review Result'
+        labels = webhook_data.get('pull_request', {}).get('labels', [])
+        incremental_state = get_incremental_base(pr_key, handler.head_sha, handler.action, labels)
+        if incremental_state:
+            delta_changes = plan_incremental_review(handler, incremental_state, changes, filter_github_changes,
+                                                    'github')
+            if delta_changes:
+                logger.info(f'PR增量审查: {incremental_state["head_sha"][:8]}..{handler.head_sha[:8]}, '
+                            f'{len(delta_changes)}/{len(changes)} 个文件')
+                review_changes = delta_changes
+                review_mode = REVIEW_MODE_INCREMENTAL
+                commits_text = build_incremental_commits_text(commits_text, incremental_state, handler.head_sha)
+                note_title = f'Auto Review Result (增量审查 {incremental_state["head_sha"][:8]}..{handler.head_sha[:8]})'
+                # 入库的评分只对应增量修改，新增/删除行数也按实际送审的增量统计
+                additions = sum(item.get('additions', 0) for item in review_changes)
+                deletions = sum(item.get('deletions', 0) for item in review_changes)
         
         try:
-            review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
+            with llm_call_context(webhook_data['repository']['name'], f"pr:{handler.pull_request_number}@{(handler.head_sha or '')[:8]}"):
+                review_result = CodeReviewer().review_and_strip_code(serialize_files(review_changes), commits_text)
+
+            # 审查期间该PR已有更新的推送，不再发布过期的审查结果
+            if MergeRequestSupersession.check_superseded(pr_key, handler.head_sha, STAT_CANCELLED_IN_FLIGHT):
+                return
             
             # API错误时发送评论并入库，不再直接返回
             if is_api_error_message(review_result):
@@ -493,7 +589,11 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
                 return  # 审查失败时直接返回
             else:
                 # 将review结果提交到GitHub的 notes
-                handler.add_pull_request_notes(f'Auto Review Result: \n{review_result}')
+                handler.add_pull_request_notes(f'{note_title}: \n{review_result}')
+
+                # 记录本次审查的head，供下次增量审查使用
+                MergeRequestReviewState.save(pr_key, handler.head_sha, review_result,
+                                             CodeReviewer.parse_review_score(review_text=review_result))
             
         except Exception as e:
             logger.error(f'GitHub PR代码审查过程中发生异常: {e}')
@@ -515,7 +615,8 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
                 webhook_data=webhook_data,
                 additions=additions,
                 deletions=deletions,
-                mr_id=webhook_data['pull_request']['number']  # 传递GitHub PR号
+                mr_id=webhook_data['pull_request']['number'],  # 传递GitHub PR号
+                review_mode=review_mode
             ))
 
     except Exception as e:
@@ -7,6 +7,7 @@ import pandas as pd
 
 from biz.entity.review_entity import MergeRequestReviewEntity, PushReviewEntity, SvnReviewEntity
 from biz.utils.log import logger
+from biz.utils.metrics import DB_WRITE_SECONDS
 
 
 def _extract_svn_line_from_paths(paths_text: str) -> str:
@@ -240,7 +241,8 @@ class ReviewService:
                             url TEXT,
                             review_result TEXT,
                             additions INTEGER DEFAULT 0,
-                            deletions INTEGER DEFAULT 0
+                            deletions INTEGER DEFAULT 0,
+                            review_mode TEXT DEFAULT 'full'
                         )
                     ''')
                 cursor.execute('''
@@ -273,56 +275,92 @@ class ReviewService:
                             file_details TEXT,
                             trigger_type TEXT DEFAULT 'scheduled'
                         )
-                    ''')                # 确保旧版本的mr_review_log、push_review_log表添加additions、deletions列
+                    ''')                # 确保旧版本的mr_review_log、push_review_log表添加additions、deletions、file_details列
                 tables = ["mr_review_log", "push_review_log"]
-                columns = ["additions", "deletions"]
+                columns = {"additions": "INTEGER DEFAULT 0", "deletions": "INTEGER DEFAULT 0", "file_details": "TEXT"}
                 for table in tables:
                     cursor.execute(f"PRAGMA table_info({table})")
                     current_columns = [col[1] for col in cursor.fetchall()]
-                    for column in columns:
+                    for column, column_type in columns.items():
                         if column not in current_columns:
-                            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER DEFAULT 0")
+                            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                # mr_review_log 记录审查方式（full 全量 / incremental 增量），增量审查的评分只对应增量修改
+                cursor.execute("PRAGMA table_info(mr_review_log)")
+                if "review_mode" not in [col[1] for col in cursor.fetchall()]:
+                    cursor.execute("ALTER TABLE mr_review_log ADD COLUMN review_mode TEXT DEFAULT 'full'")
                 conn.commit()
                 
             # 初始化版本追踪数据库
             from biz.utils.version_tracker import VersionTracker
             VersionTracker.init_db()
+
+            # 初始化MR取代记录表
+            from biz.utils.mr_supersession import MergeRequestSupersession
+            MergeRequestSupersession.init_db()
+
+            # 初始化MR增量审查状态表
+            from biz.utils.incremental_review import MergeRequestReviewState
+            MergeRequestReviewState.init_db()
+
+            # 初始化文件级审查缓存表
+            from biz.utils.review_cache import FileReviewCache
+            FileReviewCache.init_db()
+
+            # 初始化大模型限流状态表
+            from biz.llm.rate_limiter import SqliteRateLimitStore
+            SqliteRateLimitStore.init_db()
+
+            # 初始化大模型供应商健康统计表
+            from biz.llm.failover import ProviderHealthStore
+            ProviderHealthStore.init_db()
+
+            # 初始化大模型调用台账表
+            from biz.llm.call_ledger import LlmCallLedger
+            LlmCallLedger.init_db()
+
+            # 初始化Webhook收件箱表
+            from biz.utils.webhook_inbox import WebhookInbox
+            WebhookInbox.init_db()
             
         except sqlite3.DatabaseError as e:
             print(f"Database initialization failed: {e}")
 
     @staticmethod
+    @DB_WRITE_SECONDS.time(operation='mr_review_log')
     def insert_mr_review_log(entity: MergeRequestReviewEntity):
         """插入合并请求审核日志"""
         try:
             with sqlite3.connect(ReviewService.DB_FILE) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                                INSERT INTO mr_review_log (project_name,author, source_branch, target_branch, updated_at, commit_messages, score, url,review_result, additions, deletions)
-                                VALUES (?,?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                INSERT INTO mr_review_log (project_name,author, source_branch, target_branch, updated_at, commit_messages, score, url,review_result, additions, deletions, review_mode)
+                                VALUES (?,?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                             ''',
                                (entity.project_name, entity.author, entity.source_branch,
                                 entity.target_branch,
                                 entity.updated_at, entity.commit_messages, entity.score,
-                                entity.url, entity.review_result, entity.additions, entity.deletions))
+                                entity.url, entity.review_result, entity.additions, entity.deletions,
+                                entity.review_mode))
                 conn.commit()
         except sqlite3.DatabaseError as e:
             print(f"Error inserting review log: {e}")
 
     @staticmethod
+    @DB_WRITE_SECONDS.time(operation='mr_review_log')
     def insert_mr_review_log_with_details(entity: MergeRequestReviewEntity, file_details=None):
         """插入合并请求审核日志，支持结构化diff存储"""
         try:
             with sqlite3.connect(ReviewService.DB_FILE) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                                INSERT INTO mr_review_log (project_name,author, source_branch, target_branch, updated_at, commit_messages, score, url,review_result, additions, deletions, file_details)
-                                VALUES (?,?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                INSERT INTO mr_review_log (project_name,author, source_branch, target_branch, updated_at, commit_messages, score, url,review_result, additions, deletions, file_details, review_mode)
+                                VALUES (?,?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                             ''',
                                (entity.project_name, entity.author, entity.source_branch,
                                 entity.target_branch,
                                 entity.updated_at, entity.commit_messages, entity.score,
-                                entity.url, entity.review_result, entity.additions, entity.deletions, file_details))
+                                entity.url, entity.review_result, entity.additions, entity.deletions, file_details,
+                                entity.review_mode))
                 conn.commit()
         except sqlite3.DatabaseError as e:
             print(f"Error inserting review log: {e}")
@@ -365,6 +403,7 @@ class ReviewService:
             return pd.DataFrame()
 
     @staticmethod
+    @DB_WRITE_SECONDS.time(operation='push_review_log')
     def insert_push_review_log(entity: PushReviewEntity):
         """插入推送审核日志"""
         try:
@@ -382,6 +421,7 @@ class ReviewService:
             print(f"Error inserting review log: {e}")
 
     @staticmethod
+    @DB_WRITE_SECONDS.time(operation='push_review_log')
     def insert_push_review_log_with_details(entity: PushReviewEntity, file_details=None):
         """插入推送审核日志，支持结构化diff存储"""
         try:
@@ -444,6 +484,7 @@ class ReviewService:
             return pd.DataFrame()
 
     @staticmethod
+    @DB_WRITE_SECONDS.time(operation='svn_review_log')
     def insert_svn_review_log(entity: SvnReviewEntity):
         """插入SVN审核日志"""
         try:
@@ -461,6 +502,7 @@ class ReviewService:
             print(f"Error inserting svn review log: {e}")
 
     @staticmethod
+    @DB_WRITE_SECONDS.time(operation='svn_review_log')
     def insert_svn_review_log_with_details(entity: SvnReviewEntity, file_details=None):
         """插入SVN审核日志，支持结构化diff存储"""
         try:
@@ -761,7 +803,13 @@ class ReviewService:
         from biz.utils.queue import handle_queue
         
         # 使用队列异步执行重新审查
-        handle_queue(ReviewService._async_retry_review, review_type, identifier)
+        if not handle_queue(ReviewService._async_retry_review, review_type, identifier):
+            return {
+                "success": False,
+                "message": "任务队列已满，请稍后重试",
+                "review_type": review_type,
+                "identifier": identifier
+            }
         
         return {
             "success": True, 
@@ -5,7 +5,10 @@ from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional, Tuple
 import re
 from urllib.parse import urlparse
+from biz.utils.diff_compactor import compact_changes
 from biz.utils.log import logger
+from biz.utils.metrics import SVN_COMMAND_FAILURES, SVN_COMMAND_SECONDS
+from biz.utils.tracing import span
 
 
 class SVNHandler:
@@ -87,12 +90,15 @@ class SVNHandler:
             # UnicodeDecodeError，导致下面"尝试下一种编码"的回退逻辑永远不会被触发，
             # 一旦实际编码不是 utf-8（例如 GBK/CP936 环境的中文提交信息或源码），
             # 内容会被大量替换为 '�'，进而把乱码送进后续的 AI 审查。
-            result = subprocess.run(
-                command,
-                cwd=cwd,
-                capture_output=True,
-                text=False  # 二进制模式，交给 _safe_decode 做严格的多编码尝试
-            )
+            with SVN_COMMAND_SECONDS.time(command=command[1]), span(f'svn.{command[1]}'):
+                result = subprocess.run(
+                    command,
+                    cwd=cwd,
+                    capture_output=True,
+                    text=False  # 二进制模式，交给 _safe_decode 做严格的多编码尝试
+                )
+            if result.returncode != 0:
+                SVN_COMMAND_FAILURES.inc(command=command[1])
             
             stdout = self._safe_decode(result.stdout)
             stderr = self._safe_decode(result.stderr)
@@ -101,6 +107,7 @@ class SVNHandler:
         
         except Exception as e:
             logger.error(f"执行SVN命令失败: {e}")
+            SVN_COMMAND_FAILURES.inc(command=command[1])
             return "", str(e), -1
     
     def update_working_copy(self) -> bool:
@@ -426,7 +433,8 @@ class SVNHandler:
             logger.info(f'r{revision} diff 为空')
             return []
 
-        changes = self._parse_diff_output(stdout, include_deleted)
+        with span('svn.parse_diff'):
+            changes = self._parse_diff_output(stdout, include_deleted)
         logger.info(f'r{revision} 批量 diff 解析完成: {len(changes)} 个文件')
         return changes
 
@@ -613,14 +621,17 @@ class SVNHandler:
             if self.svn_username and self.svn_password:
                 command.extend(['--username', self.svn_username, '--password', self.svn_password])
             command.extend(['--non-interactive', '--trust-server-cert-failures=unknown-ca,cn-mismatch,expired,not-yet-valid,other'])
-            result = subprocess.run(command, cwd=None, capture_output=True, text=False)
+            with SVN_COMMAND_SECONDS.time(command='cat'), span('svn.cat'):
+                result = subprocess.run(command, cwd=None, capture_output=True, text=False)
             if result.returncode != 0:
+                SVN_COMMAND_FAILURES.inc(command='cat')
                 stderr_text = self._safe_decode(result.stderr)
                 logger.warning(f"svn cat 获取文件字节失败 ({target_url}, r{revision}): {stderr_text}")
                 return None
             return result.stdout
         except Exception as e:
             logger.error(f"svn cat 获取文件字节异常 ({target_url}, r{revision}): {e}")
+            SVN_COMMAND_FAILURES.inc(command='cat')
             return None
 
     def _workcopy_path_to_repo_path(self, file_path: str) -> str:
@@ -970,4 +981,4 @@ def filter_svn_changes(changes: List[Dict]) -> List[Dict]:
             'deletions': change.get('deletions', 0)
         })
     
-    return filtered_changes
+    return compact_changes(filtered_changes)
@@ -6,44 +6,39 @@ from typing import List, Dict
 
 from biz.entity.review_entity import SvnReviewEntity
 from biz.event.event_manager import event_manager
+from biz.llm.call_ledger import llm_call_context
 from biz.svn.svn_handler import SVNHandler, filter_svn_changes
 from biz.utils.code_reviewer import CodeReviewer, BatchCodeReviewer, is_api_error_message
 from biz.utils.agentic_reviewer import AgenticCodeReviewer
 from biz.utils.im import notifier
 from biz.utils.log import logger
-from biz.utils.config_manager import ConfigManager
+from biz.utils.metrics import REVIEW_SECONDS
+from biz.utils.tracing import set_span_attributes, span, trace
+from biz.utils.config_snapshot import get_config_snapshot
 
 # === SVN增量检查集成 ===
 from biz.utils.svn_checkpoint import SVNCheckpointManager
 # === SVN增量检查集成 END ===
 
 def get_config_bool(key: str, default: bool = False) -> bool:
-    """从 ConfigManager 获取布尔值配置"""
+    """从配置快照获取布尔值配置"""
     try:
-        config_manager = ConfigManager()
-        env_config = config_manager.get_env_config()
-        value = env_config.get(key, '0' if not default else '1')
-        return value.lower() in ('1', 'true', 'yes', 'on')
-    except:
+        return get_config_snapshot().get_bool(key, default)
+    except Exception:
         return default
 
 def get_config_str(key: str, default: str = '') -> str:
-    """从 ConfigManager 获取字符串配置"""
+    """从配置快照获取字符串配置"""
     try:
-        config_manager = ConfigManager()
-        env_config = config_manager.get_env_config()
-        return env_config.get(key, default)
-    except:
+        return get_config_snapshot().get_str(key, default)
+    except Exception:
         return default
 
 def get_config_int(key: str, default: int = 0) -> int:
-    """从 ConfigManager 获取整数配置"""
+    """从配置快照获取整数配置"""
     try:
-        config_manager = ConfigManager()
-        env_config = config_manager.get_env_config()
-        value = env_config.get(key, str(default))
-        return int(value)
-    except:
+        return get_config_snapshot().get_int(key, default)
+    except Exception:
         return default
 # === 版本追踪集成 ===
 from biz.utils.version_tracker import VersionTracker
@@ -200,6 +195,7 @@ def handle_multiple_svn_repositories(repositories_config: str = None, check_hour
         logger.error('多仓库SVN变更检测出现未知错误: %s', error_message)
 
 
+@trace('svn.check')
 def handle_svn_changes(svn_remote_url: str, svn_local_path: str, svn_username: str = None, svn_password: str = None, check_hours: int = 24, check_limit: int = 100, repo_name: str = None, trigger_type: str = "scheduled", repo_config: dict = None):
     """
     处理SVN变更事件 - 支持增量检查
@@ -213,6 +209,7 @@ def handle_svn_changes(svn_remote_url: str, svn_local_path: str, svn_username: s
     """
     try:
         display_name = repo_name or os.path.basename(svn_local_path)
+        set_span_attributes(repo=display_name, trigger_type=trigger_type)
         logger.info(f'开始检查SVN变更，仓库: {display_name}，远程URL: {svn_remote_url}')
         
         # 创建SVN处理器
@@ -418,6 +415,8 @@ def _review_excel_changes(svn_handler: SVNHandler, excel_changes: List[Dict], re
     return report, score
 
 
+@REVIEW_SECONDS.time(review_type='svn_commit')
+@trace('svn.commit')
 def process_svn_commit(svn_handler: SVNHandler, commit: Dict, svn_path: str, repo_name: str = None, trigger_type: str = "scheduled", repo_config: dict = None):
     """
     处理单个SVN提交，使用结构化diff JSON输入AI审查
@@ -431,6 +430,7 @@ def process_svn_commit(svn_handler: SVNHandler, commit: Dict, svn_path: str, rep
         revision = commit['revision']
         author = commit['author']
         message = commit['message']
+        set_span_attributes(repo=repo_name or os.path.basename(svn_path.rstrip('/\\')), revision=str(revision))
         logger.info(f'处理SVN提交: r{revision} by {author}')
 
         # === Merge提交检查 ===
@@ -552,7 +552,8 @@ def process_svn_commit(svn_handler: SVNHandler, commit: Dict, svn_path: str, rep
                     reviewer = AgenticCodeReviewer(tool_context=tool_context)
                 else:
                     reviewer = BatchCodeReviewer()
-                review_result = reviewer.review_in_batches(files_json, commits_text)
+                with llm_call_context(project_name, f"svn:r{revision}"):
+                    review_result = reviewer.review_in_batches(files_json, commits_text)
                 # === Agentic审查集成 END ===
                 # 无论审查结果如何（包括错误信息），都记录并处理
                 if review_result and review_result.strip():
@@ -587,9 +588,10 @@ def process_svn_commit(svn_handler: SVNHandler, commit: Dict, svn_path: str, rep
         # Excel 语义审查同样调用 AI，因此必须一并受控。
         if excel_changes and svn_review_enabled and get_config_bool('EXCEL_REVIEW_ENABLED', True):
             excel_commits_text = json.dumps(commit_info, ensure_ascii=False, indent=2)
-            excel_report, excel_score = _review_excel_changes(
-                svn_handler, excel_changes, revision, excel_commits_text,
-            )
+            with llm_call_context(project_name, f"svn:r{revision}"), span('review.excel', files=len(excel_changes)):
+                excel_report, excel_score = _review_excel_changes(
+                    svn_handler, excel_changes, revision, excel_commits_text,
+                )
             if excel_report and excel_report.strip():
                 if review_result and review_result.strip() \
                         and review_result not in ("无需要审查的文件", "SVN代码审查未启用"):
@@ -623,20 +625,21 @@ def process_svn_commit(svn_handler: SVNHandler, commit: Dict, svn_path: str, rep
         # === 版本追踪集成 ===
         version_tracking_enabled = get_config_bool('VERSION_TRACKING_ENABLED', True)
         if version_tracking_enabled:
-            VersionTracker.record_version_review(
-                project_name=project_name,
-                commits=commit_info,
-                changes=changes_for_tracking,
-                author=author,
-                branch='',
-                review_type='svn',
-                review_result=review_result,
-                score=score,
-                commit_message=message,
-                commit_date=commit['date'],
-                additions_count=additions,
-                deletions_count=deletions,
-            )
+            with span('db.version_tracking'):
+                VersionTracker.record_version_review(
+                    project_name=project_name,
+                    commits=commit_info,
+                    changes=changes_for_tracking,
+                    author=author,
+                    branch='',
+                    review_type='svn',
+                    review_result=review_result,
+                    score=score,
+                    commit_message=message,
+                    commit_date=commit['date'],
+                    additions_count=additions,
+                    deletions_count=deletions,
+                )
             if is_api_error_message(review_result):
                 logger.info(f'SVN版本 r{revision} AI审查失败，已记录到版本追踪以防止重复推送（可在UI手动重试）。')
             else:
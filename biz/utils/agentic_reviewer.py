@@ -14,7 +14,14 @@
    回复来模拟工具调用。任何只接受 messages 列表的 completions() 实现都能兼容这种方式。
 
 未提供 tool_context 时，自动降级为与 BatchCodeReviewer 完全一致的单轮/分批审查，不影响现有行为。
+
+上下文预取：每一轮工具调用都是一次完整的模型往返（开启思考时常需 30～90 秒），而首轮调用大多可以预判。
+发送首轮请求前，在 AGENTIC_PREFETCH_TOKEN_BUDGET 预算内预先执行这些工具调用，把结果附在首轮提示词末尾：
+- 本批 diff 中变更符号（新增/删除/修改签名的函数、类等）在工作副本中的检索结果
+- 本批涉及文件在被审查版本的完整内容（从小到大放入，放不下的跳过）
+预取结果与模型主动调用共用审查内的结果缓存，模型仍请求相同内容时直接命中缓存。
 """
+import asyncio
 import json
 import re
 from typing import Any, Callable, Dict, List, Optional
@@ -22,6 +29,9 @@ from typing import Any, Callable, Dict, List, Optional
 from biz.utils.code_reviewer import BatchCodeReviewer, is_api_error_message
 from biz.utils.default_config import get_env_with_default, get_env_int
 from biz.utils.log import logger
+from biz.utils.token_util import count_tokens
+from biz.utils.tool_runner import ERROR_PREFIX, ToolCallRunner
+from biz.utils.tracing import span
 
 # 工具的 JSON Schema 声明（OpenAI function calling 格式），用于原生 function calling 路径。
 # 工具名需要与调用方传入的 tool_context 字典的 key 一一对应。
@@ -83,6 +93,45 @@ _TEXT_PROTOCOL_INSTRUCTIONS = """
 """
 
 
+# 上下文预取：每批最多预取的文件数与检索的符号数
+PREFETCH_MAX_FILES = 10
+PREFETCH_MAX_SYMBOLS = 8
+_FILE_HEADER_PATTERN = re.compile(r'^==== 文件: (.+?)(?: \(.*\))? ====$', re.MULTILINE)
+# diff 变更行中的定义：Python/JS/TS/Go 函数、类/接口/结构体/枚举、Java/C#/C++ 等带修饰符的方法声明
+_SYMBOL_PATTERNS = [
+    re.compile(r'^\s*(?:async\s+)?def\s+(\w+)'),
+    re.compile(r'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*(\w+)'),
+    re.compile(r'^\s*func\s+(?:\([^)]*\)\s*)?(\w+)'),
+    re.compile(r'^\s*(?:(?:export|public|private|protected|internal|abstract|final|static|sealed|partial)\s+)*'
+               r'(?:class|interface|struct|enum|trait)\s+(\w+)'),
+    re.compile(r'^\s*(?:(?:public|private|protected|internal|static|final|virtual|override|abstract|'
+               r'synchronized|async)\s+)+[\w<>\[\],.?]+\s+(\w+)\s*\('),
+]
+_IGNORED_SYMBOLS = {'__init__', 'main', 'setUp', 'tearDown', 'toString', 'equals', 'hashCode', 'run', 'get', 'set'}
+
+
+def extract_changed_symbols(diffs_text: str, limit: int = PREFETCH_MAX_SYMBOLS) -> List[str]:
+    """
+    从 diff 的新增/删除行中提取变更的符号名（函数、类等）。
+    同时出现在新增行与删除行中的（签名被修改）优先，其次是被删除的，最后是新增的。
+    """
+    added: Dict[str, None] = {}
+    removed: Dict[str, None] = {}
+    for line in diffs_text.splitlines():
+        if line[:1] not in ('+', '-') or line.startswith(('+++', '---')):
+            continue
+        for pattern in _SYMBOL_PATTERNS:
+            match = pattern.match(line[1:])
+            if match:
+                name = match.group(1)
+                if len(name) >= 4 and name not in _IGNORED_SYMBOLS and not name.startswith('test'):
+                    (added if line[0] == '+' else removed)[name] = None
+                break
+    changed = [name for name in removed if name in added]
+    ordered = changed + [name for name in removed if name not in added] + [name for name in added if name not in removed]
+    return ordered[:limit]
+
+
 class AgenticCodeReviewer(BatchCodeReviewer):
     """在 BatchCodeReviewer 的分批/合并框架上，为每一批审查增加工具调用能力。"""
 
@@ -93,6 +142,16 @@ class AgenticCodeReviewer(BatchCodeReviewer):
         self.prompts = self._load_prompts("code_review_agentic_prompt", get_env_with_default("REVIEW_STYLE"))
         self.tool_context = tool_context or {}
         self.max_tool_rounds = get_env_int("AGENTIC_REVIEW_MAX_TOOL_ROUNDS", 5)
+        # 同一个审查器实例对应一次审查：工具结果缓存与耗时统计在各分批之间共享
+        self.tool_runner = ToolCallRunner(self._dispatch_tool)
+        self.prefetch_token_budget = max(0, get_env_int("AGENTIC_PREFETCH_TOKEN_BUDGET", 12000))
+
+    def review_in_batches(self, files_json: List[Dict], commits_text: str = "") -> str:
+        """分批审查，结束后记录本次审查模型调用与工具执行的累计耗时"""
+        try:
+            return super().review_in_batches(files_json, commits_text)
+        finally:
+            self.tool_runner.report("code", prefetch=self.prefetch_token_budget > 0)
 
     def review_code(self, diffs_text: str, commits_text: str = "") -> str:
         """审查一批代码；若未提供工具上下文，自动降级为普通单轮审查。"""
@@ -102,6 +161,12 @@ class AgenticCodeReviewer(BatchCodeReviewer):
             return self._review_with_native_tools(diffs_text, commits_text)
         return self._review_with_text_protocol(diffs_text, commits_text)
 
+    async def areview_code(self, diffs_text: str, commits_text: str = "") -> str:
+        """异步审查一批代码；工具调用循环含本地工具执行，放到线程中运行，不阻塞共享事件循环"""
+        if not self.tool_context:
+            return await super().areview_code(diffs_text, commits_text)
+        return await asyncio.to_thread(self.review_code, diffs_text, commits_text)
+
     def _review_with_native_tools(self, diffs_text: str, commits_text: str) -> str:
         """原生 function calling 路径；最终仍失败（如返回API错误消息）时降级为不带工具调用的
         普通审查，保证本次提交至少能拿到一次正常审查结果，而不是让整次审查彻底失败。"""
@@ -113,26 +178,19 @@ class AgenticCodeReviewer(BatchCodeReviewer):
 
     def _run_native_tools_loop(self, diffs_text: str, commits_text: str) -> str:
         """原生 function calling 路径（openai/deepseek/qwen/zhipuai 等 supports_tools=True 的客户端）。"""
-        messages: List[Dict[str, Any]] = [
-            self.prompts["system_message"],
-            {
-                "role": "user",
-                "content": self.prompts["user_message"]["content"].format(
-                    diffs_text=diffs_text, commits_text=commits_text
-                ),
-            },
-        ]
+        messages = self._build_agentic_messages(diffs_text, commits_text)
 
         for round_idx in range(self.max_tool_rounds):
-            response = self.client.completions_with_tools(messages, TOOLS_SCHEMA)
+            with self.tool_runner.model_call():
+                response = self.client.completions_with_tools(messages, TOOLS_SCHEMA)
             tool_calls = response.get("tool_calls") or []
             if not tool_calls:
                 return response.get("content") or ""
 
             messages.append(response["assistant_message"])
             logger.info(f"AI审查请求调用工具 (原生协议, 第{round_idx + 1}轮): {[c['name'] for c in tool_calls]}")
-            for call in tool_calls:
-                result_text = self._dispatch_tool(call)
+            # 同一轮的多个工具调用并发执行，结果按原顺序逐条回填
+            for call, result_text in zip(tool_calls, self.tool_runner.run(tool_calls)):
                 messages.append({
                     "role": "tool",
                     "tool_call_id": call["id"],
@@ -145,7 +203,8 @@ class AgenticCodeReviewer(BatchCodeReviewer):
             "role": "user",
             "content": "已达到本次审查的最大工具调用次数，请直接基于当前已获得的信息给出最终审查报告，不要再调用工具。",
         })
-        response = self.client.completions_with_tools(messages, [])
+        with self.tool_runner.model_call():
+            response = self.client.completions_with_tools(messages, [])
         return response.get("content") or ""
 
     def _review_with_text_protocol(self, diffs_text: str, commits_text: str) -> str:
@@ -167,27 +226,18 @@ class AgenticCodeReviewer(BatchCodeReviewer):
         通过普通的 completions() 调用 + 文本约定来模拟工具调用，兼容任何只接受
         标准 messages 列表（role: system/user/assistant）的客户端实现。
         """
-        system_message = dict(self.prompts["system_message"])
-        system_message["content"] = system_message["content"] + _TEXT_PROTOCOL_INSTRUCTIONS
-        messages: List[Dict[str, Any]] = [
-            system_message,
-            {
-                "role": "user",
-                "content": self.prompts["user_message"]["content"].format(
-                    diffs_text=diffs_text, commits_text=commits_text
-                ),
-            },
-        ]
+        messages = self._build_agentic_messages(diffs_text, commits_text, system_suffix=_TEXT_PROTOCOL_INSTRUCTIONS)
 
         for round_idx in range(self.max_tool_rounds):
-            content = self.client.completions(messages) or ""
+            with self.tool_runner.model_call():
+                content = self.client.completions(messages) or ""
             tool_call = self._parse_text_tool_call(content)
             if tool_call is None:
                 return content
 
             logger.info(f"AI审查请求调用工具 (文本协议, 第{round_idx + 1}轮): {tool_call['name']}")
             messages.append({"role": "assistant", "content": content})
-            result_text = self._dispatch_tool(tool_call)
+            result_text = self.tool_runner.run([tool_call])[0]
             messages.append({
                 "role": "user",
                 "content": f"工具 {tool_call['name']} 返回结果：\n{result_text}\n\n"
@@ -199,7 +249,67 @@ class AgenticCodeReviewer(BatchCodeReviewer):
             "role": "user",
             "content": "已达到本次审查的最大工具调用次数，请直接给出最终审查报告，不要再输出 tool_call。",
         })
-        return self.client.completions(messages) or ""
+        with self.tool_runner.model_call():
+            return self.client.completions(messages) or ""
+
+    def _build_agentic_messages(self, diffs_text: str, commits_text: str,
+                                system_suffix: str = "") -> List[Dict[str, Any]]:
+        """构造首轮消息；预取到的上下文追加在用户消息末尾，不影响前面部分的提示词前缀缓存"""
+        messages = self._build_messages(diffs_text, commits_text, system_suffix=system_suffix)
+        try:
+            prefetched = self._prefetch_context(diffs_text)
+        except Exception as e:
+            # 预取只是优化，失败时按原方式由模型自行调用工具
+            logger.warning(f"Agentic 审查上下文预取失败，跳过预取: {e}")
+            prefetched = ""
+        if prefetched:
+            messages[-1] = dict(messages[-1], content=messages[-1]["content"] + prefetched)
+        return messages
+
+    def _prefetch_context(self, diffs_text: str) -> str:
+        """在 token 预算内预先执行可预判的工具调用，返回附加到提示词的上下文文本（无内容时返回空串）"""
+        if self.prefetch_token_budget <= 0:
+            return ""
+        searches = []
+        if "search_code" in self.tool_context:
+            searches = [{"name": "search_code", "arguments": {"query": symbol}}
+                        for symbol in extract_changed_symbols(diffs_text)]
+        reads = []
+        if "read_file" in self.tool_context:
+            paths = list(dict.fromkeys(_FILE_HEADER_PATTERN.findall(diffs_text)))[:PREFETCH_MAX_FILES]
+            reads = [{"name": "read_file", "arguments": {"file_path": path}} for path in paths]
+        if not searches and not reads:
+            return ""
+
+        with span("agentic.prefetch", searches=len(searches), reads=len(reads)):
+            results = self.tool_runner.run(searches + reads, prefetch=True)
+        sections = []
+        for call, result in zip(searches + reads, results):
+            if result.startswith(ERROR_PREFIX):
+                continue
+            if call["name"] == "search_code":
+                header = f"#### search_code: {call['arguments']['query']}"
+            else:
+                header = f"#### read_file: {call['arguments']['file_path']}"
+            sections.append((call["name"], header, result, count_tokens(result)))
+
+        # 检索结果篇幅小、信息密度高，先放入；文件按内容从小到大放入，放不下的跳过
+        sections.sort(key=lambda item: (item[0] != "search_code", item[3] if item[0] == "read_file" else 0))
+        remaining = self.prefetch_token_budget
+        parts = []
+        used = {"search_code": 0, "read_file": 0}
+        for name, header, result, tokens in sections:
+            if tokens > remaining:
+                continue
+            remaining -= tokens
+            used[name] += 1
+            parts.append(f"{header}\n{result}")
+        if not parts:
+            return ""
+        logger.info(f"🔎 Agentic 审查预取上下文: {used['read_file']} 个文件、{used['search_code']} 个符号检索，"
+                    f"{self.prefetch_token_budget - remaining} tokens")
+        return ("\n\n以下上下文已在审查前通过工具自动获取（文件为被审查版本的完整内容，检索为变更符号在代码库中的引用），"
+                "可直接使用，无需再调用工具获取相同内容：\n\n" + "\n\n".join(parts))
 
     @staticmethod
     def _parse_text_tool_call(content: str) -> Optional[Dict[str, Any]]:
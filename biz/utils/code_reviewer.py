@@ -1,16 +1,22 @@
 import abc
-import json
+import contextvars
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Tuple
 
 import yaml
-from jinja2 import Template
 
+from biz.llm.async_runtime import gather_limited, run_sync
 from biz.llm.factory import Factory
 from biz.utils.log import logger
 from biz.utils.token_util import count_tokens, truncate_text_by_tokens
-from biz.utils.default_config import get_env_with_default, get_env_int, get_review_input_budget
+from biz.utils.default_config import get_env_with_default, get_env_int, get_env_bool, get_review_input_budget
+from biz.utils.diff_compactor import serialize_files
+from biz.utils.prompt_registry import get_prompts
+from biz.utils.review_cache import FILE_SCORE_RE, FileReviewCache, build_cache_key, build_review_version, \
+    extract_file_sections, parse_file_score
+from biz.utils.tracing import set_span_attributes, span
 
 
 def is_api_error_message(text: str) -> bool:
@@ -122,51 +128,33 @@ class BaseReviewer(abc.ABC):
         self.prompts = self._load_prompts(prompt_key, get_env_with_default("REVIEW_STYLE"))
 
     def _load_prompts(self, prompt_key: str, style="professional") -> Dict[str, Any]:
-        """加载提示词配置"""
-        prompt_templates_file = "conf/prompt_templates.yml"
+        """加载提示词配置（进程内缓存，模板文件变化时自动重新加载）"""
         try:
-            # 在打开 YAML 文件时显式指定编码为 UTF-8，避免使用系统默认的 GBK 编码。
-            with open(prompt_templates_file, "r", encoding="utf-8") as file:
-                full_config = yaml.safe_load(file)
-                if not isinstance(full_config, dict):
-                    raise ValueError(f"配置文件格式错误，期望YAML字典，实际: {type(full_config).__name__}")
-
-                prompts = full_config.get(prompt_key)
-                if prompts is None:
-                    # 尝试从模板文件兜底
-                    template_file = "conf_templates/prompt_templates.yml"
-                    if os.path.exists(template_file):
-                        with open(template_file, "r", encoding="utf-8") as tf:
-                            tmpl_config = yaml.safe_load(tf)
-                            if isinstance(tmpl_config, dict) and prompt_key in tmpl_config:
-                                prompts = tmpl_config[prompt_key]
-                                logger.info(f"'{prompt_key}' 从模板文件 conf_templates/prompt_templates.yml 自动加载（当前配置文件缺少此 key）")
-                    if prompts is None:
-                        raise KeyError(f"配置文件中未找到 '{prompt_key}'，可用的key: {list(full_config.keys())}")
-
-                if not isinstance(prompts, dict):
-                    raise ValueError(f"'{prompt_key}' 的值不是字典，实际: {type(prompts).__name__}")
-
-                if 'system_prompt' not in prompts:
-                    raise KeyError(f"'{prompt_key}' 缺少 system_prompt 字段")
-                if 'user_prompt' not in prompts:
-                    raise KeyError(f"'{prompt_key}' 缺少 user_prompt 字段")
-
-                # 使用Jinja2渲染模板
-                def render_template(template_str: str) -> str:
-                    return Template(template_str).render(style=style)
-
-                system_prompt = render_template(prompts["system_prompt"])
-                user_prompt = render_template(prompts["user_prompt"])
-
-                return {
-                    "system_message": {"role": "system", "content": system_prompt},
-                    "user_message": {"role": "user", "content": user_prompt},
-                }
+            return get_prompts(prompt_key, style)
         except (FileNotFoundError, KeyError, ValueError, yaml.YAMLError) as e:
             logger.error(f"加载提示词配置失败 (key={prompt_key}): {e}")
             raise Exception(f"提示词配置加载失败: {e}")
 
+    def _build_messages(self, diffs_text: str, commits_text: str,
+                        system_suffix: str = "") -> List[Dict[str, Any]]:
+        """
+        构造审查消息：system prompt（同一 style 下不变）→ 用户提示词中的固定说明 → 提交信息 → 代码变更。
+        变化最大的代码变更放在最后，使前面部分在多批、多次提交之间保持相同前缀，
+        可以命中 DeepSeek / Qwen / OpenAI 的提示词前缀缓存（缓存命中的输入 token 按折扣计费）。
+        """
+        system_message = self.prompts["system_message"]
+        if system_suffix:
+            system_message = dict(system_message, content=system_message["content"] + system_suffix)
+        return [
+            system_message,
+            {
+                "role": "user",
+                "content": self.prompts["user_message"]["content"].format(
+                    diffs_text=diffs_text, commits_text=commits_text
+                ),
+            },
+        ]
+
     def call_llm(self, messages: List[Dict[str, Any]]) -> str:
         """调用 LLM 进行代码审核"""
         logger.info(f"向 AI 发送代码 Review 请求, messages: {messages}")
@@ -174,6 +162,13 @@ class BaseReviewer(abc.ABC):
         logger.info(f"收到 AI 返回结果: {review_result}")
         return review_result
 
+    async def acall_llm(self, messages: List[Dict[str, Any]]) -> str:
+        """异步调用 LLM（在共享事件循环上执行）"""
+        logger.info(f"向 AI 发送代码 Review 请求(异步), messages: {messages}")
+        review_result = await self.client.acompletions(messages=messages)
+        logger.info(f"收到 AI 返回结果: {review_result}")
+        return review_result
+
     @abc.abstractmethod
     def review_code(self, *args, **kwargs) -> str:
         """抽象方法，子类必须实现"""
@@ -201,14 +196,16 @@ class CodeReviewer(BaseReviewer):
             return "代码为空"
 
         # 计算tokens数量，如果超过预算，截断changes_text
-        tokens_count = count_tokens(changes_text)
-        if tokens_count > review_max_tokens :
-            changes_text = truncate_text_by_tokens(changes_text, review_max_tokens)
+        with span('review.count_tokens'):
+            tokens_count = count_tokens(changes_text)
+            if tokens_count > review_max_tokens :
+                changes_text = truncate_text_by_tokens(changes_text, review_max_tokens)
         logger.debug(f"Reviewing code with {tokens_count} tokens, truncated to {len(changes_text)} characters if necessary.")
         logger.debug(f"commits_text with {commits_text} ")
 
         # 调用review_code方法
-        review_result = self.review_code(changes_text, commits_text).strip()
+        with span('llm.review', tokens=tokens_count):
+            review_result = self.review_code(changes_text, commits_text).strip()
         # 检查是否是API错误消息
         if is_api_error_message(review_result):
             logger.error(f"检测到API错误，返回错误消息: {review_result[:100]}...")
@@ -225,22 +222,15 @@ class CodeReviewer(BaseReviewer):
 
     def review_code(self, diffs_text: str, commits_text: str = "") -> str:
         """Review 代码并返回结果"""
-        messages = [
-            self.prompts["system_message"],
-            {
-                "role": "user",
-                "content": self.prompts["user_message"]["content"].format(
-                    diffs_text=diffs_text, commits_text=commits_text
-                ),
-            },
-        ]
-        return self.call_llm(messages)
+        return self.call_llm(self._build_messages(diffs_text, commits_text))
 
     @staticmethod
     def parse_review_score(review_text: str) -> int:
         """解析 AI 返回的 Review 结果，返回评分（支持多种评分格式）"""
         if not review_text:
             return 0
+        # 分文件段落中的"文件评分: XX分"只是单个文件的评分，不参与整体评分解析
+        review_text = FILE_SCORE_RE.sub('', review_text)
         
         # 匹配多种评分格式（按优先级排列）。
         # 数值两侧兼容 AI 常见的 markdown 加粗/反引号包裹（如 "总分: **85分**"、
@@ -280,17 +270,22 @@ class CodeReviewer(BaseReviewer):
 class BatchCodeReviewer(BaseReviewer):
     """支持分批审查 + LLM 合并报告的代码审查器"""
 
+    # 超大文件按 hunk 拆分时，每段附带的前一段末尾上下文行数
+    CHUNK_CONTEXT_LINES = 3
+
     def __init__(self):
         super().__init__("code_review_batch_prompt")
         self.merge_prompts = self._load_prompts("code_review_merge_prompt", get_env_with_default("REVIEW_STYLE"))
 
+    @span('review.batches')
     def review_in_batches(self, files_json: List[Dict], commits_text: str = "") -> str:
         """
         审查一批文件变更。
 
         现代模型上下文窗口普遍 1M，全部 diff 未超预算时单批全量审查（模型一次看到完整
-        上下文）。累计超预算时自动拆分为多批逐批审查，再用 LLM 合并为统一报告——
-        确保所有文件都被审查到。单个超大文件 diff 会被截断，截断文件在结果末尾警告。
+        上下文）。累计超预算时自动拆分为多批并发审查，再用 LLM 合并为统一报告——
+        确保所有文件都被审查到。单个超大文件 diff 按 @@ hunk 边界拆分为多段并发审查，
+        各段意见先按文件合并，再参与整体合并。
 
         Args:
             files_json: 文件变更列表
@@ -303,50 +298,87 @@ class BatchCodeReviewer(BaseReviewer):
 
         if not files_json:
             return "无需要审查的文件"
-
-        batches, truncated_files = self._pack_batches(files_json, review_max_tokens)
+        set_span_attributes(files=len(files_json))
+
+        # 文件级缓存：diff 内容与历史审查一致的文件直接复用审查意见，只将未命中的文件送审
+        with span('review.cache_lookup'):
+            cache_keys = self._file_cache_keys(files_json)
+            cached = FileReviewCache.get_many(list(cache_keys.values()),
+                                              get_env_int('FILE_REVIEW_CACHE_TTL_DAYS', 30)) if cache_keys else {}
+        cached_files = [f for f in files_json if cache_keys.get(f.get('file_path')) in cached]
+        if cached_files:
+            logger.info(f'文件级缓存命中 {len(cached_files)}/{len(files_json)} 个文件')
+            files_json = [f for f in files_json if cache_keys.get(f.get('file_path')) not in cached]
+            if not files_json:
+                return self._build_cached_report(cached_files, cache_keys, cached)
+
+        # 打包阶段逐文件 / 逐 hunk 计数 token
+        with span('review.pack'):
+            batches, truncated_files = self._pack_batches(files_json, review_max_tokens)
+        set_span_attributes(batches=len(batches))
         logger.info(f'待审查文件数: {len(files_json)}, 预算 {review_max_tokens} tokens, '
                     f'打包为 {len(batches)} 批')
 
-        # 单批：直接审查
-        if len(batches) == 1:
-            for file_entry in batches[0]:
-                file_entry.pop('_truncated', None)
-            diff_text = json.dumps(batches[0], ensure_ascii=False, indent=2)
-            result = self.review_code(diff_text, commits_text).strip()
+        # 单批且无缓存命中：直接审查
+        if len(batches) == 1 and not cached_files:
+            with span('llm.batch', batch_index=0):
+                result = self.review_code(self._serialize_batch(batches[0]), commits_text).strip()
             if is_api_error_message(result):
                 return result
             result = self._strip_markdown(result)
+            self._store_file_cache(batches[0], result, cache_keys, truncated_files)
             if truncated_files:
                 return result + self._build_truncation_warning(truncated_files, review_max_tokens)
             return result
 
-        # 多批：逐批审查后合并
-        logger.info(f'代码变更累计超预算，自动分 {len(batches)} 批逐批审查')
+        # 多批（或部分命中缓存）：并发审查后合并
+        logger.info(f'代码变更自动分 {len(batches)} 批并发审查')
+        results = self._review_batches(batches, commits_text)
         batch_results = []
-        batch_scores = []
+        batch_scores = []  # 与 batch_results 一一对应：(评分, 文件数)，审查失败为 None
         failed_batches = 0
-
-        for i, batch in enumerate(batches):
-            logger.info(f'分批审查: 第 {i + 1}/{len(batches)} 批, {len(batch)} 个文件')
-            for file_entry in batch:
-                file_entry.pop('_truncated', None)
-            diff_text = json.dumps(batch, ensure_ascii=False, indent=2)
-            result = self.review_code(diff_text, commits_text).strip()
+        chunk_results = {}  # 超大文件分段审查结果 {file_path: [(batch_index, chunk_no, result)]}
+
+        for i, (batch, result) in enumerate(zip(batches, results)):
+            if batch[0].get('_chunk'):
+                chunk_results.setdefault(batch[0]['file_path'], []).append((i, batch[0]['_chunk'][0], result))
+                if is_api_error_message(result):
+                    logger.warning(f'分批 {i + 1} 审查失败: {result[:100]}')
+                    failed_batches += 1
+                continue
 
             if is_api_error_message(result):
                 logger.warning(f'分批 {i + 1} 审查失败: {result[:100]}')
                 failed_batches += 1
                 batch_results.append(f"## 第 {i + 1} 批 (审查失败)\n{result}")
+                batch_scores.append(None)
                 continue
 
             score = CodeReviewer.parse_review_score(result)
             batch_scores.append((score, len(batch)))
             batch_results.append(
                 f"## 第 {i + 1} 批 (评分: {score}分, {len(batch)} 个文件)\n{self._strip_markdown(result)}")
+            self._store_file_cache(batch, result, cache_keys, truncated_files, score)
+
+        # 超大文件：各段意见按文件合并为一份，按 1 个文件计权
+        for file_path, chunks in chunk_results.items():
+            text, score = self._merge_file_chunks(file_path, chunks)
+            batch_results.append(text)
+            batch_scores.append((score, 1) if score is not None else None)
+            if score is None:
+                continue
+            if cache_keys.get(file_path) and file_path not in truncated_files \
+                    and not any(is_api_error_message(r) for _, _, r in chunks):
+                FileReviewCache.put_many([(cache_keys[file_path], file_path, text.split('\n', 1)[1], score)])
+
+        # 拼入缓存命中文件的历史审查意见，与各批结果一起合并
+        if cached_files:
+            cached_text, cached_score = self._build_cached_section(cached_files, cache_keys, cached)
+            batch_results.append(cached_text)
+            batch_scores.append((cached_score, len(cached_files)))
 
         # 所有批都失败时直接降级拼接，避免浪费 LLM 合并调用
-        if failed_batches == len(batches):
+        if failed_batches == len(batches) and not cached_files:
             logger.warning('所有批审查均失败，降级为拼接模式')
             summary_parts = '\n\n'.join(batch_results)
             return f"# 合并审查报告\n\n{summary_parts}\n\n**注意**: 各批审查均失败，以上为原始结果拼接。"
@@ -356,6 +388,133 @@ class BatchCodeReviewer(BaseReviewer):
             return merged + self._build_truncation_warning(truncated_files, review_max_tokens)
         return merged
 
+    def _review_batches(self, batches: List[List[Dict]], commits_text: str) -> List[str]:
+        """
+        并发审查各批，结果按批次顺序返回。
+        LLM_ASYNC_ENABLED 开启时在共享事件循环上并发（在途请求数由 LLM_ASYNC_MAX_IN_FLIGHT 控制），
+        否则使用线程池（REVIEW_BATCH_CONCURRENCY）。
+        """
+        if get_env_bool('LLM_ASYNC_ENABLED') and len(batches) > 1:
+            async def _areview(index: int) -> str:
+                batch = batches[index]
+                logger.info(f'分批审查(异步): 第 {index + 1}/{len(batches)} 批, {len(batch)} 个文件')
+                try:
+                    with span('llm.batch', batch_index=index):
+                        return (await self.areview_code(self._serialize_batch(batch), commits_text)).strip()
+                except Exception as e:
+                    logger.error(f'分批审查(异步): 第 {index + 1} 批失败: {e}')
+                    return f"❌ AI审查失败: {type(e).__name__}: {str(e)[:200]}"
+
+            limit = get_env_int('LLM_ASYNC_MAX_IN_FLIGHT', 32)
+            return run_sync(gather_limited([_areview(i) for i in range(len(batches))], limit))
+
+        def _review(index: int) -> str:
+            batch = batches[index]
+            logger.info(f'分批审查: 第 {index + 1}/{len(batches)} 批, {len(batch)} 个文件')
+            with span('llm.batch', batch_index=index):
+                return self.review_code(self._serialize_batch(batch), commits_text).strip()
+
+        return self._run_parallel(_review, list(range(len(batches))), 'batch-review')
+
+    @staticmethod
+    def _run_parallel(func, items: List, name: str) -> List:
+        """并发执行（并发数由 REVIEW_BATCH_CONCURRENCY 控制，1 为串行），结果按输入顺序返回"""
+        concurrency = max(1, min(get_env_int('REVIEW_BATCH_CONCURRENCY', 4), len(items)))
+        if concurrency == 1:
+            return [func(item) for item in items]
+        # 每个任务复制一份调用方上下文，批次内的 LLM 调用仍记入所属审查的台账（见 llm_call_context）
+        contexts = [contextvars.copy_context() for _ in items]
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=name) as executor:
+            return list(executor.map(lambda ctx, item: ctx.run(func, item), contexts, items))
+
+    @staticmethod
+    def _serialize_batch(batch: List[Dict]) -> str:
+        """序列化一批文件变更（紧凑格式，diff 原样输出；去掉 _ 开头的内部字段）"""
+        return serialize_files(batch)
+
+    def _merge_file_chunks(self, file_path: str, chunks: List[Tuple[int, int, str]]) -> Tuple[str, Any]:
+        """
+        合并同一超大文件各段的审查意见，返回 (文本, 评分)；所有段均失败时评分为 None。
+        文本首行为批次标题，其余部分以 `### 📄 文件路径` 开头，可直接写入文件级缓存。
+        """
+        chunks = sorted(chunks, key=lambda c: c[1])
+        total = len(chunks)
+        parts = []
+        scores = []
+        for _, chunk_no, result in chunks:
+            if is_api_error_message(result):
+                parts.append(f"#### 第 {chunk_no}/{total} 段 (审查失败)\n{result}")
+                continue
+            score = CodeReviewer.parse_review_score(result)
+            scores.append(score)
+            section = extract_file_sections(result, [file_path]).get(file_path)
+            body = section.split('\n', 1)[1].strip() if section and '\n' in section else self._strip_markdown(result)
+            parts.append(f"#### 第 {chunk_no}/{total} 段 (评分: {score}分)\n{body}")
+
+        batch_no = chunks[0][0] + 1
+        details = '\n\n'.join(parts)
+        note = f"该文件 diff 超过单批输入预算，已按 hunk 拆分为 {total} 段并发审查"
+        if not scores:
+            return f"## 第 {batch_no} 批 (审查失败, 文件 {file_path})\n### 📄 {file_path}\n{note}\n\n{details}", None
+        score = round(sum(scores) / len(scores))
+        return (f"## 第 {batch_no} 批 (评分: {score}分, 1 个文件, 分 {total} 段)\n"
+                f"### 📄 {file_path}\n{note}\n\n{details}"), score
+
+    def _file_cache_keys(self, files_json: List[Dict]) -> Dict[str, str]:
+        """计算每个文件的缓存键 {file_path: cache_key}；未启用缓存时返回空字典"""
+        if not get_env_bool('FILE_REVIEW_CACHE_ENABLED'):
+            return {}
+        review_version = build_review_version(
+            self.prompts["system_message"]["content"],
+            self.prompts["user_message"]["content"],
+            get_env_with_default("LLM_PROVIDER", "openai"),
+            getattr(self.client, "default_model", "") or "",
+        )
+        return {
+            f.get('file_path'): build_cache_key(f.get('file_path', ''), f.get('diff', ''), review_version)
+            for f in files_json if f.get('file_path') and f.get('diff')
+        }
+
+    def _store_file_cache(self, batch: List[Dict], result: str, cache_keys: Dict[str, str],
+                          truncated_files: List[str], score: int = None):
+        """
+        从本批审查结果中提取每个文件的审查意见及"文件评分"写入缓存。
+        被截断的文件审查不完整，不缓存；多文件批次中没有给出文件评分的文件也不缓存
+        （本批评分包含其他文件的问题，不能作为该文件的评分复用）。
+        """
+        if not cache_keys:
+            return
+        paths = [f.get('file_path') for f in batch
+                 if f.get('file_path') in cache_keys and f.get('file_path') not in truncated_files]
+        sections = extract_file_sections(result, paths)
+        entries = []
+        for path, section in sections.items():
+            file_score = parse_file_score(section)
+            if file_score is None and len(batch) == 1:
+                file_score = score if score is not None else CodeReviewer.parse_review_score(result)
+            if file_score is None:
+                logger.debug(f'文件 {path} 的审查意见未给出文件评分，不写入文件级缓存')
+                continue
+            entries.append((cache_keys[path], path, section, file_score))
+        FileReviewCache.put_many(entries)
+
+    @staticmethod
+    def _build_cached_section(cached_files: List[Dict], cache_keys: Dict[str, str],
+                              cached: Dict[str, Tuple[str, int]]) -> Tuple[str, int]:
+        """拼接缓存命中文件的历史审查意见，返回 (文本, 按文件加权的评分)"""
+        entries = [cached[cache_keys[f['file_path']]] for f in cached_files]
+        score = round(sum(s or 0 for _, s in entries) / len(entries))
+        findings = '\n\n'.join(text for text, _ in entries)
+        text = (f"## 缓存命中 (评分: {score}分, {len(entries)} 个文件)\n"
+                f"以下文件的 diff 与此前审查过的内容一致，直接复用历史审查意见：\n\n{findings}")
+        return text, score
+
+    def _build_cached_report(self, cached_files: List[Dict], cache_keys: Dict[str, str],
+                             cached: Dict[str, Tuple[str, int]]) -> str:
+        """所有文件均命中缓存时，无需调用 LLM，直接生成报告"""
+        text, score = self._build_cached_section(cached_files, cache_keys, cached)
+        return f"{text}\n\n总分: {score}分"
+
     @staticmethod
     def _build_truncation_warning(truncated_files: List[str], budget: int) -> str:
         """构造截断警告文本（用户可见，附在审查报告末尾）"""
@@ -377,8 +536,11 @@ class BatchCodeReviewer(BaseReviewer):
         现代模型上下文窗口普遍 1M，全部 diff 未超预算时单批全量审查（模型一次看到完整
         上下文，避免跨文件问题被割裂）。当累计超过输入预算时自动拆分为多批，每批 diff
         ≤ 预算，逐批审查后合并报告——确保每个文件都被审查到：
-        - 单个文件 diff 超过预算：截断该文件（分配整个预算）；
-        - 多文件累计超过预算：按 token 贪心拆批，后续文件进入下一批。
+        - 单个文件 diff 超过预算：按 @@ hunk 边界拆分为多段，每段单独一批（保留文件头，
+          并附上前一段末尾几行作为上下文），审查后按文件合并各段意见；
+        - 多文件累计超过预算：先按目录/模块（含源文件与对应测试文件）聚合为局部性分组，
+          再按 First-Fit-Decreasing 装箱，尽量减少批次数并让相关文件落在同一批；
+          分组本身超过预算时拆成单文件装箱，优先放入已有同组文件的批次。
 
         Args:
             files_json: 文件变更列表
@@ -386,16 +548,16 @@ class BatchCodeReviewer(BaseReviewer):
             max_files: 保留参数以兼容历史调用，不再参与分批
 
         Returns:
-            (batches, truncated_files): batches 为 1~N 批；truncated_files 为被截断的
-            文件路径列表（单文件超限被截断），空表示无文件被截断。
+            (batches, truncated_files): batches 为 1~N 批，超大文件的分段带有 `_chunk`
+            (段号, 总段数)；truncated_files 为有内容被截断的文件路径列表（仅单行即超过
+            预算时截断该行），空表示无文件被截断。
         """
         if not files_json:
             return [], []
 
         truncated_files = []
-        batches = []
-        current_batch = []
-        current_tokens = 0
+        chunk_batches = []  # [(batch, tokens)]
+        sized_files = []  # (file, tokens)
 
         for file in files_json:
             diff = file.get('diff', '')
@@ -403,51 +565,252 @@ class BatchCodeReviewer(BaseReviewer):
             file_path = file.get('file_path', 'unknown')
 
             if file_tokens > max_tokens:
-                # 单文件超限：单独一批并截断（分配整个预算）
-                if current_batch:
-                    batches.append(current_batch)
-                    current_batch = []
-                    current_tokens = 0
-                # 预算留出 100 token 余量；max_tokens 很小（≤100）时至少截到 1 token，
-                # 避免负数切片（tokens[:-100]）导致截断静默失效
-                truncate_limit = max(1, max_tokens - 100)
-                truncated_diff = truncate_text_by_tokens(diff, truncate_limit)
-                file_copy = dict(file)
-                file_copy['diff'] = truncated_diff
-                file_copy['_truncated'] = True
-                batches.append([file_copy])
-                truncated_files.append(file_path)
-                logger.warning(f'文件 {file_path} 超限: {file_tokens} tokens, '
-                               f'截断至 {truncate_limit} tokens')
+                # 单文件超限：按 hunk 拆分为多段，每段单独一批
+                chunks, overflow = self._split_diff_by_hunks(diff, max_tokens)
+                if overflow:
+                    truncated_files.append(file_path)
+                for index, (chunk, chunk_tokens) in enumerate(chunks):
+                    file_copy = dict(file)
+                    file_copy['diff'] = chunk
+                    if len(chunks) > 1:
+                        file_copy['_chunk'] = (index + 1, len(chunks))
+                        file_copy['chunk'] = f'{index + 1}/{len(chunks)}'
+                        if index > 0:
+                            file_copy['preceding_context'] = self._tail_lines(chunks[index - 1][0])
+                    chunk_batches.append(([file_copy], chunk_tokens))
+                logger.info(f'文件 {file_path} 超限: {file_tokens} tokens, 按 hunk 拆分为 {len(chunks)} 段')
                 continue
 
-            if current_batch and current_tokens + file_tokens > max_tokens:
-                # 累计超限：当前文件进入下一批
-                batches.append(current_batch)
-                current_batch = []
-                current_tokens = 0
+            sized_files.append((file, file_tokens))
+
+        # 按局部性分组后 First-Fit-Decreasing 装箱
+        bins = []  # [{'files': [(file, tokens)], 'tokens': int, 'groups': set}]
+
+        def _place(items, group_id, prefer_group):
+            size = sum(t for _, t in items)
+            candidates = [b for b in bins if b['tokens'] + size <= max_tokens]
+            if prefer_group:
+                same_group = [b for b in candidates if group_id in b['groups']]
+                candidates = same_group or candidates
+            if candidates:
+                target = candidates[0]
+            else:
+                target = {'files': [], 'tokens': 0, 'groups': set()}
+                bins.append(target)
+            target['files'].extend(items)
+            target['tokens'] += size
+            target['groups'].add(group_id)
+
+        groups = self._group_by_locality(sized_files)
+        groups.sort(key=lambda g: sum(t for _, t in g), reverse=True)
+        for group_id, group in enumerate(groups):
+            if sum(t for _, t in group) <= max_tokens:
+                _place(group, group_id, prefer_group=False)
+            else:
+                for item in sorted(group, key=lambda x: x[1], reverse=True):
+                    _place([item], group_id, prefer_group=True)
+
+        # 批内按路径排序，相关文件相邻
+        batches = [[f for f, _ in sorted(b['files'], key=lambda x: x[0].get('file_path', ''))] for b in bins]
+        batch_tokens = [b['tokens'] for b in bins] + [t for _, t in chunk_batches]
+        batches.extend(batch for batch, _ in chunk_batches)
+
+        if len(batches) > 1:
+            stats = self._packing_stats(batches, batch_tokens, max_tokens)
+            logger.info(f"分批打包: {stats['batch_count']} 批, 平均填充率 {stats['fill_ratio']:.0%}, "
+                        f"目录平均跨批数 {stats['dir_spread']:.2f}")
 
-            current_batch.append(file)
-            current_tokens += file_tokens
+        return batches, truncated_files
 
-        if current_batch:
-            batches.append(current_batch)
+    @staticmethod
+    def _split_diff_by_hunks(diff: str, max_tokens: int) -> Tuple[List[Tuple[str, int]], bool]:
+        """
+        按 @@ hunk 边界将超限 diff 拆分为若干段，每段 ≤ 预算并重复文件头（diff --git/---/+++ 等行）。
+        单个 hunk 超过预算时按行拆分，续段重复该 hunk 的 @@ 头；单行仍超过预算时截断该行。
 
-        return batches, truncated_files
+        Returns:
+            (chunks, overflow): chunks 为 [(分段 diff, tokens)]；overflow 表示是否有内容被截断
+        """
+        lines = diff.splitlines()
+        first_hunk = next((i for i, line in enumerate(lines) if line.startswith('@@')), 0)
+        header = '\n'.join(lines[:first_hunk])
+        header_tokens = count_tokens(header) + 1 if header else 0
+        # 预算留出 100 token 余量（分段序号、前文上下文等附加字段）；
+        # max_tokens 很小时至少保留 1 token，避免预算为负
+        budget = max(1, max_tokens - 100 - header_tokens)
+
+        hunks = []
+        for line in lines[first_hunk:]:
+            if line.startswith('@@') or not hunks:
+                hunks.append([line])
+            else:
+                hunks[-1].append(line)
+
+        pieces = []  # (text, tokens)
+        overflow = False
+        for hunk in hunks:
+            text = '\n'.join(hunk)
+            tokens = count_tokens(text) + 1
+            if tokens <= budget:
+                pieces.append((text, tokens))
+                continue
+            # 单个 hunk 超限：按行拆分
+            hunk_header = hunk[0] if hunk[0].startswith('@@') else ''
+            current, current_tokens = [], 0
+            for line in hunk:
+                line_tokens = count_tokens(line) + 1
+                if line_tokens > budget // 2:
+                    line = truncate_text_by_tokens(line, max(1, budget // 2))
+                    line_tokens = budget // 2
+                    overflow = True
+                if current and current_tokens + line_tokens > budget:
+                    pieces.append(('\n'.join(current), current_tokens))
+                    current, current_tokens = ([hunk_header], count_tokens(hunk_header) + 1) if hunk_header else ([], 0)
+                current.append(line)
+                current_tokens += line_tokens
+            if current:
+                pieces.append(('\n'.join(current), current_tokens))
+
+        chunks = []
+        current, current_tokens = [], 0
+        for text, tokens in pieces:
+            if current and current_tokens + tokens > budget:
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+
+        result = []
+        for parts in chunks:
+            chunk = '\n'.join(([header] if header else []) + parts)
+            result.append((chunk, count_tokens(chunk)))
+        return result, overflow
+
+    @classmethod
+    def _tail_lines(cls, text: str) -> str:
+        """取分段末尾几行作为下一段的前文上下文"""
+        return '\n'.join(text.splitlines()[-cls.CHUNK_CONTEXT_LINES:])
+
+    @staticmethod
+    def _locality_stem(file_path: str) -> str:
+        """获取文件的模块名（去除 test_ 前缀及 _test/_spec/Test 等测试后缀），用于源文件与测试文件配对"""
+        stem = os.path.basename(file_path.replace('\\', '/')).split('.')[0]
+        if stem.lower().startswith('test_'):
+            stem = stem[5:]
+        for suffix in ('_test', '_spec', 'Tests', 'Test', 'Spec'):
+            if stem.endswith(suffix) and len(stem) > len(suffix):
+                stem = stem[:-len(suffix)]
+                break
+        return stem.lower()
+
+    @staticmethod
+    def _is_test_file(file_path: str) -> bool:
+        normalized = '/' + file_path.replace('\\', '/')
+        base = os.path.basename(normalized)
+        stem = base.split('.')[0]
+        return (stem.lower().startswith('test_') or stem.endswith(('_test', '_spec', 'Test', 'Tests', 'Spec'))
+                or '.test.' in base or '.spec.' in base or '/test/' in normalized or '/tests/' in normalized)
+
+    @classmethod
+    def _group_by_locality(cls, sized_files: List[Tuple[Dict, int]]) -> List[List[Tuple[Dict, int]]]:
+        """按目录聚合文件，并把测试文件与同名模块的源文件并入同一组（并查集）"""
+        parent = list(range(len(sized_files)))
+
+        def _find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def _union(a, b):
+            parent[_find(a)] = _find(b)
+
+        first_by_dir = {}
+        sources_by_stem = {}
+        tests = []
+        for index, (file, _) in enumerate(sized_files):
+            path = file.get('file_path', '').replace('\\', '/')
+            directory = os.path.dirname(path)
+            if directory in first_by_dir:
+                _union(index, first_by_dir[directory])
+            else:
+                first_by_dir[directory] = index
+            if cls._is_test_file(path):
+                tests.append((index, cls._locality_stem(path)))
+            else:
+                sources_by_stem.setdefault(cls._locality_stem(path), index)
+        for index, stem in tests:
+            if stem in sources_by_stem:
+                _union(index, sources_by_stem[stem])
+
+        grouped = {}
+        for index, item in enumerate(sized_files):
+            grouped.setdefault(_find(index), []).append(item)
+        return list(grouped.values())
 
+    @staticmethod
+    def _packing_stats(batches: List[List[Dict]], batch_tokens: List[int], max_tokens: int) -> Dict[str, float]:
+        """打包统计：批次数、平均填充率（diff tokens / 批次数×预算）、每个目录平均分散到几批"""
+        dir_batches = {}
+        for index, batch in enumerate(batches):
+            for f in batch:
+                dir_batches.setdefault(os.path.dirname(f.get('file_path', '')), set()).add(index)
+        return {
+            'batch_count': len(batches),
+            'fill_ratio': sum(batch_tokens) / (len(batches) * max_tokens) if batches and max_tokens else 0.0,
+            'dir_spread': sum(len(v) for v in dir_batches.values()) / len(dir_batches) if dir_batches else 0.0,
+        }
+
+    @span('review.merge')
     def _merge_reviews(self, batch_results: List[str], batch_scores: List[Tuple[int, int]],
                        commits_text: str, failed_count: int) -> str:
-        """调用 LLM 合并多批审查结果为统一报告"""
-        total_weight = sum(w for _, w in batch_scores)
-        avg_score = sum(s * w for s, w in batch_scores) / total_weight if total_weight > 0 else 0
+        """
+        调用 LLM 合并多批审查结果为统一报告（树形归并）。
 
-        summary_text = f"该提交共分 {len(batch_results)} 批审查，各批加权平均分: {avg_score:.1f} 分\n\n"
-        for i, result in enumerate(batch_results):
-            summary_text += f"--- 第 {i + 1} 批审查结果 ---\n{result}\n\n"
+        batch_scores 与 batch_results 一一对应，元素为 (评分, 文件数)，审查失败的批次为 None。
+        批次较多、一次合并放不下时，先按输入预算与 REVIEW_MERGE_FANIN 把结果分组，各组并发合并为
+        中间结果，逐层归并到只剩一组再生成最终报告；每层评分均按文件数加权，
+        合并提示词大小与耗时随批次数对数增长。
+        """
+        # 归并节点：(文本, (加权评分, 文件数) 或 None, (起始批次, 结束批次))
+        nodes = [(text, score, (i + 1, i + 1)) for i, (text, score) in enumerate(zip(batch_results, batch_scores))]
+        budget = get_review_input_budget()
+        fanin = max(2, get_env_int('REVIEW_MERGE_FANIN', 8))
+        level = 0
+        groups = self._group_merge_nodes(nodes, budget, fanin)
+        while len(groups) > 1:
+            level += 1
+            logger.info(f'树形合并: 第 {level} 层, {len(nodes)} 个结果分 {len(groups)} 组并发合并')
+            nodes = self._run_parallel(lambda group: self._merge_group(group, commits_text), groups, 'merge-review')
+            groups = self._group_merge_nodes(nodes, budget, fanin)
+
+        avg_score, _ = self._weighted_score([score for _, score, _ in nodes])
+        if level:
+            summary_text = (f"该提交共分 {len(batch_results)} 批审查，已逐层预合并为 {len(nodes)} 部分，"
+                            f"各批按文件数加权平均分: {avg_score:.1f} 分\n\n")
+        else:
+            summary_text = f"该提交共分 {len(batch_results)} 批审查，各批加权平均分: {avg_score:.1f} 分\n\n"
+        for i, (text, _, _) in enumerate(nodes):
+            summary_text += f"--- 第 {i + 1} 部分审查结果 ---\n{text}\n\n" if level \
+                else f"--- 第 {i + 1} 批审查结果 ---\n{text}\n\n"
 
         if failed_count > 0:
             summary_text += f"\n⚠️ 注意: 有 {failed_count} 批审查失败，以上合并报告可能不完整。\n"
 
+        result = self._call_merge_llm(summary_text, commits_text)
+        if is_api_error_message(result):
+            logger.warning("合并审查失败，降级为拼接模式")
+            return f"# 合并审查报告\n\n{summary_text}\n**注意**: AI 合并失败，以上为各批原始结果的拼接。"
+
+        # 附加各批原始详述：合并阶段的 LLM 输出长度有限，文件较多时无法逐个复述，
+        # 直接保留各批原文可确保每个被审查文件的详细意见都不会丢失。
+        details = '\n\n'.join(batch_results)
+        return f"{result}\n\n---\n\n# 各批原始审查详情（共 {len(batch_results)} 批）\n\n{details}"
+
+    @span('llm.merge')
+    def _call_merge_llm(self, summary_text: str, commits_text: str) -> str:
         messages = [
             self.merge_prompts["system_message"],
             {
@@ -458,33 +821,65 @@ class BatchCodeReviewer(BaseReviewer):
                 ),
             },
         ]
-
         result = self.call_llm(messages)
         if is_api_error_message(result):
-            logger.warning("合并审查失败，降级为拼接模式")
-            return f"# 合并审查报告\n\n{summary_text}\n**注意**: AI 合并失败，以上为各批原始结果的拼接。"
-
+            return result
         result = result.strip()
         if result.startswith("```markdown") and result.endswith("```"):
             result = result[11:-3].strip()
+        return result
 
-        # 附加各批原始详述：合并阶段的 LLM 输出长度有限，文件较多时无法逐个复述，
-        # 直接保留各批原文可确保每个被审查文件的详细意见都不会丢失。
-        details = '\n\n'.join(batch_results)
-        return f"{result}\n\n---\n\n# 各批原始审查详情（共 {len(batch_results)} 批）\n\n{details}"
+    def _merge_group(self, group: List[Tuple[str, Any, Tuple[int, int]]], commits_text: str):
+        """合并一组结果为中间节点；评分按文件数加权，LLM 合并失败时退化为拼接"""
+        score, weight = self._weighted_score([score for _, score, _ in group])
+        batch_range = (group[0][2][0], group[-1][2][1])
+        summary_text = (f"以下为第 {batch_range[0]}~{batch_range[1]} 批的审查结果（按文件数加权平均分: {score:.1f} 分），"
+                        f"请合并为一份中间报告，保留所有关键问题及其所属文件\n\n")
+        summary_text += '\n\n'.join(text for text, _, _ in group)
+
+        result = self._call_merge_llm(summary_text, commits_text)
+        if is_api_error_message(result):
+            logger.warning(f'第 {batch_range[0]}~{batch_range[1]} 批预合并失败，降级为拼接')
+            result = '\n\n'.join(text for text, _, _ in group)
+        header = f"## 第 {batch_range[0]}~{batch_range[1]} 批合并结果 (评分: {round(score)}分, {weight} 个文件)\n"
+        return header + result, ((score, weight) if weight else None), batch_range
+
+    @staticmethod
+    def _weighted_score(scores: List[Any]) -> Tuple[float, int]:
+        """按文件数加权平均，返回 (评分, 总文件数)；None 表示审查失败，不参与计算"""
+        scored = [s for s in scores if s]
+        total_weight = sum(w for _, w in scored)
+        if total_weight <= 0:
+            return 0, 0
+        return sum(s * w for s, w in scored) / total_weight, total_weight
+
+    @staticmethod
+    def _group_merge_nodes(nodes: List, budget: int, fanin: int) -> List[List]:
+        """按顺序把归并节点分组：每组 token 不超过预算、节点数不超过 fanin；每组至少 2 个节点，保证逐层收敛"""
+        groups = []
+        current, current_tokens = [], 0
+        for node in nodes:
+            tokens = count_tokens(node[0])
+            if len(current) >= 2 and (current_tokens + tokens > budget or len(current) >= fanin):
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(node)
+            current_tokens += tokens
+        if current:
+            # 最后一组只剩 1 个节点时并入前一组
+            if len(current) == 1 and groups:
+                groups[-1].extend(current)
+            else:
+                groups.append(current)
+        return groups
 
     def review_code(self, diffs_text: str, commits_text: str = "") -> str:
         """审查一批代码"""
-        messages = [
-            self.prompts["system_message"],
-            {
-                "role": "user",
-                "content": self.prompts["user_message"]["content"].format(
-                    diffs_text=diffs_text, commits_text=commits_text
-                ),
-            },
-        ]
-        return self.call_llm(messages)
+        return self.call_llm(self._build_messages(diffs_text, commits_text))
+
+    async def areview_code(self, diffs_text: str, commits_text: str = "") -> str:
+        """异步审查一批代码"""
+        return await self.acall_llm(self._build_messages(diffs_text, commits_text))
 
     @staticmethod
     def _strip_markdown(text: str) -> str:
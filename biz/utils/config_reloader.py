@@ -41,6 +41,12 @@ class ConfigReloader:
             # 重新加载环境变量
             from dotenv import load_dotenv
             load_dotenv(self.env_file, override=True)
+
+            # 刷新进程内配置快照
+            from biz.utils.config_snapshot import invalidate_config_snapshot
+            invalidate_config_snapshot()
+            from biz.utils.prompt_registry import invalidate_prompt_cache
+            invalidate_prompt_cache()
             
             print(f"[ConfigReloader] 环境变量已重新加载: {self.env_file}")
             return True
@@ -123,6 +129,9 @@ class ConfigReloader:
         try:
             # 查找API进程
             api_processes = self._find_processes_by_name('api.py')
+            if not api_processes:
+                # gunicorn 部署时进程命令行中没有 api.py，改为通过 HTTP 端点通知（其余进程会自动检测到配置文件变化）
+                return self._notify_api_via_http()
             
             for proc in api_processes:
                 try:
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+配置快照模块
+将 conf_templates/.env.dist 与 conf/.env 合并解析为一份不可变快照，进程内共享。
+
+热路径（如 process_svn_commit 每个 revision 多次读取开关）直接读内存快照，
+不再每次构造 ConfigManager 重新读取、解析文件；仅在文件 mtime 变化或
+ConfigReloader / reload_config 主动失效时重新加载，并整体原子替换。
+"""
+
+import threading
+import time
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Optional, Tuple
+
+from biz.utils.config_manager import ConfigManager
+
+_PROJECT_ROOT = Path(__file__).parent.parent.parent
+ENV_DIST_FILE = _PROJECT_ROOT / "conf_templates" / ".env.dist"
+ENV_FILE = _PROJECT_ROOT / "conf" / ".env"
+
+# 两次检查文件 mtime 的最小间隔（秒），避免热路径上频繁 stat
+MTIME_CHECK_INTERVAL = 1.0
+
+_TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+class ConfigSnapshot:
+    """不可变配置快照：values 为 .env.dist 与 .env 合并后的结果，defaults 仅为 .env.dist"""
+
+    __slots__ = ('version', 'values', 'defaults', 'mtimes', 'loaded_at')
+
+    def __init__(self, version: int, values: Dict[str, str], defaults: Dict[str, str],
+                 mtimes: Tuple[float, float]):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'values', MappingProxyType(dict(values)))
+        object.__setattr__(self, 'defaults', MappingProxyType(dict(defaults)))
+        object.__setattr__(self, 'mtimes', mtimes)
+        object.__setattr__(self, 'loaded_at', time.time())
+
+    def __setattr__(self, key, value):
+        raise AttributeError("ConfigSnapshot 是只读的")
+
+    def get_str(self, key: str, default: str = '') -> str:
+        return self.values.get(key, default)
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        value = self.values.get(key)
+        if value is None:
+            return default
+        return value.lower() in _TRUE_VALUES
+
+    def get_int(self, key: str, default: int = 0) -> int:
+        try:
+            return int(self.values.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_default(self, key: str, fallback: str = '') -> str:
+        """获取 .env.dist 中的默认值"""
+        return self.defaults.get(key, fallback)
+
+
+def _file_mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+def _parse_env_file(path: Path) -> Dict[str, str]:
+    """解析 KEY=VALUE 格式的 env 文件，规则与 ConfigManager.get_env_config 保持一致"""
+    result = {}
+    if not path.exists():
+        return result
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, value = line.split('=', 1)
+                result[key.strip()] = ConfigManager._unescape_env_value(value)
+    return result
+
+
+_lock = threading.Lock()
+_snapshot: Optional[ConfigSnapshot] = None
+_last_check = 0.0
+
+
+def _load_snapshot(version: int) -> ConfigSnapshot:
+    mtimes = (_file_mtime(ENV_DIST_FILE), _file_mtime(ENV_FILE))
+    try:
+        defaults = _parse_env_file(ENV_DIST_FILE)
+    except Exception as e:
+        print(f"加载 .env.dist 文件时出错: {e}")
+        defaults = {}
+    values = dict(defaults)
+    try:
+        values.update(_parse_env_file(ENV_FILE))
+    except Exception as e:
+        print(f"加载 .env 文件时出错: {e}")
+    return ConfigSnapshot(version, values, defaults, mtimes)
+
+
+def get_config_snapshot() -> ConfigSnapshot:
+    """获取当前配置快照；文件 mtime 变化时自动重新加载"""
+    global _snapshot, _last_check
+    snapshot = _snapshot
+    now = time.monotonic()
+    if snapshot is not None and now - _last_check < MTIME_CHECK_INTERVAL:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or (_file_mtime(ENV_DIST_FILE), _file_mtime(ENV_FILE)) != snapshot.mtimes:
+            snapshot = _load_snapshot(snapshot.version + 1 if snapshot else 1)
+            _snapshot = snapshot
+        _last_check = time.monotonic()
+        return snapshot
+
+
+def invalidate_config_snapshot():
+    """立即重新加载并原子替换当前快照（供 ConfigReloader / reload_config 调用）"""
+    global _snapshot, _last_check
+    with _lock:
+        old = _snapshot
+        _snapshot = _load_snapshot(old.version + 1 if old else 1)
+        _last_check = time.monotonic()
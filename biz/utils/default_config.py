@@ -10,6 +10,8 @@ import os
 from pathlib import Path
 from typing import Dict, Optional
 
+from biz.utils.config_snapshot import get_config_snapshot, invalidate_config_snapshot
+
 class DefaultConfigManager:
     """默认配置管理器，从 .env.dist 文件中读取默认值"""
     
@@ -107,8 +109,8 @@ def get_env_with_default(key: str, custom_fallback: Optional[str] = None) -> str
     if env_value is not None:
         return env_value
     
-    # 然后从 .env.dist 获取默认值
-    default_value = _default_config.get_default(key)
+    # 然后从 .env.dist 获取默认值（读取进程内缓存的配置快照）
+    default_value = get_config_snapshot().get_default(key)
     if default_value:
         return default_value
     
@@ -209,6 +211,7 @@ def is_path_excluded(path: str, exclude_patterns: list) -> bool:
 def reload_defaults():
     """重新加载默认配置（用于测试或动态更新）"""
     _default_config.reload()
+    invalidate_config_snapshot()
 
 # 向后兼容的函数名
 def get_config_default(key: str, fallback: str = "") -> str:
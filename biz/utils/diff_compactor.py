@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+diff 压缩（送审前的 token 节省阶段）
+位于 filter_changes / filter_svn_changes 之后、审查器之前，按 DIFF_COMPACTION_STEPS 依次执行：
+
+- generated：识别 lock 文件、自动生成代码、压缩（minified）文件，diff 替换为一行说明。
+  自动生成代码按路径（DIFF_GENERATED_GLOBS）或文件开头的注释标记识别，不看普通代码中的字符串
+- whitespace：剔除只有行尾空白、空行变化的 hunk（缩进变化保留；缩进敏感的文件不处理）
+- context：diff 较大时折叠连续的未变更上下文，只保留改动附近的几行
+
+另提供紧凑的送审文本格式（serialize_files），替代 json.dumps(indent=2)：
+diff 原样输出，不再把每个换行转义成 \\n。
+
+新的压缩步骤可通过 register_compaction_step 注册，再加入 DIFF_COMPACTION_STEPS 启用。
+"""
+
+import fnmatch
+import json
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+from biz.utils.default_config import get_env_int, get_env_with_default
+from biz.utils.log import logger
+from biz.utils.token_util import count_tokens
+
+# 常见 lock 文件
+LOCK_FILE_NAMES = {
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'npm-shrinkwrap.json', 'go.sum', 'Cargo.lock',
+    'poetry.lock', 'Pipfile.lock', 'composer.lock', 'Gemfile.lock', 'packages.lock.json', 'pubspec.lock',
+}
+# 自动生成代码的常见标记：只在文件开头若干行的注释中查找（diff 需包含文件第 1 行）
+GENERATED_MARKERS = re.compile(
+    r'@generated|DO NOT EDIT|Code generated .* DO NOT EDIT|<auto-generated|auto-generated|'
+    r'This file was automatically generated|自动生成', re.IGNORECASE)
+GENERATED_MARKER_SCAN_LINES = 10
+_COMMENT_PREFIXES = ('//', '#', '/*', '*', '<!--', '--', ';', '"""', "'''")
+# 默认按路径识别的自动生成文件，可通过 DIFF_GENERATED_GLOBS 覆盖
+DEFAULT_GENERATED_GLOBS = '*.pb.go,*_pb2.py,*_pb2_grpc.py,*.g.dart,*.freezed.dart,*.Designer.cs,*.generated.*'
+# 超过该长度的新增行视为压缩行：至少 MINIFIED_MIN_LONG_LINES 行且新增行平均长度也超过该值才视为压缩文件，
+# 单行很长的普通代码（如拼接 SQL）不受影响；source map / svg 等非源码文件不要求行数
+MINIFIED_LINE_LENGTH = 300
+MINIFIED_MIN_LONG_LINES = 3
+NON_SOURCE_EXTENSIONS = {'.map', '.svg'}
+# 缩进有语义的文件不做空白字符压缩
+WHITESPACE_SENSITIVE_EXTENSIONS = {'.py', '.pyi', '.yml', '.yaml'}
+WHITESPACE_SENSITIVE_NAMES = {'Makefile', 'GNUmakefile', 'makefile'}
+
+_HUNK_HEADER_RE = re.compile(r'^@@ ')
+
+# 压缩步骤：(diff, file_path) -> 压缩后的 diff
+CompactionStep = Callable[[str, str], str]
+_COMPACTION_STEPS: Dict[str, CompactionStep] = {}
+
+
+def register_compaction_step(name: str, step: CompactionStep):
+    """注册压缩步骤，在 DIFF_COMPACTION_STEPS 中按名称启用"""
+    _COMPACTION_STEPS[name] = step
+
+
+def _split_hunks(diff: str):
+    """拆分为 (文件头行, [hunk 行列表])"""
+    lines = diff.split('\n')
+    header, hunks = [], []
+    for line in lines:
+        if _HUNK_HEADER_RE.match(line):
+            hunks.append([line])
+        elif hunks:
+            hunks[-1].append(line)
+        else:
+            header.append(line)
+    return header, hunks
+
+
+def _join_hunks(header: List[str], hunks: List[List[str]]) -> str:
+    return '\n'.join(header + [line for hunk in hunks for line in hunk])
+
+
+def _changed_lines(lines: List[str], prefix: str) -> List[str]:
+    marker = prefix * 3
+    return [line[1:] for line in lines if line.startswith(prefix) and not line.startswith(marker + ' ')]
+
+
+def _file_header_lines(diff: str) -> List[str]:
+    """diff 包含文件第 1 行时，返回新版本文件开头若干行（未变更上下文 + 新增行），否则返回空列表"""
+    _, hunks = _split_hunks(diff)
+    if not hunks or not re.match(r'^@@ -\d+(?:,\d+)? \+1[, ]', hunks[0][0]):
+        return []
+    lines = [line[1:] for line in hunks[0][1:] if line[:1] in (' ', '+')]
+    return lines[:GENERATED_MARKER_SCAN_LINES]
+
+
+def _has_generated_header(diff: str) -> bool:
+    for line in _file_header_lines(diff):
+        stripped = line.strip()
+        if stripped.startswith(_COMMENT_PREFIXES) and GENERATED_MARKERS.search(stripped):
+            return True
+    return False
+
+
+def detect_generated(diff: str, file_path: str) -> Optional[str]:
+    """识别 lock 文件 / 自动生成代码 / 压缩文件，返回原因；普通文件返回 None"""
+    path = file_path.replace('\\', '/')
+    base = os.path.basename(path)
+    if base in LOCK_FILE_NAMES:
+        return 'lock 文件'
+    if re.search(r'\.min\.(js|css)$', base) or re.search(r'[.-]bundle\.js$', base):
+        return '压缩文件'
+    globs = [g.strip() for g in get_env_with_default('DIFF_GENERATED_GLOBS', DEFAULT_GENERATED_GLOBS).split(',')]
+    if any(g and (fnmatch.fnmatch(path, g) or fnmatch.fnmatch(base, g)) for g in globs):
+        return '自动生成代码'
+    if _has_generated_header(diff):
+        return '自动生成代码'
+    added = _changed_lines(diff.split('\n'), '+')
+    if added and sum(len(line) for line in added) / len(added) > MINIFIED_LINE_LENGTH:
+        long_lines = sum(1 for line in added if len(line) > MINIFIED_LINE_LENGTH)
+        if long_lines >= MINIFIED_MIN_LONG_LINES or os.path.splitext(base)[1].lower() in NON_SOURCE_EXTENSIONS:
+            return '压缩文件'
+    return None
+
+
+def compact_generated(diff: str, file_path: str) -> str:
+    reason = detect_generated(diff, file_path)
+    if not reason:
+        return diff
+    lines = diff.split('\n')
+    additions, deletions = len(_changed_lines(lines, '+')), len(_changed_lines(lines, '-'))
+    return f"[已省略：{reason}，+{additions}/-{deletions} 行，无需审查具体内容]"
+
+
+def _is_whitespace_only(hunk: List[str]) -> bool:
+    """只有行尾空白与空行变化（缩进与行内空白保持原样比较）"""
+    removed = [line.rstrip() for line in _changed_lines(hunk, '-')]
+    added = [line.rstrip() for line in _changed_lines(hunk, '+')]
+    return bool(removed or added) and [l for l in removed if l] == [l for l in added if l]
+
+
+def _is_whitespace_sensitive(file_path: str) -> bool:
+    base = os.path.basename(file_path.replace('\\', '/'))
+    return base in WHITESPACE_SENSITIVE_NAMES or os.path.splitext(base)[1].lower() in WHITESPACE_SENSITIVE_EXTENSIONS
+
+
+def strip_whitespace_hunks(diff: str, file_path: str) -> str:
+    """剔除只有行尾空白、空行变化的 hunk；缩进敏感的文件（Python、YAML、Makefile）原样保留"""
+    if _is_whitespace_sensitive(file_path):
+        return diff
+    header, hunks = _split_hunks(diff)
+    if not hunks:
+        return diff
+    kept = [hunk for hunk in hunks if not _is_whitespace_only(hunk)]
+    if len(kept) == len(hunks):
+        return diff
+    if not kept:
+        return "[已省略：仅空白字符变更]"
+    return _join_hunks(header, kept)
+
+
+def collapse_context(diff: str, file_path: str) -> str:
+    """
+    自适应折叠未变更上下文：diff 行数不超过 DIFF_COMPACT_MIN_LINES 时保留全部上下文
+    （小改动多给上下文有助于减少误报），否则每段连续上下文只保留改动前后各
+    DIFF_CONTEXT_KEEP_LINES 行。
+    """
+    if diff.count('\n') + 1 <= get_env_int('DIFF_COMPACT_MIN_LINES', 200):
+        return diff
+    keep = max(1, get_env_int('DIFF_CONTEXT_KEEP_LINES', 5))
+    header, hunks = _split_hunks(diff)
+    if not hunks:
+        return diff
+
+    compacted = []
+    for hunk in hunks:
+        body = hunk[1:]
+        result = [hunk[0]]
+        index = 0
+        while index < len(body):
+            if not body[index].startswith(' '):
+                result.append(body[index])
+                index += 1
+                continue
+            end = index
+            while end < len(body) and body[end].startswith(' '):
+                end += 1
+            run = body[index:end]
+            # hunk 开头的上下文只保留靠近改动的部分，结尾的只保留紧跟改动的部分
+            head_keep = 0 if index == 0 else keep
+            tail_keep = 0 if end == len(body) else keep
+            if len(run) > head_keep + tail_keep + 1:
+                omitted = len(run) - head_keep - tail_keep
+                result.extend(run[:head_keep])
+                result.append(f" ...（省略 {omitted} 行未变更代码）")
+                if tail_keep:
+                    result.extend(run[-tail_keep:])
+            else:
+                result.extend(run)
+            index = end
+        compacted.append(result)
+    return _join_hunks(header, compacted)
+
+
+register_compaction_step('generated', compact_generated)
+register_compaction_step('whitespace', strip_whitespace_hunks)
+register_compaction_step('context', collapse_context)
+
+
+def get_enabled_steps() -> List[str]:
+    names = [n.strip() for n in get_env_with_default('DIFF_COMPACTION_STEPS', 'generated,whitespace,context').split(',')]
+    enabled = []
+    for name in names:
+        if not name:
+            continue
+        if name not in _COMPACTION_STEPS:
+            logger.warning(f"未知的 diff 压缩步骤: {name}，已忽略")
+            continue
+        enabled.append(name)
+    return enabled
+
+
+def compact_diff(diff: str, file_path: str, steps: Optional[List[str]] = None) -> str:
+    """按顺序执行压缩步骤"""
+    if not diff:
+        return diff
+    for name in (get_enabled_steps() if steps is None else steps):
+        diff = _COMPACTION_STEPS[name](diff, file_path)
+    return diff
+
+
+def compact_changes(changes: List[Dict], path_key: str = 'new_path') -> List[Dict]:
+    """
+    压缩变更列表中每个文件的 diff（additions/deletions 等统计保持原值），并记录本次节省的 token 数
+    """
+    steps = get_enabled_steps()
+    if not steps or not changes:
+        return changes
+
+    tokens_before = tokens_after = 0
+    compacted = []
+    for change in changes:
+        diff = change.get('diff', '')
+        new_diff = compact_diff(diff, change.get(path_key, ''), steps)
+        if new_diff != diff:
+            tokens_before += count_tokens(diff)
+            tokens_after += count_tokens(new_diff)
+            change = dict(change, diff=new_diff)
+        compacted.append(change)
+
+    if tokens_before:
+        saved = tokens_before - tokens_after
+        logger.info(f"🗜️ diff 压缩（{','.join(steps)}）: 节省 {saved} tokens "
+                    f"（被压缩文件 {tokens_before} → {tokens_after}，{saved / tokens_before:.0%}）")
+    return compacted
+
+
+def serialize_files(files: List[Dict], compact: bool = True) -> str:
+    """
+    生成送审文本。compact=True 时每个文件以 `==== 文件: 路径 (元信息) ====` 开头，其后为原样的 diff；
+    compact=False 时为旧的 json.dumps(indent=2) 格式（仅供对比）。以 _ 开头的内部字段不输出。
+    """
+    entries = [{k: v for k, v in f.items() if not k.startswith('_')} for f in files]
+    if not compact:
+        return json.dumps(entries, ensure_ascii=False, indent=2)
+
+    blocks = []
+    for entry in entries:
+        path = entry.pop('file_path', None) or entry.pop('new_path', '')
+        diff = entry.pop('diff', '')
+        context = entry.pop('preceding_context', '')
+        meta = ', '.join(f"{k}: {v}" for k, v in entry.items() if v not in ('', None))
+        parts = [f"==== 文件: {path}" + (f" ({meta})" if meta else '') + " ===="]
+        if context:
+            parts.extend(["[前一段末尾上下文]", context, "[本段 diff]"])
+        parts.append(diff)
+        blocks.append('\n'.join(parts))
+    return '\n\n'.join(blocks)
@@ -9,6 +9,7 @@ import urllib.parse
 import requests
 
 from biz.utils.log import logger
+from biz.utils.metrics import observe_notification
 from biz.utils.default_config import get_env_bool, get_env_with_default
 
 
@@ -103,6 +104,8 @@ class DingTalkNotifier:
 
     def _send_message(self, post_url, message, chunk_num=None, total_chunks=None):
         """发送请求并处理响应"""
+        started = time.monotonic()
+        success = False
         try:
             headers = {
                 "Content-Type": "application/json",
@@ -112,12 +115,15 @@ class DingTalkNotifier:
             response_data = response.json()
             suffix = f", 第{chunk_num}/{total_chunks}部分" if chunk_num else ""
             if response_data.get('errmsg') == 'ok':
+                success = True
                 logger.info(f"钉钉消息{'分块' if chunk_num else ''}发送成功! webhook_url:{post_url}{suffix}")
             else:
                 logger.error(
                     f"钉钉消息{'分块' if chunk_num else ''}发送失败! webhook_url:{post_url},errmsg:{response_data.get('errmsg')}{suffix}")
         except Exception as e:
             logger.error(f"钉钉消息{'分块' if chunk_num else ''}发送失败! 错误信息: {str(e)}")
+        finally:
+            observe_notification('dingtalk', started, success)
 
     def _send_message_in_chunks(self, content, title, post_url, msg_type, is_at_all, max_bytes):
         """将内容分割成多个部分并分别发送"""
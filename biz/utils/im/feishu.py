@@ -1,6 +1,8 @@
 import requests
 import os
+import time
 from biz.utils.log import logger
+from biz.utils.metrics import observe_notification
 from biz.utils.default_config import get_env_with_default, get_env_bool
 
 
@@ -62,6 +64,8 @@ class FeishuNotifier:
             logger.info("飞书推送未启用")
             return
 
+        started = time.monotonic()
+        success = False
         try:
             post_url = self._get_webhook_url(project_name=project_name, url_slug=url_slug)
             if msg_type == 'markdown':
@@ -126,7 +130,10 @@ class FeishuNotifier:
             if result.get('msg') != "success":
                 logger.error(f"发送飞书消息失败! webhook_url:{post_url},errmsg:{result}")
             else:
+                success = True
                 logger.info(f"飞书消息发送成功! webhook_url:{post_url}")
 
         except Exception as e:
             logger.error(f"飞书消息发送失败! 错误信息: {str(e)}")
+        finally:
+            observe_notification('feishu', started, success)
@@ -1,5 +1,7 @@
 import os
+import time
 from biz.utils.log import logger
+from biz.utils.metrics import observe_notification
 from biz.utils.default_config import get_env_with_default, get_env_bool
 import requests
 
@@ -23,6 +25,8 @@ class ExtraWebhookNotifier:
             logger.info("ExtraWebhook推送未启用")
             return
 
+        started = time.monotonic()
+        success = False
         try:
             data = {
                 "ai_codereview_data": system_data,
@@ -37,6 +41,9 @@ class ExtraWebhookNotifier:
             if response.status_code != 200:
                 logger.error(f"ExtraWebhook消息发送失败! webhook_url:{self.default_webhook_url}, error_msg:{response.text}")
                 return
+            success = True
 
         except Exception as e:
-            logger.error(f"ExtraWebhook消息发送失败! 错误信息: {str(e)}")
\ No newline at end of file
+            logger.error(f"ExtraWebhook消息发送失败! 错误信息: {str(e)}")
+        finally:
+            observe_notification('extra_webhook', started, success)
\ No newline at end of file
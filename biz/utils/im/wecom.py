@@ -2,7 +2,9 @@ import json
 import requests
 import os
 import re
+import time
 from biz.utils.log import logger
+from biz.utils.metrics import observe_notification
 from biz.utils.default_config import get_env_with_default, get_env_bool
 
 
@@ -154,6 +156,8 @@ class WeComNotifier:
 
     def _send_message(self, post_url, data, chunk_num=None, total_chunks=None):
         """ 发送请求并返回响应 """
+        started = time.monotonic()
+        success = False
         try:
             logger.debug(
                 f"发送企业微信消息{'分块' if chunk_num else ''} {chunk_num}/{total_chunks if chunk_num else ''}: url={post_url}, data={data}")
@@ -162,10 +166,13 @@ class WeComNotifier:
             if response and response.get('errcode') != 0:
                 logger.error(f"企业微信消息发送失败! webhook_url:{post_url}, errmsg:{response}")
             else:
+                success = response is not None
                 logger.info(f"企业微信消息{'分块' if chunk_num else ''}发送成功! webhook_url:{post_url}")
 
         except Exception as e:
             logger.error(f"企业微信消息{'分块' if chunk_num else ''}发送失败! {e}")
+        finally:
+            observe_notification('wecom', started, success)
 
     def _send_request(self, url, data):
         """ 发送请求并返回 JSON 响应 """
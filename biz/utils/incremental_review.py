@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+MR/PR 增量审查
+记录每个 MR 上次审查的 head SHA 与审查摘要；MR 更新时只拉取上次 head 到新 head 之间的
+增量 diff（interdiff），连同上次审查摘要一起送审，避免长期 MR 每次更新都全量重审。
+
+以下情况仍走全量审查：
+- INCREMENTAL_MR_REVIEW_ENABLED=0
+- MR 新建（open/opened）或没有上次审查记录
+- MR 打上了 MR_FULL_REVIEW_LABEL 标签（按需全量重审）
+- 上次审查的 head 已不在当前 head 的提交历史中（force-push / rebase 改写了历史）
+- 获取增量 diff 失败，或增量 diff 中没有属于 MR 的文件
+
+增量审查时记录相对全量审查节省的 token 数（日志与 incremental_review_tokens_saved_total 指标），
+审查记录以 review_mode=incremental 入库，file_details 为实际送审的增量文件。
+"""
+
+import re
+import sqlite3
+import time
+from typing import Callable, Dict, List, Optional
+
+from biz.utils.default_config import get_env_bool, get_env_with_default
+from biz.utils.diff_compactor import serialize_files
+from biz.utils.log import logger
+from biz.utils.metrics import DB_WRITE_SECONDS, INCREMENTAL_REVIEWS, INCREMENTAL_TOKENS_SAVED
+from biz.utils.token_util import count_tokens
+
+# 审查摘要最大长度
+SUMMARY_MAX_CHARS = 800
+
+# mr_review_log.review_mode
+REVIEW_MODE_FULL = 'full'
+REVIEW_MODE_INCREMENTAL = 'incremental'
+
+
+class MergeRequestReviewState:
+    """MR 上次审查状态（head SHA、审查摘要、评分）"""
+
+    DB_FILE = "data/data.db"
+
+    @staticmethod
+    def init_db():
+        """初始化 MR 审查状态表"""
+        try:
+            with sqlite3.connect(MergeRequestReviewState.DB_FILE) as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS mr_review_state (
+                        mr_key TEXT PRIMARY KEY,
+                        head_sha TEXT NOT NULL,
+                        review_summary TEXT,
+                        score INTEGER,
+                        reviewed_at INTEGER NOT NULL
+                    )
+                ''')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"MR审查状态表初始化失败: {e}")
+
+    @staticmethod
+    def get(mr_key: str) -> Optional[Dict]:
+        try:
+            with sqlite3.connect(MergeRequestReviewState.DB_FILE) as conn:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute('SELECT * FROM mr_review_state WHERE mr_key = ?', (mr_key,)).fetchone()
+                return dict(row) if row else None
+        except sqlite3.DatabaseError as e:
+            logger.error(f"查询MR审查状态失败: {e}")
+            return None
+
+    @staticmethod
+    @DB_WRITE_SECONDS.time(operation='mr_review_state')
+    def save(mr_key: str, head_sha: str, review_result: str, score: int):
+        """记录本次审查的 head 与审查摘要"""
+        if not mr_key or not head_sha:
+            return
+        try:
+            with sqlite3.connect(MergeRequestReviewState.DB_FILE) as conn:
+                conn.execute('''
+                    INSERT INTO mr_review_state (mr_key, head_sha, review_summary, score, reviewed_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(mr_key) DO UPDATE SET
+                        head_sha = excluded.head_sha,
+                        review_summary = excluded.review_summary,
+                        score = excluded.score,
+                        reviewed_at = excluded.reviewed_at
+                ''', (mr_key, head_sha, summarize_review(review_result), score, int(time.time())))
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"保存MR审查状态失败: {e}")
+
+
+def summarize_review(review_result: str, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """
+    提取审查结果摘要：保留"分文件详述"之前的总体评价与主要问题部分，并附上总分
+    """
+    if not review_result:
+        return ""
+    text = review_result.strip()
+    detail_match = re.search(r'^.*分文件详述.*$', text, re.MULTILINE)
+    summary = text[:detail_match.start()].strip() if detail_match else text
+    if len(summary) > max_chars:
+        summary = summary[:max_chars].rstrip() + "..."
+    score_match = re.search(r'总分[:：]\s*\d+\s*分', text)
+    if score_match and score_match.group(0) not in summary:
+        summary += f"\n{score_match.group(0)}"
+    return summary
+
+
+def has_full_review_label(labels: list) -> bool:
+    """MR/PR 是否打了按需全量重审标签（兼容 GitLab 的 title 与 GitHub 的 name 字段）"""
+    label = get_env_with_default('MR_FULL_REVIEW_LABEL', 'full-review').strip()
+    if not label or not labels:
+        return False
+    for item in labels:
+        name = (item.get('title') or item.get('name')) if isinstance(item, dict) else item
+        if name == label:
+            return True
+    return False
+
+
+def get_incremental_base(mr_key: str, head_sha: str, action: str, labels: list) -> Optional[Dict]:
+    """
+    判断是否可以增量审查；可以时返回上次审查状态（含 head_sha、review_summary），否则返回 None
+    """
+    if not get_env_bool('INCREMENTAL_MR_REVIEW_ENABLED'):
+        return None
+    if action not in ('update', 'synchronize') or not head_sha:
+        return None
+    if has_full_review_label(labels):
+        logger.info(f"MR {mr_key} 带有全量审查标签，执行全量审查")
+        return None
+    state = MergeRequestReviewState.get(mr_key)
+    if not state or state['head_sha'] == head_sha:
+        return None
+    return state
+
+
+def restrict_to_mr_files(delta_changes: List[Dict], mr_changes: List[Dict]) -> List[Dict]:
+    """
+    只保留属于 MR 变更文件的增量 diff。
+    MR 被 rebase 到目标分支后，旧 head 到新 head 的对比会混入目标分支上的无关变更，这里将其剔除。
+    """
+    mr_paths = {change.get('new_path') for change in mr_changes}
+    return [change for change in delta_changes if change.get('new_path') in mr_paths]
+
+
+def build_incremental_commits_text(commits_text: str, state: Dict, head_sha: str) -> str:
+    """在提交信息后附加增量审查说明与上次审查摘要"""
+    return (f"{commits_text}\n\n"
+            f"【增量审查】以下代码变更仅包含自上次审查（{state['head_sha'][:8]}）以来到 {head_sha[:8]} 的增量修改，"
+            f"请只针对增量修改进行审查和评分。上次审查摘要：\n{state.get('review_summary') or '无'}")
+
+
+def record_tokens_saved(changes: List[Dict], delta_changes: List[Dict], platform: str) -> int:
+    """估算并记录增量审查相对全量审查少送审的 token 数（统计失败不影响审查）"""
+    try:
+        full_tokens = count_tokens(serialize_files(changes))
+        delta_tokens = count_tokens(serialize_files(delta_changes))
+    except Exception as e:
+        logger.warning(f"统计增量审查节省的token失败: {e}")
+        return 0
+    saved = max(0, full_tokens - delta_tokens)
+    INCREMENTAL_TOKENS_SAVED.inc(saved, platform=platform)
+    logger.info(f"📉 增量审查送审 {delta_tokens} tokens（全量 {full_tokens} tokens），节省 {saved} tokens")
+    return saved
+
+
+def plan_incremental_review(handler, state: Dict, changes: List[Dict], filter_func: Callable[[list], list],
+                            platform: str) -> Optional[List[Dict]]:
+    """
+    获取上次审查的 head 到当前 head 之间属于 MR 文件的增量 diff；无法增量审查时返回 None（回退全量审查）
+    :param handler: GitLab MergeRequestHandler / GitHub PullRequestHandler（需提供 head_sha、is_ancestor、repository_compare）
+    :param filter_func: 对比结果的文件过滤函数（filter_changes）
+    """
+    base_sha, head_sha = state['head_sha'], handler.head_sha
+    outcome, delta_changes = 'incremental', None
+    try:
+        if not handler.is_ancestor(base_sha, head_sha):
+            outcome = 'force_push'
+            logger.info(f"上次审查的head {base_sha[:8]} 已不在 {head_sha[:8]} 的提交历史中（force-push），回退全量审查")
+        else:
+            delta_changes = restrict_to_mr_files(filter_func(handler.repository_compare(base_sha, head_sha)), changes)
+            if not delta_changes:
+                outcome = 'empty'
+                logger.info('增量diff为空或获取失败，回退全量审查')
+    except Exception as e:
+        outcome = 'compare_failed'
+        logger.warning(f"获取增量diff失败，回退全量审查: {e}")
+    INCREMENTAL_REVIEWS.inc(platform=platform, outcome=outcome)
+    if not delta_changes:
+        return None
+    record_tokens_saved(changes, delta_changes, platform)
+    return delta_changes
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Prometheus 文本格式指标（API 服务的 /metrics 端点）
+进程内聚合：计数器与直方图只在内存中累加（一次加锁、一次二分查找），抓取时渲染为 Prometheus 文本格式，
+不依赖 prometheus_client。
+
+多进程模式（METRICS_MULTIPROC_DIR 非空，默认 data/metrics）：审查任务运行在预派生工作进程池或
+rq 的 work horse 子进程中，这些进程里的观测值主进程看不到。每个进程把自身的累计值原子写入
+<pid>.json（观测时最多每 METRICS_FLUSH_INTERVAL 秒一次，队列任务结束与进程退出时各一次），
+/metrics 抓取时合并目录下所有文件；已退出进程的文件合并进 archive.json 后删除，避免文件无限增长。
+fork 出的子进程清空继承来的观测值，只上报自己的增量，不会与父进程重复计数。
+
+所有指标统一在本模块定义，抓取时即使某个指标尚无观测值也会输出 HELP / TYPE。
+队列深度等瞬时值通过 register_gauge_callback 在抓取时计算。
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import portalocker
+import psutil
+
+from biz.utils.default_config import get_env_bool, get_env_int, get_env_with_default
+from biz.utils.log import logger
+
+PREFIX = 'codereview_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+_ARCHIVE_FILE = 'archive.json'
+
+_lock = threading.Lock()
+_registry: Dict[str, '_Metric'] = {}
+_gauge_callbacks: List[Tuple[str, str, Tuple[str, ...], Callable[[], Dict[Tuple[str, ...], float]]]] = []
+_last_flush = 0.0
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        _registry[self.name] = self
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def clear(self):
+        with _lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        _maybe_flush()
+
+    def _samples(self, values) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        return [(self.name, self.labelnames, key, value) for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """直方图：每个标签组合保存各分桶计数（非累计）、总次数与总和"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            state[index] += 1
+            state[-1] += value
+        _maybe_flush()
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文，也可作为函数装饰器使用；代码块抛出异常时同样记录耗时"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def _samples(self, values) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        samples = []
+        for key, state in values.items():
+            cumulative = 0
+            # state[len(buckets)] 为超过最大分桶的次数，state[-1] 为总和
+            for bound, count in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += count
+                samples.append((self.name + '_bucket', self.labelnames + ('le',), key + (_format_value(bound),),
+                                cumulative))
+            samples.append((self.name + '_count', self.labelnames, key, cumulative))
+            samples.append((self.name + '_sum', self.labelnames, key, state[-1]))
+        return samples
+
+
+def register_gauge_callback(name: str, documentation: str, labelnames: Tuple[str, ...],
+                            callback: Callable[[], Dict[Tuple[str, ...], float]]):
+    """注册瞬时值指标，抓取时调用 callback 获取 {标签值元组: 数值}，只在执行抓取的进程内计算"""
+    _gauge_callbacks.append((PREFIX + name, documentation, tuple(labelnames), callback))
+
+
+# ---------------------------------------------------------------- 指标定义
+WEBHOOK_REQUESTS = Counter('webhook_requests_total', '接收到的 webhook / 手动触发请求数', ('source', 'event'))
+QUEUE_REJECTED = Counter('queue_rejected_total', '因任务队列已满被拒绝的任务数', ('driver',))
+QUEUE_WAIT_SECONDS = Histogram('queue_wait_seconds', '任务从入队到开始执行的等待时间', ('driver',))
+REVIEW_SECONDS = Histogram('review_duration_seconds', '一次审查任务的端到端耗时', ('review_type',))
+LLM_CALL_SECONDS = Histogram('llm_call_duration_seconds', '大模型调用耗时（含限流重试与故障转移）',
+                             ('provider', 'outcome'))
+SVN_COMMAND_SECONDS = Histogram('svn_command_duration_seconds', 'svn 子进程执行耗时', ('command',))
+SVN_COMMAND_FAILURES = Counter('svn_command_failures_total', 'svn 子进程返回非 0 或执行异常的次数', ('command',))
+DB_WRITE_SECONDS = Histogram('db_write_duration_seconds', 'SQLite 写入耗时', ('operation',),
+                             buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+AGENTIC_TOOL_SECONDS = Histogram('agentic_tool_duration_seconds', 'Agentic 审查单次工具执行耗时（不含缓存命中）', ('tool',))
+AGENTIC_TOOL_CALLS = Counter('agentic_tool_calls_total', 'Agentic 审查工具调用次数，cached=true 为命中审查内缓存',
+                             ('tool', 'cached'))
+AGENTIC_TOOL_ROUNDS = Histogram('agentic_tool_rounds', '一次 Agentic 审查的工具调用轮数（每轮为一次完整的模型往返），'
+                                'prefetch 标签区分是否开启上下文预取，sum / count 即平均轮数', ('reviewer', 'prefetch'),
+                                buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30))
+AGENTIC_PHASE_SECONDS = Histogram('agentic_review_phase_seconds', '一次 Agentic 审查中模型调用与工具执行各自的累计耗时',
+                                  ('reviewer', 'phase'))
+INCREMENTAL_TOKENS_SAVED = Counter('incremental_review_tokens_saved_total',
+                                   'MR/PR 增量审查相对全量审查少送审的 token 数（按送审 diff 估算）', ('platform',))
+INCREMENTAL_REVIEWS = Counter('incremental_reviews_total', 'MR/PR 更新事件的增量审查结果，'
+                              'outcome 为 incremental 或回退全量的原因（force_push / compare_failed / empty）',
+                              ('platform', 'outcome'))
+NOTIFICATION_SECONDS = Histogram('notification_duration_seconds', 'IM / 额外 webhook 通知发送耗时', ('channel',))
+NOTIFICATION_FAILURES = Counter('notification_failures_total', 'IM / 额外 webhook 通知发送失败次数', ('channel',))
+
+
+def observe_notification(channel: str, started: float, success: bool):
+    """记录一次通知发送的耗时与结果，started 为 time.monotonic() 起始值"""
+    NOTIFICATION_SECONDS.observe(time.monotonic() - started, channel=channel)
+    if not success:
+        NOTIFICATION_FAILURES.inc(channel=channel)
+
+
+# ---------------------------------------------------------------- 多进程模式
+def _multiproc_dir() -> Optional[str]:
+    if not get_env_bool('METRICS_ENABLED'):
+        return None
+    return get_env_with_default('METRICS_MULTIPROC_DIR') or None
+
+
+def _snapshot() -> Dict[str, List]:
+    with _lock:
+        return {name: [[list(key), value if isinstance(value, float) else list(value)]
+                       for key, value in metric._values.items()]
+                for name, metric in _registry.items() if metric._values}
+
+
+def _write_json(path: str, data: Dict[str, List]):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Dict[str, List]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def flush_metrics():
+    """把本进程的累计值写入多进程目录（未启用多进程模式时不做任何事）"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    directory = _multiproc_dir()
+    if not directory:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        _write_json(os.path.join(directory, f"{os.getpid()}.json"), _snapshot())
+    except OSError as e:
+        logger.warning(f"⚠️ 写入指标文件失败: {e}")
+
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= get_env_int('METRICS_FLUSH_INTERVAL', 5):
+        flush_metrics()
+
+
+def _merge_into(target: Dict[str, Dict[Tuple[str, ...], object]], data: Dict[str, List]):
+    for name, entries in data.items():
+        metric = _registry.get(name)
+        if metric is None:
+            continue
+        values = target.setdefault(name, {})
+        for key, value in entries:
+            key = tuple(key)
+            if isinstance(metric, Histogram):
+                state = values.get(key)
+                if state is None or len(state) != len(value):
+                    values[key] = list(value)
+                else:
+                    values[key] = [a + b for a, b in zip(state, value)]
+            else:
+                values[key] = values.get(key, 0.0) + value
+
+
+def _collect_multiproc(directory: str) -> Dict[str, Dict[Tuple[str, ...], object]]:
+    """合并所有进程的指标文件；已退出进程的文件并入 archive.json 后删除"""
+    os.makedirs(directory, exist_ok=True)
+    merged: Dict[str, Dict[Tuple[str, ...], object]] = {}
+    with portalocker.Lock(os.path.join(directory, '.lock'), timeout=10):
+        archive_path = os.path.join(directory, _ARCHIVE_FILE)
+        archive: Dict[str, Dict[Tuple[str, ...], object]] = {}
+        _merge_into(archive, _read_json(archive_path))
+        dead_files = []
+        for filename in os.listdir(directory):
+            pid = filename[:-len('.json')]
+            if not filename.endswith('.json') or not pid.isdigit():
+                continue
+            path = os.path.join(directory, filename)
+            if int(pid) != os.getpid() and not psutil.pid_exists(int(pid)):
+                _merge_into(archive, _read_json(path))
+                dead_files.append(path)
+            else:
+                _merge_into(merged, _read_json(path))
+        if dead_files:
+            _write_json(archive_path, {name: [[list(key), value] for key, value in values.items()]
+                                       for name, values in archive.items()})
+            for path in dead_files:
+                os.remove(path)
+    for name, values in archive.items():
+        _merge_into(merged, {name: [[list(key), value] for key, value in values.items()]})
+    return merged
+
+
+def reset_multiproc_dir():
+    """服务启动时清空多进程目录，丢弃上次运行（pid 可能已被复用）遗留的文件"""
+    directory = _multiproc_dir()
+    if not directory or not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        if filename.endswith('.json') or filename.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(directory, filename))
+            except OSError:
+                pass
+
+
+def _reset_after_fork():
+    global _last_flush
+    for metric in _registry.values():
+        metric._values.clear()
+    _last_flush = 0.0
+
+
+def reset_metrics():
+    """清空本进程内的全部观测值（供测试使用）"""
+    with _lock:
+        _reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    # 子进程继承的观测值仍计在父进程名下，子进程从零开始累计；_lock 可能在 fork 时被其他线程持有，重新创建
+    def _after_fork_in_child():
+        global _lock
+        _lock = threading.Lock()
+        _reset_after_fork()
+
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+atexit.register(flush_metrics)
+
+
+# ---------------------------------------------------------------- 渲染
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return f"{int(value)}.0" if abs(value) < 1e15 else repr(float(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def render_metrics() -> str:
+    """渲染 Prometheus 文本格式（多进程模式下合并所有进程的累计值）"""
+    directory = _multiproc_dir()
+    if directory:
+        flush_metrics()
+        try:
+            values_by_metric = _collect_multiproc(directory)
+        except (OSError, portalocker.LockException) as e:
+            logger.warning(f"⚠️ 合并多进程指标失败，仅输出本进程指标: {e}")
+            values_by_metric = None
+    else:
+        values_by_metric = None
+    if values_by_metric is None:
+        with _lock:
+            values_by_metric = {name: {key: value if isinstance(value, float) else list(value)
+                                       for key, value in metric._values.items()}
+                                for name, metric in _registry.items()}
+
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.type}")
+        for sample_name, labelnames, key, value in metric._samples(values_by_metric.get(name, {})):
+            lines.append(f"{sample_name}{_format_labels(labelnames, key)} {_format_value(value)}")
+    for name, documentation, labelnames, callback in _gauge_callbacks:
+        try:
+            values = callback()
+        except Exception as e:
+            logger.warning(f"⚠️ 计算指标 {name} 失败: {e}")
+            continue
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        for key, value in values.items():
+            lines.append(f"{name}{_format_labels(labelnames, tuple(str(v) for v in key))} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+MR/PR 审查防抖与取代机制
+同一个 MR（或 GitHub PR）短时间内连续推送时，只审查最新的 head SHA：
+
+- 防抖：update/synchronize 事件在接收端延迟 MR_DEBOUNCE_SECONDS 秒入队，窗口内的新事件替换旧事件；
+  每个 MR 当前等待入队的事件记录在 SQLite 中，gunicorn 多个 HTTP 工作进程分别接收到同一 MR 的事件时，
+  只有最后接收的事件到期入队，其余进程的事件到期时发现已被替换而放弃
+- 取代：接收事件时记录每个 MR 的最新 head SHA；排队中的旧 head 任务开始执行时直接丢弃，
+  进行中的旧 head 审查在发布评论前取消
+- 统计：记录防抖合并、丢弃排队、取消进行中的次数（即节省的审查次数）
+
+最新 head 记录在 SQLite 中，保证 API 进程与各工作进程之间可见。
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+from biz.utils.log import logger
+
+# 统计项
+STAT_DEBOUNCED = 'debounced'
+STAT_DROPPED_QUEUED = 'dropped_queued'
+STAT_CANCELLED_IN_FLIGHT = 'cancelled_in_flight'
+
+
+def gitlab_mr_key(url_slug: str, project_id, mr_iid) -> str:
+    return f"gitlab:{url_slug}:{project_id}:{mr_iid}"
+
+
+def github_pr_key(repo_full_name: str, pr_number) -> str:
+    return f"github:{repo_full_name}:{pr_number}"
+
+
+class MergeRequestSupersession:
+    """MR 最新 head 记录与取代判断"""
+
+    DB_FILE = "data/data.db"
+
+    @staticmethod
+    def init_db():
+        """初始化 MR head 记录表与统计表"""
+        try:
+            with sqlite3.connect(MergeRequestSupersession.DB_FILE) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS mr_review_heads (
+                        mr_key TEXT PRIMARY KEY,
+                        head_sha TEXT NOT NULL,
+                        updated_at INTEGER NOT NULL
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS mr_supersession_stats (
+                        name TEXT PRIMARY KEY,
+                        value INTEGER NOT NULL DEFAULT 0
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS mr_debounce_pending (
+                        mr_key TEXT PRIMARY KEY,
+                        token TEXT NOT NULL,
+                        due_at REAL NOT NULL
+                    )
+                ''')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"MR取代记录表初始化失败: {e}")
+
+    @staticmethod
+    def register_head(mr_key: str, head_sha: str):
+        """记录 MR 的最新 head SHA（在接收 webhook 时调用）"""
+        if not mr_key or not head_sha:
+            return
+        try:
+            with sqlite3.connect(MergeRequestSupersession.DB_FILE) as conn:
+                conn.execute('''
+                    INSERT INTO mr_review_heads (mr_key, head_sha, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(mr_key) DO UPDATE SET head_sha = excluded.head_sha, updated_at = excluded.updated_at
+                ''', (mr_key, head_sha, int(time.time())))
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"记录MR最新head失败: {e}")
+
+    @staticmethod
+    def get_latest_head(mr_key: str) -> Optional[str]:
+        try:
+            with sqlite3.connect(MergeRequestSupersession.DB_FILE) as conn:
+                row = conn.execute('SELECT head_sha FROM mr_review_heads WHERE mr_key = ?',
+                                   (mr_key,)).fetchone()
+                return row[0] if row else None
+        except sqlite3.DatabaseError as e:
+            logger.error(f"查询MR最新head失败: {e}")
+            return None
+
+    @staticmethod
+    def is_superseded(mr_key: str, head_sha: str) -> bool:
+        """当前任务的 head 是否已被更新的推送取代"""
+        if not mr_key or not head_sha:
+            return False
+        latest = MergeRequestSupersession.get_latest_head(mr_key)
+        return bool(latest) and latest != head_sha
+
+    @staticmethod
+    def incr_stat(name: str, amount: int = 1):
+        try:
+            with sqlite3.connect(MergeRequestSupersession.DB_FILE) as conn:
+                conn.execute('''
+                    INSERT INTO mr_supersession_stats (name, value) VALUES (?, ?)
+                    ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+                ''', (name, amount))
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"更新MR取代统计失败: {e}")
+
+    @staticmethod
+    def get_stats() -> Dict[str, int]:
+        """获取统计：防抖合并、丢弃排队、取消进行中的次数及节省的审查总数"""
+        stats = {STAT_DEBOUNCED: 0, STAT_DROPPED_QUEUED: 0, STAT_CANCELLED_IN_FLIGHT: 0}
+        try:
+            with sqlite3.connect(MergeRequestSupersession.DB_FILE) as conn:
+                for name, value in conn.execute('SELECT name, value FROM mr_supersession_stats'):
+                    stats[name] = value
+        except sqlite3.DatabaseError as e:
+            logger.error(f"查询MR取代统计失败: {e}")
+        stats['reviews_saved'] = sum(stats[k] for k in (STAT_DEBOUNCED, STAT_DROPPED_QUEUED, STAT_CANCELLED_IN_FLIGHT))
+        return stats
+
+    @staticmethod
+    def claim_debounce(mr_key: str, token: str, due_at: float, stale_before: float = 0) -> Optional[str]:
+        """
+        登记 MR 当前等待入队的防抖事件，返回被替换的事件标识（没有等待中的事件时返回 None）
+        :param stale_before: 到期时间早于该时间的登记视为进程崩溃 / 被杀遗留的记录，直接覆盖，不算作替换
+        """
+        try:
+            with sqlite3.connect(MergeRequestSupersession.DB_FILE, timeout=10) as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute('SELECT token FROM mr_debounce_pending WHERE mr_key = ? AND due_at >= ?',
+                                   (mr_key, stale_before)).fetchone()
+                conn.execute('''
+                    INSERT INTO mr_debounce_pending (mr_key, token, due_at) VALUES (?, ?, ?)
+                    ON CONFLICT(mr_key) DO UPDATE SET token = excluded.token, due_at = excluded.due_at
+                ''', (mr_key, token, due_at))
+                conn.commit()
+                return row[0] if row else None
+        except sqlite3.DatabaseError as e:
+            logger.error(f"登记MR防抖事件失败: {e}")
+            return None
+
+    @staticmethod
+    def owns_debounce(mr_key: str, token: str) -> bool:
+        """防抖事件是否仍是该 MR 最新的等待事件（查询失败时按未被替换处理，避免丢事件）"""
+        try:
+            with sqlite3.connect(MergeRequestSupersession.DB_FILE, timeout=10) as conn:
+                row = conn.execute('SELECT token FROM mr_debounce_pending WHERE mr_key = ?', (mr_key,)).fetchone()
+                return row is None or row[0] == token
+        except sqlite3.DatabaseError as e:
+            logger.error(f"查询MR防抖事件失败: {e}")
+            return True
+
+    @staticmethod
+    def release_debounce(mr_key: str, token: str):
+        """防抖事件已入队（或放弃）后删除登记；已被新事件替换时不删除"""
+        try:
+            with sqlite3.connect(MergeRequestSupersession.DB_FILE, timeout=10) as conn:
+                conn.execute('DELETE FROM mr_debounce_pending WHERE mr_key = ? AND token = ?', (mr_key, token))
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"删除MR防抖事件失败: {e}")
+
+    @staticmethod
+    def check_superseded(mr_key: str, head_sha: str, stat_name: str) -> bool:
+        """判断是否已被取代，是则记录统计并返回 True"""
+        if MergeRequestSupersession.is_superseded(mr_key, head_sha):
+            latest = MergeRequestSupersession.get_latest_head(mr_key)
+            logger.info(f"⏭️ MR {mr_key} 的 head {head_sha[:8]} 已被 {latest[:8]} 取代，跳过（{stat_name}）")
+            MergeRequestSupersession.incr_stat(stat_name)
+            return True
+        return False
+
+
+class MergeRequestDebouncer:
+    """
+    接收端防抖：同一 MR 在窗口期内的多次事件只入队最后一次。
+    定时器在接收事件的进程内，是否已被替换以 SQLite 中的登记为准（跨 HTTP 工作进程生效）
+    """
+
+    # 防抖到期后入队失败（队列已满）的重试间隔（秒）；重试用尽后事件保持 received 留在收件箱中，由启动恢复重新入队
+    RETRY_DELAYS = (5, 15, 45)
+    # 登记到期并用尽重试后仍未删除的时间余量（秒），超过即视为遗留记录
+    STALE_GRACE = 60
+
+    def __init__(self):
+        self._timers: Dict[str, threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, mr_key: str, delay: float, submit_func: Callable[[], bool],
+               token: Optional[str] = None) -> Optional[str]:
+        """
+        延迟 delay 秒后调用 submit_func；窗口期内同一 mr_key 的新事件（包括其他进程接收的）会替换旧事件
+        :param token: 事件标识（默认随机生成）
+        :return: 被替换的事件标识，没有被替换的事件时返回 None
+        """
+        token = token or uuid.uuid4().hex
+        with self._lock:
+            now = time.time()
+            replaced = MergeRequestSupersession.claim_debounce(
+                mr_key, token, now + delay, stale_before=now - sum(self.RETRY_DELAYS) - self.STALE_GRACE)
+            previous = self._timers.pop(mr_key, None)
+            if previous is not None:
+                previous.cancel()
+                replaced = replaced or previous.args[1]
+            if replaced:
+                MergeRequestSupersession.incr_stat(STAT_DEBOUNCED)
+                logger.info(f"⏳ MR {mr_key} 在防抖窗口内收到新事件，合并为一次审查")
+            self._schedule(mr_key, token, delay, submit_func, 0)
+        return replaced
+
+    def _schedule(self, mr_key: str, token: str, delay: float, submit_func: Callable[[], bool], attempt: int):
+        """调用方需持有 self._lock"""
+        timer = threading.Timer(delay, self._fire, args=(mr_key, token, submit_func, attempt))
+        timer.daemon = True
+        self._timers[mr_key] = timer
+        timer.start()
+
+    def _fire(self, mr_key: str, token: str, submit_func: Callable[[], bool], attempt: int):
+        with self._lock:
+            if self._timers.get(mr_key) is not threading.current_thread():
+                return
+            self._timers.pop(mr_key, None)
+        if not MergeRequestSupersession.owns_debounce(mr_key, token):
+            logger.info(f"⏭️ MR {mr_key} 的防抖事件已被其他进程接收的新事件替换，不再入队")
+            return
+        if submit_func():
+            MergeRequestSupersession.release_debounce(mr_key, token)
+            return
+        with self._lock:
+            # 重试期间收到了新事件：旧事件已被替换，不再重试
+            if mr_key in self._timers:
+                return
+            if attempt < len(self.RETRY_DELAYS):
+                retry_delay = self.RETRY_DELAYS[attempt]
+                logger.warning(f"⚠️ MR {mr_key} 防抖到期后入队失败（队列已满），{retry_delay} 秒后重试")
+                self._schedule(mr_key, token, retry_delay, submit_func, attempt + 1)
+                return
+        MergeRequestSupersession.release_debounce(mr_key, token)
+        logger.error(f"❌ MR {mr_key} 防抖到期后多次入队失败（队列已满），事件保留在收件箱中，重启后恢复")
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._timers)
+
+    def flush(self):
+        """立即提交本进程所有等待中（含等待重试）且未被替换的事件（服务关闭时调用）"""
+        with self._lock:
+            pending = list(self._timers.items())
+            self._timers.clear()
+        for mr_key, timer in pending:
+            timer.cancel()
+            token, submit_func = timer.args[1], timer.args[2]
+            if not MergeRequestSupersession.owns_debounce(mr_key, token):
+                continue
+            # 入队失败时事件由收件箱的启动恢复负责，同样删除登记，避免下一个事件被误计为防抖合并
+            if not submit_func():
+                logger.warning(f"⚠️ MR {mr_key} 关闭前入队失败（队列已满），事件保留在收件箱中，重启后恢复")
+            MergeRequestSupersession.release_debounce(mr_key, token)
+
+
+# 全局防抖器（每个 API / HTTP 工作进程一个，通过 SQLite 中的登记协调）
+mr_debouncer = MergeRequestDebouncer()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+提示词模板注册表
+进程内只解析一次 conf/prompt_templates.yml（缺少的 key 从 conf_templates/prompt_templates.yml 兜底），
+按 (prompt_key, style) 缓存 Jinja2 渲染后的提示词。
+
+每次事件构造 CodeReviewer / BatchCodeReviewer / AgenticCodeReviewer / ExcelReviewer 时
+不再重新读取、YAML 解析整个文件并编译模板；仅在文件 mtime 变化或
+reload_config / ConfigReloader 主动失效时重新加载。
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import yaml
+from jinja2 import Template
+
+from biz.utils.log import logger
+
+PROMPT_TEMPLATES_FILE = "conf/prompt_templates.yml"
+PROMPT_TEMPLATES_DIST_FILE = "conf_templates/prompt_templates.yml"
+
+# 两次检查文件 mtime 的最小间隔（秒），避免每次构造审查器都 stat
+MTIME_CHECK_INTERVAL = 1.0
+
+_lock = threading.Lock()
+_configs: Dict[str, Any] = {}
+_rendered: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_mtimes: Optional[Tuple[float, float]] = None
+_last_check = 0.0
+
+
+def _file_mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+def _load_yaml(path: str) -> Any:
+    """解析并缓存单个模板文件（文件不存在时抛出 FileNotFoundError，与直接 open 行为一致）"""
+    if path not in _configs:
+        # 显式指定编码为 UTF-8，避免使用系统默认的 GBK 编码。
+        with open(path, "r", encoding="utf-8") as file:
+            _configs[path] = yaml.safe_load(file)
+    return _configs[path]
+
+
+def _check_mtimes():
+    """模板文件有变化时清空全部缓存（调用方需持有 _lock）"""
+    global _mtimes, _last_check
+    now = time.monotonic()
+    if _mtimes is not None and now - _last_check < MTIME_CHECK_INTERVAL:
+        return
+    mtimes = (_file_mtime(PROMPT_TEMPLATES_FILE), _file_mtime(PROMPT_TEMPLATES_DIST_FILE))
+    if mtimes != _mtimes:
+        if _mtimes is not None:
+            logger.info("🔄 提示词模板文件已变化，重新加载")
+        _configs.clear()
+        _rendered.clear()
+        _mtimes = mtimes
+    _last_check = now
+
+
+def _render_prompts(prompt_key: str, style: str) -> Dict[str, Any]:
+    full_config = _load_yaml(PROMPT_TEMPLATES_FILE)
+    if not isinstance(full_config, dict):
+        raise ValueError(f"配置文件格式错误，期望YAML字典，实际: {type(full_config).__name__}")
+
+    prompts = full_config.get(prompt_key)
+    if prompts is None:
+        # 尝试从模板文件兜底
+        if os.path.exists(PROMPT_TEMPLATES_DIST_FILE):
+            tmpl_config = _load_yaml(PROMPT_TEMPLATES_DIST_FILE)
+            if isinstance(tmpl_config, dict) and prompt_key in tmpl_config:
+                prompts = tmpl_config[prompt_key]
+                logger.info(f"'{prompt_key}' 从模板文件 {PROMPT_TEMPLATES_DIST_FILE} 自动加载（当前配置文件缺少此 key）")
+        if prompts is None:
+            raise KeyError(f"配置文件中未找到 '{prompt_key}'，可用的key: {list(full_config.keys())}")
+
+    if not isinstance(prompts, dict):
+        raise ValueError(f"'{prompt_key}' 的值不是字典，实际: {type(prompts).__name__}")
+
+    if 'system_prompt' not in prompts:
+        raise KeyError(f"'{prompt_key}' 缺少 system_prompt 字段")
+    if 'user_prompt' not in prompts:
+        raise KeyError(f"'{prompt_key}' 缺少 user_prompt 字段")
+
+    # 使用Jinja2渲染模板
+    return {
+        "system_message": {"role": "system", "content": Template(prompts["system_prompt"]).render(style=style)},
+        "user_message": {"role": "user", "content": Template(prompts["user_prompt"]).render(style=style)},
+    }
+
+
+def get_prompts(prompt_key: str, style: str = "professional") -> Dict[str, Any]:
+    """
+    获取渲染后的提示词 {"system_message": ..., "user_message": ...}。
+    返回的是缓存的副本，调用方修改不会影响缓存；加载失败的结果不缓存，异常原样抛出。
+    """
+    key = (prompt_key, style)
+    with _lock:
+        _check_mtimes()
+        prompts = _rendered.get(key)
+        if prompts is None:
+            prompts = _render_prompts(prompt_key, style)
+            _rendered[key] = prompts
+    return {name: dict(message) for name, message in prompts.items()}
+
+
+def invalidate_prompt_cache():
+    """清空提示词缓存（供 reload_config / ConfigReloader / 提示词保存后调用）"""
+    global _mtimes
+    with _lock:
+        _configs.clear()
+        _rendered.clear()
+        _mtimes = None
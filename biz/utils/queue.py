@@ -1,19 +1,107 @@
 import os
-from multiprocessing import Process
+import threading
 
 from redis import Redis
-from rq import Queue
+from rq import Queue, Worker
+from rq.utils import now
 
 from biz.utils.log import logger
 from biz.utils.default_config import get_env_with_default, get_env_int
+from biz.utils.metrics import QUEUE_REJECTED, QUEUE_WAIT_SECONDS, flush_metrics, register_gauge_callback
+from biz.utils.worker_pool import WorkerPool
 
 queue_driver = get_env_with_default('QUEUE_DRIVER')
 
 if queue_driver == 'rq':
     queues = {}
 
+# 非 rq 模式下使用的常驻工作进程池（首次使用时创建）
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
 
-def handle_queue(function: callable, *args, **kwargs):
+
+def get_worker_pool(start: bool = True) -> WorkerPool:
+    global _worker_pool
+    if _worker_pool is None:
+        with _worker_pool_lock:
+            if _worker_pool is None:
+                pool = WorkerPool(
+                    size=get_env_int('QUEUE_WORKERS', 4),
+                    max_queue_size=get_env_int('QUEUE_MAX_SIZE', 100),
+                    submit_timeout=get_env_int('QUEUE_SUBMIT_TIMEOUT', 5),
+                )
+                if start:
+                    pool.start()
+                _worker_pool = pool
+    return _worker_pool
+
+
+def prepare_queue_workers():
+    """
+    只创建任务队列与共享计数器，不启动工作进程。
+    gunicorn 主进程在 fork HTTP 工作进程之前调用，使各 HTTP 工作进程向同一个队列提交任务，
+    由负责后台服务的进程调用 start_queue_workers() 拉起工作进程
+    """
+    if queue_driver != 'rq':
+        get_worker_pool(start=False)
+
+
+def start_queue_workers():
+    """启动工作进程池，当前进程成为管理进程（工作进程由 forkserver 派生，可以在多线程的进程中调用）"""
+    if queue_driver != 'rq':
+        get_worker_pool(start=False).start()
+
+
+def get_queue_metrics() -> dict:
+    """获取队列指标：队列深度、忙碌进程数、拒绝数等"""
+    if queue_driver == 'rq':
+        return {name: len(q) for name, q in queues.items()}
+    if _worker_pool is None:
+        return {}
+    return _worker_pool.metrics()
+
+
+def _queue_gauges(*names):
+    """把 get_queue_metrics() 中的指定字段转换为按队列名区分的瞬时值"""
+    def collect():
+        metrics = get_queue_metrics()
+        if queue_driver == 'rq':
+            return {(name,): depth for name, depth in metrics.items()} if 'queue_depth' in names else {}
+        return {('pool',): metrics[name] for name in names if name in metrics}
+    return collect
+
+
+register_gauge_callback('queue_depth', '队列中等待执行的任务数', ('queue',), _queue_gauges('queue_depth'))
+register_gauge_callback('queue_busy_workers', '正在执行任务的工作进程数', ('queue',), _queue_gauges('busy'))
+
+
+class QueueWorker(Worker):
+    """记录任务排队等待时间的 rq Worker；work horse 子进程执行完任务后写出指标"""
+
+    def perform_job(self, job, queue):
+        if job.enqueued_at is not None:
+            current = now() if job.enqueued_at.tzinfo else now().replace(tzinfo=None)
+            QUEUE_WAIT_SECONDS.observe(max(0.0, (current - job.enqueued_at).total_seconds()), driver='rq')
+        try:
+            return super().perform_job(job, queue)
+        finally:
+            flush_metrics()
+
+
+def shutdown_queue(timeout: float = 10):
+    """关闭工作进程池"""
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is not None:
+            _worker_pool.shutdown(timeout=timeout)
+            _worker_pool = None
+
+
+def handle_queue(function: callable, *args, **kwargs) -> bool:
+    """
+    异步执行任务
+    :return: 任务是否已被接收；非 rq 模式下队列已满时返回 False
+    """
     if queue_driver == 'rq':
         # For git-related events, url_slug is the 4th positional argument.
         # For other events like SVN, use a default queue.
@@ -28,6 +116,9 @@ def handle_queue(function: callable, *args, **kwargs):
             queues[queue_name] = Queue(queue_name, connection=Redis(redis_host, redis_port))
 
         queues[queue_name].enqueue(function, *args, **kwargs)
+        return True
     else:
-        process = Process(target=function, args=args, kwargs=kwargs)
-        process.start()
+        accepted = get_worker_pool().submit(function, *args, **kwargs)
+        if not accepted:
+            QUEUE_REJECTED.inc(driver='pool')
+        return accepted
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+文件级审查结果缓存
+以"规范化后的单文件 diff + 文件路径 + 提示词/模型版本"的哈希为键，缓存每个文件的审查意见。
+rebase / cherry-pick 会改变 commit id，但大部分文件 diff 内容不变，命中缓存的文件无需再次送审。
+"""
+
+import hashlib
+import re
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from biz.utils.log import logger
+from biz.utils.metrics import DB_WRITE_SECONDS
+
+# hunk 头中的行号会因 rebase 产生偏移，规范化时去掉，只保留函数上下文
+_HUNK_HEADER_RE = re.compile(r'^@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@')
+# 审查报告中的分文件标题：### 📄 文件路径
+_FILE_HEADING_RE = re.compile(r'^#{2,4}\s*📄\s*(.+?)\s*$')
+# 分文件段落结束：下一个同级及以上标题，或"3. **本批评分**"这类编号段落
+_SECTION_END_RE = re.compile(r'^(#{1,3}\s|\d+\.\s*\*\*)')
+# 分文件段落中的单文件评分：文件评分: XX分（兼容 markdown 加粗/反引号包裹）
+FILE_SCORE_RE = re.compile(r'文件评分[:：]\s*[*`]{0,2}\s*(\d+)\s*[*`]{0,2}\s*分?')
+
+
+def normalize_diff(diff: str) -> str:
+    """规范化 diff：去掉 hunk 行号、index 行与行尾空白"""
+    lines = []
+    for line in (diff or '').splitlines():
+        if line.startswith('index '):
+            continue
+        line = _HUNK_HEADER_RE.sub('@@', line)
+        lines.append(line.rstrip())
+    return '\n'.join(lines).strip()
+
+
+def build_cache_key(file_path: str, diff: str, review_version: str) -> str:
+    content = f"{review_version}\n{file_path}\n{normalize_diff(diff)}"
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def build_review_version(*parts: str) -> str:
+    """根据提示词内容与模型信息计算审查版本，任一变化都会使缓存失效"""
+    return hashlib.sha256('\n'.join(p or '' for p in parts).encode('utf-8')).hexdigest()[:16]
+
+
+def extract_file_sections(review_text: str, file_paths: Iterable[str]) -> Dict[str, str]:
+    """从审查报告中按 `### 📄 文件路径` 标题提取每个文件的审查意见"""
+    sections = {}
+    current_heading = None
+    current_lines = []
+
+    def _flush():
+        if current_heading is not None:
+            sections[current_heading] = '\n'.join(current_lines).strip()
+
+    for line in (review_text or '').splitlines():
+        match = _FILE_HEADING_RE.match(line.strip())
+        if match:
+            _flush()
+            current_heading = match.group(1).strip('`* ')
+            current_lines = [line.strip()]
+        elif current_heading is not None and _SECTION_END_RE.match(line.strip()):
+            _flush()
+            current_heading = None
+            current_lines = []
+        elif current_heading is not None:
+            current_lines.append(line)
+    _flush()
+
+    paths = list(dict.fromkeys(file_paths))
+    result = {}
+    for path in paths:
+        if path in sections:
+            result[path] = sections[path]
+            continue
+        # 标题只写了部分路径（或多写了前缀）时按 / 边界做后缀匹配，且必须与本批唯一一个文件对应，
+        # 否则可能把一个文件的审查意见缓存到另一个文件名下，宁可不缓存
+        candidates = [heading for heading in sections if _suffix_match(heading, path)]
+        if len(candidates) != 1:
+            continue
+        if sum(1 for other in paths if _suffix_match(candidates[0], other)) == 1:
+            result[path] = sections[candidates[0]]
+    return result
+
+
+def _suffix_match(heading: str, path: str) -> bool:
+    heading = heading.replace('\\', '/')
+    heading = heading[2:] if heading.startswith('./') else heading.lstrip('/')
+    path = path.replace('\\', '/')
+    return heading == path or path.endswith('/' + heading) or heading.endswith('/' + path)
+
+
+def parse_file_score(section: str) -> Optional[int]:
+    """解析分文件段落中的"文件评分: XX分"，解析不到返回 None"""
+    match = FILE_SCORE_RE.search(section or '')
+    if not match:
+        return None
+    score = int(match.group(1))
+    return score if 0 <= score <= 100 else None
+
+
+class FileReviewCache:
+    """文件级审查结果缓存（SQLite）"""
+
+    DB_FILE = "data/data.db"
+
+    @staticmethod
+    def init_db():
+        """初始化文件审查缓存表"""
+        try:
+            with sqlite3.connect(FileReviewCache.DB_FILE) as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS file_review_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        file_path TEXT,
+                        findings TEXT NOT NULL,
+                        score INTEGER,
+                        created_at INTEGER NOT NULL,
+                        hit_count INTEGER DEFAULT 0
+                    )
+                ''')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"文件审查缓存表初始化失败: {e}")
+
+    @staticmethod
+    def get_many(cache_keys: List[str], ttl_days: int = 30) -> Dict[str, Tuple[str, int]]:
+        """批量查询缓存，返回 {cache_key: (findings, score)}"""
+        if not cache_keys:
+            return {}
+        min_created_at = int(time.time()) - ttl_days * 86400 if ttl_days > 0 else 0
+        try:
+            with sqlite3.connect(FileReviewCache.DB_FILE) as conn:
+                placeholders = ','.join('?' * len(cache_keys))
+                rows = conn.execute(
+                    f'SELECT cache_key, findings, score FROM file_review_cache '
+                    f'WHERE cache_key IN ({placeholders}) AND created_at >= ?',
+                    (*cache_keys, min_created_at)).fetchall()
+                if rows:
+                    conn.execute(
+                        f'UPDATE file_review_cache SET hit_count = hit_count + 1 '
+                        f'WHERE cache_key IN ({",".join("?" * len(rows))})',
+                        [row[0] for row in rows])
+                    conn.commit()
+                return {row[0]: (row[1], row[2]) for row in rows}
+        except sqlite3.DatabaseError as e:
+            logger.error(f"查询文件审查缓存失败: {e}")
+            return {}
+
+    @staticmethod
+    @DB_WRITE_SECONDS.time(operation='file_review_cache')
+    def put_many(entries: List[Tuple[str, str, str, int]]):
+        """批量写入缓存，entries 为 (cache_key, file_path, findings, score)"""
+        if not entries:
+            return
+        now = int(time.time())
+        try:
+            with sqlite3.connect(FileReviewCache.DB_FILE) as conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO file_review_cache (cache_key, file_path, findings, score, created_at, hit_count)
+                    VALUES (?, ?, ?, ?, ?, 0)
+                ''', [(key, path, findings, score, now) for key, path, findings, score in entries])
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"写入文件审查缓存失败: {e}")
+
+    @staticmethod
+    def cleanup(ttl_days: int = 30) -> int:
+        """清理过期缓存，返回删除条数"""
+        try:
+            with sqlite3.connect(FileReviewCache.DB_FILE) as conn:
+                cursor = conn.execute('DELETE FROM file_review_cache WHERE created_at < ?',
+                                      (int(time.time()) - ttl_days * 86400,))
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.DatabaseError as e:
+            logger.error(f"清理文件审查缓存失败: {e}")
+            return 0
@@ -11,6 +11,8 @@ import logging
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from biz.utils.metrics import DB_WRITE_SECONDS
+
 # 获取日志器
 logger = logging.getLogger(__name__)
 
@@ -85,6 +87,7 @@ class SVNCheckpointManager:
             return int(time.time() - 24 * 3600)
     
     @staticmethod
+    @DB_WRITE_SECONDS.time(operation='svn_checkpoint')
     def update_checkpoint(repo_name: str, last_revision: str = None):
         """
         更新仓库的检查点
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/agentic_reviewer.py 上下文预取的单元测试。
+
+覆盖：
+1. 从 diff 变更行提取函数/类等符号，签名被修改的优先，忽略上下文行与测试函数
+2. 预取结果在 token 预算内附加到首轮提示词：检索结果优先，超出预算的文件跳过，错误结果不附加
+3. 模型需要的内容已预取时无需工具调用轮次；模型仍请求相同内容时命中审查内缓存
+4. 预取失败或预算为 0 时按原方式由模型自行调用工具
+"""
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils.agentic_reviewer import AgenticCodeReviewer, extract_changed_symbols
+from biz.utils.tool_runner import ToolCallRunner
+
+DIFF_TEXT = (
+    "==== 文件: src/service.py (status: modified) ====\n"
+    "@@ -1,4 +1,4 @@\n"
+    "-def handle_event(payload):\n"
+    "+def handle_event(payload, retry):\n"
+    "-    def legacy_hook(self):\n"
+    "+class EventRouter(Base):\n"
+    "+    def test_router(self):\n"
+    " def untouched_helper():\n"
+    "\n"
+    "==== 文件: src/huge.py ====\n"
+    "+x = 1\n"
+    "\n"
+    "==== 文件: src/deleted.py (status: deleted) ====\n"
+    "-y = 2"
+)
+
+
+class FakeClient:
+    """首轮提示词中没有 src/service.py 的完整内容时请求 read_file，否则直接给出结论"""
+    supports_tools = True
+
+    def __init__(self):
+        self.prompts = []
+
+    def completions_with_tools(self, messages, tools):
+        self.prompts.append(messages[1]["content"])
+        if len(self.prompts) == 1 and "#### read_file: src/service.py" not in messages[1]["content"]:
+            call = {"id": "call-1", "name": "read_file", "arguments": {"file_path": "src/service.py"}}
+            return {"tool_calls": [call], "assistant_message": {"role": "assistant", "content": ""}}
+        return {"content": "总分: 90分"}
+
+
+class TestAgenticPrefetch(TestCase):
+    def setUp(self):
+        self.calls = []
+        # 避免 tiktoken 联网下载编码文件
+        self.token_patch = patch('biz.utils.agentic_reviewer.count_tokens', side_effect=len)
+        self.token_patch.start()
+
+    def tearDown(self):
+        self.token_patch.stop()
+
+    def _read_file(self, file_path):
+        self.calls.append(("read_file", file_path))
+        if file_path == "src/deleted.py":
+            return "错误: 无法获取文件 'src/deleted.py'"
+        if file_path == "src/huge.py":
+            return "z" * 500
+        return "def handle_event(payload, retry):\n    return retry\n"
+
+    def _search_code(self, query, max_results=20):
+        self.calls.append(("search_code", query))
+        return f"src/caller.py:10: {query}(data)"
+
+    def _make_reviewer(self, budget):
+        reviewer = AgenticCodeReviewer.__new__(AgenticCodeReviewer)
+        reviewer.client = FakeClient()
+        reviewer.prompts = {
+            "system_message": {"role": "system", "content": "system"},
+            "user_message": {"role": "user", "content": "{commits_text}\n{diffs_text}"},
+        }
+        reviewer.tool_context = {"read_file": self._read_file, "search_code": self._search_code}
+        reviewer.max_tool_rounds = 5
+        reviewer.tool_runner = ToolCallRunner(reviewer._dispatch_tool)
+        reviewer.prefetch_token_budget = budget
+        return reviewer
+
+    def test_extract_changed_symbols(self):
+        self.assertEqual(extract_changed_symbols(DIFF_TEXT), ["handle_event", "legacy_hook", "EventRouter"])
+        self.assertEqual(extract_changed_symbols(DIFF_TEXT, limit=1), ["handle_event"])
+
+    def test_prefetch_within_budget(self):
+        reviewer = self._make_reviewer(300)
+        self.assertEqual(reviewer._run_native_tools_loop(DIFF_TEXT, "commit"), "总分: 90分")
+        prompt = reviewer.client.prompts[0]
+        self.assertIn("#### search_code: handle_event\nsrc/caller.py:10: handle_event(data)", prompt)
+        self.assertIn("#### read_file: src/service.py", prompt)
+        self.assertNotIn("#### read_file: src/huge.py", prompt)
+        self.assertNotIn("src/deleted.py'", prompt)
+        self.assertLess(prompt.index("#### search_code"), prompt.index("#### read_file"))
+        self.assertEqual(reviewer.tool_runner.tool_rounds, 0)
+
+        # 模型仍请求已预取的文件：命中缓存，不再执行
+        executed = len(self.calls)
+        reviewer.client = FakeClient()
+        reviewer.prefetch_token_budget = 0
+        reviewer._run_native_tools_loop(DIFF_TEXT, "commit")
+        self.assertEqual(len(self.calls), executed)
+        self.assertEqual(reviewer.tool_runner.tool_rounds, 1)
+
+    def test_prefetch_disabled_or_failed(self):
+        reviewer = self._make_reviewer(0)
+        reviewer._run_native_tools_loop(DIFF_TEXT, "commit")
+        self.assertEqual(self.calls, [("read_file", "src/service.py")])
+        self.assertEqual(reviewer.tool_runner.tool_rounds, 1)
+
+        reviewer = self._make_reviewer(300)
+        with patch.object(AgenticCodeReviewer, '_prefetch_context', side_effect=RuntimeError("boom")):
+            self.assertEqual(reviewer._run_native_tools_loop(DIFF_TEXT, "commit"), "总分: 90分")
+        self.assertEqual(reviewer.tool_runner.tool_rounds, 1)
+
+
+if __name__ == '__main__':
+    main()
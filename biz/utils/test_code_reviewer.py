@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/code_reviewer.py 中分批打包与超大文件按 hunk 拆分审查的单元测试。
+
+覆盖：
+1. 超预算的单文件 diff 按 @@ 边界拆分，每段保留文件头且不超过预算，内容不丢失
+2. 各段审查意见按文件合并为一份结果，评分按 1 个文件计权
+3. 批次较多时树形合并：分组并发预合并后再生成最终报告，评分按文件数加权
+4. 多文件按 First-Fit-Decreasing 装箱，每批不超过预算且每个文件恰好出现一次
+5. 超过预算的文件走 hunk 拆分 / 截断路径，不与其他文件同批
+6. 同目录文件、测试文件与对应源文件按局部性分组，分组不超过预算时落在同一批
+"""
+import os
+from unittest import TestCase, main
+from unittest.mock import patch, MagicMock
+
+from biz.utils.code_reviewer import BatchCodeReviewer
+
+HEADER = "diff --git a/src/big.py b/src/big.py\n--- a/src/big.py\n+++ b/src/big.py"
+
+
+def _build_diff(hunk_count: int) -> str:
+    hunks = [f"@@ -{i * 10},3 +{i * 10},3 @@ def f{i}():\n     x = {i}\n-    return x\n+    return x + {i}"
+             for i in range(hunk_count)]
+    return HEADER + "\n" + "\n".join(hunks)
+
+
+class TestHunkSplit(TestCase):
+    def setUp(self):
+        os.environ['REVIEW_BATCH_CONCURRENCY'] = '4'
+        os.environ['FILE_REVIEW_CACHE_ENABLED'] = '0'
+        # 避免 tiktoken 联网下载编码文件
+        self.token_patch = patch('biz.utils.code_reviewer.count_tokens', side_effect=len)
+        self.token_patch.start()
+        self.reviewer = BatchCodeReviewer.__new__(BatchCodeReviewer)
+        self.reviewer.client = MagicMock(default_model='test-model')
+
+    def tearDown(self):
+        os.environ.pop('REVIEW_BATCH_CONCURRENCY', None)
+        os.environ.pop('FILE_REVIEW_CACHE_ENABLED', None)
+        self.token_patch.stop()
+
+    def test_split_keeps_header_and_all_hunks(self):
+        diff = _build_diff(20)
+        batches, truncated = self.reviewer._pack_batches([{'file_path': 'src/big.py', 'diff': diff}], 500)
+        self.assertEqual(truncated, [])
+        self.assertGreater(len(batches), 1)
+        for index, batch in enumerate(batches):
+            entry = batch[0]
+            self.assertTrue(entry['diff'].startswith(HEADER))
+            self.assertLessEqual(len(entry['diff']), 500)
+            self.assertEqual(entry['_chunk'], (index + 1, len(batches)))
+            self.assertEqual('preceding_context' in entry, index > 0)
+        joined = '\n'.join(b[0]['diff'][len(HEADER) + 1:] for b in batches)
+        self.assertEqual(joined, diff[len(HEADER) + 1:])
+
+    def test_chunks_are_merged_per_file(self):
+        files = [{'file_path': 'src/big.py', 'diff': _build_diff(20)}, {'file_path': 'src/small.py', 'diff': '+y = 1'}]
+
+        def _review(diffs_text, commits_text=''):
+            if 'src/small.py' in diffs_text:
+                return "### 📄 src/small.py\n无问题\n本批评分: 90分"
+            return "### 📄 src/big.py\n- 返回值变化\n本批评分: 70分"
+
+        with patch('biz.utils.code_reviewer.get_review_input_budget', return_value=500), \
+                patch.object(self.reviewer, 'review_code', side_effect=_review) as review_code, \
+                patch.object(self.reviewer, '_merge_reviews', return_value='merged') as merge:
+            self.assertEqual(self.reviewer.review_in_batches(files), 'merged')
+        batch_results, batch_scores = merge.call_args[0][0], merge.call_args[0][1]
+        self.assertGreater(review_code.call_count, 2)
+        self.assertEqual(len(batch_results), 2)
+        self.assertEqual(sorted(batch_scores), [(70, 1), (90, 1)])
+        big = next(r for r in batch_results if 'src/big.py' in r)
+        self.assertEqual(big.count('### 📄 src/big.py'), 1)
+        self.assertIn(f'#### 第 {review_code.call_count - 1}/{review_code.call_count - 1} 段', big)
+
+    def test_tree_merge(self):
+        os.environ['REVIEW_MERGE_FANIN'] = '4'
+        self.addCleanup(os.environ.pop, 'REVIEW_MERGE_FANIN', None)
+        self.reviewer.merge_prompts = {"system_message": {"role": "system", "content": "merge"},
+                                       "user_message": {"role": "user", "content": "{batch_results}{commits_text}"}}
+        batch_results = [f"## 第 {i + 1} 批\nbatch-{i}" for i in range(10)]
+        batch_scores = [(100, 3) if i < 5 else (60, 1) for i in range(9)] + [None]
+        prompts = []
+
+        def _call_llm(messages):
+            prompts.append(messages[1]['content'])
+            return "合并后的审查报告内容，包含主要问题表格与评分明细。\n总分: 80分"
+
+        with patch('biz.utils.code_reviewer.get_review_input_budget', return_value=100000), \
+                patch.object(self.reviewer, 'call_llm', side_effect=_call_llm):
+            report = self.reviewer._merge_reviews(batch_results, batch_scores, '', 1)
+
+        # 10 个结果 → 3 组预合并（4+4+2）→ 最终合并
+        self.assertEqual(len(prompts), 4)
+        self.assertIn('第 9~10 批', ''.join(prompts[:3]))
+        self.assertIn('已逐层预合并为 3 部分', prompts[-1])
+        # (100×15 + 60×4) / 19 ≈ 91.6，失败批次不参与加权
+        self.assertIn('加权平均分: 91.6 分', prompts[-1])
+        self.assertIn('批合并结果 (评分: 100分, 12 个文件)', prompts[-1])
+        self.assertIn('batch-9', report)
+
+
+
+def _file(path: str, size: int) -> dict:
+    return {'file_path': path, 'diff': 'x' * size}
+
+
+class TestBatchPacking(TestCase):
+    def setUp(self):
+        # 避免 tiktoken 联网下载编码文件：按字符数计 token
+        self.token_patch = patch('biz.utils.code_reviewer.count_tokens', side_effect=len)
+        self.token_patch.start()
+        self.truncate_patch = patch('biz.utils.code_reviewer.truncate_text_by_tokens',
+                                    side_effect=lambda text, max_tokens: text[:max_tokens])
+        self.truncate_patch.start()
+        self.reviewer = BatchCodeReviewer.__new__(BatchCodeReviewer)
+
+    def tearDown(self):
+        self.token_patch.stop()
+        self.truncate_patch.stop()
+
+    def _paths(self, batches):
+        return [[f['file_path'] for f in batch] for batch in batches]
+
+    def test_budget_respected(self):
+        files = [_file(f'mod{i}/f.py', size) for i, size in enumerate((60, 50, 40, 30, 20, 45, 55))]
+        batches, truncated = self.reviewer._pack_batches(files, 100)
+        self.assertEqual(truncated, [])
+        for batch in batches:
+            self.assertLessEqual(sum(len(f['diff']) for f in batch), 100)
+        flat = sorted(path for batch in self._paths(batches) for path in batch)
+        self.assertEqual(flat, sorted(f['file_path'] for f in files))
+        # 总量 300：FFD 装为 3 批（60+40、55+45、50+30+20）
+        self.assertEqual(len(batches), 3)
+
+        # 未超预算时单批全量审查
+        batches, _ = self.reviewer._pack_batches(files[:2], 1000)
+        self.assertEqual(len(batches), 1)
+
+    def test_oversized_file_is_split_or_truncated(self):
+        big = {'file_path': 'src/big.py', 'diff': _build_diff(20)}
+        files = [big, _file('src/small.py', 50)]
+        batches, truncated = self.reviewer._pack_batches(files, 500)
+        self.assertEqual(truncated, [])
+        chunk_batches = [b for b in batches if b[0].get('_chunk')]
+        self.assertGreater(len(chunk_batches), 1)
+        self.assertTrue(all(len(b) == 1 and b[0]['file_path'] == 'src/big.py' for b in chunk_batches))
+        self.assertIn(['src/small.py'], self._paths(batches))
+
+        # 单行即超过预算：截断该行并记入 truncated_files
+        huge_line = {'file_path': 'src/huge.py', 'diff': HEADER + "\n@@ -1 +1 @@\n+" + 'y' * 2000}
+        batches, truncated = self.reviewer._pack_batches([huge_line], 500)
+        self.assertEqual(truncated, ['src/huge.py'])
+        self.assertTrue(all(len(b[0]['diff']) <= 500 for b in batches))
+
+    def test_locality_groups_stay_together(self):
+        files = [
+            _file('src/pkg/a.py', 30), _file('other/x.py', 60), _file('src/pkg/b.py', 30),
+            _file('tests/test_a.py', 30), _file('docs/readme.md', 50),
+        ]
+        groups = self.reviewer._group_by_locality([(f, len(f['diff'])) for f in files])
+        group_paths = sorted(sorted(f['file_path'] for f, _ in g) for g in groups)
+        self.assertIn(['src/pkg/a.py', 'src/pkg/b.py', 'tests/test_a.py'], group_paths)
+        self.assertEqual(len(groups), 3)
+
+        batches, _ = self.reviewer._pack_batches(files, 100)
+        home = [i for i, batch in enumerate(self._paths(batches))
+                if {'src/pkg/a.py', 'src/pkg/b.py', 'tests/test_a.py'} & set(batch)]
+        self.assertEqual(len(set(home)), 1)
+        self.assertEqual(sorted(self._paths(batches)[home[0]]), ['src/pkg/a.py', 'src/pkg/b.py', 'tests/test_a.py'])
+
+        # 分组超过预算时拆开装箱，仍优先放入已有同组文件的批次
+        batches, _ = self.reviewer._pack_batches(files, 70)
+        for batch in batches:
+            self.assertLessEqual(sum(len(f['diff']) for f in batch), 70)
+        spread = {i for i, batch in enumerate(self._paths(batches))
+                  for path in batch if path in ('src/pkg/a.py', 'src/pkg/b.py', 'tests/test_a.py')}
+        self.assertEqual(len(spread), 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/config_snapshot.py 配置快照的单元测试。
+
+覆盖：
+1. 快照合并 .env.dist 默认值与 .env 实际值，并提供类型化读取
+2. 快照只读，不能被修改
+3. 文件 mtime 变化后自动重新加载，版本号递增
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils import config_snapshot
+
+
+class TestConfigSnapshot(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dist = Path(self.tmp.name) / ".env.dist"
+        self.env = Path(self.tmp.name) / ".env"
+        self.dist.write_text("A=1\nB=default\nN=5\n", encoding='utf-8')
+        self.env.write_text('B="from env"\nN=abc\n', encoding='utf-8')
+        self.patches = [
+            patch.object(config_snapshot, 'ENV_DIST_FILE', self.dist),
+            patch.object(config_snapshot, 'ENV_FILE', self.env),
+            patch.object(config_snapshot, '_snapshot', None),
+            patch.object(config_snapshot, 'MTIME_CHECK_INTERVAL', 0),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_typed_accessors(self):
+        snapshot = config_snapshot.get_config_snapshot()
+        self.assertTrue(snapshot.get_bool('A'))
+        self.assertFalse(snapshot.get_bool('MISSING'))
+        self.assertTrue(snapshot.get_bool('MISSING', True))
+        self.assertEqual(snapshot.get_str('B'), 'from env')
+        self.assertEqual(snapshot.get_default('B'), 'default')
+        self.assertEqual(snapshot.get_int('N', 7), 7)
+
+    def test_snapshot_is_immutable(self):
+        snapshot = config_snapshot.get_config_snapshot()
+        with self.assertRaises(AttributeError):
+            snapshot.version = 100
+        with self.assertRaises(TypeError):
+            snapshot.values['A'] = '0'
+
+    def test_reload_on_mtime_change(self):
+        first = config_snapshot.get_config_snapshot()
+        self.assertIs(config_snapshot.get_config_snapshot(), first)
+
+        self.env.write_text("A=0\n", encoding='utf-8')
+        future = time.time() + 10
+        os.utime(self.env, (future, future))
+
+        second = config_snapshot.get_config_snapshot()
+        self.assertEqual(second.version, first.version + 1)
+        self.assertFalse(second.get_bool('A'))
+        # 旧快照保持不变
+        self.assertTrue(first.get_bool('A'))
+
+
+if __name__ == '__main__':
+    main()
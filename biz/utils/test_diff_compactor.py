@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/diff_compactor.py 送审前 diff 压缩的单元测试。
+
+覆盖：
+1. 仅行尾空白 / 空行变化的 hunk 被剔除，其余 hunk 保留；缩进与行内空白变化、缩进敏感的文件不剔除
+2. lock 文件 / 自动生成代码被替换为一行说明；代码中出现生成标记、单行很长的普通代码不会被省略
+3. 大 diff 折叠未变更上下文，小 diff 保持原样
+4. 紧凑送审格式不转义换行，且不输出内部字段
+"""
+import os
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils.diff_compactor import (collapse_context, compact_changes, compact_generated, serialize_files,
+                                      strip_whitespace_hunks)
+
+WHITESPACE_HUNK = "@@ -1,2 +1,3 @@\n-function foo() {  \n-  return 1;\n+function foo() {\n+\n+  return 1;"
+REAL_HUNK = "@@ -10,2 +10,2 @@\n x = 1\n-y = 2\n+y = 3"
+
+
+class TestDiffCompactor(TestCase):
+    def setUp(self):
+        os.environ['DIFF_COMPACT_MIN_LINES'] = '20'
+        os.environ['DIFF_CONTEXT_KEEP_LINES'] = '2'
+
+    def tearDown(self):
+        os.environ.pop('DIFF_COMPACT_MIN_LINES', None)
+        os.environ.pop('DIFF_CONTEXT_KEEP_LINES', None)
+
+    def test_strip_whitespace_hunks(self):
+        self.assertEqual(strip_whitespace_hunks(WHITESPACE_HUNK + "\n" + REAL_HUNK, 'a.js'), REAL_HUNK)
+        self.assertIn('仅空白字符', strip_whitespace_hunks(WHITESPACE_HUNK, 'a.js'))
+        self.assertEqual(strip_whitespace_hunks(REAL_HUNK, 'a.js'), REAL_HUNK)
+        # 缩进变化（移入 if 块）与字符串内的空白变化需要审查
+        indented = "@@ -1,2 +1,2 @@\n-do_dangerous();\n+    do_dangerous();"
+        self.assertEqual(strip_whitespace_hunks(indented, 'a.js'), indented)
+        literal = '@@ -1 +1 @@\n-print("a b")\n+print("ab")'
+        self.assertEqual(strip_whitespace_hunks(literal, 'a.js'), literal)
+        # 缩进敏感的文件不处理
+        for path in ('a.py', 'deploy/values.yaml', 'Makefile'):
+            self.assertEqual(strip_whitespace_hunks(WHITESPACE_HUNK, path), WHITESPACE_HUNK)
+
+    def test_generated_files(self):
+        self.assertIn('lock 文件', compact_generated("@@ -1 +1 @@\n-a\n+b", 'web/package-lock.json'))
+        generated = "@@ -0,0 +1,2 @@\n+// Code generated by protoc-gen-go. DO NOT EDIT.\n+package pb"
+        self.assertIn('自动生成代码', compact_generated(generated, 'api/service.go'))
+        self.assertEqual(compact_generated(REAL_HUNK, 'a.py'), REAL_HUNK)
+        self.assertIn('自动生成代码', compact_generated(REAL_HUNK, 'proto/user_pb2.py'))
+        # 标记出现在普通代码中（不是文件开头的注释）
+        in_code = ("@@ -40,3 +40,4 @@ def save_config():\n     header = '# 该文件由配置管理界面自动生成'\n"
+                   "+    os.system(user_input)\n     f.write(header)")
+        self.assertEqual(compact_generated(in_code, 'biz/utils/config_manager.py'), in_code)
+        not_header = "@@ -5,2 +5,3 @@\n # DO NOT EDIT below\n+x = 1\n y = 2"
+        self.assertEqual(compact_generated(not_header, 'a.py'), not_header)
+        # 单行很长的普通代码不是压缩文件，多行长行才是
+        long_sql = "@@ -1 +1 @@\n-sql = 'x'\n+sql = \"SELECT * FROM t WHERE \" + " + "name + " * 90
+        self.assertEqual(compact_generated(long_sql, 'app/dao.py'), long_sql)
+        minified = "@@ -1 +1,3 @@\n-a\n" + "\n".join("+" + "var a=1;" * 50 for _ in range(3))
+        self.assertIn('压缩文件', compact_generated(minified, 'static/app.js'))
+        self.assertIn('压缩文件', compact_generated("@@ -1 +1 @@\n-a\n+" + "x" * 400, 'static/app.js.map'))
+
+    def test_collapse_context_is_adaptive(self):
+        context = [f" line {i}" for i in range(30)]
+        diff = "\n".join(["@@ -1,61 +1,61 @@"] + context + ["-old", "+new"] + context)
+        collapsed = collapse_context(diff, 'a.py')
+        self.assertIn("-old\n+new", collapsed)
+        self.assertIn("省略 28 行未变更代码", collapsed)
+        self.assertLess(len(collapsed.splitlines()), 10)
+        self.assertEqual(collapse_context(REAL_HUNK, 'a.py'), REAL_HUNK)
+
+    def test_compact_changes_keeps_stats(self):
+        changes = [{'new_path': 'a.js', 'diff': WHITESPACE_HUNK + "\n" + REAL_HUNK, 'additions': 3, 'deletions': 3}]
+        with patch('biz.utils.diff_compactor.count_tokens', side_effect=len):
+            compacted = compact_changes(changes)
+        self.assertEqual(compacted[0]['diff'], REAL_HUNK)
+        self.assertEqual(compacted[0]['additions'], 3)
+        self.assertIn(WHITESPACE_HUNK, changes[0]['diff'])
+
+    def test_serialize_files(self):
+        text = serialize_files([{'file_path': 'a.py', 'status': 'M', 'diff': REAL_HUNK, '_chunk': (1, 2)}])
+        self.assertEqual(text, "==== 文件: a.py (status: M) ====\n" + REAL_HUNK)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/incremental_review.py MR/PR 增量审查的单元测试。
+
+覆盖：
+1. 上次审查的 head 仍在提交历史中时只送审属于 MR 文件的增量 diff，并记录节省的 token 数
+2. 获取增量 diff 失败（返回空或抛出异常）时回退全量审查
+3. force-push 后上次审查的 head 不可达时不做对比，直接回退全量审查
+"""
+import os
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils.incremental_review import plan_incremental_review
+from biz.utils.metrics import render_metrics, reset_metrics
+
+MR_CHANGES = [
+    {'new_path': 'src/a.py', 'diff': '@@ -1 +1,30 @@\n' + '+line\n' * 30, 'additions': 30, 'deletions': 0},
+    {'new_path': 'src/b.py', 'diff': '@@ -1 +1 @@\n-x = 1\n+x = 2', 'additions': 1, 'deletions': 1},
+]
+DELTA_CHANGES = [
+    {'new_path': 'src/b.py', 'diff': '@@ -1 +1 @@\n-x = 1\n+x = 2', 'additions': 1, 'deletions': 1},
+    # rebase 后混入的目标分支变更，不属于 MR 文件
+    {'new_path': 'vendor/c.py', 'diff': '@@ -1 +1 @@\n-y\n+z', 'additions': 1, 'deletions': 1},
+]
+
+
+class FakeHandler:
+    def __init__(self, reachable=True, compare_result=None, compare_error=None):
+        self.head_sha = 'bbbbbbbb2222'
+        self.reachable = reachable
+        self.compare_result = DELTA_CHANGES if compare_result is None else compare_result
+        self.compare_error = compare_error
+        self.compared = []
+
+    def is_ancestor(self, ancestor, descendant):
+        return self.reachable
+
+    def repository_compare(self, base, head):
+        self.compared.append((base, head))
+        if self.compare_error:
+            raise self.compare_error
+        return self.compare_result
+
+
+class TestIncrementalReview(TestCase):
+    STATE = {'head_sha': 'aaaaaaaa1111', 'review_summary': '总分: 80分'}
+
+    def setUp(self):
+        # 避免 tiktoken 联网下载编码文件
+        self.token_patch = patch('biz.utils.incremental_review.count_tokens', side_effect=len)
+        self.token_patch.start()
+        self.env_patch = patch.dict(os.environ, {'METRICS_ENABLED': '1', 'METRICS_MULTIPROC_DIR': ''})
+        self.env_patch.start()
+        reset_metrics()
+
+    def tearDown(self):
+        reset_metrics()
+        self.env_patch.stop()
+        self.token_patch.stop()
+
+    def _plan(self, handler, platform='gitlab'):
+        return plan_incremental_review(handler, self.STATE, MR_CHANGES, lambda changes: changes, platform)
+
+    @staticmethod
+    def _sample(line_prefix):
+        for line in render_metrics().splitlines():
+            if line.startswith(line_prefix + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0.0
+
+    def test_interdiff(self):
+        handler = FakeHandler()
+        self.assertEqual(self._plan(handler), DELTA_CHANGES[:1])
+        self.assertEqual(handler.compared, [('aaaaaaaa1111', 'bbbbbbbb2222')])
+        self.assertEqual(self._sample('codereview_incremental_reviews_total{platform="gitlab",outcome="incremental"}'), 1)
+        saved = self._sample('codereview_incremental_review_tokens_saved_total{platform="gitlab"}')
+        self.assertGreater(saved, 0)
+
+    def test_fallback_on_compare_failure(self):
+        self.assertIsNone(self._plan(FakeHandler(compare_result=[]), 'github'))
+        self.assertIsNone(self._plan(FakeHandler(compare_error=ConnectionError('timeout')), 'github'))
+        self.assertEqual(self._sample('codereview_incremental_reviews_total{platform="github",outcome="empty"}'), 1)
+        self.assertEqual(
+            self._sample('codereview_incremental_reviews_total{platform="github",outcome="compare_failed"}'), 1)
+        self.assertEqual(self._sample('codereview_incremental_review_tokens_saved_total{platform="github"}'), 0)
+
+    def test_force_push(self):
+        handler = FakeHandler(reachable=False)
+        self.assertIsNone(self._plan(handler))
+        self.assertEqual(handler.compared, [])
+        self.assertEqual(self._sample('codereview_incremental_reviews_total{platform="gitlab",outcome="force_push"}'), 1)
+
+
+if __name__ == '__main__':
+    main()
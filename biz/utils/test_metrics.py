@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/metrics.py Prometheus 指标的单元测试。
+
+覆盖：
+1. 计数器与直方图按标签聚合，渲染为 Prometheus 文本格式（累计分桶、标签转义）
+2. 计时装饰器保留函数名，异常时同样记录耗时
+3. 多进程模式：fork 出的子进程不重复计数父进程的观测值，抓取时合并各进程文件，已退出进程的文件归档
+4. 大模型调用耗时按供应商统计，关闭台账时仍然统计
+"""
+import multiprocessing
+import os
+import tempfile
+from unittest import TestCase, main, skipUnless
+
+from biz.llm.call_ledger import LedgerClient
+from biz.llm.client.base import BaseClient
+from biz.utils.metrics import DB_WRITE_SECONDS, NOTIFICATION_FAILURES, REVIEW_SECONDS, \
+    WEBHOOK_REQUESTS, flush_metrics, render_metrics, reset_metrics
+
+
+def _sample(text: str, line_prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    raise AssertionError(f"{line_prefix} not found")
+
+
+def _child_observe():
+    WEBHOOK_REQUESTS.inc(source='gitlab', event='push')
+    REVIEW_SECONDS.observe(3, review_type='gitlab_push')
+    flush_metrics()
+
+
+class FakeClient(BaseClient):
+    provider_name = 'fakeprov'
+
+    def completions(self, messages, model=None):
+        return '代码结构清晰，命名规范，总分: 90分'
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ['METRICS_ENABLED'] = '1'
+        os.environ['METRICS_MULTIPROC_DIR'] = ''
+        reset_metrics()
+
+    def tearDown(self):
+        for key in ('METRICS_ENABLED', 'METRICS_MULTIPROC_DIR', 'LLM_LEDGER_ENABLED'):
+            os.environ.pop(key, None)
+        reset_metrics()
+        self.tmpdir.cleanup()
+
+    def test_render_counters_and_histograms(self):
+        WEBHOOK_REQUESTS.inc(source='gitlab', event='merge_request')
+        WEBHOOK_REQUESTS.inc(source='gitlab', event='merge_request')
+        NOTIFICATION_FAILURES.inc(channel='we"com')
+        for value in (0.002, 0.02, 5000):
+            DB_WRITE_SECONDS.observe(value, operation='mr_review_log')
+        text = render_metrics()
+
+        self.assertIn('# TYPE codereview_webhook_requests_total counter', text)
+        self.assertEqual(_sample(text, 'codereview_webhook_requests_total{source="gitlab",event="merge_request"}'), 2)
+        self.assertIn('codereview_notification_failures_total{channel="we\\"com"} 1.0', text)
+        bucket = 'codereview_db_write_duration_seconds_bucket{operation="mr_review_log",le="%s"}'
+        self.assertEqual(_sample(text, bucket % '0.001'), 0)
+        self.assertEqual(_sample(text, bucket % '0.0025'), 1)
+        self.assertEqual(_sample(text, bucket % '0.025'), 2)
+        self.assertEqual(_sample(text, bucket % '+Inf'), 3)
+        self.assertEqual(_sample(text, 'codereview_db_write_duration_seconds_count{operation="mr_review_log"}'), 3)
+        self.assertAlmostEqual(_sample(text, 'codereview_db_write_duration_seconds_sum{operation="mr_review_log"}'),
+                               5000.022)
+        # 尚无观测值的指标也输出类型声明
+        self.assertIn('# TYPE codereview_svn_command_duration_seconds histogram', text)
+
+    def test_time_decorator(self):
+        @REVIEW_SECONDS.time(review_type='svn_commit')
+        def review():
+            raise RuntimeError('boom')
+
+        self.assertEqual(review.__name__, 'review')
+        self.assertRaises(RuntimeError, review)
+        self.assertRaises(RuntimeError, review)
+        text = render_metrics()
+        self.assertEqual(_sample(text, 'codereview_review_duration_seconds_count{review_type="svn_commit"}'), 2)
+
+    @skipUnless(hasattr(os, 'fork'), "需要 fork")
+    def test_multiprocess_merge_and_archive(self):
+        os.environ['METRICS_MULTIPROC_DIR'] = self.tmpdir.name
+        WEBHOOK_REQUESTS.inc(source='gitlab', event='push')
+        for _ in range(2):
+            child = multiprocessing.get_context('fork').Process(target=_child_observe)
+            child.start()
+            child.join()
+            self.assertEqual(child.exitcode, 0)
+
+        text = render_metrics()
+        # 父进程 1 次 + 两个子进程各 1 次，子进程没有把继承来的父进程计数再上报一遍
+        self.assertEqual(_sample(text, 'codereview_webhook_requests_total{source="gitlab",event="push"}'), 3)
+        self.assertEqual(_sample(text, 'codereview_review_duration_seconds_count{review_type="gitlab_push"}'), 2)
+        files = sorted(os.listdir(self.tmpdir.name))
+        self.assertIn('archive.json', files)
+        self.assertIn(f"{os.getpid()}.json", files)
+        self.assertEqual(len([f for f in files if f.endswith('.json')]), 2)
+        # 归档后再次抓取结果不变
+        self.assertEqual(render_metrics(), text)
+
+    def test_llm_call_latency_without_ledger(self):
+        os.environ['LLM_LEDGER_ENABLED'] = '0'
+        LedgerClient(FakeClient(), 'fakeprov').completions([])
+        text = render_metrics()
+        self.assertEqual(_sample(text, 'codereview_llm_call_duration_seconds_count{provider="fakeprov",outcome="ok"}'),
+                         1)
+
+
+if __name__ == '__main__':
+    main()
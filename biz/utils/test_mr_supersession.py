@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/mr_supersession.py MR 防抖与取代机制的单元测试。
+
+覆盖：
+1. 防抖窗口内同一 MR 的新事件替换旧事件，只入队最后一次，并记录防抖合并次数
+2. 服务关闭时 flush 立即提交等待中的事件
+3. 到期入队失败（队列已满）时按退避重试，重试用尽后不再重试；重试期间收到新事件则放弃旧事件
+4. check_superseded 只丢弃被更新 head 取代的任务，并记录统计
+5. 多个进程（各自的防抖器）接收同一 MR 的事件时，以 SQLite 登记为准只入队最后接收的事件
+6. 关闭时入队失败、进程崩溃遗留的登记不会让下一个事件被计为防抖合并
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils.mr_supersession import STAT_DEBOUNCED, STAT_DROPPED_QUEUED, MergeRequestDebouncer, \
+    MergeRequestSupersession, gitlab_mr_key
+
+
+class TestMergeRequestSupersession(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.patcher = patch.object(MergeRequestSupersession, 'DB_FILE', os.path.join(self.tmpdir.name, 'data.db'))
+        self.patcher.start()
+        MergeRequestSupersession.init_db()
+        self.debouncer = MergeRequestDebouncer()
+        self.submitted = []
+        self.done = threading.Event()
+
+    def tearDown(self):
+        self.debouncer.flush()
+        self.patcher.stop()
+        self.tmpdir.cleanup()
+
+    def _submit_func(self, name, results=None):
+        """返回入队函数：依次返回 results 中的结果（默认入队成功），每次调用记录 name"""
+        results = list(results or [])
+
+        def submit():
+            self.submitted.append(name)
+            ok = results.pop(0) if results else True
+            if ok:
+                self.done.set()
+            return ok
+        return submit
+
+    def _wait_submitted(self, count, timeout=2.0):
+        """等待入队函数被调用 count 次，再多等一会确认没有多余的调用"""
+        deadline = time.monotonic() + timeout
+        while len(self.submitted) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+
+    def test_replace_within_window(self):
+        self.debouncer.submit('mr-1', 0.1, self._submit_func('first'))
+        self.debouncer.submit('mr-1', 0.1, self._submit_func('second'))
+        self.debouncer.submit('mr-2', 0.1, self._submit_func('other'))
+        self.assertEqual(self.debouncer.pending_count(), 2)
+        self._wait_submitted(2)
+        self.assertEqual(sorted(self.submitted), ['other', 'second'])
+        self.assertEqual(MergeRequestSupersession.get_stats()[STAT_DEBOUNCED], 1)
+
+    def test_flush_on_shutdown(self):
+        self.debouncer.submit('mr-1', 60, self._submit_func('pending'))
+        self.debouncer.flush()
+        self.assertEqual(self.submitted, ['pending'])
+        self.assertEqual(self.debouncer.pending_count(), 0)
+
+    def test_retry_when_queue_full(self):
+        with patch.object(MergeRequestDebouncer, 'RETRY_DELAYS', (0.01, 0.01)):
+            self.debouncer.submit('mr-1', 0.01, self._submit_func('busy', [False, True]))
+            self.assertTrue(self.done.wait(2))
+            self._wait_submitted(2)
+            self.assertEqual(self.submitted, ['busy', 'busy'])
+
+            # 重试用尽：共调用 1 + len(RETRY_DELAYS) 次后放弃
+            self.submitted.clear()
+            self.debouncer.submit('mr-2', 0.01, self._submit_func('full', [False] * 10))
+            self._wait_submitted(3)
+            self.assertEqual(self.submitted, ['full'] * 3)
+
+        # 等待重试期间收到新事件：旧事件被替换，只入队新事件
+        self.submitted.clear()
+        with patch.object(MergeRequestDebouncer, 'RETRY_DELAYS', (0.2,)):
+            self.debouncer.submit('mr-3', 0.01, self._submit_func('old', [False, True]))
+            time.sleep(0.1)
+            self.debouncer.submit('mr-3', 0.01, self._submit_func('new'))
+            self._wait_submitted(2)
+            time.sleep(0.2)
+        self.assertEqual(self.submitted, ['old', 'new'])
+
+    def test_debounce_across_processes(self):
+        # 两个防抖器模拟两个 HTTP 工作进程，共用同一个数据库
+        other = MergeRequestDebouncer()
+        self.assertIsNone(self.debouncer.submit('mr-1', 0.1, self._submit_func('worker-1'), token='event-1'))
+        self.assertEqual(other.submit('mr-1', 0.2, self._submit_func('worker-2'), token='event-2'), 'event-1')
+        self._wait_submitted(1)
+        time.sleep(0.1)
+        self.assertEqual(self.submitted, ['worker-2'])
+        self.assertEqual(MergeRequestSupersession.get_stats()[STAT_DEBOUNCED], 1)
+        self.assertTrue(MergeRequestSupersession.owns_debounce('mr-1', 'anything'))
+
+        # 关闭时只提交未被替换的事件
+        self.submitted.clear()
+        self.debouncer.submit('mr-2', 60, self._submit_func('stale'), token='event-3')
+        other.submit('mr-2', 60, self._submit_func('latest'), token='event-4')
+        self.debouncer.flush()
+        other.flush()
+        self.assertEqual(self.submitted, ['latest'])
+
+    def test_no_stale_debounce_rows(self):
+        # 关闭时入队失败：登记被删除，事件交给收件箱恢复
+        self.debouncer.submit('mr-1', 60, self._submit_func('busy', [False]), token='event-1')
+        self.debouncer.flush()
+        self.assertEqual(self.submitted, ['busy'])
+        self.assertIsNone(self.debouncer.submit('mr-1', 60, self._submit_func('next'), token='event-2'))
+
+        # 进程崩溃遗留的登记（早已过期）直接覆盖，不算作替换
+        with sqlite3.connect(MergeRequestSupersession.DB_FILE) as conn:
+            conn.execute('INSERT INTO mr_debounce_pending (mr_key, token, due_at) VALUES (?, ?, ?)',
+                         ('mr-2', 'crashed', time.time() - 3600))
+            conn.commit()
+        self.assertIsNone(self.debouncer.submit('mr-2', 60, self._submit_func('after-crash'), token='event-3'))
+        self.assertTrue(MergeRequestSupersession.owns_debounce('mr-2', 'event-3'))
+        self.assertEqual(MergeRequestSupersession.get_stats()[STAT_DEBOUNCED], 0)
+
+    def test_check_superseded(self):
+        mr_key = gitlab_mr_key('gitlab-example-com', 1, 7)
+        MergeRequestSupersession.register_head(mr_key, 'aaaaaaaa1')
+        self.assertFalse(MergeRequestSupersession.check_superseded(mr_key, 'aaaaaaaa1', STAT_DROPPED_QUEUED))
+        MergeRequestSupersession.register_head(mr_key, 'bbbbbbbb2')
+        self.assertTrue(MergeRequestSupersession.check_superseded(mr_key, 'aaaaaaaa1', STAT_DROPPED_QUEUED))
+        self.assertFalse(MergeRequestSupersession.check_superseded(mr_key, 'bbbbbbbb2', STAT_DROPPED_QUEUED))
+        # 没有记录的 MR 或缺少 head 时不丢弃
+        self.assertFalse(MergeRequestSupersession.check_superseded('gitlab:x:1:1', 'cccccccc3', STAT_DROPPED_QUEUED))
+        self.assertFalse(MergeRequestSupersession.check_superseded(mr_key, None, STAT_DROPPED_QUEUED))
+        stats = MergeRequestSupersession.get_stats()
+        self.assertEqual((stats[STAT_DROPPED_QUEUED], stats['reviews_saved']), (1, 1))
+
+
+if __name__ == '__main__':
+    main()
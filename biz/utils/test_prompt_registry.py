@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/prompt_registry.py 提示词注册表的单元测试。
+
+覆盖：
+1. 同一 (prompt_key, style) 只解析一次文件，不同 style 分别渲染
+2. 返回副本，调用方修改不影响缓存
+3. 配置文件缺少的 key 从模板文件兜底
+4. 文件 mtime 变化或主动失效后重新加载
+"""
+import os
+import tempfile
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import yaml
+
+from biz.utils import prompt_registry
+from biz.utils.prompt_registry import get_prompts, invalidate_prompt_cache
+
+PROMPTS = {
+    'review': {'system_prompt': '风格: {{ style }}', 'user_prompt': '代码: {diffs_text}'},
+}
+DIST_PROMPTS = {
+    'merge': {'system_prompt': '合并', 'user_prompt': '{summary_text}'},
+}
+
+
+class TestPromptRegistry(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.conf_file = os.path.join(self.tmpdir.name, 'prompt_templates.yml')
+        self.dist_file = os.path.join(self.tmpdir.name, 'dist_prompt_templates.yml')
+        self._write(self.conf_file, PROMPTS)
+        self._write(self.dist_file, DIST_PROMPTS)
+        self.patches = [patch.object(prompt_registry, 'PROMPT_TEMPLATES_FILE', self.conf_file),
+                        patch.object(prompt_registry, 'PROMPT_TEMPLATES_DIST_FILE', self.dist_file),
+                        patch.object(prompt_registry, 'MTIME_CHECK_INTERVAL', 0)]
+        for p in self.patches:
+            p.start()
+        invalidate_prompt_cache()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        invalidate_prompt_cache()
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def _write(path, data, mtime=None):
+        with open(path, 'w', encoding='utf-8') as f:
+            yaml.dump(data, f, allow_unicode=True)
+        if mtime:
+            os.utime(path, (mtime, mtime))
+
+    def test_parse_once_per_key_and_style(self):
+        with patch('biz.utils.prompt_registry.yaml.safe_load', wraps=yaml.safe_load) as safe_load:
+            first = get_prompts('review', 'professional')
+            get_prompts('review', 'professional')
+            casual = get_prompts('review', 'humorous')
+        self.assertEqual(safe_load.call_count, 1)
+        self.assertEqual(first['system_message']['content'], '风格: professional')
+        self.assertEqual(casual['system_message']['content'], '风格: humorous')
+        self.assertEqual(first['user_message'], {'role': 'user', 'content': '代码: {diffs_text}'})
+
+    def test_returns_copies(self):
+        prompts = get_prompts('review')
+        prompts['system_message']['content'] += ' 追加'
+        self.assertEqual(get_prompts('review')['system_message']['content'], '风格: professional')
+
+    def test_fallback_to_dist_file(self):
+        self.assertEqual(get_prompts('merge')['system_message']['content'], '合并')
+        self.assertRaises(KeyError, get_prompts, 'missing')
+
+    def test_reload_on_mtime_change(self):
+        get_prompts('review')
+        changed = {'review': {'system_prompt': '新版', 'user_prompt': 'u'}}
+        self._write(self.conf_file, changed, mtime=os.stat(self.conf_file).st_mtime + 10)
+        self.assertEqual(get_prompts('review')['system_message']['content'], '新版')
+
+
+if __name__ == '__main__':
+    main()
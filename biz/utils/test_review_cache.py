@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/review_cache.py 文件级审查缓存的单元测试。
+
+覆盖：
+1. diff 规范化忽略 hunk 行号偏移（rebase 后同一改动命中缓存）
+2. 从批量审查报告中按 `### 📄 文件路径` 提取分文件意见；标题只按 / 边界唯一匹配，有歧义时不提取
+3. BatchCodeReviewer 只把未命中缓存的文件送审，并拼回缓存意见
+4. 缓存按文件评分写入，多文件批次中没有文件评分的文件不缓存
+"""
+import os
+import tempfile
+from unittest import TestCase, main
+from unittest.mock import patch, MagicMock
+
+from biz.utils.code_reviewer import BatchCodeReviewer, CodeReviewer
+from biz.utils.review_cache import FileReviewCache, build_cache_key, extract_file_sections, parse_file_score
+
+DIFF_A = "@@ -10,3 +10,4 @@ def foo():\n     a = 1\n-    return a\n+    return a + 1\n"
+DIFF_A_SHIFTED = "@@ -42,3 +42,4 @@ def foo():\n     a = 1\n-    return a\n+    return a + 1\n"
+
+BATCH_RESULT = """1. **本批概述**：两个文件
+2. **分文件详述**
+
+### 📄 src/a.py
+- 返回值变化需确认调用方
+文件评分: 85分
+
+### 📄 src/b.py
+无明显问题
+文件评分: 95分
+
+3. **本批评分**：本批评分: 90分
+"""
+
+
+class TestReviewCache(TestCase):
+    def test_hunk_offset_does_not_change_key(self):
+        self.assertEqual(build_cache_key('src/a.py', DIFF_A, 'v1'),
+                         build_cache_key('src/a.py', DIFF_A_SHIFTED, 'v1'))
+        self.assertNotEqual(build_cache_key('src/a.py', DIFF_A, 'v1'),
+                            build_cache_key('src/a.py', DIFF_A, 'v2'))
+
+    def test_extract_file_sections(self):
+        sections = extract_file_sections(BATCH_RESULT, ['src/a.py', 'src/b.py', 'src/c.py'])
+        self.assertEqual(set(sections), {'src/a.py', 'src/b.py'})
+        self.assertIn('调用方', sections['src/a.py'])
+        self.assertNotIn('本批评分', sections['src/b.py'])
+        self.assertEqual(parse_file_score(sections['src/a.py']), 85)
+        self.assertEqual(CodeReviewer.parse_review_score(BATCH_RESULT), 90)
+
+    def test_heading_match_requires_path_boundary(self):
+        report = "### 📄 b.py\n问题 B\n\n### 📄 utils.py\n问题 U\n\n### 📄 `./pkg/c.py`\n问题 C\n"
+        sections = extract_file_sections(report, ['src/ab.py', 'lib/b.py'])
+        self.assertEqual(sections, {'lib/b.py': report.split('\n\n')[0]})
+        # utils.py 同时对应本批两个文件，有歧义，不提取
+        self.assertEqual(extract_file_sections(report, ['a/utils.py', 'b/utils.py']), {})
+        self.assertEqual(set(extract_file_sections(report, ['src/pkg/c.py'])), {'src/pkg/c.py'})
+
+
+class TestBatchReviewerWithCache(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_patch = patch.object(FileReviewCache, 'DB_FILE', os.path.join(self.tmp.name, 'test.db'))
+        self.db_patch.start()
+        FileReviewCache.init_db()
+        os.environ['FILE_REVIEW_CACHE_ENABLED'] = '1'
+        # 避免 tiktoken 联网下载编码文件
+        self.token_patch = patch('biz.utils.code_reviewer.count_tokens', side_effect=len)
+        self.token_patch.start()
+
+        self.reviewer = BatchCodeReviewer.__new__(BatchCodeReviewer)
+        self.reviewer.client = MagicMock(default_model='test-model')
+        self.reviewer.prompts = {"system_message": {"role": "system", "content": "sys"},
+                                 "user_message": {"role": "user", "content": "{diffs_text}{commits_text}"}}
+
+    def tearDown(self):
+        os.environ.pop('FILE_REVIEW_CACHE_ENABLED', None)
+        self.token_patch.stop()
+        self.db_patch.stop()
+        self.tmp.cleanup()
+
+    def test_only_uncached_files_are_reviewed(self):
+        files = [{'file_path': 'src/a.py', 'diff': DIFF_A}, {'file_path': 'src/b.py', 'diff': '+x = 1\n'}]
+        with patch.object(self.reviewer, 'review_code', return_value=BATCH_RESULT) as review_code:
+            self.reviewer.review_in_batches([dict(f) for f in files])
+        self.assertEqual(review_code.call_count, 1)
+
+        # rebase 后 a.py 行号偏移但内容不变，全部命中缓存，不再调用 LLM
+        rebased = [{'file_path': 'src/a.py', 'diff': DIFF_A_SHIFTED}, {'file_path': 'src/b.py', 'diff': '+x = 1\n'}]
+        with patch.object(self.reviewer, 'review_code') as review_code:
+            report = self.reviewer.review_in_batches(rebased)
+        review_code.assert_not_called()
+        self.assertIn('调用方', report)
+        self.assertIn('总分: 90分', report)
+
+        # 新增文件 c.py：只有 c.py 送审，缓存意见参与合并
+        changed = rebased + [{'file_path': 'src/c.py', 'diff': '+y = 2\n'}]
+        with patch.object(self.reviewer, 'review_code', return_value="### 📄 src/c.py\n无\n本批评分: 80分") as review_code, \
+                patch.object(self.reviewer, '_merge_reviews', return_value='merged') as merge:
+            self.assertEqual(self.reviewer.review_in_batches(changed), 'merged')
+        self.assertEqual(review_code.call_count, 1)
+        self.assertIn('src/c.py', review_code.call_args[0][0])
+        self.assertNotIn('src/a.py', review_code.call_args[0][0])
+        batch_results, batch_scores = merge.call_args[0][0], merge.call_args[0][1]
+        self.assertEqual(len(batch_results), 2)
+        self.assertEqual(batch_scores, [(80, 1), (90, 2)])
+
+    def test_cache_uses_file_scores(self):
+        files = [{'file_path': 'src/a.py', 'diff': DIFF_A}, {'file_path': 'src/b.py', 'diff': '+x = 1\n'}]
+        with patch.object(self.reviewer, 'review_code', return_value=BATCH_RESULT):
+            self.reviewer.review_in_batches([dict(f) for f in files])
+        cached = FileReviewCache.get_many(list(self.reviewer._file_cache_keys(files).values()))
+        self.assertEqual(sorted(score for _, score in cached.values()), [85, 95])
+
+        # 多文件批次没有文件评分：不缓存；单文件批次以本批评分作为文件评分
+        no_scores = "### 📄 src/d.py\n问题\n\n### 📄 src/e.py\n无\n\n3. **本批评分**：本批评分: 70分"
+        files = [{'file_path': 'src/d.py', 'diff': '+d = 1\n'}, {'file_path': 'src/e.py', 'diff': '+e = 1\n'}]
+        with patch.object(self.reviewer, 'review_code', return_value=no_scores):
+            self.reviewer.review_in_batches([dict(f) for f in files])
+        self.assertEqual(FileReviewCache.get_many(list(self.reviewer._file_cache_keys(files).values())), {})
+        single = [{'file_path': 'src/d.py', 'diff': '+d = 1\n'}]
+        with patch.object(self.reviewer, 'review_code', return_value="### 📄 src/d.py\n问题\n本批评分: 70分"):
+            self.reviewer.review_in_batches([dict(f) for f in single])
+        cached = FileReviewCache.get_many(list(self.reviewer._file_cache_keys(single).values()))
+        self.assertEqual([score for _, score in cached.values()], [70])
+
+
+if __name__ == '__main__':
+    main()
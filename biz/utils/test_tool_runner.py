@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/tool_runner.py Agentic 工具调用执行器的单元测试。
+
+覆盖：
+1. 同一轮的多个工具调用并发执行，结果按调用顺序返回
+2. 参数相同的调用（参数顺序不同也视为相同）跨轮次只执行一次，并发发起的相同调用不重复执行
+3. 执行失败的错误文本不缓存，后续相同调用重新执行
+4. 模型调用与工具执行耗时分别累计
+"""
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils.tool_runner import ToolCallRunner
+
+
+def _call(name, **arguments):
+    return {"id": f"call-{name}", "name": name, "arguments": arguments}
+
+
+class TestToolCallRunner(TestCase):
+    def setUp(self):
+        self.executed = Counter()
+        self.lock = threading.Lock()
+        self.fail = False
+
+    def _dispatch(self, call):
+        with self.lock:
+            self.executed[call["arguments"].get("file_path")] += 1
+        time.sleep(0.2)
+        if self.fail:
+            return "错误: 工具执行失败 - timeout"
+        return f"content of {call['arguments'].get('file_path')}"
+
+    def _runner(self, concurrency="4"):
+        with patch.dict("os.environ", {"AGENTIC_TOOL_CONCURRENCY": concurrency}):
+            return ToolCallRunner(self._dispatch)
+
+    def test_round_runs_concurrently_in_order(self):
+        runner = self._runner()
+        calls = [_call("read_file", file_path=f"f{i}.py") for i in range(4)]
+        started = time.monotonic()
+        results = runner.run(calls)
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(results, [f"content of f{i}.py" for i in range(4)])
+        self.assertEqual(runner.tool_calls, 4)
+        self.assertGreaterEqual(runner.tool_seconds, 0.2)
+
+        serial = self._runner("1")
+        started = time.monotonic()
+        serial.run([_call("read_file", file_path=f"g{i}.py") for i in range(3)])
+        self.assertGreaterEqual(time.monotonic() - started, 0.6)
+
+    def test_memo_across_rounds_and_threads(self):
+        runner = self._runner()
+        runner.run([_call("search_code", query="foo", max_results=20)])
+        result = runner.run([{"id": "x", "name": "search_code", "arguments": {"max_results": 20, "query": "foo"}}])
+        self.assertEqual(result, ["content of None"])
+        self.assertEqual(self.executed[None], 1)
+
+        # 多个分批线程同时请求同一文件
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: runner.run([_call("read_file", file_path="a.py")])[0], range(4)))
+        self.assertEqual(results, ["content of a.py"] * 4)
+        self.assertEqual(self.executed["a.py"], 1)
+        self.assertEqual(runner.cache_hits, 4)
+
+    def test_errors_not_cached(self):
+        runner = self._runner()
+        self.fail = True
+        self.assertTrue(runner.run([_call("read_file", file_path="b.py")])[0].startswith("错误:"))
+        self.fail = False
+        self.assertEqual(runner.run([_call("read_file", file_path="b.py")]), ["content of b.py"])
+        self.assertEqual(self.executed["b.py"], 2)
+
+    def test_model_time(self):
+        runner = self._runner()
+        with runner.model_call():
+            time.sleep(0.05)
+        self.assertGreaterEqual(runner.model_seconds, 0.05)
+        self.assertEqual(runner.tool_seconds, 0)
+        runner.report("code")
+
+
+if __name__ == '__main__':
+    main()
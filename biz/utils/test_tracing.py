@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/tracing.py 审查阶段追踪与 biz/cmd/trace_view.py 耗时分解的单元测试。
+
+覆盖：
+1. trace 开启新 trace，子 span 继承仓库 / 修订号，根 span 结束时写出一行 OTLP JSON；trace 外的 span 不记录
+2. 异常时 span 标记为错误并继续抛出
+3. BatchCodeReviewer 并发分批时各批 span 带批次序号，挂在所属审查之下，合并调用单独记录
+4. 按修订号找到审查并打印阶段耗时树（含外层 SVN 检查中的同级阶段）
+"""
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.cmd.trace_view import find_review_spans, show_revision
+from biz.utils.code_reviewer import BatchCodeReviewer
+from biz.utils.tracing import read_spans, set_span_attributes, span, trace
+
+
+class TestTracing(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.trace_file = os.path.join(self.tmpdir.name, 'trace.jsonl')
+        os.environ.update({'TRACING_ENABLED': '1', 'TRACE_FILE': self.trace_file})
+
+    def tearDown(self):
+        for key in ('TRACING_ENABLED', 'TRACE_FILE', 'FILE_REVIEW_CACHE_ENABLED', 'REVIEW_BATCH_CONCURRENCY'):
+            os.environ.pop(key, None)
+        self.tmpdir.cleanup()
+
+    def _lines(self):
+        with open(self.trace_file, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_nested_spans_written_as_one_otlp_line(self):
+        with span('orphan'):
+            pass
+        self.assertFalse(os.path.exists(self.trace_file))
+
+        with trace('svn.commit', repo='demo'):
+            set_span_attributes(revision='42')
+            with span('svn.diff'):
+                with span('svn.parse_diff'):
+                    pass
+            self.assertFalse(os.path.exists(self.trace_file))
+
+        lines = self._lines()
+        self.assertEqual(len(lines), 1)
+        resource_spans = lines[0]['resourceSpans'][0]
+        self.assertIn({'key': 'service.name', 'value': {'stringValue': 'ai-codereview'}},
+                      resource_spans['resource']['attributes'])
+        spans = {s['name']: s for s in resource_spans['scopeSpans'][0]['spans']}
+        self.assertEqual(set(spans), {'svn.commit', 'svn.diff', 'svn.parse_diff'})
+        self.assertEqual(len({s['traceId'] for s in spans.values()}), 1)
+        self.assertEqual(len(spans['svn.commit']['traceId']), 32)
+        self.assertEqual(spans['svn.commit']['parentSpanId'], '')
+        self.assertEqual(spans['svn.parse_diff']['parentSpanId'], spans['svn.diff']['spanId'])
+        self.assertIn({'key': 'revision', 'value': {'stringValue': '42'}}, spans['svn.parse_diff']['attributes'])
+        self.assertLessEqual(int(spans['svn.commit']['startTimeUnixNano']),
+                             int(spans['svn.diff']['startTimeUnixNano']))
+
+    def test_error_status(self):
+        with self.assertRaises(ValueError):
+            with trace('gitlab.push'):
+                raise ValueError('bad')
+        status = self._lines()[0]['resourceSpans'][0]['scopeSpans'][0]['spans'][0]['status']
+        self.assertEqual(status, {'code': 2, 'message': 'ValueError: bad'})
+
+        os.environ['TRACING_ENABLED'] = '0'
+        with trace('gitlab.push'):
+            pass
+        self.assertEqual(len(self._lines()), 1)
+
+    def test_batch_review_spans(self):
+        os.environ.update({'FILE_REVIEW_CACHE_ENABLED': '0', 'REVIEW_BATCH_CONCURRENCY': '3'})
+        reviewer = BatchCodeReviewer.__new__(BatchCodeReviewer)
+        reviewer.prompts = {"system_message": {"role": "system", "content": "sys"},
+                            "user_message": {"role": "user", "content": "{diffs_text}{commits_text}"}}
+        reviewer.merge_prompts = {"system_message": {"role": "system", "content": "sys"},
+                                  "user_message": {"role": "user", "content": "{batch_results}{commits_text}"}}
+        files = [{'file_path': f'src/f{i}.py', 'diff': '+' + 'x' * 40 + '\n'} for i in range(3)]
+        with patch('biz.utils.code_reviewer.count_tokens', side_effect=len), \
+                patch('biz.utils.code_reviewer.get_review_input_budget', return_value=60), \
+                patch.object(reviewer, 'review_code', return_value='代码结构清晰，命名规范，总分: 80分'), \
+                patch.object(reviewer, 'call_llm', return_value='合并后的审查报告，总分: 80分'):
+            with trace('svn.commit', repo='demo', revision='7'):
+                reviewer.review_in_batches(files)
+
+        spans = read_spans(self.trace_file)
+        by_name = {}
+        for item in spans:
+            by_name.setdefault(item['name'], []).append(item)
+        batches = by_name['review.batches'][0]
+        self.assertEqual((batches['attributes']['files'], batches['attributes']['batches']), (3, 3))
+        self.assertEqual(sorted(s['attributes']['batch_index'] for s in by_name['llm.batch']), [0, 1, 2])
+        self.assertEqual({s['parent_span_id'] for s in by_name['llm.batch']}, {batches['span_id']})
+        self.assertEqual({s['attributes']['revision'] for s in by_name['llm.batch']}, {'7'})
+        self.assertIn('review.pack', by_name)
+        self.assertEqual(by_name['llm.merge'][0]['parent_span_id'], by_name['review.merge'][0]['span_id'])
+
+    def test_trace_view(self):
+        with trace('svn.check', repo='demo'):
+            with span('svn.update'):
+                pass
+            for revision in ('12', '123'):
+                with trace('svn.commit', repo='demo', revision=revision):
+                    with span('llm.batch', batch_index=0):
+                        pass
+                    with span('llm.batch', batch_index=1):
+                        pass
+
+        spans = read_spans(self.trace_file)
+        tops = find_review_spans(spans, 'r12')
+        self.assertEqual([(s['name'], s['attributes']['revision']) for s in tops], [('svn.commit', '12')])
+        self.assertEqual(tops[0]['_parent']['name'], 'svn.check')
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(show_revision(spans, '12', 'demo', False, True), 0)
+            self.assertEqual(show_revision(spans, '999', None, False, False), 1)
+        text = output.getvalue()
+        self.assertIn('svn.update', text)
+        self.assertIn('llm.batch ×2', text)
+        self.assertIn('没有找到修订号 999', text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/webhook_inbox.py Webhook 收件箱的单元测试。
+
+覆盖：
+1. 事件返回前已落盘，任务执行前后状态流转 received → processing → done / failed，入队失败记为 rejected
+2. 并发写入时多条记录合并为一次提交（组提交）
+3. 启动时只恢复上一次运行遗留的 received / processing 事件，无法解析的处理函数记为 failed，
+   被防抖替换（superseded）的事件不恢复，超出恢复范围的未完成事件被清理
+4. 访问令牌不写入收件箱，恢复时从配置重新获取，缺少令牌时记为 failed
+5. 按时间范围重放事件，默认只重放 failed / rejected，队列已满时停止并返回剩余数量
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils import webhook_inbox
+from biz.utils.webhook_inbox import TOKEN_PLACEHOLDER, InboxTask, WebhookInbox, record_webhook, reject_webhook, \
+    replay_events, resume_unfinished, supersede_webhook
+
+HANDLED = []
+TOKENS = []
+
+
+def _handler(payload, token, url, slug):
+    if payload.get('fail'):
+        raise ValueError('boom')
+    HANDLED.append(payload['seq'])
+    TOKENS.append(token)
+
+
+class TestWebhookInbox(TestCase):
+    def setUp(self):
+        HANDLED.clear()
+        TOKENS.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.patcher = patch.object(WebhookInbox, 'DB_FILE', os.path.join(self.tmpdir.name, 'data.db'))
+        self.patcher.start()
+        WebhookInbox.init_db()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmpdir.cleanup()
+
+    def _status(self, event_id):
+        with sqlite3.connect(WebhookInbox.DB_FILE) as conn:
+            return conn.execute('SELECT status, attempts, error FROM webhook_inbox WHERE event_id = ?',
+                                (event_id,)).fetchone()
+
+    def _insert(self, seq, status, boot_id, received_at=None, handler=None, token='token', source='gitlab'):
+        event_id = f"event-{seq}"
+        received_at = received_at or time.time()
+        with sqlite3.connect(WebhookInbox.DB_FILE) as conn:
+            conn.execute('INSERT INTO webhook_inbox (event_id, received_at, source, event_type, handler, args, status, '
+                         'boot_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         (event_id, received_at, source, 'push', handler or f"{__name__}:_handler",
+                          json.dumps([{'seq': seq}, token, 'http://gitlab', 'gitlab']), status, boot_id))
+            conn.commit()
+        return event_id
+
+    @staticmethod
+    def _run_submit(task, *args):
+        task(*args)
+        return True
+
+    def test_status_transitions(self):
+        args = ({'seq': 1}, 'secret-token', 'http://gitlab', 'gitlab')
+        task = record_webhook('gitlab', 'push', _handler, args, token_index=1)
+        self.assertIsInstance(task, InboxTask)
+        self.assertEqual(self._status(task.event_id)[0], 'received')
+        stored = WebhookInbox.get_events()[0]['args']
+        self.assertNotIn('secret-token', stored)
+        self.assertEqual(json.loads(stored)[1], TOKEN_PLACEHOLDER)
+        task(*args)
+        self.assertEqual(self._status(task.event_id)[:2], ('done', 1))
+        self.assertEqual(HANDLED, [1])
+
+        failing = record_webhook('gitlab', 'push', _handler, ({'fail': True}, 'token', 'http://gitlab', 'gitlab'))
+        with self.assertRaises(ValueError):
+            failing({'fail': True}, 'token', 'http://gitlab', 'gitlab')
+        self.assertEqual(self._status(failing.event_id), ('failed', 1, 'ValueError: boom'))
+
+        rejected = record_webhook('github', 'push', _handler, args)
+        reject_webhook(rejected)
+        self.assertEqual(self._status(rejected.event_id)[0], 'rejected')
+
+        # 防抖窗口内被替换：只有尚未处理的事件记为 superseded
+        replaced = record_webhook('gitlab', 'merge_request', _handler, args)
+        supersede_webhook(replaced.event_id)
+        supersede_webhook(task.event_id)
+        self.assertEqual(self._status(replaced.event_id)[0], 'superseded')
+        self.assertEqual(self._status(task.event_id)[0], 'done')
+
+        with patch.dict(os.environ, {'WEBHOOK_INBOX_ENABLED': '0'}):
+            self.assertIs(record_webhook('gitlab', 'push', _handler, args), _handler)
+
+    def test_group_commit(self):
+        commits = []
+
+        class SlowTimer:
+            @contextmanager
+            def time(self, **labels):
+                time.sleep(0.05)
+                yield
+                commits.append(labels)
+
+        writer = webhook_inbox._InboxWriter()
+        with patch.object(webhook_inbox, '_writer', writer), patch.object(webhook_inbox, 'DB_WRITE_SECONDS',
+                                                                          SlowTimer()):
+            with ThreadPoolExecutor(max_workers=40) as executor:
+                tasks = list(executor.map(
+                    lambda seq: record_webhook('gitlab', 'push', _handler, ({'seq': seq}, 't', 'u', 's')), range(40)))
+        self.assertTrue(all(isinstance(task, InboxTask) for task in tasks))
+        self.assertEqual(WebhookInbox.get_stats(), {'received': 40})
+        self.assertLess(len(commits), 10)
+
+    def test_resume_unfinished(self):
+        self._insert(1, 'received', 'previous-boot')
+        self._insert(2, 'processing', 'previous-boot')
+        self._insert(3, 'done', 'previous-boot')
+        self._insert(4, 'received', webhook_inbox.BOOT_ID)
+        self._insert(5, 'received', 'previous-boot', received_at=time.time() - 3 * 86400)
+        broken = self._insert(6, 'received', 'previous-boot', handler='biz.utils.test_webhook_inbox:missing')
+
+        result = resume_unfinished(self._run_submit)
+        self.assertEqual(result, {'queued': 2, 'skipped': 1, 'remaining': 0})
+        self.assertEqual(HANDLED, [1, 2])
+        self.assertEqual(self._status('event-2')[:2], ('done', 1))
+        self.assertEqual(self._status('event-4')[0], 'received')
+        self.assertEqual(self._status(broken)[0], 'failed')
+        # 已由本次运行接管的事件不会再次恢复
+        self._insert(7, 'received', 'previous-boot')
+        self.assertEqual(resume_unfinished(lambda task, *args: True)['queued'], 1)
+        self.assertEqual(resume_unfinished(lambda task, *args: True)['queued'], 0)
+        # 被防抖替换的事件不恢复
+        self._insert(8, 'superseded', 'previous-boot')
+        self.assertEqual(resume_unfinished(lambda task, *args: True)['queued'], 0)
+
+        # 超出恢复范围的未完成事件与超过保留天数的已结束事件被清理
+        writer = webhook_inbox._InboxWriter()
+        writer._cleanup()
+        self.assertIsNone(self._status('event-5'))
+        self.assertIsNotNone(self._status('event-3'))
+        self._insert(9, 'superseded', 'previous-boot', received_at=time.time() - 30 * 86400)
+        writer._last_cleanup = 0.0
+        writer._cleanup()
+        self.assertIsNone(self._status('event-9'))
+
+    def test_resume_resolves_token(self):
+        self._insert(1, 'received', 'previous-boot', token=TOKEN_PLACEHOLDER)
+        self._insert(2, 'received', 'previous-boot', token=TOKEN_PLACEHOLDER, source='github')
+        with patch.dict(os.environ, {'GITLAB_ACCESS_TOKEN': 'config-token', 'GITHUB_ACCESS_TOKEN': ''}):
+            result = resume_unfinished(self._run_submit)
+        self.assertEqual(result, {'queued': 1, 'skipped': 1, 'remaining': 0})
+        self.assertEqual((HANDLED, TOKENS), ([1], ['config-token']))
+        status, _, error = self._status('event-2')
+        self.assertEqual(status, 'failed')
+        self.assertIn('访问令牌', error)
+
+        # 重放时使用请求头携带的令牌
+        HANDLED.clear()
+        TOKENS.clear()
+        now = time.time()
+        with patch.dict(os.environ, {'GITHUB_ACCESS_TOKEN': ''}):
+            result = replay_events(self._run_submit, now - 60, now + 60, tokens={'github': 'header-token'})
+        self.assertEqual((result['queued'], TOKENS), (1, ['header-token']))
+
+    def test_replay_range(self):
+        now = time.time()
+        for seq, status in enumerate(('done', 'failed', 'rejected', 'done')):
+            self._insert(seq, status, 'previous-boot', received_at=now - 3600 + seq * 600)
+
+        result = replay_events(self._run_submit, now - 7200, now, statuses=['failed', 'rejected'])
+        self.assertEqual((result['matched'], HANDLED), (2, [1, 2]))
+
+        # 默认只重放 failed / rejected：上面重放后均已完成，不再重复入队；重放已完成的事件需显式指定
+        HANDLED.clear()
+        result = replay_events(self._run_submit, now - 3600, now - 2000)
+        self.assertEqual((result['matched'], HANDLED), (0, []))
+
+        HANDLED.clear()
+        result = replay_events(self._run_submit, now - 3600, now - 2000, statuses=['done', 'failed', 'rejected'])
+        self.assertEqual(result, {'queued': 3, 'skipped': 0, 'remaining': 0, 'matched': 3})
+        self.assertEqual(HANDLED, [0, 1, 2])
+        self.assertEqual(self._status('event-0')[:2], ('done', 1))
+        self.assertEqual(self._status('event-1')[:2], ('done', 2))
+
+        submitted = threading.Semaphore(1)
+        result = replay_events(lambda task, *args: submitted.acquire(blocking=False), now - 7200, now,
+                               statuses=['done'])
+        self.assertEqual((result['queued'], result['remaining']), (1, 3))
+        self.assertEqual(WebhookInbox.get_stats().get('rejected'), 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+针对 biz/utils/worker_pool.py 工作进程池的单元测试。
+
+覆盖：
+1. 任务由常驻工作进程执行，指标正确统计
+2. 队列已满时拒绝任务（背压）
+3. shutdown 后不再接收任务
+4. 共享队列中残留的上一任管理进程哨兵被忽略，工作进程数通过共享计数器统计
+5. 工作进程不是从管理进程直接 fork 的（管理进程是多线程的），由 forkserver 派生
+"""
+import os
+import tempfile
+import time
+from unittest import TestCase, main
+
+from biz.utils.worker_pool import WorkerPool
+
+
+def _write_pid(path):
+    with open(path, 'a') as f:
+        f.write(f"{os.getpid()}\n")
+
+
+def _write_parent_pid(path):
+    with open(path, 'w') as f:
+        f.write(str(os.getppid()))
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+
+
+class TestWorkerPool(TestCase):
+    def test_tasks_run_in_warm_workers(self):
+        pool = WorkerPool(size=2, max_queue_size=10, submit_timeout=1)
+        pool.start()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'pids')
+            try:
+                for _ in range(6):
+                    self.assertTrue(pool.submit(_write_pid, path))
+                deadline = time.time() + 30
+                while pool.metrics()['completed'] < 6 and time.time() < deadline:
+                    time.sleep(0.05)
+            finally:
+                pool.shutdown(timeout=5)
+
+            with open(path) as f:
+                pids = set(f.read().split())
+        # 6 个任务最多由 2 个进程执行，进程被复用
+        self.assertLessEqual(len(pids), 2)
+        metrics = pool.metrics()
+        self.assertEqual(metrics['submitted'], 6)
+        self.assertEqual(metrics['completed'], 6)
+        self.assertEqual(metrics['rejected'], 0)
+
+    def test_reject_when_queue_full(self):
+        pool = WorkerPool(size=1, max_queue_size=1, submit_timeout=0)
+        pool.start()
+        try:
+            results = [pool.submit(_sleep, 2) for _ in range(5)]
+            self.assertIn(False, results)
+            self.assertGreater(pool.metrics()['rejected'], 0)
+        finally:
+            pool.shutdown(timeout=0.5)
+        self.assertFalse(pool.submit(_sleep, 0))
+
+    def test_stale_sentinel_ignored(self):
+        pool = WorkerPool(size=1, max_queue_size=10, submit_timeout=1)
+        self.assertEqual(pool.metrics()['workers'], 0)
+        pool._task_queue.put(os.getpid() + 100000)
+        pool.start()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'pids')
+            try:
+                self.assertTrue(pool.submit(_write_pid, path))
+                deadline = time.time() + 30
+                while pool.metrics()['completed'] < 1 and time.time() < deadline:
+                    time.sleep(0.05)
+                self.assertEqual(pool.metrics()['completed'], 1)
+                self.assertEqual(pool.metrics()['workers'], 1)
+            finally:
+                pool.shutdown(timeout=5)
+        self.assertEqual(pool.metrics()['workers'], 0)
+
+    def test_workers_not_forked_from_owner(self):
+        pool = WorkerPool(size=1, max_queue_size=10, submit_timeout=1)
+        self.assertNotEqual(pool._ctx.get_start_method(), 'fork')
+        pool.start()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'ppid')
+            try:
+                self.assertTrue(pool.submit(_write_parent_pid, path))
+                deadline = time.time() + 30
+                while pool.metrics()['completed'] < 1 and time.time() < deadline:
+                    time.sleep(0.05)
+            finally:
+                pool.shutdown(timeout=5)
+            with open(path) as f:
+                self.assertNotEqual(int(f.read()), os.getpid())
+        self.assertEqual(pool.metrics()['workers'], 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Agentic 审查的工具调用执行器。
+
+- 同一轮内模型返回的多个 tool_calls 并发执行（并发数由 AGENTIC_TOOL_CONCURRENCY 控制，1 为串行），
+  结果按 tool_calls 原顺序返回，保证 tool 消息与 tool_call_id 一一对应
+- 审查级别的结果缓存：同一次审查内（跨轮次、跨分批、跨文件）参数相同的工具调用只执行一次，
+  其余直接返回缓存结果；并发发起的相同调用等待首个调用的结果，不重复执行。
+  执行失败的错误文本不缓存，后续相同调用会重新执行
+- 统计一次审查中模型调用与工具执行各自的累计耗时、工具调用轮数（每轮为一次完整的模型往返），
+  审查结束时写入指标并打印日志；工具调用轮数按是否开启上下文预取分别统计，便于对比预取前后的平均轮数
+"""
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+from biz.utils.default_config import get_env_int
+from biz.utils.log import logger
+from biz.utils.metrics import AGENTIC_PHASE_SECONDS, AGENTIC_TOOL_CALLS, AGENTIC_TOOL_ROUNDS, AGENTIC_TOOL_SECONDS
+from biz.utils.tracing import span
+
+# 工具执行失败时 _dispatch_tool 返回的错误文本前缀
+ERROR_PREFIX = "错误:"
+
+
+class ToolCallRunner:
+    """一次审查内共享的工具调用执行器（线程安全，分批/多文件并发审查共用同一个实例）"""
+
+    def __init__(self, dispatch: Callable[[Dict[str, Any]], str]):
+        self.dispatch = dispatch
+        self.concurrency = max(1, get_env_int("AGENTIC_TOOL_CONCURRENCY", 4))
+        self._memo: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self.model_seconds = 0.0
+        self.tool_seconds = 0.0
+        self.tool_calls = 0
+        self.cache_hits = 0
+        self.tool_rounds = 0
+
+    @staticmethod
+    def _memo_key(call: Dict[str, Any]) -> Tuple[str, str]:
+        arguments = call.get("arguments") or {}
+        return call.get("name") or "", json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=str)
+
+    def run(self, calls: List[Dict[str, Any]], prefetch: bool = False) -> List[str]:
+        """执行一轮工具调用，返回与 calls 顺序一致的结果文本；prefetch=True 为审查前的上下文预取，不计入轮数"""
+        if not calls:
+            return []
+        started = time.monotonic()
+        concurrency = min(self.concurrency, len(calls))
+        if concurrency == 1:
+            results = [self._run_one(call) for call in calls]
+        else:
+            contexts = [contextvars.copy_context() for _ in calls]
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="agentic-tool") as executor:
+                results = list(executor.map(lambda ctx, call: ctx.run(self._run_one, call), contexts, calls))
+        # 按墙钟时间累计：同一轮并发执行的工具只计一次最长耗时，与模型调用耗时口径一致
+        with self._lock:
+            self.tool_seconds += time.monotonic() - started
+            if not prefetch:
+                self.tool_rounds += 1
+        return results
+
+    def _run_one(self, call: Dict[str, Any]) -> str:
+        key = self._memo_key(call)
+        with self._lock:
+            self.tool_calls += 1
+            future = self._memo.get(key)
+            owner = future is None
+            if owner:
+                future = self._memo[key] = Future()
+            else:
+                self.cache_hits += 1
+        name = key[0] or "unknown"
+        AGENTIC_TOOL_CALLS.inc(tool=name, cached=str(not owner).lower())
+        if not owner:
+            return future.result()
+
+        started = time.monotonic()
+        try:
+            with span("agentic.tool", tool=name):
+                result = self.dispatch(call)
+        except Exception as e:
+            # _dispatch_tool 本身会把异常转为错误文本，这里只兜底，避免等待同一结果的调用永远阻塞
+            result = f"{ERROR_PREFIX} 工具执行失败 - {e}"
+        AGENTIC_TOOL_SECONDS.observe(time.monotonic() - started, tool=name)
+        if result.startswith(ERROR_PREFIX):
+            with self._lock:
+                self._memo.pop(key, None)
+        future.set_result(result)
+        return result
+
+    @contextmanager
+    def model_call(self):
+        """统计一次模型调用耗时"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.model_seconds += time.monotonic() - started
+
+    def report(self, reviewer: str, prefetch: bool = False):
+        """审查结束：记录本次审查模型调用与工具执行的累计耗时及工具调用轮数"""
+        if not self.tool_calls and not self.model_seconds:
+            return
+        AGENTIC_PHASE_SECONDS.observe(self.model_seconds, reviewer=reviewer, phase="model")
+        AGENTIC_PHASE_SECONDS.observe(self.tool_seconds, reviewer=reviewer, phase="tool")
+        AGENTIC_TOOL_ROUNDS.observe(self.tool_rounds, reviewer=reviewer, prefetch="on" if prefetch else "off")
+        logger.info(f"🔧 Agentic 审查耗时统计 ({reviewer}): 模型 {self.model_seconds:.1f}s，"
+                    f"工具 {self.tool_seconds:.1f}s，工具调用 {self.tool_rounds} 轮 {self.tool_calls} 次"
+                    f"（缓存命中 {self.cache_hits} 次），上下文预取{'开启' if prefetch else '关闭'}")
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+审查流水线阶段耗时追踪（轻量 span）
+把一次审查拆成 svn update / svn diff / diff 解析 / token 计数 / 各批 LLM 审查 / 合并调用 / 通知 / 写库等阶段，
+每个阶段一个 span，带仓库、修订号、批次序号等属性，用于回答"这 9 分钟花在哪里"。
+
+- 审查入口用 trace(name, **attributes) 开启一条 trace，各阶段用 span(name, **attributes) 记录；两者既是上下文管理器
+  也是装饰器，span 只在进行中的 trace 内记录
+- 父子关系通过 contextvars 传递，线程池与共享事件循环中的批次已显式复制调用方上下文（见 _run_parallel / run_sync）
+- 一条 trace 的 span 先在内存中累积，根 span 结束时一次写出一行 JSON（OTLP ExportTraceServiceRequest 的 JSON 编码，
+  与 OpenTelemetry Collector 的 file exporter / otlpjsonfile receiver 格式一致），文件按大小轮转
+- 查看某个修订号的阶段耗时分解：python biz/cmd/trace_view.py <revision>
+
+TRACING_ENABLED=0 时 trace / span 不做任何记录。
+"""
+
+import contextvars
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional
+
+from biz.utils.default_config import get_env_bool, get_env_int, get_env_with_default
+
+SERVICE_NAME = 'ai-codereview'
+SCOPE_NAME = 'biz.utils.tracing'
+# OTLP 状态码：0 未设置，1 正常，2 错误；span 类型 1 为 INTERNAL
+STATUS_OK, STATUS_ERROR = 1, 2
+SPAN_KIND_INTERNAL = 1
+# 单条 trace 在内存中最多累积的 span 数，超出后先写出已结束的部分
+MAX_PENDING_SPANS = 2000
+
+_current_span: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar('trace_current_span',
+                                                                                         default=None)
+_lock = threading.Lock()
+_pending: Dict[str, List[Dict[str, Any]]] = {}
+_trace_logger: Optional[logging.Logger] = None
+_trace_logger_key = None
+
+
+def get_trace_file() -> str:
+    return get_env_with_default('TRACE_FILE', 'log/trace.jsonl') or 'log/trace.jsonl'
+
+
+def _get_trace_logger() -> logging.Logger:
+    """专用的轮转文件 logger（只输出消息本身，不向上传播到应用日志）；fork 后或追踪文件配置变化时重建"""
+    global _trace_logger, _trace_logger_key
+    trace_file = get_trace_file()
+    with _lock:
+        if _trace_logger is None or _trace_logger_key != (os.getpid(), trace_file):
+            trace_dir = os.path.dirname(trace_file)
+            if trace_dir:
+                os.makedirs(trace_dir, exist_ok=True)
+            trace_logger = logging.getLogger(f'{SCOPE_NAME}.{os.getpid()}')
+            trace_logger.propagate = False
+            trace_logger.setLevel(logging.INFO)
+            for handler in list(trace_logger.handlers):
+                trace_logger.removeHandler(handler)
+                handler.close()
+            handler = RotatingFileHandler(trace_file, maxBytes=get_env_int('TRACE_MAX_BYTES', 20 * 1024 * 1024),
+                                          backupCount=get_env_int('TRACE_BACKUP_COUNT', 5), encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            trace_logger.addHandler(handler)
+            _trace_logger, _trace_logger_key = trace_logger, (os.getpid(), trace_file)
+        return _trace_logger
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    """按 OTLP JSON 编码转换属性值（64 位整数编码为字符串）"""
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def _to_otlp(record: Dict[str, Any]) -> Dict[str, Any]:
+    span = {
+        'traceId': record['trace_id'],
+        'spanId': record['span_id'],
+        'parentSpanId': record['parent_span_id'] or '',
+        'name': record['name'],
+        'kind': SPAN_KIND_INTERNAL,
+        'startTimeUnixNano': str(record['start_ns']),
+        'endTimeUnixNano': str(record['end_ns']),
+        'attributes': [_attribute(k, v) for k, v in record['attributes'].items() if v is not None],
+        'status': {'code': record['status']},
+    }
+    if record.get('status_message'):
+        span['status']['message'] = record['status_message']
+    return span
+
+
+def _export(records: List[Dict[str, Any]]):
+    payload = {'resourceSpans': [{
+        'resource': {'attributes': [_attribute('service.name', SERVICE_NAME), _attribute('process.pid', os.getpid())]},
+        'scopeSpans': [{'scope': {'name': SCOPE_NAME}, 'spans': [_to_otlp(record) for record in records]}],
+    }]}
+    try:
+        _get_trace_logger().info(json.dumps(payload, ensure_ascii=False))
+    except Exception as e:
+        from biz.utils.log import logger
+        logger.warning(f"⚠️ 写入追踪文件失败: {e}")
+
+
+def _end(record: Dict[str, Any], is_root: bool):
+    record['end_ns'] = time.time_ns()
+    with _lock:
+        records = _pending.setdefault(record['trace_id'], [])
+        records.append(record)
+        if is_root:
+            del _pending[record['trace_id']]
+        elif len(records) >= MAX_PENDING_SPANS:
+            _pending[record['trace_id']] = []
+        else:
+            return
+    _export(records)
+
+
+@contextmanager
+def trace(name: str, **attributes) -> Iterator[Optional[Dict[str, Any]]]:
+    """审查入口使用：没有进行中的 trace 时开启一条新 trace，否则作为子 span 记录；也可作为装饰器使用"""
+    with _span(name, attributes, start_new=True) as record:
+        yield record
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    记录一个阶段；也可作为装饰器使用。只在进行中的 trace 内记录（例如 UI 或启动时执行的 svn 命令不产生孤立记录）。
+    属性值为 None 的不写出，子 span 继承父 span 的 repo / revision 属性（便于按修订号查找）。
+    代码块抛出异常时 span 标记为错误，异常继续抛出。
+    """
+    with _span(name, attributes, start_new=False) as record:
+        yield record
+
+
+@contextmanager
+def _span(name: str, attributes: Dict[str, Any], start_new: bool) -> Iterator[Optional[Dict[str, Any]]]:
+    parent = _current_span.get()
+    if (parent is None and not start_new) or not get_env_bool('TRACING_ENABLED'):
+        yield None
+        return
+    inherited = {key: parent['attributes'][key] for key in ('repo', 'revision')
+                 if parent and key in parent['attributes']}
+    record = {
+        'trace_id': parent['trace_id'] if parent else secrets.token_hex(16),
+        'span_id': secrets.token_hex(8),
+        'parent_span_id': parent['span_id'] if parent else None,
+        'name': name,
+        'attributes': dict(inherited, **attributes),
+        'start_ns': time.time_ns(),
+        'status': STATUS_OK,
+    }
+    token = _current_span.set(record)
+    try:
+        yield record
+    except BaseException as e:
+        record['status'] = STATUS_ERROR
+        record['status_message'] = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        _current_span.reset(token)
+        _end(record, parent is None)
+
+
+def set_span_attributes(**attributes):
+    """给当前 span 补充属性（例如解析 webhook 之后才知道的仓库名与修订号）"""
+    record = _current_span.get()
+    if record is not None:
+        record['attributes'].update(attributes)
+
+
+# ---------------------------------------------------------------- 读取（trace_view 命令使用）
+def _attribute_value(value: Dict[str, Any]) -> Any:
+    if 'intValue' in value:
+        return int(value['intValue'])
+    for key in ('stringValue', 'boolValue', 'doubleValue'):
+        if key in value:
+            return value[key]
+    return None
+
+
+def read_spans(trace_file: Optional[str] = None) -> List[Dict[str, Any]]:
+    """读取追踪文件（含轮转出的备份文件，按从旧到新的顺序），返回扁平的 span 列表"""
+    trace_file = trace_file or get_trace_file()
+    backups = get_env_int('TRACE_BACKUP_COUNT', 5)
+    paths = [f"{trace_file}.{i}" for i in range(backups, 0, -1)] + [trace_file]
+    spans = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    payload = json.loads(line)
+                except ValueError:
+                    continue
+                for resource_spans in payload.get('resourceSpans', []):
+                    for scope_spans in resource_spans.get('scopeSpans', []):
+                        for item in scope_spans.get('spans', []):
+                            spans.append({
+                                'trace_id': item['traceId'],
+                                'span_id': item['spanId'],
+                                'parent_span_id': item.get('parentSpanId') or None,
+                                'name': item['name'],
+                                'start_ns': int(item['startTimeUnixNano']),
+                                'end_ns': int(item['endTimeUnixNano']),
+                                'attributes': {a['key']: _attribute_value(a['value'])
+                                               for a in item.get('attributes', [])},
+                                'status': item.get('status', {}).get('code', 0),
+                            })
+    return spans
@@ -4,6 +4,7 @@ import json
 from typing import Optional, List, Dict
 from datetime import datetime
 from biz.utils.log import logger
+from biz.utils.metrics import DB_WRITE_SECONDS
 
 
 class VersionTracker:
@@ -184,6 +185,7 @@ class VersionTracker:
             return None
 
     @staticmethod
+    @DB_WRITE_SECONDS.time(operation='version_review')
     def record_version_review(project_name: str, commits: List[Dict], 
                             changes: List[Dict] = None, author: str = "",
                             branch: str = "", review_type: str = "gitlab",
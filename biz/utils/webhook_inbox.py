@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Webhook 收件箱
+接收到的 GitLab / GitHub 事件在返回 200 之前先写入 SQLite 收件箱表，再交给任务队列处理；
+非 rq 模式下队列只存在于进程内存中，容器重启时排队中 / 处理中的审查会丢失，收件箱用于恢复与重放：
+
+- 每个事件一行，状态流转：received（已接收）→ processing（处理中）→ done（完成）/ failed（处理异常），
+  队列已满被拒绝（返回 503，由发送方重试）的记为 rejected，在防抖窗口内被同一 MR 新事件替换的记为 superseded
+- 写入采用组提交：请求线程只把记录放入内存队列并等待落盘，后台写线程把等待中的记录合并为一个事务提交
+  （WAL + synchronous=NORMAL，进程崩溃不丢已提交的记录），每个事件只增加入队与唤醒的开销
+- 启动时恢复上一次运行遗留的 received / processing 事件（rq 模式下任务本身持久化在 Redis 中，不做恢复）；
+  每次运行有独立的 BOOT_ID，gunicorn 部署时后台服务进程切换也不会把本次运行已入队的事件重复入队
+- POST /review/inbox/replay 按时间范围重放事件（默认只重放 failed / rejected）
+- 已结束的事件保留 WEBHOOK_INBOX_RETENTION_DAYS 天；超过 WEBHOOK_INBOX_RESUME_HOURS 不再恢复的 received / processing
+  事件同时清理
+
+表中保存处理函数的参数用于恢复和重放，访问令牌不落盘（以占位符代替），恢复 / 重放时从配置或重放请求头重新获取。
+"""
+
+import importlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from biz.utils.default_config import get_env_bool, get_env_int, get_env_with_default
+from biz.utils.log import logger
+from biz.utils.metrics import DB_WRITE_SECONDS
+
+STATUS_RECEIVED = 'received'
+STATUS_PROCESSING = 'processing'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_REJECTED = 'rejected'
+STATUS_SUPERSEDED = 'superseded'
+UNFINISHED_STATUSES = (STATUS_RECEIVED, STATUS_PROCESSING)
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_REJECTED, STATUS_SUPERSEDED)
+# 重放默认只处理失败与被拒绝的事件，重放已完成 / 处理中的事件需显式指定状态
+DEFAULT_REPLAY_STATUSES = (STATUS_FAILED, STATUS_REJECTED)
+
+# 参数中访问令牌的占位符，及恢复 / 重放时读取令牌的配置项
+TOKEN_PLACEHOLDER = '<access_token>'
+_TOKEN_ENV = {'gitlab': 'GITLAB_ACCESS_TOKEN', 'github': 'GITHUB_ACCESS_TOKEN'}
+
+# 本次运行的标识（gunicorn preload 时由主进程生成，各 HTTP 工作进程共用）
+BOOT_ID = uuid.uuid4().hex
+
+_COLUMNS = ('event_id', 'received_at', 'source', 'event_type', 'handler', 'args', 'status', 'boot_id', 'updated_at')
+
+
+class WebhookInbox:
+    """Webhook 收件箱表（SQLite）"""
+
+    DB_FILE = "data/data.db"
+
+    @staticmethod
+    def init_db():
+        """初始化收件箱表，并把数据库切换为 WAL 模式（组提交与其他表的读写互不阻塞）"""
+        try:
+            with sqlite3.connect(WebhookInbox.DB_FILE) as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS webhook_inbox (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        event_id TEXT NOT NULL UNIQUE,
+                        received_at REAL NOT NULL,
+                        source TEXT,
+                        event_type TEXT,
+                        handler TEXT NOT NULL,
+                        args TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        attempts INTEGER DEFAULT 0,
+                        boot_id TEXT,
+                        error TEXT,
+                        updated_at REAL
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_webhook_inbox_status ON webhook_inbox (status)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_webhook_inbox_received_at ON webhook_inbox (received_at)')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Webhook收件箱表初始化失败: {e}")
+
+    @staticmethod
+    def update_status(event_id: str, status: str, error: Optional[str] = None):
+        """更新事件状态；进入 processing 时累加处理次数"""
+        try:
+            with sqlite3.connect(WebhookInbox.DB_FILE, timeout=10) as conn:
+                conn.execute('''
+                    UPDATE webhook_inbox SET status = ?, error = ?, updated_at = ?,
+                        attempts = attempts + (CASE WHEN ? = 'processing' THEN 1 ELSE 0 END)
+                    WHERE event_id = ?
+                ''', (status, error[:500] if error else None, time.time(), status, event_id))
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.warning(f"更新Webhook事件 {event_id} 状态为 {status} 失败: {e}")
+
+    @staticmethod
+    def claim(event_ids: List[str]):
+        """恢复 / 重放前把事件重新标记为本次运行已接收"""
+        with sqlite3.connect(WebhookInbox.DB_FILE, timeout=10) as conn:
+            conn.executemany('UPDATE webhook_inbox SET status = ?, boot_id = ?, error = NULL, updated_at = ? '
+                             'WHERE event_id = ?',
+                             [(STATUS_RECEIVED, BOOT_ID, time.time(), event_id) for event_id in event_ids])
+            conn.commit()
+
+    @staticmethod
+    def get_events(received_at_gte: Optional[float] = None, received_at_lte: Optional[float] = None,
+                   statuses: Optional[Iterable[str]] = None, source: Optional[str] = None,
+                   exclude_boot_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按接收时间、状态、来源查询事件（按接收顺序）"""
+        query = 'SELECT event_id, received_at, source, event_type, handler, args, status, attempts, boot_id ' \
+                'FROM webhook_inbox WHERE 1=1'
+        params = []
+        if received_at_gte is not None:
+            query += ' AND received_at >= ?'
+            params.append(received_at_gte)
+        if received_at_lte is not None:
+            query += ' AND received_at <= ?'
+            params.append(received_at_lte)
+        if statuses:
+            statuses = list(statuses)
+            query += f" AND status IN ({', '.join('?' * len(statuses))})"
+            params.extend(statuses)
+        if source:
+            query += ' AND source = ?'
+            params.append(source)
+        if exclude_boot_id:
+            query += ' AND (boot_id IS NULL OR boot_id != ?)'
+            params.append(exclude_boot_id)
+        with sqlite3.connect(WebhookInbox.DB_FILE, timeout=10) as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(query + ' ORDER BY id', params)]
+
+    @staticmethod
+    def get_stats() -> Dict[str, int]:
+        """各状态的事件数"""
+        try:
+            with sqlite3.connect(WebhookInbox.DB_FILE) as conn:
+                return dict(conn.execute('SELECT status, COUNT(*) FROM webhook_inbox GROUP BY status').fetchall())
+        except sqlite3.DatabaseError as e:
+            logger.error(f"查询Webhook收件箱统计失败: {e}")
+            return {}
+
+    @staticmethod
+    def mark_superseded(event_id: str):
+        """尚未入队的事件被同一 MR 的新事件替换"""
+        try:
+            with sqlite3.connect(WebhookInbox.DB_FILE, timeout=10) as conn:
+                conn.execute('UPDATE webhook_inbox SET status = ?, updated_at = ? WHERE event_id = ? AND status = ?',
+                             (STATUS_SUPERSEDED, time.time(), event_id, STATUS_RECEIVED))
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.warning(f"标记Webhook事件 {event_id} 已被替换失败: {e}")
+
+    @staticmethod
+    def delete_finished_before(timestamp: float) -> int:
+        return WebhookInbox._delete_before(timestamp, FINISHED_STATUSES)
+
+    @staticmethod
+    def delete_unfinished_before(timestamp: float) -> int:
+        """删除已超出恢复时间范围、不会再被恢复的 received / processing 事件"""
+        return WebhookInbox._delete_before(timestamp, UNFINISHED_STATUSES)
+
+    @staticmethod
+    def _delete_before(timestamp: float, statuses: Tuple[str, ...]) -> int:
+        with sqlite3.connect(WebhookInbox.DB_FILE, timeout=10) as conn:
+            deleted = conn.execute(f"DELETE FROM webhook_inbox WHERE received_at < ? "
+                                   f"AND status IN ({', '.join('?' * len(statuses))})",
+                                   (timestamp, *statuses)).rowcount
+            conn.commit()
+        return deleted
+
+
+class InboxTask:
+    """队列任务包装：执行前后更新收件箱中的事件状态（可被 pickle，rq 按可调用对象入队）"""
+
+    def __init__(self, event_id: str, function: Callable):
+        self.event_id = event_id
+        self.function = function
+        self.__name__ = getattr(function, '__name__', str(function))
+
+    def __call__(self, *args, **kwargs):
+        WebhookInbox.update_status(self.event_id, STATUS_PROCESSING)
+        try:
+            result = self.function(*args, **kwargs)
+        except Exception as e:
+            WebhookInbox.update_status(self.event_id, STATUS_FAILED, f"{type(e).__name__}: {e}")
+            raise
+        WebhookInbox.update_status(self.event_id, STATUS_DONE)
+        return result
+
+
+class _PendingWrite:
+    __slots__ = ('row', 'done', 'ok')
+
+    def __init__(self, row: Tuple):
+        self.row = row
+        self.done = threading.Event()
+        self.ok = False
+
+
+class _InboxWriter:
+    """
+    组提交写线程：请求线程入队后等待，写线程把队列中已有的记录一次性写入并提交，然后逐个唤醒；
+    提交期间新到达的记录自然合并进下一次提交。fork 出的子进程按 pid 重新创建写线程
+    """
+
+    BATCH_SIZE = 500
+    COMMIT_TIMEOUT = 5.0
+    CLEANUP_INTERVAL = 3600
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+        self._last_cleanup = 0.0
+
+    def _ensure_started(self) -> queue.Queue:
+        with self._lock:
+            if self._queue is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, args=(self._queue,), daemon=True, name="webhook-inbox").start()
+            return self._queue
+
+    def append(self, row: Tuple) -> bool:
+        """写入一条记录，落盘后返回 True；写库失败或超时返回 False"""
+        pending = _PendingWrite(row)
+        self._ensure_started().put(pending)
+        return pending.done.wait(self.COMMIT_TIMEOUT) and pending.ok
+
+    def _run(self, q: queue.Queue):
+        conn, db_file = None, None
+        while True:
+            batch = [q.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            ok = False
+            try:
+                if conn is None or db_file != WebhookInbox.DB_FILE:
+                    if conn is not None:
+                        conn.close()
+                    db_file = WebhookInbox.DB_FILE
+                    conn = sqlite3.connect(db_file, timeout=10)
+                    conn.execute('PRAGMA synchronous=NORMAL')
+                with DB_WRITE_SECONDS.time(operation='webhook_inbox'):
+                    conn.executemany(f"INSERT INTO webhook_inbox ({', '.join(_COLUMNS)}) "
+                                     f"VALUES ({', '.join('?' * len(_COLUMNS))})", [item.row for item in batch])
+                    conn.commit()
+                ok = True
+            except sqlite3.DatabaseError as e:
+                logger.warning(f"写入Webhook收件箱失败（{len(batch)} 条）: {e}")
+                if conn is not None:
+                    conn.close()
+                conn = None
+            for item in batch:
+                item.ok = ok
+                item.done.set()
+            if ok:
+                self._cleanup()
+
+    def _cleanup(self):
+        if time.monotonic() - self._last_cleanup < self.CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = time.monotonic()
+        retention_days = get_env_int('WEBHOOK_INBOX_RETENTION_DAYS', 7)
+        resume_hours = get_env_int('WEBHOOK_INBOX_RESUME_HOURS', 24)
+        try:
+            deleted = 0
+            if retention_days > 0:
+                deleted += WebhookInbox.delete_finished_before(time.time() - retention_days * 86400)
+            if resume_hours > 0:
+                deleted += WebhookInbox.delete_unfinished_before(time.time() - resume_hours * 3600)
+            if deleted:
+                logger.info(f"🧹 已清理 {deleted} 条过期的Webhook收件箱记录")
+        except sqlite3.DatabaseError as e:
+            logger.warning(f"清理Webhook收件箱失败: {e}")
+
+
+_writer = _InboxWriter()
+
+
+def _handler_name(function: Callable) -> str:
+    return f"{function.__module__}:{function.__qualname__}"
+
+
+def _resolve_handler(name: str) -> Callable:
+    module_name, _, qualname = name.partition(':')
+    target = importlib.import_module(module_name)
+    for attr in qualname.split('.'):
+        target = getattr(target, attr)
+    return target
+
+
+def record_webhook(source: str, event_type: str, function: Callable, args: tuple,
+                   token_index: Optional[int] = None) -> Callable:
+    """
+    把事件写入收件箱（落盘后返回），返回应入队的任务：写入成功为 InboxTask，
+    未启用或写入失败时原样返回 function（不因收件箱故障拒绝 webhook）
+    :param token_index: args 中访问令牌的位置，该参数以占位符写入
+    """
+    if not get_env_bool('WEBHOOK_INBOX_ENABLED'):
+        return function
+    event_id = uuid.uuid4().hex
+    now = time.time()
+    stored_args = list(args)
+    if token_index is not None:
+        stored_args[token_index] = TOKEN_PLACEHOLDER
+    try:
+        row = (event_id, now, source, event_type, _handler_name(function),
+               json.dumps(stored_args, ensure_ascii=False), STATUS_RECEIVED, BOOT_ID, now)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"⚠️ Webhook事件参数无法序列化，未写入收件箱: {e}")
+        return function
+    if not _writer.append(row):
+        logger.warning(f"⚠️ Webhook事件 {source}/{event_type} 写入收件箱失败，继续处理但无法在重启后恢复")
+        return function
+    return InboxTask(event_id, function)
+
+
+def reject_webhook(task: Callable):
+    """任务未能入队（队列已满，返回 503 由发送方重试）"""
+    if isinstance(task, InboxTask):
+        WebhookInbox.update_status(task.event_id, STATUS_REJECTED, 'queue full')
+
+
+def supersede_webhook(event_id: Optional[str]):
+    """防抖窗口内被同一 MR 新事件替换的事件不会再入队，记为 superseded（不再恢复）"""
+    if event_id and get_env_bool('WEBHOOK_INBOX_ENABLED'):
+        WebhookInbox.mark_superseded(event_id)
+
+
+def _resolve_token(source: str, tokens: Optional[Dict[str, str]]) -> Optional[str]:
+    """与接收 webhook 时一致：优先使用配置中的访问令牌，其次使用重放请求携带的令牌"""
+    env_name = _TOKEN_ENV.get(source)
+    return (get_env_with_default(env_name) if env_name else None) or (tokens or {}).get(source)
+
+
+def requeue_events(events: List[Dict[str, Any]], submit: Callable[..., bool],
+                   tokens: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+    """
+    把收件箱中的事件重新入队，submit 为 handle_queue；队列已满时停止，剩余事件保持原状态留待下次处理
+    :param tokens: 按来源（gitlab / github）提供的访问令牌，配置中没有令牌时使用
+    :return: {'queued': 入队数, 'skipped': 无法解析或缺少令牌而跳过的数量, 'remaining': 因队列已满未入队的数量}
+    """
+    result = {'queued': 0, 'skipped': 0, 'remaining': 0}
+    for index, event in enumerate(events):
+        try:
+            function = _resolve_handler(event['handler'])
+            args = json.loads(event['args'])
+            if TOKEN_PLACEHOLDER in args:
+                token = _resolve_token(event['source'], tokens)
+                if not token:
+                    raise ValueError(f"缺少 {event['source']} 访问令牌，请配置令牌或在重放请求头中携带令牌")
+                args = [token if arg == TOKEN_PLACEHOLDER else arg for arg in args]
+        except Exception as e:
+            logger.error(f"❌ 无法恢复Webhook事件 {event['event_id']}（{event['handler']}）: {e}")
+            WebhookInbox.update_status(event['event_id'], STATUS_FAILED, f"无法恢复: {e}")
+            result['skipped'] += 1
+            continue
+        WebhookInbox.claim([event['event_id']])
+        task = InboxTask(event['event_id'], function)
+        if not submit(task, *args):
+            reject_webhook(task)
+            result['remaining'] = len(events) - index
+            break
+        result['queued'] += 1
+    return result
+
+
+def resume_unfinished(submit: Callable[..., bool]) -> Dict[str, int]:
+    """启动时恢复上一次运行遗留的 received / processing 事件（只恢复 WEBHOOK_INBOX_RESUME_HOURS 小时内接收的）"""
+    if not get_env_bool('WEBHOOK_INBOX_ENABLED'):
+        return {}
+    resume_hours = get_env_int('WEBHOOK_INBOX_RESUME_HOURS', 24)
+    since = time.time() - resume_hours * 3600 if resume_hours > 0 else None
+    try:
+        events = WebhookInbox.get_events(received_at_gte=since, statuses=UNFINISHED_STATUSES,
+                                         exclude_boot_id=BOOT_ID)
+    except sqlite3.DatabaseError as e:
+        logger.error(f"❌ 查询待恢复的Webhook事件失败: {e}")
+        return {}
+    if not events:
+        return {'queued': 0, 'skipped': 0, 'remaining': 0}
+    logger.info(f"🔁 发现 {len(events)} 个上次运行未处理完的Webhook事件，重新入队")
+    result = requeue_events(events, submit)
+    logger.info(f"✅ Webhook事件恢复完成: {result}")
+    return result
+
+
+def replay_events(submit: Callable[..., bool], received_at_gte: float, received_at_lte: float,
+                  statuses: Optional[Iterable[str]] = None, source: Optional[str] = None,
+                  tokens: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+    """
+    按接收时间范围重放事件（可按来源过滤）；statuses 未指定时只重放 failed / rejected，
+    避免把已完成或正在处理的事件重复入队
+    """
+    statuses = list(statuses or DEFAULT_REPLAY_STATUSES)
+    events = WebhookInbox.get_events(received_at_gte=received_at_gte, received_at_lte=received_at_lte,
+                                     statuses=statuses, source=source)
+    logger.info(f"🔁 重放 {len(events)} 个Webhook事件（{received_at_gte} ~ {received_at_lte}，状态: {statuses}）")
+    result = requeue_events(events, submit, tokens)
+    result['matched'] = len(events)
+    return result
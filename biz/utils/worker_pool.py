@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+预派生（prefork）工作进程池
+QUEUE_DRIVER 不是 rq 时用于替代"每个 webhook 启动一个新进程"的方式：
+
+- 固定数量的常驻工作进程，启动时完成模块导入预热，后续任务无需重复导入 pandas/openai 等依赖
+- 有界内存队列，队列满时提交方等待 submit_timeout 秒，仍无空位则拒绝（背压）
+- 通过共享计数器暴露队列深度、忙碌进程数、拒绝数等指标
+- 队列与计数器可以先创建、再由另一个 fork 出的进程调用 start() 拉起工作进程（gunicorn 多进程部署时，
+  各 HTTP 工作进程向同一个队列提交任务，只有调用 start() 的进程负责管理工作进程）
+- 工作进程通过 forkserver（不支持时用 spawn）启动，而不是从管理进程直接 fork：管理进程中运行着
+  HTTP 请求、调度器等线程，直接 fork 可能复制其他线程持有的锁；forkserver 是单线程的全新解释器进程，
+  工作进程也不会继承 gunicorn 的监听 socket、信号处理器与后台服务文件锁
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+from typing import Callable, Dict
+
+from biz.utils.log import logger
+from biz.utils.metrics import QUEUE_WAIT_SECONDS, flush_metrics
+
+# 共享计数器下标
+_PENDING, _BUSY, _SUBMITTED, _REJECTED, _COMPLETED, _FAILED, _WAIT_MS, _WORKERS = range(8)
+_STAT_NAMES = ('pending', 'busy', 'submitted', 'rejected', 'completed', 'failed', 'total_wait_ms', 'workers')
+# 管理进程检查并重新拉起退出的工作进程的间隔（秒）；工作进程检查管理进程是否已退出的间隔（秒）
+SUPERVISE_INTERVAL = 5
+ORPHAN_CHECK_INTERVAL = 5
+
+
+def _get_context():
+    """工作进程的启动方式：优先 forkserver，不支持的平台使用 spawn"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        # forkserver 预先导入本模块，工作进程从中 fork 时无需重复导入日志、指标等模块
+        ctx.set_forkserver_preload(['__main__', __name__])
+        return ctx
+    return multiprocessing.get_context('spawn')
+
+
+def _warm_up():
+    """预热：导入审查链路依赖，避免每个任务重复付出导入开销"""
+    try:
+        import biz.queue.worker  # noqa: F401
+        import biz.svn.svn_worker  # noqa: F401
+        from biz.utils.token_util import count_tokens
+        count_tokens("warm up")
+    except Exception as e:
+        logger.warning(f"⚠️ 工作进程预热失败: {e}")
+
+
+def _refresh_env_if_changed(last_version: int) -> int:
+    """
+    配置文件变化时刷新工作进程的环境变量（常驻进程不会随主进程 reload_config 更新）。
+    启动时传入 0 总是加载一次：forkserver 的环境变量停留在它启动时，可能早于最近一次配置变更
+    """
+    try:
+        from biz.utils.config_snapshot import get_config_snapshot, ENV_FILE
+        snapshot = get_config_snapshot()
+        if snapshot.version != last_version and ENV_FILE.exists():
+            from dotenv import load_dotenv
+            load_dotenv(ENV_FILE, override=True)
+            if last_version:
+                logger.info(f"🔄 工作进程 {os.getpid()} 检测到配置变化，已重新加载环境变量")
+        return snapshot.version
+    except Exception as e:
+        logger.warning(f"⚠️ 工作进程刷新配置失败: {e}")
+        return last_version
+
+
+def _worker_main(task_queue, stats, owner_pid):
+    # 关闭/重载信号由主进程统一处理，工作进程通过哨兵任务退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for sig_name in ('SIGHUP', 'SIGUSR1'):
+        if hasattr(signal, sig_name):
+            signal.signal(getattr(signal, sig_name), signal.SIG_IGN)
+
+    _warm_up()
+    config_version = _refresh_env_if_changed(0)
+    # 父进程是 forkserver 而不是管理进程，通过 multiprocessing 的父进程哨兵判断管理进程是否存活
+    owner = multiprocessing.parent_process()
+
+    while True:
+        try:
+            task = task_queue.get(timeout=ORPHAN_CHECK_INTERVAL)
+        except queue.Empty:
+            # 管理进程被强制杀死时退出，避免成为孤儿进程（forkserver 要等所有工作进程退出后才会退出）
+            if owner is not None and not owner.is_alive():
+                break
+            continue
+        if isinstance(task, int):
+            # 哨兵为管理进程 PID，忽略上一任管理进程关闭时残留在共享队列中的哨兵
+            if task == owner_pid:
+                break
+            continue
+
+        function, args, kwargs, enqueued_at = task
+        wait_ms = int((time.time() - enqueued_at) * 1000)
+        with stats.get_lock():
+            stats[_PENDING] -= 1
+            stats[_BUSY] += 1
+            stats[_WAIT_MS] += wait_ms
+        QUEUE_WAIT_SECONDS.observe(wait_ms / 1000, driver='pool')
+
+        config_version = _refresh_env_if_changed(config_version)
+        succeeded = False
+        try:
+            function(*args, **kwargs)
+            succeeded = True
+        except Exception as e:
+            logger.error(f"❌ 队列任务 {getattr(function, '__name__', function)} 执行失败: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            with stats.get_lock():
+                stats[_BUSY] -= 1
+                stats[_COMPLETED if succeeded else _FAILED] += 1
+            # 工作进程经 os._exit 退出不会执行 atexit，每个任务结束后写出指标
+            flush_metrics()
+
+
+class WorkerPool:
+    """固定大小的预派生工作进程池"""
+
+    def __init__(self, size: int = 4, max_queue_size: int = 100, submit_timeout: float = 5):
+        self.size = max(1, size)
+        self.max_queue_size = max(1, max_queue_size)
+        self.submit_timeout = max(0.0, submit_timeout)
+        self._ctx = _get_context()
+        self._task_queue = self._ctx.Queue(maxsize=self.max_queue_size)
+        self._stats = self._ctx.Array('q', len(_STAT_NAMES))
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._owner_pid = None
+
+    def _is_owner(self) -> bool:
+        return self._owner_pid == os.getpid()
+
+    def start(self):
+        """在当前进程中拉起工作进程，当前进程成为工作进程池的管理进程"""
+        with self._lock:
+            takeover = not self._is_owner()
+            if takeover:
+                # 上一任管理进程（如果有）的工作进程已随其退出，重置忙碌计数
+                self._owner_pid = os.getpid()
+                with self._stats.get_lock():
+                    self._stats[_BUSY] = 0
+            while len(self._workers) < self.size:
+                self._workers.append(self._spawn_worker())
+            self._update_worker_count()
+        if takeover:
+            threading.Thread(target=self._supervise, name="worker-pool-supervisor", daemon=True).start()
+        logger.info(f"✅ 工作进程池已启动: {self.size} 个进程，队列上限 {self.max_queue_size}")
+
+    def _spawn_worker(self):
+        process = self._ctx.Process(target=_worker_main, args=(self._task_queue, self._stats, self._owner_pid),
+                                    name="review-worker", daemon=True)
+        process.start()
+        return process
+
+    def _update_worker_count(self):
+        with self._stats.get_lock():
+            self._stats[_WORKERS] = sum(1 for p in self._workers if p.is_alive())
+
+    def _replace_dead_workers(self):
+        if not self._is_owner():
+            return
+        with self._lock:
+            if self._closed:
+                return
+            for index, process in enumerate(self._workers):
+                if not process.is_alive():
+                    logger.warning(f"⚠️ 工作进程 {process.pid} 已退出(exitcode={process.exitcode})，重新拉起")
+                    self._workers[index] = self._spawn_worker()
+            self._update_worker_count()
+
+    def _supervise(self):
+        """管理进程中定期检查工作进程（只向共享队列提交任务的进程不会调用 submit 触发检查）"""
+        while not self._closed:
+            time.sleep(SUPERVISE_INTERVAL)
+            self._replace_dead_workers()
+
+    def submit(self, function: Callable, *args, **kwargs) -> bool:
+        """提交任务；队列已满且等待超时则拒绝并返回 False"""
+        if self._closed:
+            logger.warning("工作进程池已关闭，拒绝新任务")
+            return False
+        self._replace_dead_workers()
+
+        with self._stats.get_lock():
+            self._stats[_PENDING] += 1
+        try:
+            task = (function, args, kwargs, time.time())
+            if self.submit_timeout > 0:
+                self._task_queue.put(task, timeout=self.submit_timeout)
+            else:
+                self._task_queue.put_nowait(task)
+        except queue.Full:
+            with self._stats.get_lock():
+                self._stats[_PENDING] -= 1
+                self._stats[_REJECTED] += 1
+            logger.warning(f"⚠️ 任务队列已满({self.max_queue_size})，拒绝任务 {getattr(function, '__name__', function)}")
+            return False
+
+        with self._stats.get_lock():
+            self._stats[_SUBMITTED] += 1
+        return True
+
+    def metrics(self) -> Dict[str, int]:
+        with self._stats.get_lock():
+            values = dict(zip(_STAT_NAMES, self._stats[:]))
+        values['queue_depth'] = max(0, values.pop('pending'))
+        values['max_queue_size'] = self.max_queue_size
+        return values
+
+    def shutdown(self, timeout: float = 10):
+        """停止接收新任务，等待工作进程处理完手头任务后退出，超时则强制终止"""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._is_owner():
+            return
+        pending = self.metrics()['queue_depth']
+        if pending:
+            logger.info(f"工作进程池关闭中，队列中仍有 {pending} 个待处理任务")
+
+        for _ in self._workers:
+            try:
+                self._task_queue.put(self._owner_pid, timeout=1)
+            except queue.Full:
+                break
+
+        deadline = time.time() + timeout
+        for process in self._workers:
+            process.join(max(0.0, deadline - time.time()))
+        for process in self._workers:
+            if process.is_alive():
+                logger.warning(f"工作进程 {process.pid} 未在 {timeout}s 内退出，强制终止")
+                process.terminate()
+                process.join(1)
+        self._workers = []
+        self._update_worker_count()
+        logger.info("✅ 工作进程池已关闭")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+API 服务的 gunicorn 生产部署配置（Docker 镜像默认使用）
+用法:
+    gunicorn -c gunicorn.conf.py api:api_app
+
+- 多个 gthread HTTP 工作进程处理 webhook 接入，可以利用多核，慢请求不会阻塞其他请求
+- preload_app：主进程导入应用并创建审查任务队列后再 fork，所有 HTTP 工作进程向同一个队列提交任务
+- 工作进程池、定时任务调度器与 SVN 后台任务只在一个进程中运行：各 HTTP 工作进程竞争
+  log/api_services.lock 文件锁，持锁的进程启动这些服务；该进程退出后由其他进程接管
+- 持锁的 HTTP 工作进程是多线程的，工作进程池的进程（包括退出后重新拉起的）由它启动的单线程
+  forkserver 派生，不会继承 gunicorn 的监听 socket、信号处理器与文件锁
+- 平滑重启：kill -HUP <主进程 PID>，逐个替换 HTTP 工作进程，进行中的请求处理完再退出；
+  preload 模式下 HUP 不会重新加载代码，更新代码需要重启服务
+- 工作进程回收：HTTP 工作进程处理 API_MAX_REQUESTS 个请求后自动重启（运行后台服务的进程除外）
+- 配置文件变化后各进程自动重新加载配置（调度器只在运行后台服务的进程中重新配置）
+- MR/PR 防抖：各 HTTP 工作进程在本进程内计时，同一 MR 等待中的事件登记在 SQLite 中，
+  不同进程接收到同一 MR 的事件时只有最后接收的事件入队；进程退出时提交本进程未被替换的事件
+
+开发环境仍可直接运行 python api.py（Flask 开发服务器，单进程）。
+"""
+
+import os
+import sys
+import threading
+import time
+
+_PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+from dotenv import load_dotenv
+
+# HUP 时 gunicorn 会重新执行本文件，覆盖加载使新的进程数等配置生效
+load_dotenv(os.path.join(_PROJECT_ROOT, "conf", ".env"), override=True)
+
+from biz.utils.default_config import get_env_int
+
+# 运行后台服务的进程所持有的文件锁；未持锁的进程检查锁与配置变化的间隔（秒）
+SERVICE_LOCK_FILE = os.path.join("log", "api_services.lock")
+SERVICE_CHECK_INTERVAL = 5
+
+chdir = _PROJECT_ROOT
+bind = f"0.0.0.0:{get_env_int('API_PORT', 5001)}"
+workers = max(1, get_env_int('API_WORKERS', 4))
+worker_class = 'gthread'
+threads = max(1, get_env_int('API_THREADS', 4))
+max_requests = max(0, get_env_int('API_MAX_REQUESTS', 1000))
+max_requests_jitter = max(0, get_env_int('API_MAX_REQUESTS_JITTER', 100))
+timeout = get_env_int('API_TIMEOUT', 120)
+graceful_timeout = get_env_int('API_GRACEFUL_TIMEOUT', 30)
+preload_app = True
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    """主进程：检查配置、清空多进程指标目录、创建共享任务队列（均在 fork HTTP 工作进程之前）"""
+    import api
+    from biz.utils.metrics import reset_multiproc_dir
+    from biz.utils.queue import prepare_queue_workers
+
+    api.check_config()
+    reset_multiproc_dir()
+    prepare_queue_workers()
+    server.log.info(f"🚀 AI-CodeReview API 服务（gunicorn）: http://{bind}，"
+                    f"{workers} 个工作进程 × {threads} 个线程")
+
+
+def _acquire_service_lock():
+    """非阻塞获取后台服务文件锁，成功返回文件对象（持有到进程退出），失败返回 None"""
+    import portalocker
+
+    os.makedirs(os.path.dirname(SERVICE_LOCK_FILE), exist_ok=True)
+    lockfile = open(SERVICE_LOCK_FILE, "a")
+    try:
+        portalocker.lock(lockfile, portalocker.LOCK_EX | portalocker.LOCK_NB)
+    except portalocker.exceptions.LockException:
+        lockfile.close()
+        return None
+    # 文件内容为当前持锁进程的 PID，便于排查
+    lockfile.truncate(0)
+    lockfile.write(str(os.getpid()))
+    lockfile.flush()
+    return lockfile
+
+
+def _service_loop(worker):
+    """HTTP 工作进程的后台线程：竞争后台服务锁，并在配置文件变化时重新加载配置"""
+    import api
+
+    while worker.alive:
+        if getattr(worker, 'service_lock', None) is None:
+            lockfile = _acquire_service_lock()
+            if lockfile is not None:
+                worker.service_lock = lockfile
+                # 运行后台服务的进程不参与按请求数回收，避免调度器与工作进程池频繁重启
+                worker.max_requests = sys.maxsize
+                worker.log.info(f"✅ 工作进程 {worker.pid} 负责运行工作进程池、定时任务与 SVN 后台任务")
+                try:
+                    api.start_services()
+                except Exception as e:
+                    worker.log.error(f"❌ 后台服务启动失败: {e}")
+        try:
+            api.reload_config_if_changed()
+        except Exception as e:
+            worker.log.warning(f"⚠️ 检查配置变化失败: {e}")
+        time.sleep(SERVICE_CHECK_INTERVAL)
+
+
+def post_fork(server, worker):
+    worker.service_lock = None
+    threading.Thread(target=_service_loop, args=(worker,), name="api-services", daemon=True).start()
+
+
+def worker_exit(server, worker):
+    """HTTP 工作进程退出：提交防抖窗口内的 MR 事件；运行后台服务的进程关闭调度器与工作进程池"""
+    import api
+
+    if getattr(worker, 'service_lock', None) is not None:
+        api.shutdown_background_tasks()
+    else:
+        api.mr_debouncer.flush()
@@ -21,7 +21,8 @@ def run_rq_worker():
     """运行 RQ 队列工作器"""
     try:
         from redis import Redis
-        from rq import Worker, Queue
+        from rq import Queue
+        from biz.utils.queue import QueueWorker
         
         # 获取 Redis 配置
         redis_url = get_env_with_default('REDIS_URL')
@@ -39,7 +40,7 @@ def run_rq_worker():
         logger.info(f"🚀 启动 RQ Worker，监听队列: {queue_names}")
         
         # 创建并启动工作器
-        worker = Worker(queues, connection=redis_conn)
+        worker = QueueWorker(queues, connection=redis_conn)
         worker.work()
         
     except ImportError:
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+分批打包统计对比
+在真实仓库的提交历史上对比旧的"按输入顺序贪心拆批"与当前 BatchCodeReviewer._pack_batches
+（局部性分组 + First-Fit-Decreasing）的批次数、平均填充率与目录跨批数。
+
+用法:
+    python scripts/benchmark_batch_packing.py --repo /path/to/git/repo --commits 200 --budget 8000
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from biz.utils.code_reviewer import BatchCodeReviewer
+
+
+def _approx_tokens(text: str) -> int:
+    """离线环境下的 token 估算（约 4 字符 1 token）"""
+    return max(1, len(text) // 4)
+
+
+def load_commit_files(repo: str, sha: str) -> list:
+    """读取单个提交的分文件 diff，转换为审查用的 files_json 格式"""
+    output = subprocess.run(['git', '-C', repo, 'show', '--format=', '--patch', '--no-color', sha],
+                            capture_output=True, text=True, errors='replace').stdout
+    files = []
+    for chunk in re.split(r'^diff --git ', output, flags=re.MULTILINE):
+        match = re.match(r'a/(\S+) b/(\S+)', chunk)
+        if not match:
+            continue
+        files.append({'file_path': match.group(2), 'diff': chunk})
+    return files
+
+
+def legacy_pack(files: list, max_tokens: int, counter) -> list:
+    """旧算法：按输入顺序贪心拆批"""
+    batches, current, current_tokens = [], [], 0
+    for file in files:
+        tokens = counter(file['diff'])
+        if tokens > max_tokens:
+            if current:
+                batches.append(current)
+                current, current_tokens = [], 0
+            batches.append([file])
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(file)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分批打包统计对比")
+    parser.add_argument('--repo', default='.', help="git 仓库路径")
+    parser.add_argument('--commits', type=int, default=200, help="统计最近多少个提交")
+    parser.add_argument('--budget', type=int, default=8000, help="每批 token 预算")
+    parser.add_argument('--approx', action='store_true', help="使用字符数估算 token（无需 tiktoken 编码文件）")
+    args = parser.parse_args()
+
+    counter = _approx_tokens
+    if not args.approx:
+        from biz.utils.token_util import count_tokens
+        counter = count_tokens
+
+    shas = subprocess.run(['git', '-C', args.repo, 'rev-list', '--no-merges', f'-{args.commits}', 'HEAD'],
+                          capture_output=True, text=True).stdout.split()
+    reviewer = BatchCodeReviewer.__new__(BatchCodeReviewer)
+
+    totals = {'legacy': [0, 0, 0.0, 0.0], 'ffd': [0, 0, 0.0, 0.0]}  # 提交数, 批次数, 填充率和, 目录跨批数和
+    # 统计只关心批次划分
+    with patch('biz.utils.code_reviewer.count_tokens', side_effect=counter), \
+            patch('biz.utils.code_reviewer.logger'):
+        for sha in shas:
+            # 超大文件按 hunk 拆分成独立批次，与装箱算法无关，不计入对比
+            files = [f for f in load_commit_files(args.repo, sha) if counter(f['diff']) <= args.budget]
+            if not files:
+                continue
+            legacy = legacy_pack(files, args.budget, counter)
+            if len(legacy) < 2:
+                continue  # 单批提交两种算法一致，不计入对比
+            packed, _ = reviewer._pack_batches([dict(f) for f in files], args.budget)
+            for name, batches in (('legacy', legacy), ('ffd', packed)):
+                batch_tokens = [min(args.budget, sum(counter(f['diff']) for f in b)) for b in batches]
+                stats = BatchCodeReviewer._packing_stats(batches, batch_tokens, args.budget)
+                totals[name][0] += 1
+                totals[name][1] += stats['batch_count']
+                totals[name][2] += stats['fill_ratio']
+                totals[name][3] += stats['dir_spread']
+
+    count = totals['legacy'][0]
+    if not count:
+        print("没有需要分批的提交，可调小 --budget 或增加 --commits")
+        return
+    print(f"多批提交数: {count}（预算 {args.budget} tokens）")
+    for name, label in (('legacy', '旧贪心算法'), ('ffd', '局部性 FFD')):
+        _, batch_count, fill, spread = totals[name]
+        print(f"{label:<10} 总批次 {batch_count:6d} | 平均填充率 {fill / count:6.1%} | 目录平均跨批数 {spread / count:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+LLM 客户端复用基准测试
+在本地启动一个 OpenAI 兼容的桩服务（HTTP/1.1 keep-alive，统计新建的 TCP 连接数），模拟多次审查：
+旧方式每次审查新建 OpenAIClient（新的 httpx 连接池），新方式通过 Factory.getClient() 取进程内共享实例。
+输出总耗时、新建连接数与连接复用率。本地桩服务没有 TLS 握手，真实供应商下每个新连接还要多付出
+一次 TLS 握手（通常数十到数百毫秒），节省会更明显。
+
+用法: python scripts/benchmark_client_reuse.py [--reviews 100] [--calls-per-review 3] [--latency-ms 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头与正文分两次写出，关闭 Nagle 避免与客户端延迟 ACK 叠加出约 40ms 的固定延迟
+    disable_nagle_algorithm = True
+    connections = 0
+    requests = 0
+    latency = 0.0
+    _lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StubHandler._lock:
+            StubHandler.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with StubHandler._lock:
+            StubHandler.requests += 1
+        time.sleep(StubHandler.latency)
+        data = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "总分: 90分"}}],
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def run(label: str, get_client, reviews: int, calls_per_review: int):
+    StubHandler.connections = StubHandler.requests = 0
+    start = time.perf_counter()
+    for _ in range(reviews):
+        client = get_client()
+        for _ in range(calls_per_review):
+            client.completions([{"role": "user", "content": "review"}])
+    elapsed = time.perf_counter() - start
+    reuse = 1 - StubHandler.connections / max(StubHandler.requests, 1)
+    print(f"{label:<28} 总耗时 {elapsed * 1000:9.1f} ms | 请求 {StubHandler.requests:5d} | "
+          f"新建连接 {StubHandler.connections:5d} | 连接复用率 {reuse:6.1%}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 客户端复用基准测试")
+    parser.add_argument('--reviews', type=int, default=100, help="模拟的审查次数（每次构造一次客户端）")
+    parser.add_argument('--calls-per-review', type=int, default=3, help="每次审查的 LLM 调用次数（分批 + 合并）")
+    parser.add_argument('--latency-ms', type=float, default=5, help="桩服务每个请求的模拟耗时")
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ.update({
+        'LLM_PROVIDER': 'openai',
+        'OPENAI_API_KEY': 'benchmark',
+        'OPENAI_API_BASE_URL': f'http://127.0.0.1:{server.server_port}/v1',
+        'OPENAI_API_MODEL': 'stub-model',
+        'OPENAI_THINKING_LEVEL': 'off',
+        'LLM_STREAMING_ENABLED': '0',
+        'LLM_FAILOVER_PROVIDERS': '',
+        'LLM_RATE_LIMIT_RPM': '0',
+        'LLM_RATE_LIMIT_TPM': '0',
+    })
+    from biz.llm.client.openai import OpenAIClient
+    from biz.llm.client_registry import get_client_registry_stats
+    from biz.llm.factory import Factory
+
+    legacy = run("每次审查新建客户端", OpenAIClient, args.reviews, args.calls_per_review)
+    shared = run("共享客户端 (Factory)", Factory.getClient, args.reviews, args.calls_per_review)
+    print(f"加速比: {legacy / max(shared, 1e-9):.2f}x | 注册表: {get_client_registry_stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
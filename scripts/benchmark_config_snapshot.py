@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+配置读取基准测试
+对比 process_svn_commit 中每个 revision 读取配置开关的开销：
+旧方式每次构造 ConfigManager 并重新解析 .env.dist + conf/.env，新方式读取进程内配置快照。
+
+用法: python scripts/benchmark_config_snapshot.py [--commits 200]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from biz.utils.config_manager import ConfigManager
+from biz.utils.config_snapshot import get_config_snapshot
+
+# process_svn_commit 单个 revision 内读取的配置项
+PER_COMMIT_BOOL_KEYS = ['VERSION_TRACKING_ENABLED', 'SVN_REVIEW_ENABLED', 'AGENTIC_REVIEW_ENABLED',
+                        'EXCEL_REVIEW_ENABLED', 'VERSION_TRACKING_ENABLED']
+PER_COMMIT_INT_KEYS = ['EXCEL_REVIEW_MAX_FILES']
+PER_COMMIT_STR_KEYS = ['EXCEL_SUPPORTED_EXTENSIONS']
+
+
+def legacy_per_commit():
+    for key in PER_COMMIT_BOOL_KEYS:
+        ConfigManager().get_env_config().get(key, '0').lower() in ('1', 'true', 'yes', 'on')
+    for key in PER_COMMIT_INT_KEYS:
+        int(ConfigManager().get_env_config().get(key, '0'))
+    for key in PER_COMMIT_STR_KEYS:
+        ConfigManager().get_env_config().get(key, '')
+
+
+def snapshot_per_commit():
+    for key in PER_COMMIT_BOOL_KEYS:
+        get_config_snapshot().get_bool(key)
+    for key in PER_COMMIT_INT_KEYS:
+        get_config_snapshot().get_int(key)
+    for key in PER_COMMIT_STR_KEYS:
+        get_config_snapshot().get_str(key)
+
+
+def run(label: str, func, commits: int) -> float:
+    start = time.perf_counter()
+    for _ in range(commits):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} 总耗时 {elapsed * 1000:10.2f} ms | 每个 revision {elapsed / commits * 1e6:10.2f} µs")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="配置快照基准测试")
+    parser.add_argument('--commits', type=int, default=200, help="模拟的 revision 数量")
+    args = parser.parse_args()
+
+    get_config_snapshot()  # 预热
+    legacy = run("ConfigManager 每次解析", legacy_per_commit, args.commits)
+    snapshot = run("配置快照", snapshot_per_commit, args.commits)
+    print(f"加速比: {legacy / max(snapshot, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+diff 压缩效果评估
+在真实仓库的提交历史上统计送审文本的 token 数：
+旧格式（json.dumps(indent=2)、未压缩）→ 紧凑格式 → 逐个叠加各压缩步骤，输出每步累计节省比例。
+
+加 --review N 时，另抽取 N 个提交分别用原始 diff 与压缩后 diff 实际调用当前配置的 LLM 审查，
+对比评分差异与分文件意见覆盖数，用于确认压缩后审查质量保持稳定（会产生真实的 LLM 调用费用）。
+
+用法:
+    python scripts/benchmark_diff_compaction.py --repo /path/to/git/repo --commits 200 --context 10
+    python scripts/benchmark_diff_compaction.py --repo /path/to/git/repo --commits 50 --review 10
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from biz.utils.diff_compactor import compact_diff, get_enabled_steps, serialize_files
+
+
+def _approx_tokens(text: str) -> int:
+    """离线环境下的 token 估算（约 4 字符 1 token）"""
+    return max(1, len(text) // 4)
+
+
+def load_commit_files(repo: str, sha: str, context: int) -> list:
+    """读取单个提交的分文件 diff，转换为审查用的 files_json 格式"""
+    output = subprocess.run(['git', '-C', repo, 'show', '--format=', '--patch', '--no-color', f'-U{context}', sha],
+                            capture_output=True, text=True, errors='replace').stdout
+    files = []
+    for chunk in re.split(r'^diff --git ', output, flags=re.MULTILINE):
+        match = re.match(r'a/(\S+) b/(\S+)', chunk)
+        if not match:
+            continue
+        files.append({'file_path': match.group(2), 'diff': chunk})
+    return files
+
+
+def compact_files(files: list, steps: list) -> list:
+    return [dict(f, diff=compact_diff(f['diff'], f['file_path'], steps)) for f in files]
+
+
+def compare_reviews(samples: list):
+    """用当前配置的 LLM 分别审查原始 diff 与压缩后 diff，对比评分与分文件意见覆盖"""
+    from biz.utils.code_reviewer import BatchCodeReviewer, CodeReviewer
+    from biz.utils.review_cache import extract_file_sections
+
+    reviewer = BatchCodeReviewer()
+    deltas = []
+    for sha, files, compacted in samples:
+        paths = [f['file_path'] for f in files]
+        raw_report = reviewer.review_in_batches([dict(f) for f in files], '')
+        compact_report = reviewer.review_in_batches([dict(f) for f in compacted], '')
+        raw_score = CodeReviewer.parse_review_score(raw_report)
+        compact_score = CodeReviewer.parse_review_score(compact_report)
+        deltas.append(abs(raw_score - compact_score))
+        print(f"{sha[:8]} 评分 {raw_score:3d} → {compact_score:3d} | 分文件意见 "
+              f"{len(extract_file_sections(raw_report, paths))} → "
+              f"{len(extract_file_sections(compact_report, paths))} / {len(paths)}")
+    if deltas:
+        print(f"评分差异: 平均 {statistics.mean(deltas):.1f} 分, 最大 {max(deltas)} 分")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="diff 压缩效果评估")
+    parser.add_argument('--repo', default='.', help="git 仓库路径")
+    parser.add_argument('--commits', type=int, default=200, help="统计最近多少个提交")
+    parser.add_argument('--context', type=int, default=10, help="diff 上下文行数（对应 SVN_DIFF_CONTEXT_LINES）")
+    parser.add_argument('--approx', action='store_true', help="使用字符数估算 token（无需 tiktoken 编码文件）")
+    parser.add_argument('--review', type=int, default=0, help="抽取多少个提交实际调用 LLM 对比审查质量")
+    args = parser.parse_args()
+
+    counter = _approx_tokens
+    if not args.approx:
+        from biz.utils.token_util import count_tokens
+        counter = count_tokens
+
+    steps = get_enabled_steps()
+    stages = [('旧格式 (JSON indent=2)', None), ('紧凑格式', [])]
+    stages += [(f"+ {name}", steps[:i + 1]) for i, name in enumerate(steps)]
+
+    shas = subprocess.run(['git', '-C', args.repo, 'rev-list', '--no-merges', f'-{args.commits}', 'HEAD'],
+                          capture_output=True, text=True).stdout.split()
+    totals = [0] * len(stages)
+    per_commit_saving = []
+    samples = []
+    for sha in shas:
+        files = load_commit_files(args.repo, sha, args.context)
+        if not files:
+            continue
+        counts = []
+        for _, stage_steps in stages:
+            if stage_steps is None:
+                counts.append(counter(serialize_files(files, compact=False)))
+            else:
+                counts.append(counter(serialize_files(compact_files(files, stage_steps))))
+        for index, count in enumerate(counts):
+            totals[index] += count
+        per_commit_saving.append(1 - counts[-1] / counts[0])
+        if len(samples) < args.review and counts[-1] < counts[1]:
+            samples.append((sha, files, compact_files(files, steps)))
+
+    if not per_commit_saving:
+        print("没有可统计的提交")
+        return
+    print(f"提交数: {len(per_commit_saving)}（diff 上下文 {args.context} 行，压缩步骤 {','.join(steps) or '无'}）")
+    for (label, _), total in zip(stages, totals):
+        print(f"{label:<24} {total:10d} tokens | 累计节省 {1 - total / totals[0]:6.1%}")
+    print(f"单提交节省: 中位数 {statistics.median(per_commit_saving):.1%}, "
+          f"最大 {max(per_commit_saving):.1%}")
+
+    if samples:
+        compare_reviews(samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+"""
+端到端审查吞吐基准测试（离线，无需网络）
+把 GitLab Push / Merge Request webhook 与 SVN 提交经由真实的 handle_push_event / handle_merge_request_event /
+process_svn_commit 审查路径回放，外部依赖全部用本地桩替代：
+- OpenAI 兼容桩服务：可配置首字延迟、输出 token 数与输出速率，支持流式（SSE）与非流式
+- GitLab 桩接口：compare / MR changes / MR commits / notes / comments，diff 内容按提交 SHA 确定性生成
+- 企业微信桩接口：接收审查通知
+- SVN：替换 svn 子进程调用，svn diff 返回合成的 diff 输出（可配置命令耗时），解析、审查、入库走真实代码
+桩服务运行在独立进程中，统计的 CPU / RSS 只包含审查进程本身；数据库、追踪与日志写到临时目录。
+
+对每个并发度（同时处理的审查数）输出 reviews/min、p50/p95 延迟、CPU 秒 / 平均占用核数、峰值 RSS、
+LLM 请求数与错误日志数；--output 保存结果，--baseline 与之前保存的结果对比。
+
+用法:
+    python scripts/benchmark_end_to_end.py --concurrency 1,4,8 --events 24
+    python scripts/benchmark_end_to_end.py --mix svn --files 12 --llm-latency-ms 800 --llm-tokens-per-sec 60
+    python scripts/benchmark_end_to_end.py --payload-dir recorded_hooks/ --output after.json --baseline before.json
+
+--payload-dir 下的 *.json 为录制的 GitLab webhook 请求体（object_kind 为 push 或 merge_request），
+回放时作为模板使用：提交 SHA 与 MR iid 每次改写为新值，避免被版本追踪 / 文件审查缓存判定为重复而跳过。
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import psutil
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+SCENARIOS = ('gitlab_push', 'gitlab_mr', 'svn')
+REVIEW_REPLY = ("### 😀代码评分：{score}\n\n#### ✅代码优点：\n- 结构清晰，命名规范\n\n"
+                "#### 🤔问题点：\n- 建议补充异常处理\n\n{padding}\n\n总分: {score}分")
+
+
+# ---------------------------------------------------------------- 合成数据
+def synthetic_files(seed: str, files: int, lines: int) -> list:
+    """按种子确定性地生成 files 个文件的新增代码行（同一种子内容相同，不同种子内容不同）"""
+    result = []
+    for i in range(files):
+        digest = hashlib.md5(f"{seed}:{i}".encode('utf-8')).hexdigest()[:8]
+        path = f"src/module_{i % 4}/handler_{i}.py"
+        body = [f"def handle_{digest}_{n}(request, retries={n % 5}):" if n % 8 == 0
+                else f"    value_{n} = request.get('field_{n}', '{digest}')  # step {n}" for n in range(lines)]
+        result.append((path, body))
+    return result
+
+
+def gitlab_diffs(seed: str, files: int, lines: int) -> list:
+    return [{
+        'old_path': path, 'new_path': path, 'new_file': False, 'renamed_file': False, 'deleted_file': False,
+        'diff': f"@@ -1,2 +1,{len(body) + 2} @@\n import os\n import sys\n" + ''.join(f"+{line}\n" for line in body),
+    } for path, body in synthetic_files(seed, files, lines)]
+
+
+def svn_diff_output(revision: str, files: int, lines: int) -> str:
+    blocks = []
+    for path, body in synthetic_files(f"svn:{revision}", files, lines):
+        full_path = f"trunk/{path}"
+        blocks.append(f"Index: {full_path}\n{'=' * 67}\n"
+                      f"--- {full_path}\t(revision {int(revision) - 1})\n+++ {full_path}\t(revision {revision})\n"
+                      f"@@ -1,2 +1,{len(body) + 2} @@\n import os\n import sys\n"
+                      + ''.join(f"+{line}\n" for line in body))
+    return ''.join(blocks)
+
+
+def _sha(seed: str) -> str:
+    return hashlib.sha1(seed.encode('utf-8')).hexdigest()
+
+
+# ---------------------------------------------------------------- 桩服务（独立进程）
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    config: dict = {}
+    stats: dict = {}
+    # 每个事件拉取 diff 的次数（push 按 compare 的目标 SHA，MR 按 iid），用于核对事件是否恰好处理一次
+    fetches: dict = {}
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _count(self, key: str):
+        with StubHandler._lock:
+            StubHandler.stats[key] = StubHandler.stats.get(key, 0) + 1
+
+    def _count_fetch(self, key: str):
+        with StubHandler._lock:
+            StubHandler.fetches[key] = StubHandler.fetches.get(key, 0) + 1
+
+    def _send_json(self, data, status: int = 200):
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self) -> dict:
+        raw = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+        return json.loads(raw) if raw else {}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        config = StubHandler.config
+        if url.path == '/_stats':
+            with StubHandler._lock:
+                return self._send_json(dict(StubHandler.stats))
+        if url.path == '/_fetches':
+            with StubHandler._lock:
+                return self._send_json(dict(StubHandler.fetches))
+        if parts[:2] != ['api', 'v4'] or len(parts) < 5:
+            return self._send_json({'message': 'not found'}, 404)
+        time.sleep(config['gitlab_latency'])
+        self._count('gitlab_get')
+        project_id = parts[3]
+        if parts[4:6] == ['repository', 'compare']:
+            target = parse_qs(url.query).get('to', [''])[0]
+            self._count_fetch(f"push:{project_id}:{target}")
+            return self._send_json({'diffs': gitlab_diffs(f"{project_id}:{target}", config['files'], config['lines'])})
+        if parts[4:6] == ['repository', 'commits']:
+            return self._send_json([])
+        if parts[4] == 'protected_branches':
+            return self._send_json([{'name': '*'}])
+        if parts[4] == 'merge_requests' and len(parts) >= 7:
+            iid = parts[5]
+            if parts[6] == 'changes':
+                self._count_fetch(f"mr:{project_id}:{iid}")
+                return self._send_json({'changes': gitlab_diffs(f"{project_id}:mr{iid}", config['files'],
+                                                                config['lines'])})
+            if parts[6] == 'commits':
+                return self._send_json([{'id': _sha(f"{project_id}:mr{iid}"), 'title': f'feat: benchmark mr {iid}',
+                                         'message': f'feat: benchmark mr {iid}', 'author_name': 'bench'}])
+        return self._send_json({'message': 'not found'}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self._read_body()
+        if url.path == '/_reset':
+            with StubHandler._lock:
+                StubHandler.stats, StubHandler.fetches = {}, {}
+            return self._send_json({})
+        if url.path.endswith('/chat/completions'):
+            return self._chat_completion(body)
+        if url.path.startswith('/im/'):
+            time.sleep(StubHandler.config['im_latency'])
+            self._count('im_messages')
+            return self._send_json({'errcode': 0, 'errmsg': 'ok'})
+        if url.path.startswith('/api/v4/'):
+            time.sleep(StubHandler.config['gitlab_latency'])
+            self._count('gitlab_notes')
+            return self._send_json({'id': 1}, 201)
+        return self._send_json({'message': 'not found'}, 404)
+
+    def _chat_completion(self, body: dict):
+        config = StubHandler.config
+        self._count('llm_requests')
+        prompt_chars = sum(len(str(message.get('content') or '')) for message in body.get('messages', []))
+        prompt_tokens = max(1, prompt_chars // 4)
+        output_tokens = config['output_tokens']
+        with StubHandler._lock:
+            StubHandler.stats['llm_prompt_tokens'] = StubHandler.stats.get('llm_prompt_tokens', 0) + prompt_tokens
+        content = REVIEW_REPLY.format(score=85, padding='- 细节建议：保持函数短小。' * max(0, output_tokens // 10))
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': output_tokens,
+                 'total_tokens': prompt_tokens + output_tokens}
+        time.sleep(config['llm_latency'])
+        base = {'id': 'stub', 'created': int(time.time()), 'model': body.get('model', 'stub')}
+        if not body.get('stream'):
+            time.sleep(output_tokens / config['tokens_per_sec'])
+            return self._send_json(dict(base, object='chat.completion', usage=usage, choices=[
+                {'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}]))
+
+        # 流式：按输出速率分块推送，最后一个分块带 usage
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        chunks = 20
+        step = max(1, len(content) // chunks)
+        for i in range(0, len(content), step):
+            delta = {'index': 0, 'delta': {'content': content[i:i + step]}, 'finish_reason': None}
+            self.wfile.write(f"data: {json.dumps(dict(base, object='chat.completion.chunk', choices=[delta]))}\n\n"
+                             .encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(output_tokens / config['tokens_per_sec'] / chunks)
+        done = {'index': 0, 'delta': {}, 'finish_reason': 'stop'}
+        for chunk in (dict(base, object='chat.completion.chunk', choices=[done]),
+                      dict(base, object='chat.completion.chunk', choices=[], usage=usage)):
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def _serve_stubs(config: dict, port_queue, host: str = '127.0.0.1', port: int = 0):
+    StubHandler.config = config
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def _stub_request(base_url: str, path: str, method: str = 'GET') -> dict:
+    import requests
+    return requests.request(method, f"{base_url}{path}", timeout=10).json()
+
+
+# ---------------------------------------------------------------- SVN 子进程替身
+class FakeSvn:
+    """替换 biz.svn.svn_handler.subprocess.run：svn diff 返回合成输出，其余命令直接成功"""
+
+    def __init__(self, files: int, lines: int, latency: float):
+        self.files, self.lines, self.latency = files, lines, latency
+
+    def __call__(self, command, cwd=None, capture_output=True, text=False, **kwargs):
+        time.sleep(self.latency)
+        stdout = ''
+        if command[1] == 'diff':
+            stdout = svn_diff_output(command[command.index('-c') + 1], self.files, self.lines)
+        elif command[1] == 'info':
+            stdout = 'svn://benchmark/repo\n'
+        return subprocess.CompletedProcess(command, 0, stdout.encode('utf-8'), b'')
+
+
+# ---------------------------------------------------------------- 事件构造
+def load_payloads(payload_dir: str) -> list:
+    payloads = []
+    for path in sorted(Path(payload_dir).glob('*.json')):
+        data = json.loads(path.read_text(encoding='utf-8'))
+        kind = data.get('object_kind')
+        if kind in ('push', 'merge_request'):
+            payloads.append(('gitlab_push' if kind == 'push' else 'gitlab_mr', data))
+        else:
+            print(f"⚠️ 跳过 {path.name}：不是 GitLab push / merge_request 事件")
+    return payloads
+
+
+def gitlab_push_payload(seq: int, template: dict = None) -> dict:
+    data = json.loads(json.dumps(template)) if template else {
+        'object_kind': 'push', 'event_name': 'push', 'ref': 'refs/heads/main', 'user_name': 'bench',
+        'user_username': 'bench',
+        'project': {'id': 1001, 'name': 'bench-project', 'default_branch': 'main',
+                    'web_url': 'http://gitlab.local/bench/bench-project'},
+    }
+    data['event_name'] = 'push'
+    after = _sha(f"push:{seq}:{time.time_ns()}")
+    data['before'], data['after'] = _sha(f"push-before:{seq}"), after
+    data['commits'] = [{'id': after, 'message': f'feat: benchmark push {seq}', 'timestamp': '2024-01-01T00:00:00Z',
+                        'url': f'http://gitlab.local/commit/{after}', 'author': {'name': 'bench'}}]
+    return data
+
+
+# MR iid 每次回放取新值（按启动时间起步，多次运行之间也不重复）
+_mr_iids = itertools.count(int(time.time()))
+
+
+def gitlab_mr_payload(seq: int, template: dict = None) -> dict:
+    data = json.loads(json.dumps(template)) if template else {
+        'object_kind': 'merge_request', 'user': {'name': 'bench', 'username': 'bench'},
+        'project': {'id': 1001, 'name': 'bench-project', 'default_branch': 'main',
+                    'web_url': 'http://gitlab.local/bench/bench-project'},
+        'object_attributes': {'target_project_id': 1001, 'source_branch': 'feature', 'target_branch': 'main',
+                              'title': 'benchmark', 'url': 'http://gitlab.local/bench/bench-project/-/merge_requests'},
+    }
+    attributes = data.setdefault('object_attributes', {})
+    attributes['iid'] = next(_mr_iids)
+    attributes['action'] = 'open'
+    attributes['last_commit'] = {'id': _sha(f"mr:{seq}:{time.time_ns()}")}
+    return data
+
+
+def build_events(mix: list, count: int, payloads: list, round_index: int) -> list:
+    events = []
+    revision_base = (round_index + 1) * 100000 + int(time.time()) % 1000 * 100
+    sources = payloads or [(scenario, None) for scenario in mix]
+    for i in range(count):
+        scenario, template = sources[i % len(sources)]
+        seq = round_index * count + i
+        if scenario == 'gitlab_push':
+            events.append((scenario, gitlab_push_payload(seq, template)))
+        elif scenario == 'gitlab_mr':
+            events.append((scenario, gitlab_mr_payload(seq, template)))
+        else:
+            revision = str(revision_base + i)
+            events.append((scenario, {
+                'revision': revision, 'author': 'bench', 'message': f'benchmark commit r{revision}',
+                'date': '2024-01-01T00:00:00Z',
+                'paths': [{'path': f'/trunk/src/module_{n % 4}/handler_{n}.py', 'action': 'M'} for n in range(3)],
+            }))
+    return events
+
+
+# ---------------------------------------------------------------- 执行与统计
+class ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def run_round(events: list, concurrency: int, svn_handler, stub_url: str, gitlab_url: str,
+              error_counter: ErrorCounter) -> dict:
+    from biz.queue.worker import handle_merge_request_event, handle_push_event
+    from biz.svn.svn_worker import process_svn_commit
+
+    def _run(event):
+        scenario, data = event
+        started = time.perf_counter()
+        if scenario == 'gitlab_push':
+            handle_push_event(data, 'benchmark-token', gitlab_url, 'gitlab_local')
+        elif scenario == 'gitlab_mr':
+            handle_merge_request_event(data, 'benchmark-token', gitlab_url, 'gitlab_local')
+        else:
+            process_svn_commit(svn_handler, data, svn_handler.svn_local_path, 'bench-svn', 'manual')
+        return time.perf_counter() - started
+
+    process = psutil.Process()
+    peak_rss = [process.memory_info().rss]
+    sampling = threading.Event()
+
+    def _sample_rss():
+        while not sampling.wait(0.05):
+            peak_rss[0] = max(peak_rss[0], process.memory_info().rss)
+
+    _stub_request(stub_url, '/_reset', 'POST')
+    errors_before = error_counter.count
+    sampler = threading.Thread(target=_sample_rss, daemon=True)
+    sampler.start()
+    cpu_before = process.cpu_times()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(_run, events))
+    wall = time.perf_counter() - started
+    cpu_after = process.cpu_times()
+    sampling.set()
+    sampler.join()
+    cpu = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+    stub_stats = _stub_request(stub_url, '/_stats')
+    return {
+        'concurrency': concurrency,
+        'reviews': len(events),
+        'wall_seconds': round(wall, 3),
+        'reviews_per_min': round(len(events) / wall * 60, 2),
+        'p50_seconds': round(percentile(latencies, 50), 3),
+        'p95_seconds': round(percentile(latencies, 95), 3),
+        'cpu_seconds': round(cpu, 3),
+        'cpu_cores': round(cpu / wall, 2),
+        'peak_rss_mb': round(peak_rss[0] / 1024 / 1024, 1),
+        'llm_requests': stub_stats.get('llm_requests', 0),
+        'llm_prompt_tokens': stub_stats.get('llm_prompt_tokens', 0),
+        'notes': stub_stats.get('gitlab_notes', 0),
+        'im_messages': stub_stats.get('im_messages', 0),
+        'errors': error_counter.count - errors_before,
+    }
+
+
+def print_results(results: list, baseline: dict = None):
+    print(f"\n{'并发':>4} {'审查数':>6} {'reviews/min':>12} {'p50':>8} {'p95':>8} {'CPU秒':>8} {'核数':>6} "
+          f"{'峰值RSS':>9} {'LLM请求':>8} {'通知':>5} {'错误':>5}")
+    print('-' * 100)
+    for result in results:
+        line = (f"{result['concurrency']:>4} {result['reviews']:>6} {result['reviews_per_min']:>12.1f} "
+                f"{result['p50_seconds']:>7.2f}s {result['p95_seconds']:>7.2f}s {result['cpu_seconds']:>8.2f} "
+                f"{result['cpu_cores']:>6.2f} {result['peak_rss_mb']:>7.1f}MB {result['llm_requests']:>8} "
+                f"{result['im_messages']:>5} {result['errors']:>5}")
+        previous = (baseline or {}).get(str(result['concurrency']))
+        if previous:
+            throughput = result['reviews_per_min'] / max(previous['reviews_per_min'], 1e-9) - 1
+            p95 = result['p95_seconds'] / max(previous['p95_seconds'], 1e-9) - 1
+            cpu = result['cpu_seconds'] / max(previous['cpu_seconds'], 1e-9) - 1
+            line += f"  | 对比基线: 吞吐 {throughput:+.1%} p95 {p95:+.1%} CPU {cpu:+.1%}"
+        print(line)
+
+
+def configure_environment(args, workdir: str, stub_url: str):
+    os.environ.update({
+        'LOG_FILE': os.path.join(workdir, 'app.log'),
+        'LOG_LEVEL': args.log_level,
+        'TRACE_FILE': os.path.join(workdir, 'trace.jsonl'),
+        'METRICS_MULTIPROC_DIR': '',
+        'LLM_PROVIDER': 'openai',
+        'OPENAI_API_KEY': 'benchmark',
+        'OPENAI_API_BASE_URL': f'{stub_url}/v1',
+        'OPENAI_API_MODEL': 'stub-model',
+        'OPENAI_THINKING_LEVEL': 'off',
+        'LLM_STREAMING_ENABLED': '1' if args.stream else '0',
+        'LLM_FAILOVER_PROVIDERS': '',
+        'LLM_RATE_LIMIT_RPM': '0',
+        'LLM_RATE_LIMIT_TPM': '0',
+        'REVIEW_BATCH_CONCURRENCY': str(args.batch_concurrency),
+        'AGENTIC_REVIEW_ENABLED': '0',
+        'PUSH_REVIEW_ENABLED': '1',
+        'SVN_REVIEW_ENABLED': '1',
+        'MERGE_REVIEW_ONLY_PROTECTED_BRANCHES_ENABLED': '0',
+        'DINGTALK_ENABLED': '0',
+        'FEISHU_ENABLED': '0',
+        'EXTRA_WEBHOOK_ENABLED': '0',
+        'WECOM_ENABLED': '1',
+        'WECOM_WEBHOOK_URL': f'{stub_url}/im/wecom',
+    })
+
+
+def use_approximate_tokens_if_offline():
+    """tiktoken 编码文件需要联网下载（无本地缓存时），离线环境下改用约 4 字符 1 token 的估算"""
+    try:
+        import tiktoken
+        tiktoken.get_encoding('cl100k_base')
+        return
+    except Exception:
+        print("⚠️ 无法加载 tiktoken 编码（离线且无缓存），token 计数改用估算值（约 4 字符 1 token）")
+    import biz.llm.rate_limiter
+    import biz.utils.code_reviewer
+    import biz.utils.diff_compactor
+    import biz.utils.token_util
+
+    def count_tokens(text: str) -> int:
+        return max(1, len(text or '') // 4)
+
+    def truncate_text_by_tokens(text: str, max_tokens: int, encoding_name: str = 'cl100k_base') -> str:
+        return text[:max_tokens * 4]
+
+    for module in (biz.utils.token_util, biz.utils.code_reviewer, biz.utils.diff_compactor, biz.llm.rate_limiter):
+        module.count_tokens = count_tokens
+    biz.utils.token_util.truncate_text_by_tokens = truncate_text_by_tokens
+    biz.utils.code_reviewer.truncate_text_by_tokens = truncate_text_by_tokens
+
+
+def isolate_databases(workdir: str):
+    """所有 SQLite 存储改写到临时目录，不影响 data/data.db"""
+    from biz.llm.call_ledger import LlmCallLedger
+    from biz.llm.failover import ProviderHealthStore
+    from biz.llm.rate_limiter import SqliteRateLimitStore
+    from biz.service.review_service import ReviewService
+    from biz.utils.incremental_review import MergeRequestReviewState
+    from biz.utils.mr_supersession import MergeRequestSupersession
+    from biz.utils.review_cache import FileReviewCache
+    from biz.utils.svn_checkpoint import SVNCheckpointManager
+    from biz.utils.version_tracker import VersionTracker
+
+    db_file = os.path.join(workdir, 'data.db')
+    for store in (ReviewService, VersionTracker, MergeRequestSupersession, MergeRequestReviewState, FileReviewCache,
+                  SqliteRateLimitStore, ProviderHealthStore, LlmCallLedger, SVNCheckpointManager):
+        store.DB_FILE = db_file
+    ReviewService.init_db()
+    SVNCheckpointManager.init_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端审查吞吐基准测试（本地桩服务，无需网络）")
+    parser.add_argument('--concurrency', default='1,4', help="逗号分隔的并发度列表（同时处理的审查数）")
+    parser.add_argument('--events', type=int, default=12, help="每个并发度回放的事件数")
+    parser.add_argument('--warmup', type=int, default=2, help="正式计时前的预热事件数")
+    parser.add_argument('--mix', default=','.join(SCENARIOS), help=f"事件类型轮换顺序，可选 {', '.join(SCENARIOS)}")
+    parser.add_argument('--payload-dir', help="录制的 GitLab webhook 请求体目录（*.json），指定后替代合成事件")
+    parser.add_argument('--files', type=int, default=6, help="每次提交变更的文件数")
+    parser.add_argument('--lines', type=int, default=60, help="每个文件新增的代码行数")
+    parser.add_argument('--batch-concurrency', type=int, default=4, help="REVIEW_BATCH_CONCURRENCY：单次审查内的分批并发数")
+    parser.add_argument('--llm-latency-ms', type=float, default=300, help="LLM 桩的首字延迟")
+    parser.add_argument('--llm-output-tokens', type=int, default=400, help="LLM 桩每次返回的输出 token 数")
+    parser.add_argument('--llm-tokens-per-sec', type=float, default=200, help="LLM 桩的输出速率")
+    parser.add_argument('--stream', action='store_true', help="启用流式调用（LLM_STREAMING_ENABLED=1）")
+    parser.add_argument('--gitlab-latency-ms', type=float, default=20, help="GitLab 桩接口每个请求的耗时")
+    parser.add_argument('--im-latency-ms', type=float, default=20, help="IM 通知桩接口每个请求的耗时")
+    parser.add_argument('--svn-latency-ms', type=float, default=50, help="每条 svn 命令的模拟耗时")
+    parser.add_argument('--log-level', default='WARNING', help="审查流程的日志级别")
+    parser.add_argument('--output', help="保存结果的 JSON 文件")
+    parser.add_argument('--baseline', help="对比的基线结果 JSON 文件（之前 --output 保存的）")
+    parser.add_argument('--keep-workdir', action='store_true', help="保留临时目录（数据库、追踪文件与日志）")
+    args = parser.parse_args()
+
+    mix = [item.strip() for item in args.mix.split(',') if item.strip()]
+    unknown = [item for item in mix if item not in SCENARIOS]
+    if unknown or not mix:
+        parser.error(f"未知的事件类型: {', '.join(unknown) or '(空)'}")
+    concurrency_levels = [int(item) for item in args.concurrency.split(',') if item.strip()]
+    payloads = load_payloads(args.payload_dir) if args.payload_dir else []
+
+    stub_config = {
+        'llm_latency': args.llm_latency_ms / 1000, 'output_tokens': args.llm_output_tokens,
+        'tokens_per_sec': max(args.llm_tokens_per_sec, 1e-3), 'gitlab_latency': args.gitlab_latency_ms / 1000,
+        'im_latency': args.im_latency_ms / 1000, 'files': args.files, 'lines': args.lines,
+    }
+    port_queue = multiprocessing.Queue()
+    stub_process = multiprocessing.Process(target=_serve_stubs, args=(stub_config, port_queue), daemon=True)
+    stub_process.start()
+    stub_url = f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+    workdir = tempfile.mkdtemp(prefix='codereview-bench-')
+    configure_environment(args, workdir, stub_url)
+    # 以下导入依赖上面的环境变量（日志文件、LLM 供应商等）
+    from biz.svn import svn_handler as svn_handler_module
+    from biz.utils.log import logger
+
+    isolate_databases(workdir)
+    use_approximate_tokens_if_offline()
+    error_counter = ErrorCounter()
+    logger.addHandler(error_counter)
+    svn_handler_module.subprocess.run = FakeSvn(args.files, args.lines, args.svn_latency_ms / 1000)
+    working_copy = os.path.join(workdir, 'svn_wc')
+    os.makedirs(os.path.join(working_copy, '.svn'))
+    svn_handler = svn_handler_module.SVNHandler('svn://benchmark/repo/trunk', working_copy)
+
+    print(f"🚀 端到端基准：事件 {','.join(mix) if not payloads else f'{len(payloads)} 个录制请求体'} | "
+          f"{args.files} 文件 × {args.lines} 行 | LLM 首字 {args.llm_latency_ms:.0f}ms + "
+          f"{args.llm_output_tokens} token @ {args.llm_tokens_per_sec:.0f} token/s{' (流式)' if args.stream else ''} | "
+          f"分批并发 {args.batch_concurrency}")
+    try:
+        if args.warmup:
+            run_round(build_events(mix, args.warmup, payloads, 0), 1, svn_handler, stub_url, stub_url, error_counter)
+        results = []
+        for index, concurrency in enumerate(concurrency_levels, start=1):
+            events = build_events(mix, args.events, payloads, index)
+            results.append(run_round(events, concurrency, svn_handler, stub_url, stub_url, error_counter))
+            print(f"✅ 并发 {concurrency}: {results[-1]['reviews_per_min']:.1f} reviews/min")
+
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = {str(item['concurrency']): item for item in json.load(f)['results']}
+        print_results(results, baseline)
+        if results and any(result['errors'] for result in results):
+            print(f"⚠️ 审查过程中出现错误日志，详见 {os.path.join(workdir, 'app.log')}")
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+            print(f"💾 结果已保存到 {args.output}")
+    finally:
+        from biz.llm.call_ledger import flush_ledger
+        flush_ledger()
+        stub_process.terminate()
+        if args.keep_workdir:
+            print(f"📁 临时目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
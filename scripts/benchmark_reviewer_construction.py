@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+审查器构造开销基准测试
+对比每个事件构造审查器时加载提示词的开销：
+旧方式每次打开 conf/prompt_templates.yml、YAML 解析整个文件并编译 Jinja2 模板，
+新方式从进程内提示词注册表按 (prompt_key, style) 取缓存。
+
+加 --construct 时另外实际构造 CodeReviewer / BatchCodeReviewer / AgenticCodeReviewer / ExcelReviewer，
+分别在每次清空提示词缓存与缓存命中两种情况下计时（含 LLM 客户端创建，需已配置当前供应商）。
+
+用法: python scripts/benchmark_reviewer_construction.py [--events 200] [--construct]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+import yaml
+from jinja2 import Template
+
+from biz.utils.default_config import get_env_with_default
+from biz.utils.prompt_registry import PROMPT_TEMPLATES_DIST_FILE, PROMPT_TEMPLATES_FILE, get_prompts, \
+    invalidate_prompt_cache
+
+# 每个事件构造审查器时加载的提示词：BatchCodeReviewer 加载审查 + 合并两份，Agentic 额外加载工具提示词
+PROMPTS_PER_EVENT = {
+    'CodeReviewer': ['code_review_prompt'],
+    'BatchCodeReviewer': ['code_review_batch_prompt', 'code_review_merge_prompt'],
+    'AgenticCodeReviewer': ['code_review_batch_prompt', 'code_review_merge_prompt', 'code_review_agentic_prompt'],
+    'ExcelReviewer': ['excel_review_prompt'],
+}
+
+
+def legacy_load(prompt_key: str, style: str):
+    """旧版 BaseReviewer._load_prompts 的加载过程"""
+    with open(PROMPT_TEMPLATES_FILE, "r", encoding="utf-8") as file:
+        full_config = yaml.safe_load(file)
+    prompts = full_config.get(prompt_key)
+    if prompts is None and os.path.exists(PROMPT_TEMPLATES_DIST_FILE):
+        with open(PROMPT_TEMPLATES_DIST_FILE, "r", encoding="utf-8") as tf:
+            prompts = (yaml.safe_load(tf) or {}).get(prompt_key)
+    return (Template(prompts["system_prompt"]).render(style=style),
+            Template(prompts["user_prompt"]).render(style=style))
+
+
+def run(label: str, func, events: int) -> float:
+    start = time.perf_counter()
+    for _ in range(events):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} 总耗时 {elapsed * 1000:10.2f} ms | 每个事件 {elapsed / events * 1000:8.3f} ms")
+    return elapsed
+
+
+def bench_prompts(events: int, style: str):
+    for reviewer, keys in PROMPTS_PER_EVENT.items():
+        print(f"[{reviewer}] 每个事件加载 {len(keys)} 份提示词")
+        legacy = run("  旧方式（每次解析+编译）", lambda: [legacy_load(k, style) for k in keys], events)
+        get_prompts(keys[0], style)  # 预热
+        cached = run("  提示词注册表（缓存命中）", lambda: [get_prompts(k, style) for k in keys], events)
+        print(f"  加速比: {legacy / max(cached, 1e-9):.1f}x")
+
+
+def bench_construct(events: int):
+    from biz.excel.excel_reviewer import ExcelReviewer
+    from biz.utils.agentic_reviewer import AgenticCodeReviewer
+    from biz.utils.code_reviewer import BatchCodeReviewer, CodeReviewer
+
+    for cls in (CodeReviewer, BatchCodeReviewer, AgenticCodeReviewer, ExcelReviewer):
+        try:
+            cls()
+        except Exception as e:
+            print(f"[{cls.__name__}] 构造失败，跳过（请检查 LLM 供应商配置）: {e}")
+            continue
+        print(f"[{cls.__name__}] 实际构造")
+
+        def _cold():
+            invalidate_prompt_cache()
+            cls()
+
+        cold = run("  每次清空提示词缓存", _cold, events)
+        warm = run("  提示词缓存命中", cls, events)
+        print(f"  加速比: {cold / max(warm, 1e-9):.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="审查器构造开销基准测试")
+    parser.add_argument('--events', type=int, default=200, help="模拟的事件数量")
+    parser.add_argument('--construct', action='store_true', help="实际构造审查器（含 LLM 客户端创建）")
+    args = parser.parse_args()
+
+    style = get_env_with_default("REVIEW_STYLE") or "professional"
+    bench_prompts(args.events, style)
+    if args.construct:
+        bench_construct(args.events)
+
+
+if __name__ == "__main__":
+    main()
@@ -161,10 +161,11 @@ nodaemon=true
 user=root
 
 [program:api]
-command=python /app/api.py
+command=gunicorn -c /app/gunicorn.conf.py api:api_app
 directory=/app
 autostart=true
 autorestart=true
+stopwaitsecs=60
 stderr_logfile=/app/log/api.err.log
 stdout_logfile=/app/log/api.out.log
 environment=PYTHONPATH="/app"
@@ -256,6 +257,7 @@ def validate_critical_config():
     important_files = {
         '/app/conf/.env': '环境变量配置文件',
         '/app/api.py': 'API 主程序',
+        '/app/gunicorn.conf.py': 'API 服务 gunicorn 配置',
         '/app/ui.py': 'UI 主程序'
     }
     
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Webhook 接收端压测工具
+按配置的事件组合向运行中的实例 /review/webhook 发送 GitLab Push / Merge Request 事件，统计接收延迟
+（HTTP 返回耗时）、状态码分布与错误率，并核对每个被接收（HTTP 200）的事件最终恰好被处理一次。
+
+核对方式：工具在本地启动 GitLab 桩接口（同时提供 OpenAI 兼容接口与企业微信接口，见 benchmark_end_to_end.py），
+事件通过 X-Gitlab-Instance 请求头指向该桩；审查任务处理事件时会向桩拉取一次 diff（Push 为 compare，
+MR 为 changes），按事件统计拉取次数：1 次为恰好一次，0 次为丢失 / 未处理完，多于 1 次为重复处理。
+被测实例需满足：
+- 未配置 GITLAB_URL（否则忽略请求头，事件不会指向桩接口），PUSH_REVIEW_ENABLED=1，
+  MERGE_REVIEW_ONLY_PROTECTED_BRANCHES_ENABLED 不影响（桩接口把所有分支视为受保护）
+- 建议把大模型指向桩接口，避免压测产生真实调用费用：
+  LLM_PROVIDER=openai OPENAI_API_BASE_URL=<桩地址>/v1 OPENAI_API_KEY=loadtest OPENAI_THINKING_LEVEL=off
+只关心接收端吞吐时可加 --no-verify。
+
+用法:
+    python scripts/load_test_webhook.py --url http://127.0.0.1:5001/review/webhook --rate 50 --requests 500
+    python scripts/load_test_webhook.py --concurrency 32 --duration 60 --mix push=3,mr=1 --payload-kb 64
+    python scripts/load_test_webhook.py --stub-host 0.0.0.0 --stub-port 9100 \\
+        --stub-public-url http://host.docker.internal:9100 --rate 20 --requests 200 --output intake.json
+
+--rate 为开环速率（每秒请求数，按计划发送时间计算延迟，包含客户端排队，避免协同遗漏）；
+--rate 0 为闭环模式，--concurrency 个连接各自发送完一个再发下一个。
+退出码：错误率超过 --max-error-rate 或核对发现丢失 / 重复时为 1。
+"""
+
+import argparse
+import json
+import multiprocessing
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmark_end_to_end import _serve_stubs, _stub_request, gitlab_mr_payload, gitlab_push_payload, percentile
+
+EVENT_TYPES = ('push', 'mr')
+
+
+def parse_mix(mix: str) -> list:
+    """push=3,mr=1 → ['push', 'push', 'push', 'mr']"""
+    sequence = []
+    for item in mix.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in EVENT_TYPES:
+            raise ValueError(f"未知的事件类型: {name}（可选 {', '.join(EVENT_TYPES)}）")
+        sequence.extend([name] * int(weight or 1))
+    if not sequence:
+        raise ValueError("事件组合为空")
+    return sequence
+
+
+def build_event(event_type: str, seq: int, payload_kb: int) -> tuple:
+    """返回 (payload, 用于核对的事件键)；事件键与 GitLab 桩接口记录拉取次数时使用的键一致"""
+    if event_type == 'push':
+        data = gitlab_push_payload(seq)
+        key = f"push:{data['project']['id']}:{data['after']}"
+    else:
+        data = gitlab_mr_payload(seq)
+        key = f"mr:{data['object_attributes']['target_project_id']}:{data['object_attributes']['iid']}"
+    if payload_kb > 0:
+        # 真实 webhook 请求体常有几十 KB（大量 commits、仓库描述等），接收端会完整解析并记录日志
+        data['project']['description'] = 'x' * (payload_kb * 1024)
+    return data, key
+
+
+class LoadGenerator:
+    def __init__(self, args, stub_url: str, control_url: str):
+        self.args = args
+        # stub_url 写入请求头供被测实例访问，control_url 供本工具查询桩接口的统计
+        self.stub_url = stub_url
+        self.control_url = control_url
+        self.mix = parse_mix(args.mix)
+        self.results = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _send(self, seq: int, scheduled: float):
+        event_type = self.mix[seq % len(self.mix)]
+        data, key = build_event(event_type, seq, self.args.payload_kb)
+        headers = {'X-Gitlab-Instance': self.stub_url, 'X-Gitlab-Token': self.args.token,
+                   'X-Gitlab-Event': 'Push Hook' if event_type == 'push' else 'Merge Request Hook'}
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        started = time.perf_counter()
+        try:
+            response = self._session().post(self.args.url, json=data, headers=headers, timeout=self.args.timeout)
+            status = str(response.status_code)
+        except requests.RequestException as e:
+            status = type(e).__name__
+        finished = time.perf_counter()
+        with self._lock:
+            self.results.append({'seq': seq, 'type': event_type, 'key': key, 'status': status,
+                                 # 开环模式从计划发送时间算起（包含客户端排队），闭环模式从实际发送算起
+                                 'latency': finished - (scheduled if self.args.rate > 0 else started)})
+
+    def run(self) -> float:
+        args = self.args
+        deadline = time.perf_counter() + args.duration if args.duration else None
+        started = time.perf_counter()
+        if args.rate > 0:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                seq = 0
+                while (not args.requests or seq < args.requests) and (deadline is None or
+                                                                       time.perf_counter() < deadline):
+                    scheduled = started + seq / args.rate
+                    # 提前提交，避免线程池排队导致发送晚于计划时间
+                    while scheduled - time.perf_counter() > 0.5:
+                        time.sleep(0.1)
+                    executor.submit(self._send, seq, scheduled)
+                    seq += 1
+        else:
+            counter = iter(range(args.requests or sys.maxsize))
+            counter_lock = threading.Lock()
+
+            def _worker():
+                while deadline is None or time.perf_counter() < deadline:
+                    with counter_lock:
+                        seq = next(counter, None)
+                    if seq is None:
+                        return
+                    self._send(seq, time.perf_counter())
+
+            threads = [threading.Thread(target=_worker) for _ in range(args.concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return time.perf_counter() - started
+
+    def verify(self) -> dict:
+        """等待已接收的事件处理完成，按事件核对 diff 拉取次数"""
+        accepted = [result['key'] for result in self.results if result['status'] == '200']
+        fetches = {}
+        started = time.time()
+        deadline = started + self.args.drain_timeout
+        while True:
+            fetches = _stub_request(self.control_url, '/_fetches')
+            pending = sum(1 for key in accepted if not fetches.get(key))
+            if not pending or time.time() >= deadline:
+                break
+            print(f"⏳ 等待处理完成：剩余 {pending}/{len(accepted)}", end='\r', flush=True)
+            time.sleep(1)
+        if accepted:
+            print()
+        counts = Counter(fetches.get(key, 0) for key in accepted)
+        return {
+            'accepted': len(accepted),
+            'exactly_once': counts.get(1, 0),
+            'missing': counts.get(0, 0),
+            'duplicated': sum(count for times, count in counts.items() if times > 1),
+            'drain_seconds': round(time.time() - started, 1),
+        }
+
+
+def summarize(results: list, wall: float) -> dict:
+    statuses = Counter(result['status'] for result in results)
+    latencies = [result['latency'] for result in results if result['status'] == '200']
+    total = len(results)
+    # 503 为队列满的背压响应（预期行为，单独统计），其余非 200 记为错误
+    errors = total - statuses.get('200', 0) - statuses.get('503', 0)
+    return {
+        'requests': total,
+        'wall_seconds': round(wall, 3),
+        'achieved_rate': round(total / wall, 2) if wall else 0,
+        'statuses': dict(statuses),
+        'rejected': statuses.get('503', 0),
+        'errors': errors,
+        'error_rate': round(errors / total, 4) if total else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round(max(latencies, default=0) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Webhook 接收端压测（GitLab Push / Merge Request 事件）")
+    parser.add_argument('--url', default='http://127.0.0.1:5001/review/webhook', help="被测实例的 webhook 地址")
+    parser.add_argument('--rate', type=float, default=20, help="开环发送速率（请求/秒），0 为闭环模式")
+    parser.add_argument('--concurrency', type=int, default=16, help="并发连接数（开环模式下为最大在途请求数）")
+    parser.add_argument('--requests', type=int, default=200, help="请求总数（0 表示只受 --duration 限制）")
+    parser.add_argument('--duration', type=float, default=0, help="最长发送时间（秒），0 表示不限")
+    parser.add_argument('--mix', default='push=1,mr=1', help="事件组合与权重，如 push=3,mr=1")
+    parser.add_argument('--payload-kb', type=int, default=0, help="每个请求体额外填充的大小（KB）")
+    parser.add_argument('--token', default='loadtest', help="X-Gitlab-Token 请求头（实例未配置 GITLAB_ACCESS_TOKEN 时使用）")
+    parser.add_argument('--timeout', type=float, default=30, help="单个请求的超时（秒）")
+    parser.add_argument('--no-verify', action='store_true', help="不核对事件处理情况，只测接收端")
+    parser.add_argument('--drain-timeout', type=float, default=300, help="等待已接收事件处理完成的最长时间（秒）")
+    parser.add_argument('--stub-host', default='127.0.0.1', help="桩接口监听地址")
+    parser.add_argument('--stub-port', type=int, default=0, help="桩接口监听端口（0 为随机端口）")
+    parser.add_argument('--stub-public-url', help="被测实例访问桩接口使用的地址（实例在容器内时需要），默认 http://<stub-host>:<port>")
+    parser.add_argument('--llm-latency-ms', type=float, default=200, help="桩 LLM 接口的首字延迟")
+    parser.add_argument('--llm-tokens-per-sec', type=float, default=500, help="桩 LLM 接口的输出速率")
+    parser.add_argument('--max-error-rate', type=float, default=0.0, help="允许的错误率，超过时退出码为 1")
+    parser.add_argument('--output', help="保存结果的 JSON 文件")
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error("--requests 与 --duration 不能同时为 0")
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    stub_config = {
+        'llm_latency': args.llm_latency_ms / 1000, 'output_tokens': 200,
+        'tokens_per_sec': max(args.llm_tokens_per_sec, 1e-3), 'gitlab_latency': 0.005, 'im_latency': 0.005,
+        'files': 3, 'lines': 40,
+    }
+    port_queue = multiprocessing.Queue()
+    stub_process = multiprocessing.Process(target=_serve_stubs, args=(stub_config, port_queue, args.stub_host,
+                                                                      args.stub_port), daemon=True)
+    stub_process.start()
+    port = port_queue.get(timeout=10)
+    local_stub_url = f"http://127.0.0.1:{port}"
+    stub_url = (args.stub_public_url or f"http://{args.stub_host}:{port}").rstrip('/')
+
+    print(f"🚀 压测 {args.url} | {'开环 %.1f req/s' % args.rate if args.rate > 0 else '闭环'} | 并发 {args.concurrency} | "
+          f"组合 {args.mix} | 填充 {args.payload_kb}KB")
+    print(f"🧪 桩接口: {stub_url}（GitLab API / OpenAI 兼容 {stub_url}/v1 / 企业微信 {stub_url}/im/wecom）")
+    try:
+        generator = LoadGenerator(args, stub_url, local_stub_url)
+        wall = generator.run()
+        summary = summarize(generator.results, wall)
+        print(f"\n📨 请求 {summary['requests']} | 实际速率 {summary['achieved_rate']:.1f} req/s | "
+              f"状态码 {summary['statuses']}")
+        print(f"⏱️ 接收延迟 p50 {summary['p50_ms']:.1f}ms  p95 {summary['p95_ms']:.1f}ms  "
+              f"p99 {summary['p99_ms']:.1f}ms  max {summary['max_ms']:.1f}ms")
+        print(f"❗ 错误 {summary['errors']}（{summary['error_rate']:.2%}） | 队列满拒绝 {summary['rejected']}")
+
+        failed = summary['error_rate'] > args.max_error_rate
+        if not args.no_verify:
+            verification = generator.verify()
+            summary['verification'] = verification
+            print(f"\n🔍 已接收 {verification['accepted']} | 恰好处理一次 {verification['exactly_once']} | "
+                  f"未处理 {verification['missing']} | 重复处理 {verification['duplicated']} | "
+                  f"等待 {verification['drain_seconds']}s")
+            failed = failed or verification['missing'] > 0 or verification['duplicated'] > 0
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({'args': vars(args), 'summary': summary}, f, ensure_ascii=False, indent=2)
+            print(f"💾 结果已保存到 {args.output}")
+        print("❌ 未通过" if failed else "✅ 通过")
+        return 1 if failed else 0
+    finally:
+        stub_process.terminate()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
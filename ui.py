@@ -14,7 +14,7 @@ import os
 import atexit
 from ui_components.config import setup_page_config, apply_custom_css
 from ui_components.auth import check_authentication, login_sidebar, quick_login_button
-from ui_components.pages import data_analysis_page, env_management_page
+from ui_components.pages import data_analysis_page, env_management_page, llm_usage_page
 from biz.utils.config_manager import ConfigManager
 
 # 信号处理和优雅关闭
@@ -323,7 +323,7 @@ def main_dashboard():
         st.markdown("### 🛠️ 系统功能")
         
         # 页面导航 - 仅登录后显示配置管理
-        page_options = ["📊 数据分析"]
+        page_options = ["📊 数据分析", "🤖 LLM 用量"]
         if st.session_state.get("authenticated", False):
             page_options.append("⚙️ 配置管理")
         page = st.radio(
@@ -380,6 +380,8 @@ def main_dashboard():
             st.markdown("""
             **📊 数据分析**: 查看代码审查统计和详细记录
             
+            **🤖 LLM 用量**: 按项目 / 供应商查看调用吞吐、P95 延迟与 token 花费
+            
             **⚙️ 配置管理**: 管理AI模型、平台开关等系统配置
             
             **用户操作**: 
@@ -395,6 +397,8 @@ def main_dashboard():
             st.markdown("---")
             # 显示一键登录按钮
             quick_login_button()
+    elif page == "🤖 LLM 用量":
+        llm_usage_page()
     else:  # 数据分析页面
         data_analysis_page()
 
@@ -7,6 +7,7 @@ import requests
 import os
 import json
 import datetime
+import pandas as pd
 from dotenv import load_dotenv
 from biz.utils.config_manager import ConfigManager
 from .utils import get_platform_status, get_review_stats, get_available_authors, get_available_projects
@@ -499,6 +500,80 @@ def _display_detailed_analysis(review_stats, platforms):
                 date_range=processed_date_range,
                 score_range=score_range            )
 
+def llm_usage_page():
+    """LLM 用量页面：按项目 / 供应商统计吞吐、延迟与 token 花费（数据来自大模型调用台账）"""
+    st.markdown("""
+    <div class="config-card">
+        <h2 style="margin: 0; text-align: center;">🤖 LLM 用量与延迟</h2>
+        <p style="margin: 0.5rem 0 0 0; text-align: center; font-size: 1.1rem;">按项目与供应商查看调用吞吐、P95 延迟与 token 花费，用于容量规划</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    import plotly.express as px
+    from biz.llm.call_ledger import LlmCallLedger, summarize_calls
+
+    col_range, col_refresh = st.columns([3, 1])
+    with col_range:
+        range_label = st.radio("时间范围", ["最近24小时", "最近7天", "最近30天"], horizontal=True,
+                               key="llm_usage_range")
+    with col_refresh:
+        st.markdown("<br>", unsafe_allow_html=True)  # 对齐按钮
+        if st.button("🔄 刷新数据", key="refresh_llm_usage_btn"):
+            st.rerun()
+
+    window_seconds = {"最近24小时": 86400, "最近7天": 7 * 86400, "最近30天": 30 * 86400}[range_label]
+    now = int(datetime.datetime.now().timestamp())
+    df = LlmCallLedger.get_calls(created_at_gte=now - window_seconds)
+    if df.empty:
+        st.info("📊 所选时间范围内暂无大模型调用记录（确认 LLM_LEDGER_ENABLED=1 且已有审查任务运行）")
+        return
+    df['project_name'] = df['project_name'].replace('', '（未关联）')
+
+    overall = summarize_calls(df.assign(scope='all'), ['scope'], window_seconds).iloc[0]
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("📞 调用次数", f"{int(overall['calls']):,}", help=f"平均 {overall['calls_per_hour']:.1f} 次/小时")
+    col2.metric("⏱️ P95 耗时", f"{overall['p95_ms'] / 1000:.1f}s", help=f"P50 {overall['p50_ms'] / 1000:.1f}s")
+    col3.metric("🔤 输入 / 输出 tokens", f"{int(overall['prompt_tokens']):,} / {int(overall['completion_tokens']):,}")
+    col4.metric("♻️ 缓存命中率", f"{overall['cache_hit_rate']:.1%}", help="命中提示词前缀缓存的输入 token 占比")
+    col5.metric("💰 估算费用", f"{overall['cost']:.2f}", help=f"失败率 {overall['error_rate']:.1%}，"
+                                                               f"重试 {int(overall['retries'])} 次")
+
+    df['time'] = pd.to_datetime(df['created_at'].map(datetime.datetime.fromtimestamp))
+    df['hour'] = df['time'].dt.floor('h')
+    trend = df.groupby(['hour', 'provider']).agg(calls=('outcome', 'size'),
+                                                 p95_ms=('duration_ms', lambda s: s.quantile(0.95))).reset_index()
+    trend_col1, trend_col2 = st.columns(2)
+    with trend_col1:
+        st.plotly_chart(px.bar(trend, x='hour', y='calls', color='provider', title="每小时调用次数",
+                               labels={'hour': '时间', 'calls': '调用次数', 'provider': '供应商'}),
+                        use_container_width=True)
+    with trend_col2:
+        st.plotly_chart(px.line(trend, x='hour', y='p95_ms', color='provider', markers=True, title="每小时 P95 耗时 (ms)",
+                                labels={'hour': '时间', 'p95_ms': 'P95 耗时 (ms)', 'provider': '供应商'}),
+                        use_container_width=True)
+
+    columns = {'calls': '调用次数', 'calls_per_hour': '次/小时', 'p50_ms': 'P50 耗时(ms)', 'p95_ms': 'P95 耗时(ms)',
+               'ttft_p95_ms': '首token P95(ms)', 'prompt_tokens': '输入tokens', 'cached_tokens': '缓存命中tokens',
+               'completion_tokens': '输出tokens', 'cache_hit_rate': '缓存命中率', 'cost': '估算费用',
+               'retries': '重试次数', 'error_rate': '失败率'}
+    for title, group_by in (("🏗️ 按项目", ['project_name']), ("🔌 按供应商 / 模型", ['provider', 'model'])):
+        st.markdown(f"### {title}")
+        summary = summarize_calls(df, group_by, window_seconds)
+        summary = summary[group_by + list(columns)].rename(
+            columns=dict(columns, project_name='项目', provider='供应商', model='模型'))
+        st.dataframe(summary.style.format({'次/小时': '{:.1f}', 'P50 耗时(ms)': '{:.0f}', 'P95 耗时(ms)': '{:.0f}',
+                                           '首token P95(ms)': '{:.0f}', '缓存命中率': '{:.1%}', '估算费用': '{:.4f}',
+                                           '失败率': '{:.1%}'}, na_rep='-'),
+                     use_container_width=True, hide_index=True)
+
+    with st.expander("🔍 最近失败的调用"):
+        failed = df[df['outcome'] != 'ok'].sort_values('created_at', ascending=False).head(50)
+        if failed.empty:
+            st.info("所选时间范围内没有失败的调用")
+        else:
+            st.dataframe(failed[['time', 'project_name', 'correlation_id', 'provider', 'model', 'outcome',
+                                 'retries', 'duration_ms', 'error']], use_container_width=True, hide_index=True)
+
 # 支持的 AI 供应商（与「🤖 AI模型」标签页中的顺序保持一致）
 LLM_PROVIDERS = ["deepseek", "openai", "zhipuai", "qwen", "jedi", "ollama"]
 